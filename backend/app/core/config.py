@@ -48,7 +48,7 @@ class SecretManager:
         self._client: Optional[secretmanager.SecretManagerServiceClient] = None
         self._cache: Dict[str, str] = {}
         
-        logger.info(f"SecretManager initialized with project_id: {self.project_id}")
+        logger.info("SecretManager initialized with project_id: %s", self.project_id)
     
     @property
     def client(self) -> secretmanager.SecretManagerServiceClient:
@@ -58,7 +58,7 @@ class SecretManager:
                 self._client = secretmanager.SecretManagerServiceClient()
                 logger.info("Secret Manager client initialized successfully")
             except Exception as e:
-                logger.error(f"Failed to initialize Secret Manager client: {e}")
+                logger.error("Failed to initialize Secret Manager client: %s", e)
                 raise
         return self._client
     
@@ -72,10 +72,10 @@ class SecretManager:
             response = self.client.access_secret_version(request={"name": secret_path})
             secret_value = response.payload.data.decode("UTF-8")
             self._cache[secret_name] = secret_value
-            logger.debug(f"Retrieved secret: {secret_name}")
+            logger.debug("Retrieved secret: %s", secret_name)
             return secret_value
         except Exception as e:
-            logger.error(f"Failed to get secret {secret_name}: {e}")
+            logger.error("Failed to get secret %s: %s", secret_name, e)
             raise
 
 
@@ -109,6 +109,82 @@ class Settings(BaseSettings):
     # Charm API Configuration
     charm_facility_id: str = "1043817000000046409"
     
+    # Supabase connection pool (async data layer)
+    supabase_pool_max_connections: int = 20
+    supabase_pool_max_keepalive: int = 10
+    supabase_pool_keepalive_expiry: float = 30.0
+    supabase_request_timeout: float = 10.0
+    supabase_connect_timeout: float = 5.0
+    
+    # Charm HTTP client (shared, pooled, HTTP/2)
+    charm_http2: bool = True
+    charm_pool_max_connections: int = 20
+    charm_pool_max_keepalive: int = 10
+    charm_pool_keepalive_expiry: float = 60.0
+    charm_connect_timeout: float = 5.0
+    charm_lookup_timeout: float = 15.0
+    charm_search_timeout: float = 15.0
+    charm_write_timeout: float = 30.0
+    charm_max_concurrent_requests: int = 8  # per-item fan-out writes in flight at once
+    
+    # Charm access token cache (seconds before expiry)
+    charm_token_expiry_buffer: int = 60
+    charm_token_proactive_refresh: int = 300
+    
+    # Background EHR push queue
+    ehr_push_workers: int = 3
+    ehr_push_max_attempts: int = 5
+    ehr_push_backoff_base: float = 10.0
+    ehr_push_backoff_max: float = 600.0
+    ehr_push_poll_interval: float = 5.0
+    ehr_push_stale_after: int = 900
+    # Queue Charm writes (section data, diagnoses) when a section is completed or confirmed.
+    # Off by default: turning it on writes intake PHI and LLM diagnoses to the live chart
+    ehr_auto_push_enabled: bool = False
+    # Push medical history as a keyed diff against the chart instead of re-posting every entry
+    ehr_push_sync_mode: bool = True
+    
+    # Charm patient record cache (MRN lookups and patient details)
+    patient_cache_ttl: float = 300.0
+    patient_cache_max_entries: int = 1000
+    
+    # Charm provider-directory search cache (normalized search parameters -> providers)
+    provider_search_cache_ttl: float = 900.0
+    provider_search_cache_max_entries: int = 500
+    
+    # Local mirror of the Charm provider directory (background sync + fuzzy search index)
+    provider_directory_sync_interval: float = 3600.0  # seconds between full re-listings
+    provider_directory_page_size: int = 200
+    provider_directory_min_score: float = 0.6  # weakest match returned from the local index
+    
+    # Persistent cache of Perplexity provider web searches (Supabase + in-process front)
+    provider_web_search_cache_ttl: float = 604800.0  # 7 days
+    
+    # Preloaded Charm payer list (insurance section)
+    payer_directory_refresh_interval: float = 21600.0  # seconds between background re-fetches
+    payer_directory_retry_interval: float = 60.0  # seconds between re-fetches until the first load succeeds
+    payer_directory_page_size: int = 500
+    payer_directory_min_score: float = 0.5  # weakest match returned by search_payers
+    
+    # Conversation memory (rolling summary + raw message window per session)
+    conversation_window_messages: int = 6  # most recent messages always kept verbatim
+    conversation_summary_trigger: int = 12  # unsummarized messages before older ones are folded into the summary
+    conversation_history_max_messages: int = 20  # hard cap on raw messages fetched and sent per turn
+    conversation_summary_max_chars: int = 1500
+    
+    # Identity verification fast path (local extractors before the LLM)
+    identity_fast_path_min_confidence: float = 0.8  # below this the LLM extracts last name and DOB
+    
+    # Latency metrics (/metrics and Server-Timing) - internal diagnostics, not for the public API
+    metrics_window_size: int = 1024  # recent samples per stage used for p50/p95/p99
+    metrics_token: Optional[str] = None  # bearer token required by /metrics; /metrics is not served without one
+    server_timing_header: bool = environment == "development"  # exposes internal stage timings to the client
+    
+    # Logging pipeline (queued, sampled, PHI-redacted)
+    log_queue_size: int = 10000  # records beyond this are dropped rather than blocking a request
+    log_sample_rates: Dict[str, float] = {}  # logger-name prefix -> fraction of DEBUG/INFO records kept
+    log_redact_phi: bool = True
+    
     # CORS Configuration
     @property
     def cors_origins(self) -> list[str]:
@@ -140,7 +216,7 @@ class Settings(BaseSettings):
         try:
             return get_secret_manager().get_secret("open-ai-key")
         except Exception as e:
-            logger.error(f"Failed to get OpenAI API key from Secret Manager: {e}")
+            logger.error("Failed to get OpenAI API key from Secret Manager: %s", e)
             raise ValueError("OpenAI API key not found in environment variables or Secret Manager")
     
     def get_supabase_url(self) -> str:
@@ -152,7 +228,7 @@ class Settings(BaseSettings):
         try:
             return get_secret_manager().get_secret("supabase-url")
         except Exception as e:
-            logger.error(f"Failed to get Supabase URL from Secret Manager: {e}")
+            logger.error("Failed to get Supabase URL from Secret Manager: %s", e)
             raise ValueError("Supabase URL not found in environment variables or Secret Manager")
     
     def get_supabase_service_role_key(self) -> str:
@@ -164,7 +240,7 @@ class Settings(BaseSettings):
         try:
             return get_secret_manager().get_secret("supabase-service-role-key")
         except Exception as e:
-            logger.error(f"Failed to get Supabase service role key from Secret Manager: {e}")
+            logger.error("Failed to get Supabase service role key from Secret Manager: %s", e)
             raise ValueError("Supabase service role key not found in environment variables or Secret Manager")
     
     def get_charm_client_id(self) -> str:
@@ -237,6 +313,9 @@ class LogConfig(BaseModel):
             "stream": "ext://sys.stdout",
         },
     }
+    # Everything propagates to the root handler, which app.core.log_pipeline puts behind a queue
     loggers: dict = {
-        LOGGER_NAME: {"handlers": ["default"], "level": LOG_LEVEL},
-    }
\ No newline at end of file
+        LOGGER_NAME: {"handlers": [], "level": LOG_LEVEL},
+        "app": {"handlers": [], "level": LOG_LEVEL},
+    }
+    root: dict = {"handlers": ["default"], "level": "WARNING"}
\ No newline at end of file
@@ -2,23 +2,35 @@
 Supabase database configuration and connection management
 """
 
+import asyncio
 import logging
 from typing import Optional
 
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, acreate_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 
 
 class SupabaseManager:
-    """Manages Supabase client connection with lazy initialization"""
-    
+    """
+    Manages Supabase client connections with lazy initialization
+
+    The async client is what request handlers use. It shares one pooled httpx
+    connection pool across every repository so PostgREST round trips never block
+    the event loop. The sync client is kept for standalone scripts.
+    """
+
     def __init__(self):
         self.settings = get_settings()
         self._client: Optional[Client] = None
-        logger.info(f"SupabaseManager initialized for project: {self.settings.gcp_project_id}")
-    
+        self._async_client: Optional[AsyncClient] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._async_lock = asyncio.Lock()
+        logger.info("SupabaseManager initialized for project: %s", self.settings.gcp_project_id)
+
     @property
     def client(self) -> Client:
         """Lazy initialization of Supabase client"""
@@ -26,19 +38,72 @@ class SupabaseManager:
             try:
                 supabase_url = self.settings.get_supabase_url()
                 supabase_key = self.settings.get_supabase_service_role_key()
-                
+
                 self._client = create_client(supabase_url, supabase_key)
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
-                logger.error(f"Failed to initialize Supabase client: {e}")
+                logger.error("Failed to initialize Supabase client: %s", e)
                 raise
         return self._client
 
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """Create the pooled httpx client shared by all async PostgREST calls"""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.settings.supabase_pool_max_connections,
+                max_keepalive_connections=self.settings.supabase_pool_max_keepalive,
+                keepalive_expiry=self.settings.supabase_pool_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                self.settings.supabase_request_timeout,
+                connect=self.settings.supabase_connect_timeout,
+            ),
+        )
+
+    async def get_async_client(self) -> AsyncClient:
+        """Lazy initialization of the async Supabase client"""
+        if self._async_client is not None:
+            return self._async_client
+
+        async with self._async_lock:
+            if self._async_client is None:
+                try:
+                    supabase_url = self.settings.get_supabase_url()
+                    supabase_key = self.settings.get_supabase_service_role_key()
+
+                    self._http_client = self._create_http_client()
+                    options = AsyncClientOptions(
+                        httpx_client=self._http_client,
+                        postgrest_client_timeout=self.settings.supabase_request_timeout,
+                    )
+                    self._async_client = await acreate_client(supabase_url, supabase_key, options=options)
+                    logger.info(
+                        "Async Supabase client initialized (pool max=%s, timeout=%ss)",
+                        self.settings.supabase_pool_max_connections, self.settings.supabase_request_timeout
+                    )
+                except Exception as e:
+                    logger.error("Failed to initialize async Supabase client: %s", e)
+                    raise
+        return self._async_client
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool (called from the application lifespan)"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            logger.info("Closed Supabase connection pool")
+        self._http_client = None
+        self._async_client = None
+
 
 # Global instance
 supabase_manager = SupabaseManager()
 
 
 def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
-    return supabase_manager.client
\ No newline at end of file
+    """Get Supabase client instance (sync - for scripts, not request handlers)"""
+    return supabase_manager.client
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Get the shared async Supabase client instance"""
+    return await supabase_manager.get_async_client()
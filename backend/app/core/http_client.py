@@ -0,0 +1,150 @@
+"""
+Shared HTTP client for Charm Tracker EHR API calls
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_CHARM_API_PREFIX = re.compile(r"^/api/ehr/v\d+/")
+
+
+@dataclass
+class ConnectionStats:
+    """Connection reuse counters for the shared Charm client"""
+    requests: int = 0
+    connections_opened: int = 0
+    tls_handshakes: int = 0
+    http2_responses: int = 0
+    errors: int = 0
+
+    @property
+    def reused_requests(self) -> int:
+        """Requests served over an already-open connection"""
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["reused_requests"] = self.reused_requests
+        stats["reuse_ratio"] = round(self.reused_requests / self.requests, 3) if self.requests else 0.0
+        return stats
+
+
+class CharmHTTPClient:
+    """
+    Process-wide pooled httpx client for ehr.charmtracker.com
+
+    One long-lived client keeps TCP/TLS connections alive between calls and
+    multiplexes concurrent requests over HTTP/2, instead of paying a new
+    handshake for every allergy, surgery or history entry pushed to Charm.
+    Opened and closed by the application lifespan; created lazily otherwise.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = ConnectionStats()
+        self._timeouts = {
+            "lookup": self.settings.charm_lookup_timeout,
+            "search": self.settings.charm_search_timeout,
+            "write": self.settings.charm_write_timeout,
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazy initialization of the shared client"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info(
+                "Charm HTTP client initialized (http2=%s, pool max=%s)",
+                self.settings.charm_http2, self.settings.charm_pool_max_connections
+            )
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.settings.charm_http2,
+            limits=httpx.Limits(
+                max_connections=self.settings.charm_pool_max_connections,
+                max_keepalive_connections=self.settings.charm_pool_max_keepalive,
+                keepalive_expiry=self.settings.charm_pool_keepalive_expiry,
+            ),
+            timeout=self.timeout("write"),
+            event_hooks={
+                "request": [self._on_request],
+                "response": [self._on_response],
+            },
+        )
+
+    def timeout(self, endpoint: str) -> httpx.Timeout:
+        """
+        Timeout for a class of Charm endpoint
+
+        lookup - single-record GETs (patient, allergies, details)
+        search - directory searches (providers, payers)
+        write  - POST/PUT calls that create or update chart data
+        """
+        read_timeout = self._timeouts.get(endpoint, self.settings.charm_write_timeout)
+        return httpx.Timeout(read_timeout, connect=self.settings.charm_connect_timeout)
+
+    @staticmethod
+    def _stage_name(request: httpx.Request) -> str:
+        """Metrics stage for a Charm call, e.g. GET /api/ehr/v1/patients/123/allergies -> charm.get.patients.allergies"""
+        path = _CHARM_API_PREFIX.sub("", request.url.path)
+        segments = [segment for segment in path.split("/") if segment and not segment.isdigit()]
+        return ".".join(["charm", request.method.lower()] + segments)
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.stats.requests += 1
+        request.extensions["trace"] = self._trace
+        request.extensions["started_at"] = time.perf_counter()
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        if response.http_version == "HTTP/2":
+            self.stats.http2_responses += 1
+
+        started = response.request.extensions.get("started_at")
+        if started is not None:
+            metrics.observe(self._stage_name(response.request), time.perf_counter() - started, error=response.status_code >= 500)
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        # httpcore only emits connect/TLS events when it has to open a new connection
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            self.stats.tls_handshakes += 1
+        elif event_name.endswith(".failed"):
+            self.stats.errors += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection reuse metrics"""
+        return self.stats.as_dict()
+
+    async def start(self) -> None:
+        """Open the connection pool (called from the application lifespan)"""
+        _ = self.client
+
+    async def aclose(self) -> None:
+        """Close the connection pool (called from the application lifespan)"""
+        if self._client is not None:
+            await self._client.aclose()
+            logger.info("Closed Charm HTTP client: %s", self.get_stats())
+        self._client = None
+
+
+# Global instance
+charm_http_client = CharmHTTPClient()
+
+
+def get_charm_http_client() -> CharmHTTPClient:
+    """Get the shared Charm HTTP client instance"""
+    return charm_http_client
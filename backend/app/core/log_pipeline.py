@@ -0,0 +1,275 @@
+"""
+Non-blocking, PHI-redacted logging pipeline
+Records are queued on the request path and formatted/written by a background listener thread
+"""
+
+import logging
+import queue
+import random
+import re
+import threading
+from dataclasses import dataclass, asdict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Mapping, Optional
+
+from app.core.config import get_settings
+
+REDACTED = "[REDACTED]"
+
+# Field names (case-insensitive, camelCase and snake_case) whose values are PHI
+PHI_FIELDS = frozenset(name.lower() for name in (
+    "firstName", "first_name", "middleName", "middle_name", "lastName", "last_name", "name",
+    "dateOfBirth", "date_of_birth", "dob",
+    "email", "mobile", "home", "work", "phone", "home_phone", "work_phone", "workExtension", "work_phone_extn",
+    "addressLine1", "address_line1", "addressLine2", "address_line2", "city", "zipCode", "postal_code",
+    "ssn", "memberId", "member_id", "subscriberId", "subscriber_id", "groupNumber", "group_number",
+    "emergencyContact", "message", "content",
+))
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"(?<!\d)(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}(?!\d)")
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Copy of a dict/list structure with the values of PHI fields replaced"""
+    if depth > 8:
+        return REDACTED
+    if isinstance(value, Mapping):
+        return {
+            key: REDACTED if str(key).lower() in PHI_FIELDS and value[key] not in (None, "", {}, [])
+            else redact(value[key], depth + 1)
+            for key in value
+        }
+    if isinstance(value, (list, tuple, set)):
+        return [redact(item, depth + 1) for item in value]
+    return value
+
+
+def scrub(text: str) -> str:
+    """Mask email addresses and phone numbers in free text"""
+    return _PHONE.sub(REDACTED, _EMAIL.sub(REDACTED, text))
+
+
+class Payload:
+    """
+    Log argument that renders as the size and shape of a payload, never its contents
+
+        logger.debug("Charm response for %s: %s", PHI(mrn), Payload(response.content))
+
+    Nothing is measured unless the record is actually emitted.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        value = self.value
+        if value is None:
+            return "<none>"
+        if isinstance(value, (bytes, bytearray)):
+            return f"<{len(value)} bytes>"
+        if isinstance(value, str):
+            return f"<{len(value.encode('utf-8', 'replace'))} bytes>"
+        if isinstance(value, Mapping):
+            return f"<dict {len(value)} keys: {', '.join(sorted(str(key) for key in value)[:12])}>"
+        if isinstance(value, (list, tuple, set)):
+            return f"<{type(value).__name__} {len(value)} items>"
+        if hasattr(value, "content"):  # httpx.Response
+            return f"<{getattr(value, 'status_code', '?')} {len(value.content)} bytes>"
+        return f"<{type(value).__name__}>"
+
+    __repr__ = __str__
+
+
+class PHI:
+    """
+    Log argument for a single PHI value (allergen, diagnosis, surgery, free text)
+
+        logger.info("Allergy %s already recorded", PHI(allergen))
+
+    Field names are lost once a value is passed as a bare string, so the redaction
+    filter cannot recognise it; wrapping the value marks it explicitly.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        return REDACTED
+
+    __repr__ = __str__
+
+
+class PHIRedactionFilter(logging.Filter):
+    """
+    Redact PHI fields in structured log args
+
+    Runs on the calling thread so dict/list args are copied before the caller can
+    mutate them; strings are scrubbed later by the listener thread. Scalar PHI
+    values must be passed wrapped in `PHI`, which is never rendered.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, (Mapping, list)):
+            record.msg = redact(record.msg)
+        if isinstance(record.args, Mapping):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(
+                redact(arg) if isinstance(arg, (Mapping, list, tuple, set)) else arg
+                for arg in record.args
+            )
+        return True
+
+
+class ScrubbingQueueListener(QueueListener):
+    """QueueListener that masks emails and phone numbers in message text before handing records on"""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]", *handlers: logging.Handler, scrub_text: bool = True):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.scrub_text = scrub_text
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if self.scrub_text:
+            if isinstance(record.msg, str):
+                record.msg = scrub(record.msg)
+            if isinstance(record.args, tuple):
+                record.args = tuple(scrub(arg) if isinstance(arg, str) else arg for arg in record.args)
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of DEBUG/INFO records per logger
+
+    Rates come from `log_sample_rates` ({"app.services.ehr_service": 0.1, ...}); the
+    longest matching logger-name prefix wins. WARNING and above are never sampled out.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+@dataclass
+class LogPipelineStats:
+    """Counters for the queued logging pipeline"""
+    enqueued: int = 0
+    dropped: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never formats or blocks on the calling thread
+
+    The stdlib handler formats the message before enqueueing; here only the
+    (already redacted) args are carried over and the listener thread does the
+    formatting and I/O. A full queue drops the record instead of waiting.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]", stats: LogPipelineStats):
+        super().__init__(log_queue)
+        self.stats = stats
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.stats.enqueued += 1
+        except queue.Full:
+            self.stats.dropped += 1
+
+
+class LogPipeline:
+    """
+    Process-wide logging pipeline installed on the root logger
+
+    start() moves the root handlers behind a bounded queue served by a listener
+    thread and adds the sampling and PHI redaction filters; stop() drains the
+    queue and restores the original handlers. Loggers that have their own handlers
+    and do not propagate to the root are not affected.
+    """
+
+    def __init__(self):
+        self.stats = LogPipelineStats()
+        self._listener: Optional[QueueListener] = None
+        self._handler: Optional[NonBlockingQueueHandler] = None
+        self._targets: List[logging.Handler] = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._listener is not None:
+                return
+
+            settings = get_settings()
+            root = logging.getLogger()
+            self._targets = list(root.handlers) or [logging.StreamHandler()]
+
+            self._handler = NonBlockingQueueHandler(queue.Queue(settings.log_queue_size), self.stats)
+            self._handler.addFilter(SamplingFilter(settings.log_sample_rates))
+            if settings.log_redact_phi:
+                self._handler.addFilter(PHIRedactionFilter())
+
+            for handler in self._targets:
+                root.removeHandler(handler)
+            root.addHandler(self._handler)
+
+            self._listener = ScrubbingQueueListener(self._handler.queue, *self._targets, scrub_text=settings.log_redact_phi)
+            self._listener.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._listener is None:
+                return
+
+            root = logging.getLogger()
+            root.removeHandler(self._handler)
+            self._listener.stop()  # drains whatever is still queued
+            for handler in self._targets:
+                root.addHandler(handler)
+            self._listener = None
+            self._handler = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.as_dict()
+        stats["queued"] = self._handler.queue.qsize() if self._handler else 0
+        stats["running"] = self.running
+        return stats
+
+
+# Global logging pipeline
+log_pipeline = LogPipeline()
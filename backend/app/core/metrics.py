@@ -0,0 +1,216 @@
+"""
+Latency instrumentation for the request hot path
+Per-stage timers feed a Prometheus text endpoint and a Server-Timing response header
+"""
+
+import functools
+import logging
+import math
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.\-]")
+
+
+@dataclass
+class StageStats:
+    """Latency samples for one stage; quantiles are taken over a sliding window"""
+    window: Deque[float]
+    count: int = 0
+    total: float = 0.0
+    errors: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.window.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+@dataclass
+class RequestTimings:
+    """Stage durations accumulated during one HTTP request"""
+    stages: Dict[str, float] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def server_timing(self, total: float) -> str:
+        """Format as a Server-Timing header value (durations in milliseconds)"""
+        entries = []
+        for stage, seconds in self.stages.items():
+            entry = f"{_SERVER_TIMING_NAME.sub('_', stage)};dur={seconds * 1000:.1f}"
+            if self.calls[stage] > 1:
+                entry += f';desc="x{self.calls[stage]}"'
+            entries.append(entry)
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# Timings for the request currently being handled (None outside a request)
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+class MetricsRegistry:
+    """
+    Process-wide per-stage latency metrics
+
+    Stages are dotted names such as `db.verify_session`, `charm.get.patients`,
+    `charm.token` or `agent.conversation`. Every observation is recorded in the
+    process totals and, when inside a request, in that request's breakdown.
+    """
+
+    def __init__(self, window_size: Optional[int] = None):
+        self.window_size = window_size or get_settings().metrics_window_size
+        self._stages: Dict[str, StageStats] = {}
+
+    def _get_stage(self, stage: str) -> StageStats:
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = StageStats(window=deque(maxlen=self.window_size))
+            self._stages[stage] = stats
+        return stats
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        """Record one duration for a stage"""
+        stats = self._get_stage(stage)
+        stats.observe(seconds)
+        if error:
+            stats.errors += 1
+
+        request_timings = _request_timings.get()
+        if request_timings is not None:
+            request_timings.add(stage, seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as `stage`"""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, error=error)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator timing every call of an async function as `stage`"""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.timer(stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, error count, mean and p50/p95/p99 in seconds"""
+        result = {}
+        for stage, stats in sorted(self._stages.items()):
+            result[stage] = {
+                "count": stats.count,
+                "errors": stats.errors,
+                "mean": stats.total / stats.count if stats.count else 0.0,
+                **{f"p{int(q * 100)}": stats.quantile(q) for q in QUANTILES},
+            }
+        return result
+
+    def render_prometheus(self) -> str:
+        """Render all stages in the Prometheus text exposition format"""
+        lines: List[str] = [
+            "# HELP poc_intake_stage_duration_seconds Latency of request pipeline stages",
+            "# TYPE poc_intake_stage_duration_seconds summary",
+        ]
+        for stage, stats in sorted(self._stages.items()):
+            label = stage.replace("\\", "\\\\").replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'poc_intake_stage_duration_seconds{{stage="{label}",quantile="{q}"}} {stats.quantile(q):.6f}')
+            lines.append(f'poc_intake_stage_duration_seconds_sum{{stage="{label}"}} {stats.total:.6f}')
+            lines.append(f'poc_intake_stage_duration_seconds_count{{stage="{label}"}} {stats.count}')
+
+        lines.append("# HELP poc_intake_stage_errors_total Stage calls that raised an exception")
+        lines.append("# TYPE poc_intake_stage_errors_total counter")
+        for stage, stats in sorted(self._stages.items()):
+            label = stage.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'poc_intake_stage_errors_total{{stage="{label}"}} {stats.errors}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self._stages.clear()
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that opens a per-request timing scope
+
+    Records the whole request as `http.<METHOD> <route>` and, when enabled,
+    adds a Server-Timing header with the stages observed before the response
+    started. For streamed responses only the stages before the first byte are
+    included in the header; the rest still reach /metrics.
+    """
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None, header_enabled: Optional[bool] = None):
+        self.app = app
+        self.registry = registry or metrics
+        self.header_enabled = get_settings().server_timing_header if header_enabled is None else header_enabled
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message) -> None:
+            if message["type"] == "http.response.start" and self.header_enabled:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        error = False
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            _request_timings.reset(token)
+            self.registry.observe(f"http.{scope['method']} {route_path}", time.perf_counter() - start, error=error)
+
+
+def get_request_timings() -> Optional[RequestTimings]:
+    """Timings collected so far for the current request"""
+    return _request_timings.get()
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+timed = metrics.timed
@@ -3,28 +3,42 @@ Charm Tracker API Token Manager
 Uses Supabase authTokens table for token storage and automatic refresh
 """
 
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional
 
 import httpx
-from app.core.database import get_supabase_client
+from app.core.database import get_async_supabase_client
 from app.core.config import get_settings
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
 
 class CharmTokenManager:
-    """Manages Charm Tracker API authentication tokens with Supabase storage"""
+    """
+    Manages Charm Tracker API authentication tokens with Supabase storage
+
+    The current token is cached in memory until shortly before it expires, so
+    Supabase is only read on a cold start or cache miss. Refreshes are
+    single-flight: concurrent callers wait on one in-flight refresh instead of
+    each hitting the OAuth endpoint. A background refresh is started when the
+    token enters the proactive refresh window, before the expiry buffer.
+    """
 
     def __init__(self):
         self.settings = get_settings()
         self.table_name = "authTokens"
+        self._access_token: Optional[str] = None
+        self._expires_at: Optional[datetime] = None  # naive UTC
+        self._refresh_lock = asyncio.Lock()
+        self._background_refresh: Optional[asyncio.Task] = None
         logger.info("CharmTokenManager initialized with Supabase storage")
 
-    def _get_supabase_client(self):
-        """Get Supabase client"""
-        return get_supabase_client()
+    async def _get_supabase_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
 
     def _get_secret(self, secret_name: str) -> str:
         """Get secret from settings (which handles Secret Manager)"""
@@ -42,14 +56,15 @@ class CharmTokenManager:
     async def _get_token_from_db(self) -> Optional[Dict]:
         """Get charm token from Supabase authTokens table"""
         try:
-            response = self._get_supabase_client().table(self.table_name).select("*").eq("tokenName", "charm").execute()
+            client = await self._get_supabase_client()
+            response = await client.table(self.table_name).select("*").eq("tokenName", "charm").execute()
             
             if response.data and len(response.data) > 0:
                 return response.data[0]
             return None
             
         except Exception as e:
-            logger.error(f"Error retrieving charm token from database: {e}")
+            logger.error("Error retrieving charm token from database: %s", e)
             raise
 
     async def _save_token_to_db(self, access_token: str, expires_in: int) -> None:
@@ -65,16 +80,17 @@ class CharmTokenManager:
             }
             
             # Try to update existing record first
-            response = self._get_supabase_client().table(self.table_name).update(token_data).eq("tokenName", "charm").execute()
+            client = await self._get_supabase_client()
+            response = await client.table(self.table_name).update(token_data).eq("tokenName", "charm").execute()
             
             # If no rows were updated, insert new record
             if not response.data:
-                response = self._get_supabase_client().table(self.table_name).insert(token_data).execute()
+                response = await client.table(self.table_name).insert(token_data).execute()
             
-            logger.info(f"Saved charm token to database, expires at {expires_at}")
+            logger.info("Saved charm token to database, expires at %s", expires_at)
             
         except Exception as e:
-            logger.error(f"Error saving charm token to database: {e}")
+            logger.error("Error saving charm token to database: %s", e)
             raise
 
     async def _refresh_token(self) -> str:
@@ -102,7 +118,7 @@ class CharmTokenManager:
                 response = await client.post(access_token_url, headers=headers)
                 
                 if response.status_code == 400:
-                    logger.error(f"Token refresh failed with 400 - refresh token may be expired: {response.text}")
+                    logger.error("Token refresh failed with 400 - refresh token may be expired: %s", response.text)
                     raise ValueError("Refresh token is invalid or expired. Manual re-authentication required.")
                 
                 response.raise_for_status()
@@ -113,50 +129,99 @@ class CharmTokenManager:
                     raise ValueError("No access_token in response")
                 
                 expires_in = auth_data.get("expires_in", 3600)  # Default to 1 hour
+                self._set_cached_token(access_token, datetime.utcnow() + timedelta(seconds=expires_in))
                 
-                # Save to database
-                await self._save_token_to_db(access_token, expires_in)
+                # Save to database so other instances pick up the new token
+                try:
+                    await self._save_token_to_db(access_token, expires_in)
+                except Exception:
+                    logger.warning("Refreshed token is cached in memory but could not be persisted")
                 
                 logger.info("Token refreshed and saved successfully")
                 return access_token
                 
         except Exception as e:
-            logger.error(f"Failed to refresh Charm Tracker token: {e}")
+            logger.error("Failed to refresh Charm Tracker token: %s", e)
             raise
 
+    def _set_cached_token(self, access_token: str, expires_at: datetime) -> None:
+        """Store the token in the in-process cache"""
+        self._access_token = access_token
+        self._expires_at = expires_at
+
+    @staticmethod
+    def _parse_expiration(expiration_str: str) -> datetime:
+        """Parse a stored expiration timestamp as naive UTC"""
+        expiration_time = datetime.fromisoformat(expiration_str.replace('Z', '+00:00'))
+        if expiration_time.tzinfo is not None:
+            expiration_time = expiration_time.astimezone(timezone.utc).replace(tzinfo=None)
+        return expiration_time
+
+    def _seconds_until_expiry(self) -> float:
+        """Seconds left on the cached token (negative or zero when there is none)"""
+        if not self._access_token or not self._expires_at:
+            return 0.0
+        return (self._expires_at - datetime.utcnow()).total_seconds()
+
+    def _cached_token_is_valid(self) -> bool:
+        """Check the cached token against the expiry buffer (1 minute by default)"""
+        return self._seconds_until_expiry() > self.settings.charm_token_expiry_buffer
+
+    def _schedule_background_refresh(self) -> None:
+        """Start a background refresh if the token is close to expiring"""
+        if self._seconds_until_expiry() > self.settings.charm_token_proactive_refresh:
+            return
+        if self._refresh_lock.locked():
+            return
+        if self._background_refresh and not self._background_refresh.done():
+            return
+        self._background_refresh = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self) -> None:
+        """Proactively refresh the token before callers see it expire"""
+        try:
+            async with self._refresh_lock:
+                if self._seconds_until_expiry() > self.settings.charm_token_proactive_refresh:
+                    return  # Already refreshed by someone else
+                logger.info("Proactively refreshing Charm Tracker token")
+                await self._refresh_token()
+        except Exception as e:
+            # The cached token is still usable; the next caller inside the buffer retries
+            logger.error("Background token refresh failed: %s", e)
+
+    async def _load_or_refresh_token(self) -> str:
+        """Cache miss: read the stored token, refreshing it if expired or missing"""
+        token_record = await self._get_token_from_db()
+        
+        if token_record and token_record.get("tokenExpiration"):
+            self._set_cached_token(
+                token_record["authToken"],
+                self._parse_expiration(token_record["tokenExpiration"])
+            )
+            if self._cached_token_is_valid():
+                logger.debug("Using existing valid token from database")
+                return token_record["authToken"]
+        
+        # Token is expired or doesn't exist, refresh it
+        logger.info("Token expired or not found, refreshing...")
+        return await self._refresh_token()
+
+    @timed("charm.token")
     async def get_token(self) -> str:
         """Get current valid access token, refreshing if necessary"""
-        #print("DEBUG: get_token called")
         try:
-            #print("DEBUG: About to get token from database")
-            # Get token from database
-            token_record = await self._get_token_from_db()
-            #print(f"DEBUG: Got token record: {token_record}")
-            
-            if token_record:
-                # Check if token is still valid
-                expiration_str = token_record.get("tokenExpiration")
-                if expiration_str:
-                    # Parse expiration time
-                    expiration_time = datetime.fromisoformat(expiration_str.replace('Z', '+00:00'))
-                    if isinstance(expiration_time.tzinfo, type(None)):
-                        # Assume UTC if no timezone info
-                        expiration_time = expiration_time.replace(tzinfo=None)
-                        current_time = datetime.utcnow()
-                    else:
-                        current_time = datetime.now(expiration_time.tzinfo)
-                    
-                    # Check if token is still valid (with 1 minute buffer)
-                    if current_time < (expiration_time - timedelta(minutes=1)):
-                        logger.debug("Using existing valid token from database")
-                        return token_record["authToken"]
+            if self._cached_token_is_valid():
+                self._schedule_background_refresh()
+                return self._access_token
             
-            # Token is expired or doesn't exist, refresh it
-            logger.info("Token expired or not found, refreshing...")
-            return await self._refresh_token()
+            # Single flight: the first caller loads/refreshes, the rest wait and reuse it
+            async with self._refresh_lock:
+                if self._cached_token_is_valid():
+                    return self._access_token
+                return await self._load_or_refresh_token()
             
         except Exception as e:
-            logger.error(f"Error getting charm token: {e}")
+            logger.error("Error getting charm token: %s", e)
             raise
 
     async def get_api_headers(self) -> Dict[str, str]:
@@ -172,7 +237,7 @@ class CharmTokenManager:
             }
             
         except Exception as e:
-            logger.error(f"Error getting API headers: {e}")
+            logger.error("Error getting API headers: %s", e)
             raise
 
 
@@ -0,0 +1,101 @@
+"""
+In-process TTL + LRU cache
+Shared by the patient record, provider search and provider web search caches
+"""
+
+import copy
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a TTL cache (several caches may share one)"""
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0  # misses where an expired entry was found
+    invalidations: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.hits + self.misses
+        stats["hit_ratio"] = round(self.hits / lookups, 3) if lookups else 0.0
+        return stats
+
+
+@dataclass
+class _CacheEntry(Generic[V]):
+    value: V
+    expires_at: float
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Entries expire ttl_seconds after they are written; past max_entries the least
+    recently used entry is evicted. Values are deep-copied in and out, so callers
+    may modify what they store or get back.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000, stats: Optional[CacheStats] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = stats or CacheStats()
+        self._entries: "OrderedDict[K, _CacheEntry[V]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Cached value, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.misses += 1
+            self.stats.stale += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return copy.deepcopy(entry.value)
+
+    def put(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value for ttl_seconds (the cache default unless given)"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = _CacheEntry(copy.deepcopy(value), time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, key: K, fields: Dict[str, Any]) -> bool:
+        """Merge fields into a cached dict value, keeping its expiry; False if not cached"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry.value.update(copy.deepcopy(fields))
+        return True
+
+    def discard(self, key: K) -> bool:
+        """Drop one entry; True if it was cached"""
+        return self._entries.pop(key, None) is not None
+
+    def discard_where(self, predicate: Callable[[K, V], bool]) -> int:
+        """Drop every entry the predicate matches; returns how many were dropped"""
+        keys = [key for key, entry in self._entries.items() if predicate(key, entry.value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many were dropped"""
+        count = len(self._entries)
+        self._entries.clear()
+        return count
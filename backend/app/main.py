@@ -2,20 +2,36 @@
 Main FastAPI application for POC Intake
 """
 
+import hmac
 import logging
 import logging.config
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.core.config import get_settings, LogConfig
 from app.core.token_manager import charm_token_manager
+from app.core.database import supabase_manager
+from app.core.http_client import charm_http_client
+from app.core.metrics import metrics, ServerTimingMiddleware
+from app.core.log_pipeline import log_pipeline
+from app.services.ehr_service import ehr_service
+from app.services.ehr_push_queue import ehr_push_queue
+from app.services.identity_verification import identity_service
+from app.services.diagnosis_engine import diagnosis_engine
+from app.services.prompt_compiler import prompt_compiler
+from app.services.provider_directory import provider_directory
+from app.services.provider_web_search_cache import provider_web_search_cache
+from app.services.payer_directory import payer_directory
 from app.routers import intake, chat
 
-# Configure logging
+# Configure logging - records are formatted and written off the event loop
 logging.config.dictConfig(LogConfig().model_dump())
+log_pipeline.start()
 logger = logging.getLogger("poc_intake")
 
 
@@ -25,11 +41,22 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting POC Intake application")
     logger.info("Token manager initialized with Supabase storage")
+    await charm_http_client.start()
+    diagnosis_engine.warm()
+    await ehr_push_queue.start()
+    await provider_directory.start()
+    await payer_directory.start()
   
     yield
     
     # Shutdown
     logger.info("Shutting down POC Intake application")
+    await payer_directory.stop()
+    await provider_directory.stop()
+    await ehr_push_queue.stop()
+    await charm_http_client.aclose()
+    await supabase_manager.aclose()
+    log_pipeline.stop()
 
 
 # Initialize FastAPI app
@@ -58,6 +85,9 @@ if not settings.debug:
         allowed_hosts=["*.poundofcure.com", "localhost", "127.0.0.1"]
     )
 
+# Outermost, so Server-Timing covers the whole request
+app.add_middleware(ServerTimingMiddleware)
+
 # Include routers
 app.include_router(intake.router, prefix="/api/v1", tags=["intake"])
 app.include_router(chat.router, prefix="/api/v1", tags=["chat"])
@@ -80,10 +110,33 @@ async def health_check():
     return {
         "status": "healthy",
         "environment": settings.environment,
-        "project": settings.gcp_project_id
+        "project": settings.gcp_project_id,
+        "charm_http": charm_http_client.get_stats(),
+        "patient_cache": ehr_service.patient_cache.get_stats(),
+        "provider_search_cache": ehr_service.provider_cache.get_stats(),
+        "provider_directory": provider_directory.get_stats(),
+        "provider_web_search_cache": provider_web_search_cache.get_stats(),
+        "payer_directory": payer_directory.get_stats(),
+        "logging": log_pipeline.get_stats(),
+        "prompt_tokens": prompt_compiler.get_stats(),
+        "identity_fast_path": identity_service.get_stats(),
+        "diagnosis_engine": diagnosis_engine.get_stats()
     }
 
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Per-stage latency (p50/p95/p99, sum, count) in Prometheus text format
+    Internal only: requires `Authorization: Bearer <metrics_token>` and is not served when no token is set
+    """
+    token = get_settings().metrics_token
+    if not token or not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -7,7 +7,8 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
-from app.core.database import get_supabase_client
+from app.core.database import get_async_supabase_client
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +19,11 @@ class ChatHistoryRepository:
     def __init__(self):
         self.table_name = "n8n_chat_histories"
     
-    def _get_client(self):
-        """Get Supabase client"""
-        return get_supabase_client()
+    async def _get_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
     
+    @timed("db.add_message")
     async def add_message(self, session_id: str, message: Dict[str, Any]) -> bool:
         """
         Add a single message to chat history
@@ -39,18 +41,20 @@ class ChatHistoryRepository:
                 "message": message
             }
             
-            response = self._get_client().table(self.table_name).insert(message_data).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).insert(message_data).execute()
             
             if not response.data:
                 raise Exception("Failed to add message")
             
-            logger.debug(f"Added message to chat history for session {session_id}")
+            logger.debug("Added message to chat history for session %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error adding message to chat history for session {session_id}: {e}")
+            logger.error("Error adding message to chat history for session %s: %s", session_id, e)
             raise
     
+    @timed("db.add_messages")
     async def add_messages(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
         """
         Add multiple messages to chat history
@@ -71,18 +75,20 @@ class ChatHistoryRepository:
                 for message in messages
             ]
             
-            response = self._get_client().table(self.table_name).insert(message_data).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).insert(message_data).execute()
             
             if not response.data:
                 raise Exception("Failed to add messages")
             
-            logger.debug(f"Added {len(messages)} messages to chat history for session {session_id}")
+            logger.debug("Added %s messages to chat history for session %s", len(messages), session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error adding messages to chat history for session {session_id}: {e}")
+            logger.error("Error adding messages to chat history for session %s: %s", session_id, e)
             raise
     
+    @timed("db.get_conversation_history")
     async def get_conversation_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Get conversation history for a session
@@ -95,23 +101,25 @@ class ChatHistoryRepository:
             List[Dict]: List of message dictionaries ordered by creation time
         """
         try:
-            query = self._get_client().table(self.table_name).select("message").eq("session_id", session_id).order("id", desc=False)
+            client = await self._get_client()
+            query = client.table(self.table_name).select("message").eq("session_id", session_id).order("id", desc=False)
             
             if limit:
                 query = query.limit(limit)
             
-            response = query.execute()
+            response = await query.execute()
             
             # Extract just the message content from each record
             messages = [record["message"] for record in response.data]
             
-            logger.debug(f"Retrieved {len(messages)} messages for session {session_id}")
+            logger.debug("Retrieved %s messages for session %s", len(messages), session_id)
             return messages
             
         except Exception as e:
-            logger.error(f"Error retrieving conversation history for session {session_id}: {e}")
+            logger.error("Error retrieving conversation history for session %s: %s", session_id, e)
             raise
     
+    @timed("db.get_recent_messages")
     async def get_recent_messages(self, session_id: str, count: int = 20) -> List[Dict[str, Any]]:
         """
         Get recent messages for a session (for maintaining context window)
@@ -124,8 +132,9 @@ class ChatHistoryRepository:
             List[Dict]: List of recent message dictionaries
         """
         try:
-            response = (
-                self._get_client()
+            client = await self._get_client()
+            response = await (
+                client
                 .table(self.table_name)
                 .select("message")
                 .eq("session_id", session_id)
@@ -138,13 +147,42 @@ class ChatHistoryRepository:
             messages = [record["message"] for record in response.data]
             messages.reverse()  # Most recent last for conversation flow
             
-            logger.debug(f"Retrieved {len(messages)} recent messages for session {session_id}")
+            logger.debug("Retrieved %s recent messages for session %s", len(messages), session_id)
             return messages
             
         except Exception as e:
-            logger.error(f"Error retrieving recent messages for session {session_id}: {e}")
+            logger.error("Error retrieving recent messages for session %s: %s", session_id, e)
             raise
     
+    @timed("db.get_messages_after")
+    async def get_messages_after(self, session_id: str, after_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Get the most recent messages newer than a given message id
+
+        Args:
+            session_id: The session identifier
+            after_id: Only messages with a larger id are returned (None for all)
+            limit: Maximum number of (most recent) messages to retrieve
+
+        Returns:
+            List[Dict]: {"id": ..., "message": {...}} records in chronological order
+        """
+        try:
+            client = await self._get_client()
+            query = client.table(self.table_name).select("id, message").eq("session_id", session_id)
+            if after_id is not None:
+                query = query.gt("id", after_id)
+            response = await query.order("id", desc=True).limit(limit).execute()
+
+            records = list(reversed(response.data or []))
+            logger.debug("Retrieved %s messages after %s for session %s", len(records), after_id, session_id)
+            return records
+
+        except Exception as e:
+            logger.error("Error retrieving messages after %s for session %s: %s", after_id, session_id, e)
+            raise
+
+    @timed("db.clear_conversation_history")
     async def clear_conversation_history(self, session_id: str) -> bool:
         """
         Clear all conversation history for a session
@@ -156,15 +194,17 @@ class ChatHistoryRepository:
             bool: True if successful, raises exception on failure
         """
         try:
-            response = self._get_client().table(self.table_name).delete().eq("session_id", session_id).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).delete().eq("session_id", session_id).execute()
             
-            logger.info(f"Cleared conversation history for session {session_id}")
+            logger.info("Cleared conversation history for session %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error clearing conversation history for session {session_id}: {e}")
+            logger.error("Error clearing conversation history for session %s: %s", session_id, e)
             raise
     
+    @timed("db.get_conversation_summary")
     async def get_conversation_summary(self, session_id: str) -> Dict[str, Any]:
         """
         Get summary statistics for a conversation
@@ -176,8 +216,9 @@ class ChatHistoryRepository:
             Dict: Summary including message count, first/last message times, etc.
         """
         try:
-            response = (
-                self._get_client()
+            client = await self._get_client()
+            response = await (
+                client
                 .table(self.table_name)
                 .select("id, message")
                 .eq("session_id", session_id)
@@ -204,7 +245,7 @@ class ChatHistoryRepository:
             }
             
         except Exception as e:
-            logger.error(f"Error getting conversation summary for session {session_id}: {e}")
+            logger.error("Error getting conversation summary for session %s: %s", session_id, e)
             raise
 
 
@@ -0,0 +1,194 @@
+"""
+Repository layer for the background EHR push job queue in Supabase
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+
+from app.core.database import get_async_supabase_client
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class EHRPushJobRepository:
+    """Repository for managing queued Charm push jobs in Supabase"""
+
+    def __init__(self):
+        self.table_name = "ehr_push_jobs"
+
+    async def _get_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
+
+    @timed("db.get_active_job")
+    async def get_active_job(self, record_id: str, section: str) -> Optional[Dict[str, Any]]:
+        """Get the pending or running job for a session section, if any"""
+        try:
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .select("*")
+                .eq("record_id", record_id)
+                .eq("section", section)
+                .in_("status", ["pending", "running"])
+                .limit(1)
+                .execute()
+            )
+
+            if response.data:
+                return response.data[0]
+            return None
+
+        except Exception as e:
+            logger.error("Error retrieving active push job for %s on record %s: %s", section, record_id, e)
+            raise
+
+    @timed("db.create_job")
+    async def create_job(self, record_id: str, session_id: str, section: str, max_attempts: int) -> Dict[str, Any]:
+        """Insert a new pending push job"""
+        try:
+            now = datetime.utcnow().isoformat()
+            job_data = {
+                "record_id": record_id,
+                "session_id": session_id,
+                "section": section,
+                "status": "pending",
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "next_attempt_at": now,
+                "created_at": now,
+                "updated_at": now
+            }
+
+            client = await self._get_client()
+            response = await client.table(self.table_name).insert(job_data).execute()
+
+            if not response.data:
+                raise Exception("Failed to create push job")
+
+            return response.data[0]
+
+        except Exception as e:
+            logger.error("Error creating push job for %s on record %s: %s", section, record_id, e)
+            raise
+
+    @timed("db.claim_due_jobs")
+    async def claim_due_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Claim up to `limit` pending jobs whose next attempt is due
+
+        Each job is claimed with a conditional pending -> running update, so two
+        workers (or two instances) can never run the same job.
+        """
+        try:
+            now = datetime.utcnow().isoformat()
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .select("id")
+                .eq("status", "pending")
+                .lte("next_attempt_at", now)
+                .order("created_at")
+                .limit(limit)
+                .execute()
+            )
+
+            claimed = []
+            for row in response.data or []:
+                claim_response = await (
+                    client
+                    .table(self.table_name)
+                    .update({"status": "running", "locked_at": now, "updated_at": now})
+                    .eq("id", row["id"])
+                    .eq("status", "pending")
+                    .execute()
+                )
+                if claim_response.data:
+                    claimed.append(claim_response.data[0])
+
+            return claimed
+
+        except Exception as e:
+            logger.error("Error claiming push jobs: %s", e)
+            raise
+
+    async def _update_job(self, job_id: str, update_data: Dict[str, Any]) -> bool:
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        client = await self._get_client()
+        response = await client.table(self.table_name).update(update_data).eq("id", job_id).execute()
+        return bool(response.data)
+
+    @timed("db.mark_succeeded")
+    async def mark_succeeded(self, job_id: str, attempts: int) -> bool:
+        """Mark a job as successfully pushed"""
+        try:
+            return await self._update_job(job_id, {
+                "status": "succeeded",
+                "attempts": attempts,
+                "locked_at": None,
+                "last_error": None
+            })
+        except Exception as e:
+            logger.error("Error marking push job %s succeeded: %s", job_id, e)
+            raise
+
+    @timed("db.schedule_retry")
+    async def schedule_retry(self, job_id: str, attempts: int, next_attempt_at: datetime, error: str) -> bool:
+        """Put a failed job back in the queue for a later attempt"""
+        try:
+            return await self._update_job(job_id, {
+                "status": "pending",
+                "attempts": attempts,
+                "next_attempt_at": next_attempt_at.isoformat(),
+                "locked_at": None,
+                "last_error": error
+            })
+        except Exception as e:
+            logger.error("Error scheduling retry for push job %s: %s", job_id, e)
+            raise
+
+    @timed("db.mark_failed")
+    async def mark_failed(self, job_id: str, attempts: int, error: str) -> bool:
+        """Mark a job as permanently failed after exhausting its attempts"""
+        try:
+            return await self._update_job(job_id, {
+                "status": "failed",
+                "attempts": attempts,
+                "locked_at": None,
+                "last_error": error
+            })
+        except Exception as e:
+            logger.error("Error marking push job %s failed: %s", job_id, e)
+            raise
+
+    @timed("db.release_stale_jobs")
+    async def release_stale_jobs(self, stale_after_seconds: int) -> int:
+        """
+        Return jobs stuck in running (e.g. the instance stopped mid-push) to pending
+        Returns the number of jobs released
+        """
+        try:
+            cutoff = (datetime.utcnow() - timedelta(seconds=stale_after_seconds)).isoformat()
+            now = datetime.utcnow().isoformat()
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .update({"status": "pending", "locked_at": None, "next_attempt_at": now, "updated_at": now})
+                .eq("status", "running")
+                .lt("locked_at", cutoff)
+                .execute()
+            )
+            return len(response.data or [])
+
+        except Exception as e:
+            logger.error("Error releasing stale push jobs: %s", e)
+            raise
+
+
+# Global repository instance
+ehr_push_job_repository = EHRPushJobRepository()
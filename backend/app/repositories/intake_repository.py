@@ -2,44 +2,235 @@
 Repository layer for intake session data operations with Supabase
 """
 
+import copy
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from uuid import uuid4
 
-from app.core.database import get_supabase_client
+from app.core.database import get_async_supabase_client
+from app.core.log_pipeline import PHI
+from app.core.metrics import timed
 from app.models.intake_schemas import IntakeSession
 
 logger = logging.getLogger(__name__)
 
 
+class IntakeVersionConflict(Exception):
+    """The intake was changed by another write since the expected version was read"""
+
+
+def _merge_changes(base: Any, value: Any, latest: Any) -> Any:
+    """Apply the difference between base and value to latest (dicts field by field, recursively)"""
+    if isinstance(value, dict) and isinstance(latest, dict) and isinstance(base, dict):
+        merged = dict(latest)
+        for field in base.keys() - value.keys():
+            merged.pop(field, None)  # removed by the caller
+        for field, field_value in value.items():
+            if field not in base:
+                merged[field] = field_value
+            elif base[field] != field_value:
+                merged[field] = _merge_changes(base[field], field_value, latest.get(field))
+        return merged
+    return value
+
+
+def merge_intake_sections(latest_intake: Dict[str, Any], updated_data: Dict[str, Any], base_intake: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Re-apply a caller's changes on top of the latest stored intake
+    base_intake is what the caller read. Only the fields it changed relative to that are
+    written; every other field keeps the latest stored value, so concurrent writes to
+    other sections, tracking flags or fields survive. Keys it did not change are dropped.
+    """
+    merged = {}
+    for key, value in updated_data.items():
+        base = base_intake.get(key)
+        if base == value:
+            continue
+        if base is None and isinstance(value, dict):
+            base = {}  # section created by the caller - all of its fields are changes
+        merged[key] = _merge_changes(base, value, latest_intake.get(key))
+    return merged
+
+
+class SessionUnitOfWork:
+    """
+    Request-scoped view of the poc_intake_sessions record that owns one session
+
+    The record is read once by load(). Repository methods given the unit of work
+    stage their changes in memory instead of writing: intake sections and their
+    `_tracking` keys, and fields of the session's entry in `sessions`. commit()
+    flushes everything in a single apply_session_changes call and then runs the
+    after_commit callbacks (e.g. queueing Charm pushes that read the stored intake).
+
+    Used as an async context manager it loads on entry and commits on a clean exit;
+    an exception discards the staged changes.
+    """
+
+    def __init__(self, repository: "IntakeSessionRepository", session_id: str):
+        self.repository = repository
+        self.session_id = session_id
+        self.record: Optional[Dict[str, Any]] = None
+        self.intake_patch: Dict[str, Any] = {}
+        self.session_updates: Dict[str, Any] = {}
+        # The intake as read, so a conflicting write can be merged with only this request's changes
+        self.base_intake: Dict[str, Any] = {}
+        self._after_commit: List[Callable[[], Awaitable[Any]]] = []
+        self._loaded = False
+
+    async def load(self) -> Optional[Dict[str, Any]]:
+        """Read the record once; later calls return the in-memory copy"""
+        if not self._loaded:
+            self.record = await self.repository.verify_session(self.session_id)
+            self.base_intake = copy.deepcopy(self.intake)
+            self._loaded = True
+        return self.record
+
+    @property
+    def intake(self) -> Dict[str, Any]:
+        """Stored intake with the staged sections applied"""
+        if self.record is None:
+            return {}
+        if self.record.get("intake") is None:
+            self.record["intake"] = {}
+        return self.record["intake"]
+
+    @property
+    def current_session(self) -> Dict[str, Any]:
+        """This session's entry in the record's sessions array, with staged updates applied"""
+        if self.record is None:
+            return {}
+        return self.record.setdefault("current_session", {})
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.intake_patch or self.session_updates)
+
+    def stage_intake(self, patch: Dict[str, Any]) -> None:
+        """Replace top-level intake keys (sections or tracking) at commit"""
+        for key, value in patch.items():
+            self.intake[key] = value
+            self.intake_patch[key] = value
+
+    def stage_session(self, updates: Dict[str, Any]) -> None:
+        """Merge fields into this session's entry at commit"""
+        # current_session is the same dict as the entry inside record["sessions"]
+        self.current_session.update(updates)
+        self.session_updates.update(updates)
+
+    def after_commit(self, callback: Callable[[], Awaitable[Any]]) -> None:
+        """Run callback once the staged changes are stored"""
+        self._after_commit.append(callback)
+
+    async def commit(self) -> bool:
+        """
+        Flush the staged changes in one write and run the after_commit callbacks
+        Returns False if the session does not exist
+        """
+        if self.record is None:
+            return False
+
+        if self.is_dirty:
+            await self.repository.apply_session_changes(self)
+            self.intake_patch = {}
+            self.session_updates = {}
+            self.base_intake = copy.deepcopy(self.intake)
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error("Error in after-commit callback for session %s: %s", self.session_id, e)
+        return True
+
+    async def __aenter__(self) -> "SessionUnitOfWork":
+        await self.load()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.commit()
+        elif self.is_dirty:
+            logger.info("Discarding staged changes for session %s after error", self.session_id)
+
+
 class IntakeSessionRepository:
     """Repository for managing intake session data in Supabase"""
     
     def __init__(self):
         self.table_name = "poc_intake_sessions"
     
-    def _get_client(self):
-        """Get Supabase client"""
-        return get_supabase_client()
+    async def _get_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
+    
+    def unit_of_work(self, session_id: str) -> SessionUnitOfWork:
+        """Create the per-request unit of work for a session (loaded on entry or by load())"""
+        return SessionUnitOfWork(self, session_id)
+    
+    @timed("db.apply_session_changes")
+    async def apply_session_changes(self, unit_of_work: SessionUnitOfWork, attempts: int = 3) -> Optional[int]:
+        """
+        Write a unit of work's staged intake keys and session fields in one round trip
+        Intake keys are a compare-and-swap against the version that was loaded; if another
+        write landed first, only the fields this request changed (relative to what it
+        loaded) are re-applied over the latest stored intake and the write is retried.
+        Returns the new intake_version
+        """
+        record = unit_of_work.record
+        intake_patch = unit_of_work.intake_patch
+        expected_version = record.get("intake_version", 0) if intake_patch else None
+        client = await self._get_client()
+        
+        for attempt in range(1, attempts + 1):
+            response = await client.rpc("apply_session_changes", {
+                "p_record_id": record["id"],
+                "p_session_id": unit_of_work.session_id,
+                "p_intake_patch": intake_patch,
+                "p_session_updates": unit_of_work.session_updates,
+                "p_expected_version": expected_version
+            }).execute()
+            
+            if response.data is not None:
+                record["intake_version"] = response.data
+                logger.info("Flushed session %s: intake keys %s, session fields %s", unit_of_work.session_id, list(intake_patch), list(unit_of_work.session_updates))
+                return response.data
+            
+            if expected_version is None:
+                raise Exception(f"Session record {record['id']} not found")
+            
+            logger.info("Intake for record %s changed during request, merging and retrying (%s/%s)", record['id'], attempt, attempts)
+            latest = await client.table(self.table_name).select("intake, intake_version").eq("id", record["id"]).execute()
+            if not latest.data:
+                raise Exception(f"Session record {record['id']} not found")
+            latest_intake = latest.data[0].get("intake") or {}
+            intake_patch = merge_intake_sections(latest_intake, unit_of_work.intake_patch, unit_of_work.base_intake)
+            expected_version = latest.data[0].get("intake_version", 0)
+            record["intake"] = {**latest_intake, **intake_patch}
+        
+        raise IntakeVersionConflict(f"Intake for record {record['id']} kept changing after {attempts} attempts")
     
+    @timed("db.get_session_by_mrn")
     async def get_session_by_mrn(self, charm_mrn: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve intake session by patient MRN
         Returns the most recent session for the given MRN
         """
         try:
-            response = self._get_client().table(self.table_name).select("*").eq("charm_mrn", charm_mrn).order("created_at", desc=True).limit(1).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).select("*").eq("charm_mrn", charm_mrn).order("created_at", desc=True).limit(1).execute()
             
             if response.data:
                 return response.data[0]
             return None
             
         except Exception as e:
-            logger.error(f"Error retrieving session for MRN {charm_mrn}: {e}")
+            logger.error("Error retrieving session for MRN %s: %s", PHI(charm_mrn), e)
             raise
     
+    @timed("db.create_session")
     async def create_session(self, charm_mrn: str, user_id: Optional[str] = None, initial_data: Optional[Dict[str, Any]] = None) -> str:
         """
         Create a new intake session
@@ -56,103 +247,112 @@ class IntakeSessionRepository:
                 "last_updated": now
             }
             
-            response = self._get_client().table(self.table_name).insert(session_data).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).insert(session_data).execute()
             
             if not response.data:
                 raise Exception("Failed to create session")
             
             session_id = response.data[0]["id"]
-            logger.info(f"Created new session {session_id} for MRN {charm_mrn}")
+            logger.info("Created new session %s for MRN %s", session_id, PHI(charm_mrn))
             return session_id
             
         except Exception as e:
-            logger.error(f"Error creating session for MRN {charm_mrn}: {e}")
+            logger.error("Error creating session for MRN %s: %s", PHI(charm_mrn), e)
             raise
     
-    async def update_session_intake(self, session_id: str, intake_data: Dict[str, Any]) -> bool:
+    @timed("db.patch_intake")
+    async def patch_intake(self, record_id: str, patch: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """
+        Merge top-level intake keys server-side in one round trip (patch_session_intake)
+        Pass the intake_version that was read to make the write a compare-and-swap
+        Returns the new intake_version
+        """
+        client = await self._get_client()
+        response = await client.rpc("patch_session_intake", {
+            "p_record_id": record_id,
+            "p_patch": patch,
+            "p_expected_version": expected_version
+        }).execute()
+        
+        if response.data is None:
+            if expected_version is not None:
+                raise IntakeVersionConflict(f"Intake for record {record_id} changed since version {expected_version}")
+            raise Exception(f"Session {record_id} not found")
+        
+        return response.data
+    
+    @timed("db.update_intake_with_retry")
+    async def update_intake_with_retry(self, record_id: str, build_patch: Callable[[Dict[str, Any]], Dict[str, Any]], current_record: Optional[Dict[str, Any]] = None, attempts: int = 3) -> bool:
+        """
+        Read-modify-write of intake keys without lost updates
+        build_patch receives the current intake and returns the keys to write; it is
+        re-run against fresh data whenever another write lands in between.
+        current_record (with intake and intake_version) skips the first read.
+        """
+        client = await self._get_client()
+        row = current_record
+        for attempt in range(1, attempts + 1):
+            if row is None:
+                response = await client.table(self.table_name).select("intake, intake_version").eq("id", record_id).execute()
+                if not response.data:
+                    raise Exception(f"Session {record_id} not found")
+                row = response.data[0]
+            
+            patch = build_patch(row.get("intake") or {})
+            if not patch:
+                return True
+            
+            try:
+                await self.patch_intake(record_id, patch, expected_version=row.get("intake_version", 0))
+                return True
+            except IntakeVersionConflict:
+                logger.info("Intake for record %s changed during update, retrying (%s/%s)", record_id, attempt, attempts)
+                row = None
+        
+        raise IntakeVersionConflict(f"Intake for record {record_id} kept changing after {attempts} attempts")
+    
+    @timed("db.update_session_intake")
+    async def update_session_intake(self, session_id: str, intake_data: Dict[str, Any], expected_version: Optional[int] = None, unit_of_work: Optional[SessionUnitOfWork] = None) -> bool:
         """
         Update the intake data for a session
-        Merges new data with existing data
+        Merges the given top-level keys into the stored intake
+        With a unit of work the keys are staged and written by its commit()
         """
+        if unit_of_work is not None:
+            unit_of_work.stage_intake(intake_data)
+            return True
+        
         try:
-            logger.info(f"\n🔄 UPDATE_SESSION_INTAKE - Session {session_id}")
-            logger.info(f"📥 INCOMING intake_data: {intake_data}")
-            
-            # First get the current session
-            current_response = self._get_client().table(self.table_name).select("intake").eq("id", session_id).execute()
-            
-            if not current_response.data:
-                logger.error(f"❌ Session {session_id} not found in database")
-                raise Exception(f"Session {session_id} not found")
-            
-            # Merge the intake data
-            current_intake = current_response.data[0].get("intake", {})
-            logger.info(f"📊 CURRENT intake in DB: {current_intake}")
-            
-            # Show before merge
-            logger.info(f"🔀 MERGING: current_intake.update(intake_data)")
-            current_intake.update(intake_data)
-            logger.info(f"🔄 MERGED result: {current_intake}")
-            
-            # Update the session
-            now = datetime.utcnow().isoformat()
-            update_data = {
-                "intake": current_intake,
-                "last_updated": now
-            }
-            logger.info(f"📤 SENDING update_data to DB: {update_data}")
-            
-            response = self._get_client().table(self.table_name).update(update_data).eq("id", session_id).execute()
-            logger.info(f"📬 DATABASE response: {response}")
-            logger.info(f"📬 Response data: {response.data}")
-            logger.info(f"📬 Response count: {response.count}")
-            
-            if not response.data:
-                logger.error(f"❌ Database update failed - no data in response")
-                raise Exception("Failed to update session")
-            
-            logger.info(f"✅ Successfully updated session {session_id} with new intake data")
+            logger.debug("🔄 UPDATE_SESSION_INTAKE - Session %s keys: %s", session_id, list(intake_data))
+            await self.patch_intake(session_id, intake_data, expected_version)
+            logger.debug("✅ Successfully updated session %s with new intake data", session_id)
             return True
             
+        except IntakeVersionConflict:
+            raise
         except Exception as e:
-            logger.error(f"Error updating session {session_id}: {e}")
+            logger.error("Error updating session %s: %s", session_id, e)
             raise
     
-    async def update_session_section(self, session_id: str, section_name: str, section_data: Dict[str, Any]) -> bool:
+    @timed("db.update_session_section")
+    async def update_session_section(self, session_id: str, section_name: str, section_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
         """
         Update a specific section of the intake data
         section_name should be one of: intake_demographics, intake_insurance, intake_weight_history, intake_medical_history
         """
         try:
-            # Get current session
-            current_response = self._get_client().table(self.table_name).select("intake").eq("id", session_id).execute()
-            
-            if not current_response.data:
-                raise Exception(f"Session {session_id} not found")
-            
-            # Update the specific section
-            current_intake = current_response.data[0].get("intake", {})
-            current_intake[section_name] = section_data
-            
-            # Update the session
-            now = datetime.utcnow().isoformat()
-            update_data = {
-                "intake": current_intake,
-                "last_updated": now
-            }
-            
-            response = self._get_client().table(self.table_name).update(update_data).eq("id", session_id).execute()
-            
-            if not response.data:
-                raise Exception("Failed to update session section")
-            
-            logger.info(f"Updated session {session_id} section {section_name}")
+            await self.patch_intake(session_id, {section_name: section_data}, expected_version)
+            logger.info("Updated session %s section %s", session_id, section_name)
             return True
             
+        except IntakeVersionConflict:
+            raise
         except Exception as e:
-            logger.error(f"Error updating session {session_id} section {section_name}: {e}")
+            logger.error("Error updating session %s section %s: %s", session_id, section_name, e)
             raise
     
+    @timed("db.complete_session")
     async def complete_session(self, session_id: str, rating: Optional[float] = None, comments: Optional[str] = None) -> bool:
         """
         Mark a session as completed with optional rating and comments
@@ -170,29 +370,32 @@ class IntakeSessionRepository:
             if comments is not None:
                 update_data["comments"] = comments
             
-            response = self._get_client().table(self.table_name).update(update_data).eq("id", session_id).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).update(update_data).eq("id", session_id).execute()
             
             if not response.data:
                 raise Exception("Failed to complete session")
             
-            logger.info(f"Completed session {session_id}")
+            logger.info("Completed session %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error completing session {session_id}: {e}")
+            logger.error("Error completing session %s: %s", session_id, e)
             raise
     
+    @timed("db.get_session_by_id")
     async def get_session_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by session_id (UUID)"""
         try:
-            response = self._get_client().table(self.table_name).select("*").eq("id", session_id).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).select("*").eq("id", session_id).execute()
             
             if response.data:
                 return response.data[0]
             return None
             
         except Exception as e:
-            logger.error(f"Error retrieving session {session_id}: {e}")
+            logger.error("Error retrieving session %s: %s", session_id, e)
             raise
     
     def determine_current_section(self, intake_data: Dict[str, Any]) -> str:
@@ -219,36 +422,47 @@ class IntakeSessionRepository:
         # All sections are marked complete
         return "completed"
     
-    async def mark_section_complete(self, session_id: str, section_name: str) -> bool:
+    @timed("db.mark_section_complete")
+    async def mark_section_complete(self, session_id: str, section_name: str, unit_of_work: Optional[SessionUnitOfWork] = None) -> bool:
         """
         Mark a specific intake section as complete
+        With a unit of work the change is staged against its loaded record
         """
+        if unit_of_work is not None:
+            if section_name not in unit_of_work.intake:
+                logger.warning("Section %s not found in intake data for session %s", section_name, session_id)
+                return False
+            section_data = dict(unit_of_work.intake.get(section_name) or {})
+            section_data["isComplete"] = True
+            unit_of_work.stage_intake({section_name: section_data})
+            logger.info("Marked section %s as complete for session %s", section_name, session_id)
+            return True
+        
         try:
             # Get current session data
             session_record = await self.verify_session(session_id)
             if not session_record:
-                logger.error(f"Session {session_id} not found")
+                logger.error("Session %s not found", session_id)
                 return False
             
-            # Get current intake data
-            intake_data = session_record.get("intake", {})
-            
-            # Update the section's is_complete field
-            if section_name in intake_data:
-                intake_data[section_name]["isComplete"] = True
-                
-                # Update the session with modified intake data
-                success = await self.update_session_intake(session_record["id"], intake_data)
-                
-                if success:
-                    logger.info(f"Marked section {section_name} as complete for session {session_id}")
-                return success
-            else:
-                logger.warning(f"Section {section_name} not found in intake data for session {session_id}")
+            if section_name not in (session_record.get("intake") or {}):
+                logger.warning("Section %s not found in intake data for session %s", section_name, session_id)
                 return False
+            
+            # Set the section's is_complete field, re-reading if a concurrent write lands first
+            def build_patch(intake_data: Dict[str, Any]) -> Dict[str, Any]:
+                section_data = dict(intake_data.get(section_name) or {})
+                section_data["isComplete"] = True
+                return {section_name: section_data}
+            
+            success = await self.update_intake_with_retry(session_record["id"], build_patch, current_record=session_record)
+            
+            if success:
+                logger.info("Marked section %s as complete for session %s", section_name, session_id)
+            return success
                 
         except Exception as e:
-            logger.error(f"Error marking section {section_name} complete for session {session_id}: {e}")
+            logger.error("Error marking section %s complete for session %s: %s", section_name, session_id, e)
             raise
     
     def _is_demographics_complete(self, demographics_data: Dict[str, Any]) -> bool:
@@ -290,6 +504,7 @@ class IntakeSessionRepository:
             
         return True
     
+    @timed("db.create_session_with_verification")
     async def create_session_with_verification(self, charm_mrn: str, session_id: str, patient_data: Optional[Dict[str, Any]] = None, charm_patient_id: Optional[str] = None) -> str:
         """
         Create a new intake session or add a new session to existing record
@@ -320,12 +535,13 @@ class IntakeSessionRepository:
                 if charm_patient_id and not existing.get("charm_patient_id"):
                     update_data["charm_patient_id"] = charm_patient_id
                 
-                response = self._get_client().table(self.table_name).update(update_data).eq("id", existing["id"]).execute()
+                client = await self._get_client()
+                response = await client.table(self.table_name).update(update_data).eq("id", existing["id"]).execute()
                 
                 if not response.data:
                     raise Exception("Failed to update sessions")
                 
-                logger.info(f"Added new session {session_id} to existing record for MRN {charm_mrn}")
+                logger.info("Added new session %s to existing record for MRN %s", session_id, PHI(charm_mrn))
                 return existing["id"]
             else:
                 # Create new record with first session
@@ -338,51 +554,77 @@ class IntakeSessionRepository:
                     "last_updated": datetime.utcnow().isoformat()
                 }
                 
-                response = self._get_client().table(self.table_name).insert(session_data).execute()
+                client = await self._get_client()
+                response = await client.table(self.table_name).insert(session_data).execute()
                 
                 if not response.data:
                     raise Exception("Failed to create session record")
                 
                 record_id = response.data[0]["id"]
-                logger.info(f"Created new record {record_id} with session {session_id} for MRN {charm_mrn}")
+                logger.info("Created new record %s with session %s for MRN %s", record_id, session_id, PHI(charm_mrn))
                 return record_id
                 
         except Exception as e:
-            logger.error(f"Error creating/updating session for MRN {charm_mrn}: {e}")
+            logger.error("Error creating/updating session for MRN %s: %s", PHI(charm_mrn), e)
             raise
     
-    async def verify_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+    @timed("db.verify_session")
+    async def verify_session(self, session_id: str, unit_of_work: Optional[SessionUnitOfWork] = None) -> Optional[Dict[str, Any]]:
         """
         Find and verify if a session exists and get its confirmation status
         Returns the full record if found, None otherwise
+        With a unit of work for the session its loaded record is returned without a query
+
+        Uses a JSONB containment filter (sessions @> [{"session_id": ...}]) backed by
+        the GIN index from migrations/001_poc_intake_sessions_session_index.sql, so only
+        the matching row is returned instead of scanning the whole table.
         """
+        if unit_of_work is not None and unit_of_work.session_id == session_id:
+            return await unit_of_work.load()
+        
         try:
-            # Search for records containing this session_id
-            response = self._get_client().table(self.table_name).select("*").execute()
-            
-            for record in response.data:
-                sessions = record.get("sessions", [])
-                for session in sessions:
-                    if session.get("session_id") == session_id:
-                        # Found the session, return the record with session info
-                        record["current_session"] = session
-                        return record
-            
+            session_filter = json.dumps([{"session_id": session_id}])
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .select("*")
+                .filter("sessions", "cs", session_filter)
+                .limit(1)
+                .execute()
+            )
+
+            if not response.data:
+                return None
+
+            record = response.data[0]
+            for session in record.get("sessions") or []:
+                if session.get("session_id") == session_id:
+                    # Found the session, return the record with session info
+                    record["current_session"] = session
+                    return record
+
             return None
             
         except Exception as e:
-            logger.error(f"Error verifying session {session_id}: {e}")
+            logger.error("Error verifying session %s: %s", session_id, e)
             raise
     
-    async def update_session_data(self, session_id: str, session_updates: Dict[str, Any]) -> bool:
+    @timed("db.update_session_data")
+    async def update_session_data(self, session_id: str, session_updates: Dict[str, Any], unit_of_work: Optional[SessionUnitOfWork] = None) -> bool:
         """
         Update specific session data fields
+        With a unit of work the fields are staged and written by its commit()
         """
+        if unit_of_work is not None:
+            unit_of_work.stage_session(session_updates)
+            return True
+        
         try:
             # Find the record containing this session
             record = await self.verify_session(session_id)
             if not record:
-                logger.error(f"Session {session_id} not found")
+                logger.error("Session %s not found", session_id)
                 return False
             
             # Update the session data
@@ -396,7 +638,7 @@ class IntakeSessionRepository:
                     break
             
             if not session_updated:
-                logger.error(f"Session {session_id} not found in sessions array")
+                logger.error("Session %s not found in sessions array", session_id)
                 return False
             
             # Update the record with modified sessions
@@ -405,28 +647,35 @@ class IntakeSessionRepository:
                 "last_updated": datetime.utcnow().isoformat()
             }
             
-            response = self._get_client().table(self.table_name).update(update_data).eq("id", record["id"]).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).update(update_data).eq("id", record["id"]).execute()
             
             if not response.data:
-                logger.error(f"Failed to update session data for {session_id}")
+                logger.error("Failed to update session data for %s", session_id)
                 return False
             
-            logger.info(f"Updated session data for {session_id}")
+            logger.info("Updated session data for %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error updating session data for {session_id}: {e}")
+            logger.error("Error updating session data for %s: %s", session_id, e)
             raise
 
-    async def confirm_session(self, session_id: str) -> bool:
+    @timed("db.confirm_session")
+    async def confirm_session(self, session_id: str, unit_of_work: Optional[SessionUnitOfWork] = None) -> bool:
         """
         Mark a session as confirmed after identity verification
+        With a unit of work the confirmation is staged and written by its commit()
         """
+        if unit_of_work is not None:
+            unit_of_work.stage_session({"confirmed": True, "confirmed_at": datetime.utcnow().isoformat()})
+            return True
+        
         try:
             # Find the record containing this session
             record = await self.verify_session(session_id)
             if not record:
-                logger.error(f"Session {session_id} not found")
+                logger.error("Session %s not found", session_id)
                 return False
             
             # Update the session's confirmed status
@@ -441,7 +690,7 @@ class IntakeSessionRepository:
                     break
             
             if not session_updated:
-                logger.error(f"Session {session_id} not found in sessions array")
+                logger.error("Session %s not found in sessions array", session_id)
                 return False
             
             # Update the record
@@ -450,16 +699,17 @@ class IntakeSessionRepository:
                 "last_updated": datetime.utcnow().isoformat()
             }
             
-            response = self._get_client().table(self.table_name).update(update_data).eq("id", record["id"]).execute()
+            client = await self._get_client()
+            response = await client.table(self.table_name).update(update_data).eq("id", record["id"]).execute()
             
             if not response.data:
                 raise Exception("Failed to confirm session")
             
-            logger.info(f"Confirmed session {session_id}")
+            logger.info("Confirmed session %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error confirming session {session_id}: {e}")
+            logger.error("Error confirming session %s: %s", session_id, e)
             raise
 
 
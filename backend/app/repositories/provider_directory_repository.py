@@ -0,0 +1,96 @@
+"""
+Repository layer for the local mirror of the Charm provider directory in Supabase
+"""
+
+import logging
+from typing import Dict, List, Any
+
+from app.core.database import get_async_supabase_client
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderDirectoryRepository:
+    """Repository for the mirrored Charm referral directory"""
+
+    def __init__(self, page_size: int = 1000):
+        self.table_name = "charm_provider_directory"
+        self.page_size = page_size
+
+    async def _get_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
+
+    @timed("db.load_provider_directory")
+    async def load_all(self) -> List[Dict[str, Any]]:
+        """All mirrored providers, read in pages"""
+        try:
+            client = await self._get_client()
+            providers: List[Dict[str, Any]] = []
+            start = 0
+            while True:
+                response = await (
+                    client
+                    .table(self.table_name)
+                    .select("provider")
+                    .order("provider_id")
+                    .range(start, start + self.page_size - 1)
+                    .execute()
+                )
+                rows = response.data or []
+                providers.extend(row["provider"] for row in rows)
+                if len(rows) < self.page_size:
+                    return providers
+                start += self.page_size
+
+        except Exception as e:
+            logger.error("Error loading the mirrored provider directory: %s", e)
+            raise
+
+    @timed("db.upsert_providers")
+    async def upsert_providers(self, providers: List[Dict[str, Any]], synced_at: str) -> None:
+        """Insert or replace providers, stamped with the sync time"""
+        rows = [
+            {"provider_id": str(provider["provider_id"]), "provider": provider, "synced_at": synced_at}
+            for provider in providers
+            if provider.get("provider_id")
+        ]
+        if not rows:
+            return
+
+        try:
+            client = await self._get_client()
+            for start in range(0, len(rows), self.page_size):
+                await (
+                    client
+                    .table(self.table_name)
+                    .upsert(rows[start:start + self.page_size], on_conflict="provider_id")
+                    .execute()
+                )
+
+        except Exception as e:
+            logger.error("Error upserting %s mirrored providers: %s", len(rows), e)
+            raise
+
+    @timed("db.delete_stale_providers")
+    async def delete_stale(self, synced_before: str) -> int:
+        """Delete providers a completed sync did not see; returns the number removed"""
+        try:
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .delete()
+                .lt("synced_at", synced_before)
+                .execute()
+            )
+            return len(response.data or [])
+
+        except Exception as e:
+            logger.error("Error deleting stale mirrored providers: %s", e)
+            raise
+
+
+# Global repository instance
+provider_directory_repository = ProviderDirectoryRepository()
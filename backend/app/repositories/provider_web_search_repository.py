@@ -0,0 +1,61 @@
+"""
+Repository layer for cached provider web searches in Supabase
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Any
+
+from app.core.database import get_async_supabase_client
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderWebSearchRepository:
+    """Repository for persisted Perplexity provider search results"""
+
+    def __init__(self):
+        self.table_name = "provider_web_search_cache"
+
+    async def _get_client(self):
+        """Get the shared async Supabase client"""
+        return await get_async_supabase_client()
+
+    @timed("db.get_web_search")
+    async def get_unexpired(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Cached search for a key, if it has not expired"""
+        try:
+            client = await self._get_client()
+            response = await (
+                client
+                .table(self.table_name)
+                .select("*")
+                .eq("cache_key", cache_key)
+                .gt("expires_at", datetime.utcnow().isoformat())
+                .limit(1)
+                .execute()
+            )
+
+            if response.data:
+                return response.data[0]
+            return None
+
+        except Exception as e:
+            logger.error("Error retrieving cached web search %s: %s", cache_key, e)
+            raise
+
+    @timed("db.save_web_search")
+    async def save(self, entry: Dict[str, Any]) -> None:
+        """Insert or replace a cached search"""
+        try:
+            client = await self._get_client()
+            await client.table(self.table_name).upsert(entry, on_conflict="cache_key").execute()
+
+        except Exception as e:
+            logger.error("Error saving cached web search %s: %s", entry.get('cache_key'), e)
+            raise
+
+
+# Global repository instance
+provider_web_search_repository = ProviderWebSearchRepository()
@@ -3,18 +3,25 @@ Chat API endpoints for the intake conversation
 Now powered by Pydantic AI for type-safe, structured data collection
 """
 
+import asyncio
+import json
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from app.repositories.intake_repository import intake_repository
+from app.repositories.intake_repository import intake_repository, SessionUnitOfWork
 from app.repositories.chat_history_repository import chat_history_repository
-from app.services.pydantic_intake_agent import pydantic_intake_agent, IntakeContext
+from app.services.pydantic_intake_agent import pydantic_intake_agent, IntakeContext, IntakeAgentResponse
 from app.services.ehr_service import ehr_service
+from app.services.identity_verification import identity_service
+from app.services.ehr_push_queue import ehr_push_queue, DIAGNOSIS_SECTION, SECTION_TYPE_MAP
+from app.services.conversation_memory import conversation_memory, ConversationWindow
 from app.core.config import get_settings
+from app.core.log_pipeline import Payload
 
 logger = logging.getLogger(__name__)
 
@@ -163,10 +170,12 @@ def _generate_post_verification_message(demographics_data: Dict[str, Any], missi
             return base_message + "Let me start by collecting your contact information. What is your mobile phone number?"
 
 
-async def _check_and_push_diagnoses_on_completion(session_id: str, updated_data: Dict[str, Any]) -> bool:
+async def _check_and_push_diagnoses_on_completion(unit_of_work: SessionUnitOfWork, updated_data: Dict[str, Any]) -> bool:
     """
-    Check if the entire intake is completed and push diagnoses to Charm if so
+    Check if the entire intake is completed and queue the diagnosis push to Charm if so
+    The push is queued once the unit of work has stored the completed intake
     """
+    session_id = unit_of_work.session_id
     try:
         # Check if the "completed" section indicates the intake is fully done
         completed_data = updated_data.get("completed", {})
@@ -175,41 +184,43 @@ async def _check_and_push_diagnoses_on_completion(session_id: str, updated_data:
         if not is_intake_complete:
             return False  # Intake not yet complete
         
-        # Get session data for patient ID
-        session_record = await intake_repository.verify_session(session_id)
+        if updated_data.get("completed_tracking", {}).get("pushed_to_charm", False):
+            return False  # Diagnoses already pushed
+        
+        session_record = unit_of_work.record
         if not session_record or not session_record.get("charm_patient_id"):
-            logger.error(f"No patient ID found for session {session_id}, cannot push diagnoses")
+            logger.error("No patient ID found for session %s, cannot push diagnoses", session_id)
             return False
         
-        patient_id = session_record["charm_patient_id"]
-        
-        # Get the complete intake data for diagnosis analysis
-        complete_intake_data = session_record.get("intake", {})
-        
-        # Merge with the current updated data to ensure we have the latest information
-        for key, value in updated_data.items():
-            complete_intake_data[key] = value
-        
-        # Call the diagnosis function
-        logger.info(f"Intake completed for session {session_id}, analyzing and pushing diagnoses for patient {patient_id}")
-        success = await ehr_service.push_diagnosis_to_charm(patient_id, complete_intake_data)
-        
-        if success:
-            logger.info(f"Successfully completed diagnosis analysis and push for patient {patient_id}")
-            return True
-        else:
-            logger.error(f"Failed to complete diagnosis analysis and push for patient {patient_id}")
-            return False
+        # Diagnosis analysis runs in a background worker against the stored intake data
+        logger.info("Intake completed for session %s, queueing diagnosis push for patient %s", session_id, session_record['charm_patient_id'])
+        unit_of_work.after_commit(lambda: ehr_push_queue.enqueue(session_record["id"], session_id, DIAGNOSIS_SECTION))
+        return True
             
     except Exception as e:
-        logger.error(f"Error checking and pushing diagnoses on completion for session {session_id}: {e}")
+        logger.error("Error checking and pushing diagnoses on completion for session %s: %s", session_id, e)
         return False
 
 
-async def _check_and_mark_section_complete(session_id: str, section_name: str, updated_data: Dict[str, Any]) -> bool:
+def _queue_section_push(unit_of_work: SessionUnitOfWork, section_name: str) -> bool:
+    """
+    Queue a Charm push of a completed section once the unit of work commits
+    """
+    session_id = unit_of_work.session_id
+    session_record = unit_of_work.record
+    if not session_record or not session_record.get("charm_patient_id"):
+        logger.warning("No patient ID found for session %s, cannot push to Charm", session_id)
+        return False
+    
+    unit_of_work.after_commit(lambda: ehr_push_queue.enqueue(session_record["id"], session_id, section_name))
+    return True
+
+
+async def _check_and_mark_section_complete(unit_of_work: SessionUnitOfWork, section_name: str, updated_data: Dict[str, Any]) -> bool:
     """
     Check if a section has been completed using the new tracking structure
     """
+    session_id = unit_of_work.session_id
     try:
         tracking_key = f"{section_name}_tracking"
         tracking_data = updated_data.get(tracking_key, {})
@@ -218,55 +229,96 @@ async def _check_and_mark_section_complete(session_id: str, section_name: str, u
         is_complete = tracking_data.get("isComplete", False)
         
         if is_complete:
-            # Mark the section as complete in the database
-            await intake_repository.mark_section_complete(session_id, section_name)
-            logger.info(f"Automatically marked {section_name} as complete for session {session_id}")
+            # Mark the section as complete (written with the rest of the turn)
+            await intake_repository.mark_section_complete(session_id, section_name, unit_of_work=unit_of_work)
+            logger.info("Automatically marked %s as complete for session %s", section_name, session_id)
             
-            # Check if we should call Charm APIs to push data
-            pushed_to_charm = tracking_data.get("pushed_to_charm", False)
-            if not pushed_to_charm:
-                # Get session data for Charm integration
-                session_record = await intake_repository.verify_session(session_id)
-                if session_record and session_record.get("charm_patient_id"):
-                    patient_id = session_record["charm_patient_id"]
-                    section_data = updated_data.get(section_name, {})
-                    
-                    # Map section names to types expected by ehr_service
-                    section_type_map = {
-                        "intake_demographics": "demographics",
-                        "intake_medical_history": "medical_history",
-                        "intake_weight_history": "weight_history",
-                        "intake_insurance": "insurance"
-                    }
-                    
-                    section_type = section_type_map.get(section_name)
-                    if section_type:
-                        # Call the new push_intake_section method
-                        success = await ehr_service.push_intake_section(section_type, patient_id, section_data)
-                        
-                        if success:
-                            # Update tracking to mark as pushed to Charm
-                            tracking_data["pushed_to_charm"] = True
-                            # Update the session with the new tracking data
-                            updated_tracking = {f"{section_name}_tracking": tracking_data}
-                            await intake_repository.update_session_intake(session_record["id"], updated_tracking)
-                            logger.info(f"Successfully pushed {section_name} to Charm for patient {patient_id}")
-                        else:
-                            logger.error(f"Failed to push {section_name} to Charm for patient {patient_id}")
-                    else:
-                        logger.error(f"Unknown section name for Charm push: {section_name}")
-                else:
-                    logger.warning(f"No patient ID found for session {session_id}, cannot push to Charm")
+            # Queue the Charm push after commit - the worker writes pushed_to_charm back to the tracking data
+            if not tracking_data.get("pushed_to_charm", False):
+                _queue_section_push(unit_of_work, section_name)
             
             return True
             
         return False
         
     except Exception as e:
-        logger.error(f"Error checking section completion for {section_name} in session {session_id}: {e}")
+        logger.error("Error checking section completion for %s in session %s: %s", section_name, session_id, e)
         return False
 
 
+async def _build_intake_context(request: "ChatMessage", session_record: Dict[str, Any]) -> IntakeContext:
+    """
+    Build the agent context for a confirmed session
+    """
+    intake_data = session_record.get("intake", {})
+    current_section = intake_repository.determine_current_section(intake_data)
+    
+    # Get patient data if available
+    patient_data = None
+    if session_record.get("charm_mrn"):
+        try:
+            patient_data = await ehr_service.validate_patient_by_mrn(session_record["charm_mrn"])
+        except Exception as e:
+            logger.warning("Could not retrieve patient data for session %s: %s", request.session_id, e)
+    
+    # Rolling summary plus only the messages it does not cover yet
+    window = await conversation_memory.load_window(request.session_id, session_record.get("current_session", {}))
+    
+    # Create context for single agent system
+    return IntakeContext(
+        session_id=request.session_id,
+        current_section=current_section,
+        patient_data=patient_data,
+        intake_data=intake_data,
+        conversation_history=window.messages,
+        conversation_summary=window.summary,
+        conversation_message_ids=window.message_ids
+    )
+
+
+async def _save_conversation_turn(request: "ChatMessage", unit_of_work: SessionUnitOfWork, context: IntakeContext, agent_response: IntakeAgentResponse) -> None:
+    """
+    Stage the agent's extracted data on the unit of work and persist the chat messages for one turn
+    """
+    # Stage the extracted data - the unit of work writes it with the completion flags in one call.
+    # updated_data is the whole merged intake; only the current section and its tracking key
+    # belong to this turn, and only those that changed are staged, so other keys are never
+    # written back with the values read at the start of the turn
+    if agent_response.updated_data:
+        turn_keys = (context.current_section, f"{context.current_section}_tracking")
+        turn_changes = {
+            key: agent_response.updated_data[key]
+            for key in turn_keys
+            if key in agent_response.updated_data and agent_response.updated_data[key] != context.intake_data.get(key)
+        }
+        if turn_changes:
+            await intake_repository.update_session_intake(
+                unit_of_work.record["id"],
+                turn_changes,
+                unit_of_work=unit_of_work
+            )
+        
+        # Completed sections are written to the Charm chart only when automatic pushes are enabled
+        if get_settings().ehr_auto_push_enabled:
+            merged_intake = {**context.intake_data, **agent_response.updated_data}
+            await _check_and_mark_section_complete(unit_of_work, context.current_section, merged_intake)
+            await _check_and_push_diagnoses_on_completion(unit_of_work, merged_intake)
+               
+    # Add new messages to chat history table
+    now = datetime.utcnow().isoformat()
+    user_message = {"role": "user", "content": request.message, "timestamp": now}
+    assistant_message = {"role": "assistant", "content": agent_response.response, "timestamp": now}
+    
+    await chat_history_repository.add_messages(request.session_id, [user_message, assistant_message])
+    
+    # Fold older messages into the session's conversation summary once this turn is stored
+    conversation_memory.schedule_refresh(unit_of_work, ConversationWindow(
+        summary=context.conversation_summary,
+        messages=context.conversation_history,
+        message_ids=context.conversation_message_ids
+    ))
+
+
 class ChatMessage(BaseModel):
     message: str
     session_id: str
@@ -284,250 +336,311 @@ class ChatResponse(BaseModel):
 async def chat_message(request: ChatMessage):
     """
     Process a chat message from the user using the LangChain agent
+    The session record is read once and all changes are written once at the end of the turn
     """
     try:
-        # Verify session exists and check confirmation status
-        session_record = await intake_repository.verify_session(request.session_id)
-        if not session_record:
-            raise HTTPException(
-                status_code=404,
-                detail="Session not found"
+        async with intake_repository.unit_of_work(request.session_id) as unit_of_work:
+            return await _handle_chat_message(request, unit_of_work)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error processing chat message for session %s: %s", request.session_id, e)
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error processing message"
+        )
+
+
+async def _handle_chat_message(request: ChatMessage, unit_of_work: SessionUnitOfWork) -> ChatResponse:
+    """
+    Handle one chat turn against a loaded unit of work; changes are staged, not written
+    """
+    # The session record was loaded once by the unit of work
+    session_record = unit_of_work.record
+    if not session_record:
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found"
+        )
+    
+    current_session = session_record.get("current_session", {})
+    is_confirmed = current_session.get("confirmed", False)
+    
+    # If not confirmed, handle identity verification
+    if not is_confirmed:
+        # Handle identity verification flow
+        verification_data = current_session.get("patient_data", {})
+        stored_dob = verification_data.get("dob", "")
+        stored_last_name = verification_data.get("last_name", "").lower()
+        
+        # Check verification attempt count
+        verification_attempts = current_session.get("verification_attempts", 0)
+        if verification_attempts >= 3:
+            return ChatResponse(
+                response="I'm sorry, but we've reached the maximum number of verification attempts. Please call our office at 520-298-3300 to complete your registration and schedule your appointment.",
+                session_id=request.session_id,
+                current_section="verification_failed",
+                updated_data={},
+                agent_actions=["verification_limit_reached"]
             )
         
-        current_session = session_record.get("current_session", {})
-        is_confirmed = current_session.get("confirmed", False)
+        # Extract identity locally; history and the LLM are only used when the message alone is not enough
+        extracted = await identity_service.resolve_identity(
+            request.message,
+            load_history=lambda: chat_history_repository.get_recent_messages(request.session_id, count=6),
+            llm_extract=pydantic_intake_agent.extract_identity
+        )
         
-        # If not confirmed, handle identity verification
-        if not is_confirmed:
-            # Handle identity verification flow
-            verification_data = current_session.get("patient_data", {})
-            stored_dob = verification_data.get("dob", "")
-            stored_last_name = verification_data.get("last_name", "").lower()
-            
-            # Check verification attempt count
-            verification_attempts = current_session.get("verification_attempts", 0)
-            if verification_attempts >= 3:
+        # Always attempt verification if we have any extracted information
+        if extracted.last_name and extracted.date_of_birth:
+            # Verify the information
+            if (extracted.date_of_birth == stored_dob and 
+                extracted.last_name.lower() == stored_last_name):
+                
+                # Mark session as confirmed
+                await intake_repository.confirm_session(request.session_id, unit_of_work=unit_of_work)
+                
+                # Get the full patient data now that they're verified
+                patient_data = await ehr_service.validate_patient_by_mrn(session_record["charm_mrn"])
+                
+                # Store patient_id in session for future API calls
+                patient_id = patient_data.get("patient_id") if patient_data else None
+                if patient_id:
+                    await intake_repository.update_session_data(request.session_id, {"charm_patient_id": patient_id}, unit_of_work=unit_of_work)
+                    logger.info("Stored patient_id %s for session %s", patient_id, request.session_id)
+                
+                # Get existing intake data first (resume functionality)
+                existing_intake = session_record.get("intake", {})
+                existing_demographics = existing_intake.get("intake_demographics", {})
+                
+                # Create EHR data structure
+                ehr_demographics_data = {
+                    "patient_id": patient_id,
+                    "record_id": session_record["charm_mrn"], # type: ignore
+                    "firstName": patient_data.get("first_name", ""), # type: ignore
+                    "lastName": patient_data.get("last_name", ""), # type: ignore
+                    "dateOfBirth": patient_data.get("dob", ""), # type: ignore
+                    "gender": patient_data.get("gender", ""), # type: ignore
+                    "email": patient_data.get("email", ""), # type: ignore
+                    "phone": {
+                        "mobile": patient_data.get("mobile", ""), # type: ignore
+                        "home": patient_data.get("home_phone", ""), # type: ignore
+                        "work": patient_data.get("work_phone", ""), # type: ignore
+                        "workExtension": patient_data.get("work_phone_extn", ""), # type: ignore
+                        "preferred": "mobile" if patient_data.get("mobile") else "" # type: ignore
+                    },
+                    "address": {
+                        "addressLine1": patient_data.get("address_line1", ""), # type: ignore
+                        "addressLine2": patient_data.get("address_line2", ""), # type: ignore
+                        "city": patient_data.get("city", ""), # type: ignore
+                        "state": patient_data.get("state", ""), # type: ignore
+                        "country": patient_data.get("country", "us"), # type: ignore
+                        "zipCode": patient_data.get("postal_code", "") # type: ignore
+                    },
+                    "communicationPreferences": {
+                        "preferredMethod": "",
+                        "emailNotifications": patient_data.get("email_notification", "true") == "true", # type: ignore
+                        "textNotifications": patient_data.get("text_notification", "true") == "true", # type: ignore
+                        "voiceNotifications": patient_data.get("voice_notification", "true") == "true" # type: ignore
+                    },
+                    "maritalStatus": patient_data.get("marital_status", ""), # type: ignore
+                    "employmentStatus": "",
+                    "isComplete": False  # Always start as incomplete, even with EHR data
+                }
+                
+                # Merge existing user data with EHR data (user data takes precedence)
+                from app.services.pydantic_intake_agent import _deep_merge_dict
+                demographics_data = _deep_merge_dict(ehr_demographics_data, existing_demographics)
+                
+                # Debug logging for resume functionality - sizes only, never the demographics themselves
+                logger.info("🔄 VERIFICATION SUCCESS - Session %s", request.session_id)
+                logger.debug("Demographics for session %s: existing=%s ehr=%s merged=%s", request.session_id, Payload(existing_demographics), Payload(ehr_demographics_data), Payload(demographics_data))
+                
+                # Create tracking data - initialize unasked_fields with all fields, then remove populated ones
+                from app.services.pydantic_intake_agent import _initialize_unasked_fields
+                unasked_fields = _initialize_unasked_fields("intake_demographics", demographics_data)
+                
+                # Preserve existing tracking data and update it
+                existing_tracking = existing_intake.get("intake_demographics_tracking", {})
+                tracking_data = {
+                    "unasked_fields": unasked_fields,
+                    "isComplete": existing_tracking.get("isComplete", False),
+                    "pushed_to_charm": existing_tracking.get("pushed_to_charm", False)
+                }
+                
+                # Only the demographics keys are written - other sections are left as stored
+                complete_data = {
+                    "intake_demographics": demographics_data,
+                    "intake_demographics_tracking": tracking_data
+                }
+                
+                logger.debug("💾 Demographics intake data: %s", Payload(complete_data))
+                
+                # Update the session with merged intake data
+                await intake_repository.update_session_intake(session_record["id"], complete_data, unit_of_work=unit_of_work)
+                
+                # Generate intelligent response based on what data is missing
+                missing_fields = _identify_missing_demographics_fields(demographics_data)
+                response_message = _generate_post_verification_message(demographics_data, missing_fields)
+                
                 return ChatResponse(
-                    response="I'm sorry, but we've reached the maximum number of verification attempts. Please call our office at 520-298-3300 to complete your registration and schedule your appointment.",
+                    response=response_message,
                     session_id=request.session_id,
-                    current_section="verification_failed",
-                    updated_data={},
-                    agent_actions=["verification_limit_reached"]
+                    current_section="intake_demographics",
+                    updated_data=complete_data,
+                    agent_actions=["identity_verified", "demographics_populated"]
                 )
-            
-            # Get conversation history for context
-            conversation_history = await chat_history_repository.get_recent_messages(request.session_id, count=6)
-            
-            # Use Pydantic AI to extract identity information with conversation context
-            extracted = await pydantic_intake_agent.extract_identity(request.message, conversation_history)
-            
-            # Always attempt verification if we have any extracted information
-            if extracted.last_name and extracted.date_of_birth:
-                # Verify the information
-                if (extracted.date_of_birth == stored_dob and 
-                    extracted.last_name.lower() == stored_last_name):
-                    
-                    # Mark session as confirmed
-                    await intake_repository.confirm_session(request.session_id)
-                    
-                    # Get the full patient data now that they're verified
-                    patient_data = await ehr_service.validate_patient_by_mrn(session_record["charm_mrn"])
-                    
-                    # Store patient_id in session for future API calls
-                    patient_id = patient_data.get("patient_id") if patient_data else None
-                    if patient_id:
-                        await intake_repository.update_session_data(request.session_id, {"charm_patient_id": patient_id})
-                        logger.info(f"Stored patient_id {patient_id} for session {request.session_id}")
-                    
-                    # Get existing intake data first (resume functionality)
-                    existing_intake = session_record.get("intake", {})
-                    existing_demographics = existing_intake.get("intake_demographics", {})
-                    
-                    # Create EHR data structure
-                    ehr_demographics_data = {
-                        "patient_id": patient_id,
-                        "record_id": session_record["charm_mrn"], # type: ignore
-                        "firstName": patient_data.get("first_name", ""), # type: ignore
-                        "lastName": patient_data.get("last_name", ""), # type: ignore
-                        "dateOfBirth": patient_data.get("dob", ""), # type: ignore
-                        "gender": patient_data.get("gender", ""), # type: ignore
-                        "email": patient_data.get("email", ""), # type: ignore
-                        "phone": {
-                            "mobile": patient_data.get("mobile", ""), # type: ignore
-                            "home": patient_data.get("home_phone", ""), # type: ignore
-                            "work": patient_data.get("work_phone", ""), # type: ignore
-                            "workExtension": patient_data.get("work_phone_extn", ""), # type: ignore
-                            "preferred": "mobile" if patient_data.get("mobile") else "" # type: ignore
-                        },
-                        "address": {
-                            "addressLine1": patient_data.get("address_line1", ""), # type: ignore
-                            "addressLine2": patient_data.get("address_line2", ""), # type: ignore
-                            "city": patient_data.get("city", ""), # type: ignore
-                            "state": patient_data.get("state", ""), # type: ignore
-                            "country": patient_data.get("country", "us"), # type: ignore
-                            "zipCode": patient_data.get("postal_code", "") # type: ignore
-                        },
-                        "communicationPreferences": {
-                            "preferredMethod": "",
-                            "emailNotifications": patient_data.get("email_notification", "true") == "true", # type: ignore
-                            "textNotifications": patient_data.get("text_notification", "true") == "true", # type: ignore
-                            "voiceNotifications": patient_data.get("voice_notification", "true") == "true" # type: ignore
-                        },
-                        "maritalStatus": patient_data.get("marital_status", ""), # type: ignore
-                        "employmentStatus": "",
-                        "isComplete": False  # Always start as incomplete, even with EHR data
-                    }
-                    
-                    # Merge existing user data with EHR data (user data takes precedence)
-                    from app.services.pydantic_intake_agent import _deep_merge_dict
-                    demographics_data = _deep_merge_dict(ehr_demographics_data, existing_demographics)
-                    
-                    # Debug logging for resume functionality
-                    logger.info(f"🔄 VERIFICATION SUCCESS - Session {request.session_id}")
-                    logger.info(f"📋 Existing demographics: {existing_demographics}")
-                    logger.info(f"🏥 EHR demographics: {ehr_demographics_data}")
-                    logger.info(f"🔀 Merged demographics: {demographics_data}")
-                    
-                    # Create tracking data - initialize unasked_fields with all fields, then remove populated ones
-                    from app.services.pydantic_intake_agent import _initialize_unasked_fields
-                    unasked_fields = _initialize_unasked_fields("intake_demographics", demographics_data)
-                    
-                    # Preserve existing tracking data and update it
-                    existing_tracking = existing_intake.get("intake_demographics_tracking", {})
-                    tracking_data = {
-                        "unasked_fields": unasked_fields,
-                        "isComplete": existing_tracking.get("isComplete", False),
-                        "pushed_to_charm": existing_tracking.get("pushed_to_charm", False)
-                    }
-                    
-                    # Complete data structure with tracking - merge with ALL existing data
-                    complete_data = existing_intake.copy()  # Start with existing intake data
-                    complete_data.update({
-                        "intake_demographics": demographics_data,
-                        "intake_demographics_tracking": tracking_data
-                    })
-                    
-                    logger.info(f"💾 Complete merged intake data: {complete_data}")
-                    
-                    # Update the session with merged intake data
-                    await intake_repository.update_session_intake(session_record["id"], complete_data)
-                    
-                    # Generate intelligent response based on what data is missing
-                    missing_fields = _identify_missing_demographics_fields(demographics_data)
-                    response_message = _generate_post_verification_message(demographics_data, missing_fields)
-                    
-                    return ChatResponse(
-                        response=response_message,
-                        session_id=request.session_id,
-                        current_section="intake_demographics",
-                        updated_data=complete_data,
-                        agent_actions=["identity_verified", "demographics_populated"]
-                    )
-                else:
-                    # Information doesn't match - increment attempt count and provide feedback
-                    new_attempt_count = verification_attempts + 1
-                    
-                    # Update session with new attempt count
-                    await intake_repository.update_session_data(request.session_id, {"verification_attempts": new_attempt_count})
-                    
-                    # Format the date nicely for display
-                    try:
-                        from datetime import datetime as dt
-                        parsed_date = dt.strptime(extracted.date_of_birth, "%Y-%m-%d")
-                        formatted_date = parsed_date.strftime("%B %d, %Y")
-                    except:
-                        formatted_date = extracted.date_of_birth
-                    
-                    attempts_remaining = 3 - new_attempt_count
-                    if attempts_remaining > 0:
-                        feedback_msg = f"I'm using \"{extracted.last_name}\" and {formatted_date} for your date of birth and I'm not able to match you to an existing patient. Are these correct? You have {attempts_remaining} attempt{'s' if attempts_remaining != 1 else ''} remaining."
-                    else:
-                        feedback_msg = f"I'm using \"{extracted.last_name}\" and {formatted_date} for your date of birth and I'm not able to match you to an existing patient. This was your final attempt. Please call our office at 520-298-3300 to complete your registration."
-                    
-                    return ChatResponse(
-                        response=feedback_msg,
-                        session_id=request.session_id,
-                        current_section="identity_verification",
-                        updated_data={},
-                        agent_actions=["verification_failed", "feedback_provided", f"attempt_{new_attempt_count}"]
-                    )
             else:
-                # No identity information extracted - increment attempt count
+                # Information doesn't match - increment attempt count and provide feedback
                 new_attempt_count = verification_attempts + 1
                 
                 # Update session with new attempt count
-                await intake_repository.update_session_data(request.session_id, {"verification_attempts": new_attempt_count})
+                await intake_repository.update_session_data(request.session_id, {"verification_attempts": new_attempt_count}, unit_of_work=unit_of_work)
+                
+                # Format the date nicely for display
+                try:
+                    from datetime import datetime as dt
+                    parsed_date = dt.strptime(extracted.date_of_birth, "%Y-%m-%d")
+                    formatted_date = parsed_date.strftime("%B %d, %Y")
+                except:
+                    formatted_date = extracted.date_of_birth
                 
                 attempts_remaining = 3 - new_attempt_count
                 if attempts_remaining > 0:
-                    response_msg = f"I wasn't able to find your last name and date of birth in your message. Please provide both your **last name** and **date of birth** to verify your identity. You have {attempts_remaining} attempt{'s' if attempts_remaining != 1 else ''} remaining."
+                    feedback_msg = f"I'm using \"{extracted.last_name}\" and {formatted_date} for your date of birth and I'm not able to match you to an existing patient. Are these correct? You have {attempts_remaining} attempt{'s' if attempts_remaining != 1 else ''} remaining."
                 else:
-                    response_msg = "I wasn't able to find your last name and date of birth. This was your final attempt. Please call our office at 520-298-3300 to complete your registration."
+                    feedback_msg = f"I'm using \"{extracted.last_name}\" and {formatted_date} for your date of birth and I'm not able to match you to an existing patient. This was your final attempt. Please call our office at 520-298-3300 to complete your registration."
                 
                 return ChatResponse(
-                    response=response_msg,
+                    response=feedback_msg,
                     session_id=request.session_id,
                     current_section="identity_verification",
                     updated_data={},
-                    agent_actions=["awaiting_verification", f"attempt_{new_attempt_count}"]
+                    agent_actions=["verification_failed", "feedback_provided", f"attempt_{new_attempt_count}"]
                 )
-        
-        # Session is confirmed, proceed with normal flow
-        intake_data = session_record.get("intake", {})
-        current_section = intake_repository.determine_current_section(intake_data)
-        
-        # Get patient data if available
-        patient_data = None
-        if session_record.get("charm_mrn"):
-            try:
-                patient_data = await ehr_service.validate_patient_by_mrn(session_record["charm_mrn"])
-            except Exception as e:
-                logger.warning(f"Could not retrieve patient data for session {request.session_id}: {e}")
-        
-        # Get conversation history from chat history table
-        conversation_history = await chat_history_repository.get_recent_messages(request.session_id, count=40)
-        
-        # Create context for single agent system
-        context = IntakeContext(
-            session_id=request.session_id,
-            current_section=current_section,
-            patient_data=patient_data,
-            intake_data=intake_data,
-            conversation_history=conversation_history
-        )
-        
-        # Process message with single Pydantic agent
-        agent_response = await pydantic_intake_agent.process_conversation(request.message, context)
-        
-        # Update database with any extracted data
-        if agent_response.updated_data:     
-            result = await intake_repository.update_session_intake(session_record["id"], agent_response.updated_data)
-                   
-        # Add new messages to chat history table
-        now = datetime.utcnow().isoformat()
-        user_message = {"role": "user", "content": request.message, "timestamp": now}
-        assistant_message = {"role": "assistant", "content": agent_response.response, "timestamp": now}
-        
-        await chat_history_repository.add_messages(request.session_id, [user_message, assistant_message])
-        
-        return ChatResponse(
-            response=agent_response.response,
-            session_id=request.session_id,
-            current_section=agent_response.current_section,
-            updated_data=agent_response.updated_data,
-            agent_actions=agent_response.agent_actions
-        )
-        
-    except HTTPException:
-        raise
+        else:
+            # No identity information extracted - increment attempt count
+            new_attempt_count = verification_attempts + 1
+            
+            # Update session with new attempt count
+            await intake_repository.update_session_data(request.session_id, {"verification_attempts": new_attempt_count}, unit_of_work=unit_of_work)
+            
+            attempts_remaining = 3 - new_attempt_count
+            if attempts_remaining > 0:
+                response_msg = f"I wasn't able to find your last name and date of birth in your message. Please provide both your **last name** and **date of birth** to verify your identity. You have {attempts_remaining} attempt{'s' if attempts_remaining != 1 else ''} remaining."
+            else:
+                response_msg = "I wasn't able to find your last name and date of birth. This was your final attempt. Please call our office at 520-298-3300 to complete your registration."
+            
+            return ChatResponse(
+                response=response_msg,
+                session_id=request.session_id,
+                current_section="identity_verification",
+                updated_data={},
+                agent_actions=["awaiting_verification", f"attempt_{new_attempt_count}"]
+            )
+    
+    # Session is confirmed, proceed with normal flow
+    context = await _build_intake_context(request, session_record)
+    
+    # Process message with single Pydantic agent
+    agent_response = await pydantic_intake_agent.process_conversation(request.message, context)
+    
+    await _save_conversation_turn(request, unit_of_work, context, agent_response)
+    
+    return ChatResponse(
+        response=agent_response.response,
+        session_id=request.session_id,
+        current_section=agent_response.current_section,
+        updated_data=agent_response.updated_data,
+        agent_actions=agent_response.agent_actions
+    )
+
+ 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _save_turn_in_background(request: ChatMessage, unit_of_work: SessionUnitOfWork, context: IntakeContext, agent_response: IntakeAgentResponse) -> None:
+    try:
+        await _save_conversation_turn(request, unit_of_work, context, agent_response)
+        await unit_of_work.commit()
     except Exception as e:
-        logger.error(f"Error processing chat message for session {request.session_id}: {e}")
+        logger.error("Error saving streamed conversation turn for session %s: %s", request.session_id, e)
+
+
+# Strong references to in-flight persistence tasks so they are not garbage collected
+_background_saves: Set[asyncio.Task] = set()
+
+
+@router.post("/chat/stream")
+async def chat_message_stream(request: ChatMessage):
+    """
+    Process a chat message and stream the reply as Server-Sent Events
+
+    Events:
+    - delta: {"text": "..."} chunks of the assistant's response as it is generated
+    - final: the complete ChatResponse (updated_data, agent_actions, current_section)
+    - error: {"detail": "..."} if the message could not be processed
+
+    Intake data and chat history are saved after the final event is sent.
+    """
+    unit_of_work = intake_repository.unit_of_work(request.session_id)
+    session_record = await unit_of_work.load()
+    if not session_record:
         raise HTTPException(
-            status_code=500,
-            detail="Internal server error processing message"
+            status_code=404,
+            detail="Session not found"
         )
+    
+    async def event_stream():
+        try:
+            if not session_record.get("current_session", {}).get("confirmed", False):
+                # Identity verification is short and deterministic - answer it in one piece
+                chat_response = await _handle_chat_message(request, unit_of_work)
+                await unit_of_work.commit()
+                yield _sse_event("delta", {"text": chat_response.response})
+                yield _sse_event("final", chat_response.model_dump())
+                return
+            
+            context = await _build_intake_context(request, session_record)
+            
+            agent_response = None
+            async for event in pydantic_intake_agent.process_conversation_stream(request.message, context):
+                if event["type"] == "delta":
+                    yield _sse_event("delta", {"text": event["text"]})
+                else:
+                    agent_response = event["response"]
+            
+            chat_response = ChatResponse(
+                response=agent_response.response,
+                session_id=request.session_id,
+                current_section=agent_response.current_section,
+                updated_data=agent_response.updated_data,
+                agent_actions=agent_response.agent_actions
+            )
+            yield _sse_event("final", chat_response.model_dump())
+            
+            # Persist after the reply is delivered; runs to completion even if the client disconnects
+            task = asyncio.create_task(_save_turn_in_background(request, unit_of_work, context, agent_response))
+            _background_saves.add(task)
+            task.add_done_callback(_background_saves.discard)
+            
+        except Exception as e:
+            logger.error("Error streaming chat message for session %s: %s", request.session_id, e)
+            yield _sse_event("error", {"detail": "Internal server error processing message"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 
- 
 @router.get("/chat/{session_id}/summary")
 async def get_conversation_summary(session_id: str):
     """Get a summary of the conversation for a session"""
@@ -536,7 +649,7 @@ async def get_conversation_summary(session_id: str):
         return summary
         
     except Exception as e:
-        logger.error(f"Error getting conversation summary for session {session_id}: {e}")
+        logger.error("Error getting conversation summary for session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error retrieving conversation summary"
@@ -555,7 +668,7 @@ async def get_conversation_history(session_id: str, limit: Optional[int] = None)
         }
         
     except Exception as e:
-        logger.error(f"Error getting conversation history for session {session_id}: {e}")
+        logger.error("Error getting conversation history for session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error retrieving conversation history"
@@ -621,7 +734,7 @@ async def get_section_summary(session_id: str):
         }
         
     except Exception as e:
-        logger.error(f"Error getting section summary for session {session_id}: {e}")
+        logger.error("Error getting section summary for session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error retrieving section summary"
@@ -632,26 +745,33 @@ async def get_section_summary(session_id: str):
 async def confirm_section_data(session_id: str, corrections: dict = None): # type: ignore
     """Confirm section data and move to next section"""
     try:
-        session_record = await intake_repository.verify_session(session_id)
-        if not session_record:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Apply any corrections
-        if corrections:
-            current_intake = session_record.get("intake", {})
-            # Apply corrections to the data
-            updated_data = _apply_corrections(current_intake, corrections)
-            await intake_repository.update_session_intake(session_record["id"], updated_data)
-        
-        # Mark current section as complete and move to next
-        intake_data = session_record.get("intake", {})
-        current_section = intake_repository.determine_current_section(intake_data)
-        
-        # Mark section complete
-        await intake_repository.mark_section_complete(session_id, current_section)
-        
-        # Get next section
-        next_section = intake_repository.determine_current_section(intake_data)
+        async with intake_repository.unit_of_work(session_id) as unit_of_work:
+            if not unit_of_work.record:
+                raise HTTPException(status_code=404, detail="Session not found")
+            
+            # Apply any corrections, staging only the corrected sections
+            if corrections:
+                corrected_keys = {field_path.split('.')[0] for field_path in corrections}
+                updated_data = _apply_corrections(unit_of_work.intake, corrections)
+                await intake_repository.update_session_intake(
+                    unit_of_work.record["id"],
+                    {key: updated_data[key] for key in corrected_keys},
+                    unit_of_work=unit_of_work
+                )
+            
+            # Mark current section as complete and move to next
+            current_section = intake_repository.determine_current_section(unit_of_work.intake)
+            
+            # Mark section complete (corrections and completion are written together)
+            await intake_repository.mark_section_complete(session_id, current_section, unit_of_work=unit_of_work)
+            
+            # A confirmed section is pushed like one completed in the chat, under the same setting
+            tracking_data = unit_of_work.intake.get(f"{current_section}_tracking") or {}
+            if get_settings().ehr_auto_push_enabled and current_section in SECTION_TYPE_MAP and not tracking_data.get("pushed_to_charm", False):
+                _queue_section_push(unit_of_work, current_section)
+            
+            # Get next section
+            next_section = intake_repository.determine_current_section(unit_of_work.intake)
         
         return {
             "session_id": session_id,
@@ -661,7 +781,7 @@ async def confirm_section_data(session_id: str, corrections: dict = None): # typ
         }
         
     except Exception as e:
-        logger.error(f"Error confirming section for session {session_id}: {e}")
+        logger.error("Error confirming section for session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error confirming section"
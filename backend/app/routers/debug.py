@@ -9,7 +9,8 @@ from fastapi import APIRouter, HTTPException
 
 from app.services.ehr_service import ehr_service
 from app.repositories.intake_repository import intake_repository
-from app.core.database import get_supabase_client
+from app.core.database import get_async_supabase_client
+from app.core.log_pipeline import PHI
 
 logger = logging.getLogger(__name__)
 
@@ -26,16 +27,16 @@ async def debug_health():
 async def debug_supabase():
     """Test Supabase connection"""
     try:
-        client = get_supabase_client()
+        client = await get_async_supabase_client()
         # Try a simple query
-        response = client.table("poc_intake_sessions").select("count", count="exact").execute()
+        response = await client.table("poc_intake_sessions").select("count", count="exact").execute()
         return {
             "status": "ok", 
             "message": "Supabase connection working",
             "session_count": response.count
         }
     except Exception as e:
-        logger.error(f"Supabase connection failed: {e}")
+        logger.error("Supabase connection failed: %s", e)
         return {"status": "error", "message": str(e)}
 
 
@@ -56,7 +57,7 @@ async def debug_ehr_validation(mrn: str):
                 "message": "Patient not found with provided MRN"
             }
     except Exception as e:
-        logger.error(f"EHR validation failed for MRN {mrn}: {e}")
+        logger.error("EHR validation failed for MRN %s: %s", PHI(mrn), e)
         return {"status": "error", "message": str(e)}
 
 
@@ -8,6 +8,7 @@ from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
+from app.core.log_pipeline import PHI
 from app.services.ehr_service import ehr_service
 from app.repositories.intake_repository import intake_repository
 
@@ -19,7 +20,7 @@ router = APIRouter()
 @router.get("/test")
 async def test_endpoint():
     """Simple test endpoint"""
-    print("DEBUG: test endpoint called")
+    logger.debug("Test endpoint called")
     return {"message": "test endpoint works"}
 
 
@@ -42,8 +43,7 @@ async def initialize_session(request: SessionInitRequest = None):
     2. Check for existing session in Supabase
     3. Return session data and current progress
     """
-    print("SESSIONS INIT CALLED - POST REQUEST RECEIVED")
-    logger.info(f"DEBUG: initialize_session called with MRN: {request.mrn}")
+    logger.debug("initialize_session called with MRN: %s", PHI(request.mrn))
     try:
         # Validate patient exists in EHR
         patient_data = await ehr_service.validate_patient_by_mrn(request.mrn)
@@ -57,7 +57,7 @@ async def initialize_session(request: SessionInitRequest = None):
         from uuid import uuid4
         new_session_id = str(uuid4())
         
-        logger.info(f"DEBUG: Creating new session {new_session_id} for MRN {request.mrn}")
+        logger.debug("Creating new session %s for MRN %s", new_session_id, PHI(request.mrn))
         
         # Create or update the record with new unconfirmed session
         # Store minimal patient data for verification (DOB and last name)
@@ -76,7 +76,7 @@ async def initialize_session(request: SessionInitRequest = None):
             charm_patient_id
         )
         
-        logger.info(f"DEBUG: Created/updated record {record_id} with session {new_session_id}")
+        logger.debug("Created/updated record %s with session %s", record_id, new_session_id)
         
         # Don't populate demographics yet - wait for verification
         demographics_data = {
@@ -135,8 +135,8 @@ async def initialize_session(request: SessionInitRequest = None):
         )
             
     except Exception as e:
-        logger.error(f"DEBUG: Exception occurred: {e}")
-        logger.error(f"Error initializing session for MRN {request.mrn}: {e}")
+        logger.debug("Exception occurred: %s", e)
+        logger.error("Error initializing session for MRN %s: %s", PHI(request.mrn), e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error during session initialization"
@@ -163,7 +163,7 @@ async def get_session(session_id: str):
             try:
                 patient_data = await ehr_service.validate_patient_by_mrn(session_data["charm_mrn"])
             except Exception as e:
-                logger.warning(f"Could not retrieve patient data for session {session_id}: {e}")
+                logger.warning("Could not retrieve patient data for session %s: %s", session_id, e)
         
         return SessionResponse(
             session_id=session_id,
@@ -175,7 +175,7 @@ async def get_session(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving session {session_id}: {e}")
+        logger.error("Error retrieving session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error retrieving session"
@@ -218,7 +218,7 @@ async def update_session_section(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating session {session_id} section {section_name}: {e}")
+        logger.error("Error updating session %s section %s: %s", session_id, section_name, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error updating session"
@@ -248,8 +248,40 @@ async def complete_session(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error completing session {session_id}: {e}")
+        logger.error("Error completing session %s: %s", session_id, e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error completing session"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/sessions/{session_id}/charm-diff")
+async def get_session_charm_diff(session_id: str):
+    """Dry run of the medical history push: what would be inserted or updated in Charm"""
+    try:
+        session_data = await intake_repository.get_session_by_id(session_id)
+        if not session_data:
+            raise HTTPException(
+                status_code=404,
+                detail="Session not found"
+            )
+        
+        patient_id = session_data.get("charm_patient_id")
+        if not patient_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Session is not linked to a Charm patient"
+            )
+        
+        intake_data = session_data.get("intake") or {}
+        diff = await ehr_service.diff_medical_history(patient_id, intake_data.get("intake_medical_history") or {})
+        return diff.as_report()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error computing Charm diff for session %s: %s", session_id, e)
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error computing Charm diff"
+        )
@@ -0,0 +1,95 @@
+"""
+Allergen classification for the Charm Allergy API
+Keyword lists from allergen_classes.json are compiled once into a single regex
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLASSES_PATH = os.path.join(os.path.dirname(__file__), '../models/allergen_classes.json')
+
+DEFAULT_TYPE = "Medication"
+
+
+def normalize_allergen(text: Optional[str]) -> str:
+    """Lowercase words only - "Penicillin " and "penicillin." normalize alike"""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+class AllergyClassifier:
+    """
+    Maps an allergen to its Charm allergy type
+
+    Each type's keywords become one named group of a single alternation regex, with
+    groups in precedence order and longer keywords first, so one scan classifies an
+    allergen whatever the number of keywords. Keywords match whole words (plurals
+    allowed): "fur" no longer matches "furosemide" nor "cat" "medication". The
+    earliest type found in the allergen wins; unmatched allergens get the default.
+    """
+
+    def __init__(
+        self,
+        types: Dict[str, Iterable[str]],
+        default_type: str = DEFAULT_TYPE,
+        no_known: Iterable[str] = (),
+        no_known_drug: Iterable[str] = ()
+    ):
+        self.default_type = default_type
+        self.no_known = frozenset(normalize_allergen(phrase) for phrase in no_known)
+        self.no_known_drug = frozenset(normalize_allergen(phrase) for phrase in no_known_drug)
+        self._types: List[str] = []
+        groups = []
+        for allergy_type, keywords in types.items():
+            words = sorted({normalize_allergen(keyword) for keyword in keywords if keyword}, key=lambda word: (-len(word), word))
+            if not words:
+                continue
+            alternation = "|".join(re.escape(word).replace(r"\ ", r"\s+") for word in words)
+            groups.append(f"(?P<t{len(self._types)}>{alternation})")
+            self._types.append(allergy_type)
+        self._pattern = re.compile(rf"\b(?:{'|'.join(groups)})(?:s|es)?\b") if groups else None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CLASSES_PATH) -> "AllergyClassifier":
+        """Classifier from the JSON data file (default type only if it cannot be read)"""
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            logger.error("Error loading allergen classes: %s", e)
+            return cls({})
+
+        return cls(
+            {entry["type"]: entry.get("keywords", []) for entry in config.get("types", [])},
+            default_type=config.get("default_type", DEFAULT_TYPE),
+            no_known=config.get("no_known", []),
+            no_known_drug=config.get("no_known_drug", [])
+        )
+
+    def classify(self, allergen: str) -> str:
+        """Charm allergy type for an allergen"""
+        if self._pattern is None:
+            return self.default_type
+        ranks = [int(match.lastgroup[1:]) for match in self._pattern.finditer(normalize_allergen(allergen))]
+        return self._types[min(ranks)] if ranks else self.default_type
+
+    def is_no_known(self, allergen: Optional[str]) -> bool:
+        """True for "none", "NKA", "no known allergies" and similar"""
+        return normalize_allergen(allergen) in self.no_known
+
+    def is_no_known_drug(self, allergen: Optional[str]) -> bool:
+        """
+        True for "NKDA", "no known drug allergies" and similar
+
+        These rule out drug allergies only, so they are neither an allergen nor
+        grounds to mark the whole chart "No Known".
+        """
+        return normalize_allergen(allergen) in self.no_known_drug
+
+
+# Global classifier (built once per process)
+allergy_classifier = AllergyClassifier.load()
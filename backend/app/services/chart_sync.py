@@ -0,0 +1,250 @@
+"""
+Keyed diff of intake lists against a patient's existing Charm chart
+Used to make EHR pushes idempotent: only new or changed entries are written
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_key(text: Any) -> str:
+    """Lowercase words and numbers only, used for keys and field comparison"""
+    return " ".join(re.findall(r"[a-z0-9]+", str(text or "").lower()))
+
+
+@dataclass(frozen=True)
+class ChartListSpec:
+    """
+    How one intake list maps onto a Charm chart list
+
+    path is relative to /patients/{patient_id}; the chart list is read from
+    response_key and updated at {path}/{record[id_field]}. payload_key and
+    record_keys give the identity used to pair an intake payload with a chart
+    record (a record may be known under several names, e.g. trade and generic);
+    compared lists (payload field, chart field, intake field) triples that trigger
+    an update. A field is only compared when the patient answered its intake field,
+    so builder defaults (a "Moderate" severity, "Take as directed") never overwrite
+    what a clinician recorded.
+    """
+    kind: str
+    path: str
+    response_key: str
+    id_field: str
+    payload_key: Callable[[Dict[str, Any]], str]
+    record_keys: Callable[[Dict[str, Any]], Iterable[str]]
+    compared: Tuple[Tuple[str, str, str], ...] = ()
+    batch_inserts: bool = False  # the insert endpoint takes an array
+
+
+@dataclass(frozen=True)
+class ChartTextSpec:
+    """A free-text history entry; the intake text is added unless the chart text already holds it"""
+    kind: str
+    path: str
+    text_field: str
+
+
+@dataclass
+class ChartChange:
+    """One write needed to bring the chart in line with the intake"""
+    kind: str
+    action: str  # "insert" or "update"
+    key: str
+    payload: Dict[str, Any]  # full entry for an insert, only the changed fields for an update
+    path: str  # insert endpoint, relative to /patients/{patient_id}
+    record_id: Optional[str] = None
+    changed: List[str] = field(default_factory=list)
+    batch: bool = False  # insert together with the other changes for the same path
+    ok: Optional[bool] = None  # None until applied
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.path}/{self.record_id}" if self.action == "update" else self.path
+
+    def as_dict(self) -> Dict[str, Any]:
+        change = {"kind": self.kind, "action": self.action, "key": self.key, "payload": self.payload}
+        if self.record_id:
+            change["record_id"] = self.record_id
+        if self.changed:
+            change["changed"] = self.changed
+        if self.ok is not None:
+            change["ok"] = self.ok
+        return change
+
+
+@dataclass
+class ChartDiff:
+    """Changes for one patient, plus what was already on the chart"""
+    patient_id: str
+    changes: List[ChartChange] = field(default_factory=list)
+    unchanged: Dict[str, int] = field(default_factory=dict)
+    fetch_errors: Dict[str, str] = field(default_factory=dict)
+    conflicts: Dict[str, str] = field(default_factory=dict)  # intake contradicts the chart; nothing written
+    dry_run: bool = True
+
+    def add(self, kind: str, changes: List[ChartChange], unchanged: int) -> None:
+        self.changes.extend(changes)
+        self.unchanged[kind] = self.unchanged.get(kind, 0) + unchanged
+
+    @property
+    def succeeded(self) -> bool:
+        """Nothing failed to fetch or conflicted and every change was applied (vacuously true for no changes)"""
+        return not self.fetch_errors and not self.conflicts and all(change.ok for change in self.changes)
+
+    @property
+    def is_empty(self) -> bool:
+        """No intake entries were compared at all"""
+        return not (self.changes or self.fetch_errors or self.conflicts or any(self.unchanged.values()))
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        kinds = {kind: {"insert": 0, "update": 0, "unchanged": count} for kind, count in self.unchanged.items()}
+        for change in self.changes:
+            kinds.setdefault(change.kind, {"insert": 0, "update": 0, "unchanged": 0})[change.action] += 1
+        return kinds
+
+    def as_report(self) -> Dict[str, Any]:
+        return {
+            "patient_id": self.patient_id,
+            "dry_run": self.dry_run,
+            "summary": self.summary(),
+            "changes": [change.as_dict() for change in self.changes],
+            "fetch_errors": dict(self.fetch_errors),
+            "conflicts": dict(self.conflicts),
+        }
+
+
+def _same_value(intake_value: Any, chart_value: Any) -> bool:
+    """Field values are equal up to case, punctuation and spacing ("500mg" == "500 mg")"""
+    return normalize_key(intake_value).replace(" ", "") == normalize_key(chart_value).replace(" ", "")
+
+
+def _record_keys(spec: ChartListSpec, record: Dict[str, Any]) -> List[str]:
+    return [key for key in (normalize_key(value) for value in spec.record_keys(record)) if key]
+
+
+def _answered(value: Any) -> bool:
+    return bool(normalize_key(value))
+
+
+def diff_list(
+    spec: ChartListSpec,
+    entries: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    records: List[Dict[str, Any]]
+) -> Tuple[List[ChartChange], int]:
+    """
+    Changes for one list of (payload, intake item) entries: payloads with no
+    matching record are inserts, matched payloads whose answered compared fields
+    differ are updates carrying just those fields. Repeated payload keys are sent
+    once. Returns (changes, number of payloads already on the chart).
+    """
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        for key in _record_keys(spec, record):
+            by_key.setdefault(key, record)
+
+    changes: List[ChartChange] = []
+    unchanged = 0
+    seen = set()
+    for payload, intake in entries:
+        key = normalize_key(spec.payload_key(payload))
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        record = by_key.get(key)
+        if record is None:
+            changes.append(ChartChange(kind=spec.kind, action="insert", key=key, payload=payload, path=spec.path, batch=spec.batch_inserts))
+            continue
+
+        changed = [
+            payload_field
+            for payload_field, record_field, intake_field in spec.compared
+            if _answered(intake.get(intake_field))
+            and payload.get(payload_field) not in (None, "")
+            and not _same_value(payload[payload_field], record.get(record_field))
+        ]
+        if changed:
+            changes.append(ChartChange(
+                kind=spec.kind, action="update", key=key,
+                payload={payload_field: payload[payload_field] for payload_field in changed}, path=spec.path,
+                record_id=str(record.get(spec.id_field)), changed=changed
+            ))
+        else:
+            unchanged += 1
+    return changes, unchanged
+
+
+def diff_text(spec: ChartTextSpec, content: str, chart_data: Any) -> Tuple[List[ChartChange], int]:
+    """
+    Insert for a free-text entry unless every line of it is already in the chart text
+    Returns (changes, 1 if already recorded else 0) like diff_list.
+    """
+    existing = chart_data.get(spec.text_field) if isinstance(chart_data, dict) else None
+    recorded = f" {normalize_key(existing)} "
+    lines = [normalize_key(line) for line in re.split(r"\\n|\n", content)]
+    if recorded.strip() and all(f" {line} " in recorded for line in lines if line):
+        return [], 1
+    payload = {"content": content, "is_html": False}
+    return [ChartChange(kind=spec.kind, action="insert", key=spec.kind, payload=payload, path=spec.path)], 0
+
+
+# =============================================================================
+# Medical history lists and text entries
+# =============================================================================
+
+MEDICATIONS = ChartListSpec(
+    kind="medications",
+    path="medications",
+    response_key="medications",
+    id_field="patient_medication_id",
+    payload_key=lambda payload: payload.get("drug_name"),
+    record_keys=lambda record: (record.get("trade_name"), record.get("generic_drug_name"), record.get("generic_product_name"), record.get("drug_name")),
+    compared=(("strength_description", "strength_description", "strength"), ("directions", "directions", "directions")),
+    batch_inserts=True,
+)
+
+ALLERGIES = ChartListSpec(
+    kind="allergies",
+    path="allergies",
+    response_key="allergies",
+    id_field="patient_allergy_id",
+    payload_key=lambda payload: payload.get("allergen"),
+    record_keys=lambda record: (record.get("allergen"),),
+    compared=(("severity", "severity", "severity"), ("reactions", "reactions", "reaction")),
+)
+
+FAMILY_HISTORY = ChartListSpec(
+    kind="family_history",
+    path="medicalhistory/familyhistory",
+    response_key="data",
+    id_field="family_history_id",
+    # A relative can have several problems, so the problem is part of the identity
+    payload_key=lambda payload: f"{payload.get('relationship')} {payload.get('comments')}",
+    record_keys=lambda record: [f"{record.get('relationship')} {record.get('comments')}"] + [
+        f"{record.get('relationship')} {entry.get('comments') or entry.get('diagnosis')}"
+        for entry in record.get("diagnosis_list") or []
+    ],
+)
+
+SURGERIES = ChartListSpec(
+    kind="surgeries",
+    path="medicalhistory/procedure",
+    response_key="data",
+    id_field="procedure_id",
+    payload_key=lambda payload: payload.get("procedure"),
+    record_keys=lambda record: (record.get("procedure"),),
+    compared=(("from_date", "from_date", "year"),),
+)
+
+PAST_MEDICAL_HISTORY = ChartTextSpec(
+    kind="past_medical_history",
+    path="medicalhistory/pastmedicalhistory",
+    text_field="past_medical_history",
+)
+
+SOCIAL_HISTORY = ChartTextSpec(
+    kind="social_history",
+    path="medicalhistory/socialhistory",
+    text_field="social_history",
+)
@@ -0,0 +1,122 @@
+"""
+Rolling conversation memory for the intake agent
+A per-session summary of older turns plus a short window of recent raw messages
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.config import get_settings
+from app.repositories.chat_history_repository import chat_history_repository
+from app.repositories.intake_repository import SessionUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+# Key of the summary in the session's entry of poc_intake_sessions.sessions
+SUMMARY_KEY = "conversation_summary"
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+@dataclass
+class ConversationWindow:
+    """What the agent sees of a conversation on one turn"""
+    summary: str = ""
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    message_ids: List[int] = field(default_factory=list)
+
+
+class ConversationMemory:
+    """
+    Summary + recent-window memory stored with the session
+
+    The session entry holds {"text", "last_message_id", "summarized_messages"}.
+    Each turn fetches only chat messages newer than last_message_id (capped at
+    conversation_history_max_messages). Once conversation_summary_trigger of them
+    have piled up, everything but the last conversation_window_messages is folded
+    into the summary in the background after the turn is committed, so the prompt
+    stays bounded without dropping older context.
+    """
+
+    def __init__(self, history_repository=None, summarizer: Optional[Summarizer] = None):
+        self.settings = get_settings()
+        self.history = history_repository or chat_history_repository
+        self._summarizer = summarizer
+        self._in_flight: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def summarizer(self) -> Summarizer:
+        if self._summarizer is None:
+            from app.services.pydantic_intake_agent import pydantic_intake_agent
+            self._summarizer = pydantic_intake_agent.summarize_conversation
+        return self._summarizer
+
+    async def load_window(self, session_id: str, current_session: Dict[str, Any]) -> ConversationWindow:
+        """Summary and the unsummarized messages for a session"""
+        stored = current_session.get(SUMMARY_KEY) or {}
+        records = await self.history.get_messages_after(
+            session_id,
+            after_id=stored.get("last_message_id"),
+            limit=self.settings.conversation_history_max_messages
+        )
+        return ConversationWindow(
+            summary=stored.get("text", ""),
+            messages=[_as_history_entry(record["message"]) for record in records],
+            message_ids=[record["id"] for record in records]
+        )
+
+    def schedule_refresh(self, unit_of_work: SessionUnitOfWork, window: ConversationWindow) -> bool:
+        """
+        Fold older messages into the summary after the turn commits, if enough have accumulated
+        Returns True if a refresh was scheduled
+        """
+        if len(window.messages) < self.settings.conversation_summary_trigger:
+            return False
+        if unit_of_work.session_id in self._in_flight:
+            return False
+
+        keep = self.settings.conversation_window_messages
+        fold_messages = window.messages[:-keep] if keep else list(window.messages)
+        fold_ids = window.message_ids[:len(fold_messages)]
+        if not fold_messages:
+            return False
+
+        self._in_flight.add(unit_of_work.session_id)
+
+        async def start_refresh() -> None:
+            task = asyncio.create_task(self._refresh(unit_of_work, window.summary, fold_messages, fold_ids[-1]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        unit_of_work.after_commit(start_refresh)
+        return True
+
+    async def _refresh(self, unit_of_work: SessionUnitOfWork, previous_summary: str, messages: List[Dict[str, str]], last_message_id: int) -> None:
+        session_id = unit_of_work.session_id
+        try:
+            stored = unit_of_work.current_session.get(SUMMARY_KEY) or {}
+            summary = await self.summarizer(previous_summary, messages)
+            unit_of_work.stage_session({SUMMARY_KEY: {
+                "text": summary,
+                "last_message_id": last_message_id,
+                "summarized_messages": stored.get("summarized_messages", 0) + len(messages),
+                "updated_at": datetime.utcnow().isoformat()
+            }})
+            await unit_of_work.commit()
+            logger.info("Folded %s messages into the conversation summary for session %s", len(messages), session_id)
+        except Exception as e:
+            logger.error("Error refreshing conversation summary for session %s: %s", session_id, e)
+        finally:
+            self._in_flight.discard(session_id)
+
+
+def _as_history_entry(message: Dict[str, Any]) -> Dict[str, str]:
+    return {"role": str(message.get("role", "unknown")), "content": str(message.get("content", ""))}
+
+
+# Global conversation memory
+conversation_memory = ConversationMemory()
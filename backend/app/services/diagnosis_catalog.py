@@ -0,0 +1,200 @@
+"""
+Clinic diagnosis catalog
+Parses the approved diagnosis list once into code, name and fuzzy token indexes
+"""
+
+import difflib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSIS_LIST_PATH = os.path.join(os.path.dirname(__file__), "../../../.vscode/Diagnosis List for AI Scribe.md")
+
+# "##Name" headings followed by "CODE ( ICD10)" - the code is sometimes glued onto the heading line,
+# and some headings are preceded by a form feed
+_ENTRY = re.compile(r"^[ \t\f]*##\s*(?P<name>.+?)\s*(?:\n\s*)?(?P<code>[A-Z]\d{2}(?:\.[0-9A-Z]{1,4})?)\s*(?:\(\s*(?P<type>ICD\s*10)\s*\))?\s*$", re.MULTILINE)
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "by", "dr", "elsewhere", "has", "have", "had", "i", "in", "my", "not",
+    "of", "or", "the", "to", "unspecified", "with", "without", "classified"
+})
+
+# Lay terms patients use -> catalog wording appended to the query
+_SYNONYMS = {
+    "high blood pressure": "essential hypertension",
+    "htn": "essential hypertension",
+    "hypertensive": "essential hypertension",
+    "high cholesterol": "hyperlipidemia",
+    "cholesterol": "hyperlipidemia",
+    "triglycerides": "mixed hyperlipidemia",
+    "sleep apnea": "obstructive sleep apnea",
+    "osa": "obstructive sleep apnea",
+    "diabetes": "type 2 diabetes mellitus",
+    "t2dm": "type 2 diabetes mellitus",
+    "dm2": "type 2 diabetes mellitus",
+    "pre diabetes": "prediabetes",
+    "borderline diabetes": "prediabetes",
+    "acid reflux": "gastro esophageal reflux disease",
+    "reflux": "gastro esophageal reflux disease",
+    "gerd": "gastro esophageal reflux disease",
+    "fatty liver": "fatty liver",
+    "nafld": "fatty liver",
+    "masld": "fatty liver",
+    "pcos": "polycystic ovarian syndrome",
+    "arthritis": "polyosteoarthritis",
+    "osteoarthritis": "polyosteoarthritis",
+    "thyroid": "hypothyroidism",
+    "hypothyroid": "hypothyroidism",
+    "ckd": "chronic kidney disease",
+    "kidney disease": "chronic kidney disease",
+    "anemia": "iron deficiency anemia",
+    "depressed": "depression",
+    "anxious": "anxiety disorder",
+    "trouble sleeping": "insomnia",
+    "tired": "chronic fatigue",
+}
+_SYNONYM_PATTERNS = [(re.compile(rf"\b{re.escape(phrase)}\b"), expansion) for phrase, expansion in _SYNONYMS.items()]
+
+
+def normalize(text: str) -> str:
+    """Lowercase words and numbers only - "[BMI]30.0-30.9" and "[BMI] 30.0-30.9" normalize alike"""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in normalize(text).split() if token not in _STOPWORDS]
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """One approved diagnosis"""
+    name: str
+    code: str
+    code_type: str = "ICD10"
+
+
+class DiagnosisCatalog:
+    """
+    Indexed clinic diagnosis list
+
+    by_code maps an ICD-10 code to its entries (Z98.84 has several approved names),
+    by_name maps the normalized name to its entry and the token index backs fuzzy
+    search, which candidate pre-selection and output validation both use.
+    """
+
+    def __init__(self, entries: Iterable[CatalogEntry]):
+        self.entries: List[CatalogEntry] = list(entries)
+        self.by_code: Dict[str, List[CatalogEntry]] = {}
+        self.by_name: Dict[str, CatalogEntry] = {}
+        self._entry_tokens: List[Set[str]] = []
+        self._token_index: Dict[str, Set[int]] = {}
+
+        for position, entry in enumerate(self.entries):
+            self.by_code.setdefault(entry.code, []).append(entry)
+            self.by_name.setdefault(normalize(entry.name), entry)
+            tokens = set(_tokens(entry.name))
+            self._entry_tokens.append(tokens)
+            for token in tokens:
+                self._token_index.setdefault(token, set()).add(position)
+        self._vocabulary = sorted(self._token_index)
+
+    @classmethod
+    def parse(cls, text: str) -> "DiagnosisCatalog":
+        """Catalog from the markdown list"""
+        return cls(
+            CatalogEntry(name=match.group("name").strip(), code=match.group("code"))
+            for match in _ENTRY.finditer(text)
+        )
+
+    @classmethod
+    def load(cls, path: str = DIAGNOSIS_LIST_PATH) -> "DiagnosisCatalog":
+        """Catalog from the markdown file (empty if it cannot be read)"""
+        try:
+            with open(path, 'r') as f:
+                catalog = cls.parse(f.read())
+            logger.info("Loaded %s diagnoses (%s codes) into the catalog", len(catalog), len(catalog.by_code))
+            return catalog
+        except Exception as e:
+            logger.error("Error loading diagnosis list: %s", e)
+            return cls([])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup_code(self, code: str) -> List[CatalogEntry]:
+        return self.by_code.get(code.strip().upper(), [])
+
+    def lookup_name(self, name: str) -> Optional[CatalogEntry]:
+        return self.by_name.get(normalize(name))
+
+    def search(self, text: str, limit: int = 5, min_score: float = 0.3) -> List[Tuple[CatalogEntry, float]]:
+        """
+        Fuzzy search by name tokens (lay terms expanded, typos matched per token)
+        Scores are 0-1: mostly how much of the query matched, partly how much of the entry
+        """
+        lowered = normalize(text)
+        expanded = " ".join([lowered] + [expansion for pattern, expansion in _SYNONYM_PATTERNS if pattern.search(lowered)])
+        query = set(_tokens(expanded))
+        if not query:
+            return []
+
+        weights: Dict[int, Dict[str, float]] = {}
+        for token in query:
+            for vocabulary_token, weight in self._match_token(token):
+                for position in self._token_index.get(vocabulary_token, ()):
+                    matched = weights.setdefault(position, {})
+                    matched[vocabulary_token] = max(matched.get(vocabulary_token, 0.0), weight)
+
+        scored = []
+        for position, matched in weights.items():
+            total = sum(matched.values())
+            score = 0.7 * min(total / len(query), 1.0) + 0.3 * (len(matched) / max(len(self._entry_tokens[position]), 1))
+            if score >= min_score:
+                scored.append((self.entries[position], round(score, 3)))
+        scored.sort(key=lambda item: (-item[1], item[0].name))
+        return scored[:limit]
+
+    def _match_token(self, token: str) -> List[Tuple[str, float]]:
+        """Vocabulary tokens matching a query token: exact, else close spellings of longer words"""
+        if token in self._token_index:
+            return [(token, 1.0)]
+        if len(token) < 4:
+            return []
+        return [
+            (close, difflib.SequenceMatcher(None, token, close).ratio())
+            for close in difflib.get_close_matches(token, self._vocabulary, n=3, cutoff=0.85)
+        ]
+
+    def candidates(self, conditions: Iterable[str], per_condition: int = 5, limit: int = 25) -> List[CatalogEntry]:
+        """Small subset of the catalog likely to match the patient's conditions"""
+        selected: Dict[CatalogEntry, None] = {}
+        for condition in conditions:
+            for entry, _ in self.search(condition, limit=per_condition):
+                selected.setdefault(entry, None)
+        return list(selected)[:limit]
+
+    def resolve(self, name: str, code: str, min_score: float = 0.8) -> Optional[CatalogEntry]:
+        """
+        Catalog entry for a (name, code) pair, correcting whichever half is wrong
+        A known code keeps its code and takes the closest approved name; an unknown
+        code is replaced via an exact or strong fuzzy name match. None if neither fits.
+        """
+        entries = self.lookup_code(code)
+        if entries:
+            target = normalize(name)
+            return max(entries, key=lambda entry: difflib.SequenceMatcher(None, target, normalize(entry.name)).ratio())
+
+        entry = self.lookup_name(name)
+        if entry:
+            return entry
+        matches = self.search(name, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
+
+
+def render_entries(entries: Iterable[CatalogEntry]) -> str:
+    """Compact "CODE: name" lines for a prompt"""
+    return "\n".join(f"{entry.code}: {entry.name}" for entry in entries)
@@ -0,0 +1,356 @@
+"""
+Diagnosis engine for completed intakes
+Deterministic rules assign BMI- and history-driven codes; the LLM only maps free-text conditions
+"""
+
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from pydantic_ai import Agent
+
+from app.core.log_pipeline import PHI, Payload
+from app.core.metrics import timed
+from app.services.diagnosis_catalog import CatalogEntry, DiagnosisCatalog, render_entries
+from app.services.prompt_compiler import compact_json
+
+logger = logging.getLogger(__name__)
+
+class DiagnosisRecommendation(BaseModel):
+    """Model for recommended diagnoses based on patient intake data"""
+    name: str = Field(description="The full name of the diagnosis")
+    code: str = Field(description="The ICD-10 code for the diagnosis")
+    code_type: str = Field(default="ICD10", description="The type of code, typically ICD10")
+    status: str = Field(default="Active", description="Status of the diagnosis")
+    comments: Optional[str] = Field(default=None, description="Additional comments about the diagnosis")
+    reasoning: str = Field(description="Explanation for why this diagnosis was recommended")
+
+
+class DiagnosisAnalysis(BaseModel):
+    """Model for complete diagnosis analysis results"""
+    bmi: Optional[float] = Field(description="Calculated BMI from height and weight")
+    bmi_category: Optional[str] = Field(description="BMI category (Normal, Overweight, Obese, etc.)")
+    recommended_diagnoses: List[DiagnosisRecommendation] = Field(description="List of recommended diagnoses")
+    analysis_notes: str = Field(description="Overall analysis notes")
+
+
+class ComorbidityMapping(BaseModel):
+    """Model for the LLM's mapping of free-text conditions onto the clinic's diagnosis list"""
+    recommended_diagnoses: List[DiagnosisRecommendation] = Field(description="Diagnoses from the clinic list matching the patient's conditions")
+    analysis_notes: str = Field(default="", description="Notes on conditions that could not be mapped")
+
+
+# Codes the rules own - model output for these is ignored
+RULE_CODE_PREFIXES = ("Z68.", "E66.")
+
+# Obesity-related comorbidities that make BMI 35-39.9 morbid obesity
+OBESITY_COMORBIDITY_CODES = frozenset({"R73.03", "E11.9", "I10", "E78.2", "E78.5", "G47.33", "K76.0", "K21.9", "M15.9", "E28.2"})
+
+# (lower bound, code, name) for the adult BMI Z-codes on the clinic list, highest first
+_BMI_BANDS = [
+    (70.0, "Z68.45", "Body mass index [BMI] 70 or greater, adult"),
+    (60.0, "Z68.44", "Body mass index [BMI] 60.0-69.9, adult"),
+    (50.0, "Z68.43", "Body mass index [BMI] 50.0-59.9, adult"),
+    (45.0, "Z68.42", "Body mass index [BMI] 45.0-49.9, adult"),
+    (40.0, "Z68.41", "Body mass index [BMI] 40.0-44.9, adult"),
+] + [
+    (float(whole), f"Z68.{whole}", f"Body mass index [BMI] {whole}.0-{whole}.9, adult")
+    for whole in range(39, 21, -1)
+]
+
+# (pattern, diagnosis name) for bariatric surgery types; the code is always Z98.84
+_BARIATRIC_TYPES = [
+    (re.compile(r"bypass|rygb|roux"), "History of gastric bypass"),
+    (re.compile(r"sleeve|vsg|gastrectomy"), "History of vertical sleeve gastrectomy"),
+    (re.compile(r"band"), "Status Post Gastric Banding by another surgeon"),
+]
+
+_INSULIN = re.compile(r"\b(insulin|lantus|levemir|tresiba|toujeo|basaglar|semglee|humalog|novolog|admelog|apidra|fiasp|lyumjev|humulin|novolin)\b", re.IGNORECASE)
+
+_DIAGNOSIS_PROMPT = """You map a patient's self-reported medical conditions onto a clinic's approved ICD-10 diagnosis list.
+
+Each request lists the candidate diagnoses from the clinic's approved list as "CODE: name" lines.
+
+Instructions:
+1. Map each reported condition to the matching candidate diagnosis, if there is one
+2. Medications are context only - do not diagnose from a medication alone
+3. Do not return BMI or obesity/overweight codes, or any code already assigned
+4. Only recommend candidate diagnoses, using their exact names and ICD-10 codes
+5. Give short reasoning for each recommendation"""
+
+
+def _create_diagnosis_agent() -> Agent:
+    """Create the comorbidity-mapping agent"""
+    return Agent(
+        'gpt-4o-mini',
+        result_type=ComorbidityMapping,
+        system_prompt=_DIAGNOSIS_PROMPT,
+    )
+
+
+@dataclass
+class PatientFacts:
+    """What the diagnosis rules need from a completed intake"""
+    bmi: Optional[float] = None
+    age: Optional[int] = None
+    gender: str = ""
+    has_bariatric_history: bool = False
+    bariatric_surgery_types: List[str] = field(default_factory=list)
+    has_gerd: bool = False
+    conditions: List[str] = field(default_factory=list)  # free text - mapped by the LLM
+    medications: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DiagnosisEngineStats:
+    """How many analyses needed the LLM"""
+    analyses: int = 0
+    llm_calls: int = 0
+    llm_skipped: int = 0
+    rule_diagnoses: int = 0
+    llm_diagnoses: int = 0
+    corrected: int = 0  # name or code fixed against the catalog
+    dropped: int = 0  # not on the clinic list
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["llm_skip_ratio"] = round(self.llm_skipped / self.analyses, 3) if self.analyses else 0.0
+        return stats
+
+
+class DiagnosisEngine:
+    """
+    Long-lived diagnosis engine
+
+    The clinic catalog is parsed once and the agent is built once (warm() at startup).
+    BMI Z-codes, obesity class, bariatric status, GERD and insulin use come from
+    rules over the structured intake. Only free-text conditions go to the LLM, with
+    just the catalog entries they plausibly match, and the call is skipped when
+    there are none. Every diagnosis is checked against the catalog before it is
+    returned: wrong names or codes are corrected, unknown diagnoses dropped.
+    """
+
+    def __init__(self, catalog: Optional[DiagnosisCatalog] = None, agent: Optional[Agent] = None):
+        self.catalog = catalog if catalog is not None else DiagnosisCatalog.load()
+        self._agent = agent
+        self.stats = DiagnosisEngineStats()
+
+    @property
+    def agent(self) -> Agent:
+        if self._agent is None:
+            self._agent = _create_diagnosis_agent()
+        return self._agent
+
+    def warm(self) -> None:
+        """Build the agent ahead of the first completed intake"""
+        try:
+            self.agent
+        except Exception as e:
+            logger.warning("Diagnosis agent not built at startup, will retry on first use: %s", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.stats.as_dict()
+
+    async def analyze(self, intake_data: Dict[str, Any]) -> DiagnosisAnalysis:
+        """Recommended diagnoses for a completed intake"""
+        facts = self.extract_facts(intake_data)
+        history_diagnoses = self.history_diagnoses(facts)
+        mapped_diagnoses = []
+        notes = ["BMI, obesity, bariatric, GERD and insulin codes assigned by rule"]
+
+        candidates = self.catalog.candidates(facts.conditions) if facts.conditions else []
+        if candidates:
+            mapping = await self._map_conditions(facts, candidates, history_diagnoses)
+            assigned = {diagnosis.code for diagnosis in history_diagnoses}
+            # Validated now so only real catalog comorbidities drive the obesity class below
+            for diagnosis in self.validate(mapping.recommended_diagnoses):
+                if diagnosis.code.startswith(RULE_CODE_PREFIXES) or diagnosis.code in assigned:
+                    continue
+                assigned.add(diagnosis.code)
+                mapped_diagnoses.append(diagnosis)
+            if mapping.analysis_notes:
+                notes.append(mapping.analysis_notes)
+        else:
+            self.stats.llm_skipped += 1
+
+        # Obesity class last: BMI 35-39.9 depends on the comorbidities found above
+        comorbidity_codes = {diagnosis.code for diagnosis in history_diagnoses + mapped_diagnoses}
+        bmi_diagnoses = [
+            diagnosis
+            for diagnosis in (self.obesity_diagnosis(facts, comorbidity_codes), self.bmi_diagnosis(facts))
+            if diagnosis
+        ]
+        rule_diagnoses = bmi_diagnoses + history_diagnoses
+        self.stats.analyses += 1
+        self.stats.rule_diagnoses += len(rule_diagnoses)
+        self.stats.llm_diagnoses += len(mapped_diagnoses)
+
+        return DiagnosisAnalysis(
+            bmi=facts.bmi,
+            bmi_category=bmi_category(facts.bmi),
+            recommended_diagnoses=self.validate(rule_diagnoses + mapped_diagnoses),
+            analysis_notes="; ".join(notes)
+        )
+
+    def extract_facts(self, intake_data: Dict[str, Any]) -> PatientFacts:
+        """Pull the rule inputs out of the stored intake sections"""
+        demographics = intake_data.get("intake_demographics") or {}
+        weight_history = intake_data.get("intake_weight_history") or {}
+        medical_history = intake_data.get("intake_medical_history") or {}
+        facts = PatientFacts(gender=demographics.get("gender") or "", age=_age(demographics.get("dateOfBirth")))
+
+        current_vitals = weight_history.get("currentVitals") or {}
+        height = current_vitals.get("height") or {}
+        weight = current_vitals.get("weight")
+        try:
+            total_inches = (float(height.get("feet") or 0) * 12) + float(height.get("inches") or 0)
+            if total_inches > 0 and weight and float(weight) > 0:
+                facts.bmi = round((float(weight) / (total_inches ** 2)) * 703, 1)
+        except (TypeError, ValueError):
+            logger.warning("Unusable height/weight in intake: %s", Payload(current_vitals))
+
+        bariatric = weight_history.get("bariatricSurgeryHistory") or {}
+        facts.has_bariatric_history = bool(bariatric.get("hasBariatricSurgeryHistory"))
+        surgery_types = bariatric.get("surgeryType") or []
+        facts.bariatric_surgery_types = [surgery_types] if isinstance(surgery_types, str) else list(surgery_types)
+
+        specific = medical_history.get("specificConditions") or {}
+        facts.has_gerd = bool((specific.get("gerdHeartburn") or {}).get("hasGerd"))
+        facts.conditions = [
+            str(condition) for condition in (medical_history.get("PMHx") or []) + (medical_history.get("PMHxObesityComorbid") or [])
+            if condition
+        ]
+        facts.medications = [
+            " ".join(filter(None, [medication.get("medicationName"), medication.get("strength")]))
+            for medication in medical_history.get("currentMedications") or []
+            if medication.get("medicationName")
+        ]
+        return facts
+
+    def history_diagnoses(self, facts: PatientFacts) -> List[DiagnosisRecommendation]:
+        """
+        Bariatric status, GERD and insulin use from the structured history
+        A bariatric procedure of unknown type is added to facts.conditions for the LLM instead
+        """
+        diagnoses = []
+
+        if facts.has_bariatric_history:
+            names = [name for surgery in facts.bariatric_surgery_types for pattern, name in _BARIATRIC_TYPES if pattern.search(surgery.lower())]
+            if names:
+                # One Z98.84 entry; the most recent (last listed) procedure names it
+                diagnoses.append(DiagnosisRecommendation(
+                    name=names[-1],
+                    code="Z98.84",
+                    comments=", ".join(facts.bariatric_surgery_types) if len(facts.bariatric_surgery_types) > 1 else None,
+                    reasoning="Reported bariatric surgery history"
+                ))
+            else:
+                # Unknown procedure type - let the LLM read it alongside the other conditions
+                facts.conditions.append(f"Bariatric surgery: {', '.join(facts.bariatric_surgery_types) or 'type not specified'}")
+
+        if facts.has_gerd:
+            diagnoses.append(DiagnosisRecommendation(
+                name="Gastro-esophageal reflux disease without esophagitis",
+                code="K21.9",
+                reasoning="Reported GERD/heartburn"
+            ))
+
+        if any(_INSULIN.search(medication) for medication in facts.medications):
+            diagnoses.append(DiagnosisRecommendation(
+                name="Long term (current) use of insulin",
+                code="Z79.4",
+                reasoning="Insulin on the current medication list"
+            ))
+
+        return diagnoses
+
+    def bmi_diagnosis(self, facts: PatientFacts) -> Optional[DiagnosisRecommendation]:
+        """Adult BMI Z-code (only BMI 22 and up are on the clinic list)"""
+        if facts.bmi is None or (facts.age is not None and facts.age < 20):
+            return None
+        for lower_bound, code, name in _BMI_BANDS:
+            if facts.bmi >= lower_bound:
+                return DiagnosisRecommendation(name=name, code=code, reasoning=f"Calculated BMI {facts.bmi}")
+        return None
+
+    def obesity_diagnosis(self, facts: PatientFacts, comorbidity_codes: set) -> Optional[DiagnosisRecommendation]:
+        """Overweight / obesity / morbid obesity from BMI and obesity-related comorbidities"""
+        if facts.bmi is None or (facts.age is not None and facts.age < 20):
+            return None
+        if facts.bmi >= 40 or (facts.bmi >= 35 and comorbidity_codes & OBESITY_COMORBIDITY_CODES):
+            reasoning = f"BMI {facts.bmi}" if facts.bmi >= 40 else f"BMI {facts.bmi} with obesity-related comorbidity"
+            return DiagnosisRecommendation(name="Morbid obesity", code="E66.01", reasoning=reasoning)
+        if facts.bmi >= 30:
+            return DiagnosisRecommendation(name="Obesity, unspecified", code="E66.9", reasoning=f"BMI {facts.bmi}")
+        if facts.bmi >= 25:
+            return DiagnosisRecommendation(name="Overweight", code="E66.3", reasoning=f"BMI {facts.bmi}")
+        return None
+
+    def validate(self, diagnoses: List[DiagnosisRecommendation]) -> List[DiagnosisRecommendation]:
+        """Diagnoses checked against the catalog: corrected where possible, dropped if unknown, one per code"""
+        if not len(self.catalog):
+            logger.warning("Diagnosis catalog is empty - pushing diagnoses unvalidated")
+            return diagnoses
+
+        validated: Dict[str, DiagnosisRecommendation] = {}
+        for diagnosis in diagnoses:
+            entry = self.catalog.resolve(diagnosis.name, diagnosis.code)
+            if entry is None:
+                self.stats.dropped += 1
+                logger.warning("Dropping diagnosis not on the clinic list: %s (%s)", PHI(diagnosis.name), diagnosis.code)
+                continue
+            if (entry.name, entry.code) != (diagnosis.name, diagnosis.code):
+                self.stats.corrected += 1
+                logger.info("Corrected diagnosis %s (%s) to %s (%s)", PHI(diagnosis.name), diagnosis.code, entry.name, entry.code)
+                diagnosis = diagnosis.model_copy(update={"name": entry.name, "code": entry.code, "code_type": entry.code_type})
+            validated.setdefault(diagnosis.code, diagnosis)
+        return list(validated.values())
+
+    @timed("agent.diagnosis")
+    async def _map_conditions(self, facts: PatientFacts, candidates: List[CatalogEntry], assigned: List[DiagnosisRecommendation]) -> ComorbidityMapping:
+        """Map free-text conditions onto the candidate catalog entries with the LLM"""
+        self.stats.llm_calls += 1
+        patient = compact_json({
+            "conditions": facts.conditions,
+            "medications": facts.medications,
+            "gender": facts.gender,
+            "age": facts.age,
+            "already_assigned": [f"{diagnosis.code} {diagnosis.name}" for diagnosis in assigned]
+        })
+        result = await self.agent.run(f"Candidate diagnoses:\n{render_entries(candidates)}\n\nMap these patient conditions to the candidate diagnoses: {patient}")
+        return result.output
+
+
+def bmi_category(bmi: Optional[float]) -> Optional[str]:
+    """Adult BMI category"""
+    if bmi is None:
+        return None
+    if bmi < 18.5:
+        return "Underweight"
+    if bmi < 25:
+        return "Normal"
+    if bmi < 30:
+        return "Overweight"
+    if bmi < 35:
+        return "Obese Class I"
+    if bmi < 40:
+        return "Obese Class II"
+    return "Obese Class III"
+
+
+def _age(date_of_birth: Optional[str]) -> Optional[int]:
+    if not date_of_birth:
+        return None
+    try:
+        born = datetime.strptime(str(date_of_birth)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    today = date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+# Global diagnosis engine
+diagnosis_engine = DiagnosisEngine()
@@ -0,0 +1,198 @@
+"""
+Background queue for pushing completed intake sections to Charm
+Jobs are stored in Supabase and processed by an asyncio worker pool off the request path
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.repositories.ehr_push_job_repository import ehr_push_job_repository
+from app.repositories.intake_repository import intake_repository
+from app.services.ehr_service import ehr_service
+
+logger = logging.getLogger(__name__)
+
+# Intake section -> section type expected by EHRService.push_intake_section
+SECTION_TYPE_MAP = {
+    "intake_demographics": "demographics",
+    "intake_medical_history": "medical_history",
+    "intake_weight_history": "weight_history",
+    "intake_insurance": "insurance"
+}
+
+# Section name used for the end-of-intake diagnosis push
+DIAGNOSIS_SECTION = "completed"
+
+
+class EHRPushQueue:
+    """
+    Durable queue of Charm push jobs with an asyncio worker pool
+
+    enqueue() records a job and returns immediately. Workers claim due jobs,
+    push the section with EHRService, retry failures with exponential backoff
+    and write the outcome back to `<section>_tracking.pushed_to_charm`.
+    """
+
+    def __init__(self, job_repository=None, session_repository=None, service=None):
+        self.settings = get_settings()
+        self.jobs = job_repository or ehr_push_job_repository
+        self.sessions = session_repository or intake_repository
+        self.ehr_service = service or ehr_service
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    async def enqueue(self, record_id: str, session_id: str, section: str) -> bool:
+        """
+        Queue a push for a session section
+        Returns False if the section cannot be pushed or a push is already queued
+        """
+        if section != DIAGNOSIS_SECTION and section not in SECTION_TYPE_MAP:
+            logger.error("Unknown section name for Charm push: %s", section)
+            return False
+
+        try:
+            if await self.jobs.get_active_job(record_id, section):
+                logger.debug("Push for %s already queued for session %s", section, session_id)
+                return False
+
+            job = await self.jobs.create_job(record_id, session_id, section, self.settings.ehr_push_max_attempts)
+            logger.info("📥 Queued Charm push job %s for %s (session %s)", job['id'], section, session_id)
+            self._wakeup.set()
+            return True
+
+        except Exception as e:
+            # A concurrent request may have queued the same section first (unique active-job index)
+            logger.error("Error queueing Charm push for %s in session %s: %s", section, session_id, e)
+            return False
+
+    def _backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given attempt number"""
+        delay = self.settings.ehr_push_backoff_base * (2 ** (attempts - 1))
+        delay = min(delay, self.settings.ehr_push_backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _push(self, job: Dict[str, Any]) -> bool:
+        """Run the Charm push for a job against the latest stored intake data"""
+        section = job["section"]
+        session_record = await self.sessions.get_session_by_id(job["record_id"])
+        if not session_record:
+            raise ValueError(f"Session record {job['record_id']} not found")
+
+        patient_id = session_record.get("charm_patient_id")
+        if not patient_id:
+            raise ValueError(f"No patient ID found for session {job['session_id']}")
+
+        intake_data = session_record.get("intake") or {}
+        if section == DIAGNOSIS_SECTION:
+            return await self.ehr_service.push_diagnosis_to_charm(patient_id, intake_data)
+
+        section_type = SECTION_TYPE_MAP[section]
+        return await self.ehr_service.push_intake_section(section_type, patient_id, intake_data.get(section, {}))
+
+    async def _write_tracking_status(self, job: Dict[str, Any], pushed: bool, error: Optional[str] = None) -> None:
+        """Write the push outcome back to <section>_tracking in the session intake"""
+        tracking_key = f"{job['section']}_tracking"
+
+        # Compare-and-swap so a chat turn updating the same tracking data is not overwritten
+        def build_patch(intake_data: Dict[str, Any]) -> Dict[str, Any]:
+            tracking_data = dict(intake_data.get(tracking_key) or {})
+            tracking_data["pushed_to_charm"] = pushed
+            if error:
+                tracking_data["push_error"] = error
+            else:
+                tracking_data.pop("push_error", None)
+            return {tracking_key: tracking_data}
+
+        await self.sessions.update_intake_with_retry(job["record_id"], build_patch)
+
+    async def process_job(self, job: Dict[str, Any]) -> bool:
+        """Process one claimed job, scheduling a retry or failing it on error"""
+        attempts = job.get("attempts", 0) + 1
+        max_attempts = job.get("max_attempts") or self.settings.ehr_push_max_attempts
+
+        try:
+            success = await self._push(job)
+            error = None if success else "Charm push returned failure"
+        except Exception as e:
+            success = False
+            error = str(e)
+
+        try:
+            if success:
+                await self.jobs.mark_succeeded(job["id"], attempts)
+                await self._write_tracking_status(job, True)
+                logger.info("✅ Pushed %s to Charm for session %s", job['section'], job['session_id'])
+                return True
+
+            if attempts >= max_attempts:
+                await self.jobs.mark_failed(job["id"], attempts, error)
+                await self._write_tracking_status(job, False, error)
+                logger.error("❌ Giving up on %s push for session %s after %s attempts: %s", job['section'], job['session_id'], attempts, error)
+                return False
+
+            delay = self._backoff_delay(attempts)
+            await self.jobs.schedule_retry(job["id"], attempts, datetime.utcnow() + timedelta(seconds=delay), error)
+            logger.warning("🔁 Push of %s for session %s failed (attempt %s/%s), retrying in %.0fs: %s", job['section'], job['session_id'], attempts, max_attempts, delay, error)
+            return False
+
+        except Exception as e:
+            logger.error("Error recording result of push job %s: %s", job['id'], e)
+            return False
+
+    async def _worker(self, worker_id: int) -> None:
+        """Claim and process due jobs until stopped"""
+        while self._running:
+            try:
+                jobs = await self.jobs.claim_due_jobs(limit=1)
+            except Exception as e:
+                logger.error("Push worker %s could not claim jobs: %s", worker_id, e)
+                jobs = []
+
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.ehr_push_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for job in jobs:
+                await self.process_job(job)
+
+    async def start(self) -> None:
+        """Start the worker pool (called from the application lifespan)"""
+        if self._running:
+            return
+
+        self._running = True
+        try:
+            released = await self.jobs.release_stale_jobs(self.settings.ehr_push_stale_after)
+            if released:
+                logger.info("Released %s stale Charm push jobs back to the queue", released)
+        except Exception as e:
+            logger.warning("Could not release stale Charm push jobs: %s", e)
+
+        self._workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.settings.ehr_push_workers)
+        ]
+        logger.info("EHR push queue started with %s workers", len(self._workers))
+
+    async def stop(self) -> None:
+        """Stop the worker pool; unfinished jobs are picked up again on next start"""
+        self._running = False
+        self._wakeup.set()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("EHR push queue stopped")
+
+
+# Global queue instance
+ehr_push_queue = EHRPushQueue()
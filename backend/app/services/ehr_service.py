@@ -3,181 +3,165 @@ EHR API service for patient validation and data operations
 Uses the Charm Tracker API with token management
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
-import httpx
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic import BaseModel, Field
 from app.core.token_manager import get_charm_api_headers
 from app.core.config import get_settings
+from app.core.http_client import CharmHTTPClient, get_charm_http_client
+from app.core.log_pipeline import PHI, Payload
+from app.services.diagnosis_engine import DiagnosisEngine, DiagnosisRecommendation, diagnosis_engine as shared_diagnosis_engine
+from app.services.patient_cache import PatientRecordCache
+from app.services.provider_search_cache import ProviderSearchCache, provider_search_cache
+from app.services.provider_directory import ProviderDirectory, provider_directory as shared_provider_directory
+from app.services.payer_directory import PayerDirectory, payer_directory as shared_payer_directory
+from app.services.allergy_classifier import allergy_classifier, normalize_allergen
+from app.services import chart_sync
+from app.services.chart_sync import ChartChange, ChartDiff
 
 logger = logging.getLogger(__name__)
 
 
-class DiagnosisRecommendation(BaseModel):
-    """Model for recommended diagnoses based on patient intake data"""
-    name: str = Field(description="The full name of the diagnosis")
-    code: str = Field(description="The ICD-10 code for the diagnosis")
-    code_type: str = Field(default="ICD10", description="The type of code, typically ICD10")
-    status: str = Field(default="Active", description="Status of the diagnosis")
-    comments: Optional[str] = Field(default=None, description="Additional comments about the diagnosis")
-    reasoning: str = Field(description="Explanation for why this diagnosis was recommended")
-
-
-class DiagnosisAnalysis(BaseModel):
-    """Model for complete diagnosis analysis results"""
-    bmi: Optional[float] = Field(description="Calculated BMI from height and weight")
-    bmi_category: Optional[str] = Field(description="BMI category (Normal, Overweight, Obese, etc.)")
-    recommended_diagnoses: List[DiagnosisRecommendation] = Field(description="List of recommended diagnoses")
-    analysis_notes: str = Field(description="Overall analysis notes")
-
-
-def _load_diagnosis_list() -> str:
-    """Load the diagnosis list from the markdown file"""
-    try:
-        import os
-        diagnosis_file_path = os.path.join(os.path.dirname(__file__), "../../../.vscode/Diagnosis List for AI Scribe.md")
-        with open(diagnosis_file_path, 'r') as f:
-            return f.read()
-    except Exception as e:
-        logger.error(f"Error loading diagnosis list: {e}")
-        return "Error loading diagnosis list - using default set"
-
-
-def _create_diagnosis_agent() -> Agent:
-    """Create the diagnosis agent with dynamic diagnosis list"""
-    diagnosis_list = _load_diagnosis_list()
-    
-    # For now, let's just return a string model name to avoid the isinstance error
-    # TODO: Fix package version compatibility issue
-    
-    system_prompt = f"""You are a medical diagnosis assistant that analyzes patient intake data to recommend appropriate ICD-10 diagnoses.
-
-Available diagnoses from the clinic's approved list:
-{diagnosis_list}
-
-BMI Calculation: BMI = weight(lbs) / (height(inches)^2) * 703
-
-Instructions:
-1. Calculate BMI from height and weight if available
-2. Determine appropriate BMI-related diagnoses based on the calculated BMI
-3. Review medical history for conditions that match available diagnoses from the list above
-4. Consider weight-related comorbidities mentioned in the intake
-5. Include bariatric surgery history if mentioned
-6. Only recommend diagnoses that are explicitly listed in the available diagnoses above
-7. Use the exact diagnosis names and ICD-10 codes from the list
-8. Provide clear reasoning for each recommendation based on the intake data"""
-
-    return Agent(
-        'gpt-4o-mini',
-        result_type=DiagnosisAnalysis,
-        system_prompt=system_prompt,
-    )
-
-
 class EHRService:
     """Service for interacting with Charm Tracker EHR API"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[CharmHTTPClient] = None,
+        diagnosis_engine: Optional[DiagnosisEngine] = None,
+        provider_cache: Optional[ProviderSearchCache] = None,
+        provider_directory: Optional[ProviderDirectory] = None,
+        payer_directory: Optional[PayerDirectory] = None
+    ):
         self.settings = get_settings()
         self.base_url = self.settings.charm_api_base_url
         self.facility_id = self.settings.charm_facility_id
+        # Shared pooled client - connections are reused across every Charm call
+        self.http_client = http_client or get_charm_http_client()
+        # Caps concurrent Charm writes across all fan-out pushes (Charm rate limits)
+        self._request_semaphore = asyncio.Semaphore(self.settings.charm_max_concurrent_requests)
+        # Patient lookups/details reused across chat turns; dropped when we write the chart
+        self.patient_cache = PatientRecordCache(
+            ttl_seconds=self.settings.patient_cache_ttl,
+            max_entries=self.settings.patient_cache_max_entries
+        )
+        # Provider-directory searches shared with the agent's search_providers tool
+        self.provider_cache = provider_cache or provider_search_cache
+        # Local mirror of the referral directory, searched before Charm
+        self.provider_directory = provider_directory or shared_provider_directory
+        # Payer list preloaded at startup and refreshed in the background
+        self.payer_directory = payer_directory or shared_payer_directory
+        # Built once per process - rules first, LLM only for free-text conditions
+        self.diagnosis_engine = diagnosis_engine or shared_diagnosis_engine
     
     async def validate_patient_by_mrn(self, record_id: str) -> Optional[Dict[str, Any]]:
         """
         Validate patient exists using the /patients endpoint
         Returns patient data if found, None if not found
+        Found patients are served from the patient cache until the TTL expires
         """
+        cached_patient = self.patient_cache.get_by_mrn(record_id)
+        if cached_patient is not None:
+            return cached_patient
+        
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/patients",
-                    params={
-                        "record_id": record_id,
-                        "facility_id": "ALL"
-                    },
-                    headers=headers,
-                    timeout=30.0
-                )
-                print(response)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "0" and data.get("patients") and len(data["patients"]) > 0:
-                        logger.info(f"Patient found for MRN {record_id}")
-                        return data["patients"][0]  # Return first matching patient
-                    else:
-                        logger.warning(f"No patient found for MRN {record_id}")
-                        return None
-                elif response.status_code == 404:
-                    logger.warning(f"Patient not found for MRN {record_id}")
-                    return None
-                elif response.status_code == 400:
-                    logger.warning(f"Invalid MRN format or patient not found: {record_id}")
-                    return None
+            client = self.http_client.client
+            response = await client.get(
+                f"{self.base_url}/patients",
+                params={
+                    "record_id": record_id,
+                    "facility_id": "ALL"
+                },
+                headers=headers,
+                timeout=self.http_client.timeout("lookup")
+            )
+            logger.debug("Charm patient lookup for MRN %s returned %s", PHI(record_id), Payload(response))
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("code") == "0" and data.get("patients") and len(data["patients"]) > 0:
+                    logger.info("Patient found for MRN %s", PHI(record_id))
+                    patient = data["patients"][0]  # Return first matching patient
+                    self.patient_cache.put_by_mrn(record_id, patient)
+                    return patient
                 else:
-                    logger.error(f"API error validating patient {record_id}: {response.status_code} - {response.text}")
-                    response.raise_for_status()
-                    
+                    logger.warning("No patient found for MRN %s", PHI(record_id))
+                    return None
+            elif response.status_code == 404:
+                logger.warning("Patient not found for MRN %s", PHI(record_id))
+                return None
+            elif response.status_code == 400:
+                logger.warning("Invalid MRN format or patient not found: %s", PHI(record_id))
+                return None
+            else:
+                logger.error("API error validating patient %s: %s - %s", PHI(record_id), response.status_code, response.text)
+                response.raise_for_status()
+                
         except Exception as e:
-            logger.error(f"Error validating patient {record_id}: {e}")
+            logger.error("Error validating patient %s: %s", PHI(record_id), e)
             raise
     
     async def get_payers_list(self) -> List[Dict[str, Any]]:
         """
         Get list of payers from the EHR API
-        Used for insurance validation and lookup
+        Used for insurance validation and lookup; served from the preloaded payer list
         """
         try:
-            headers = await get_charm_api_headers()
+            await self.payer_directory.ensure_loaded()
+            return self.payer_directory.payers
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/payers",
-                    params={"facility_id": "ALL"},
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                logger.info(f"Retrieved {len(data)} payers from EHR")
-                return data
-                
         except Exception as e:
-            logger.error(f"Error retrieving payers list: {e}")
+            logger.error("Error retrieving payers list: %s", e)
             raise
     
+    def search_payers(self, insurer_name: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Ranked payers from the preloaded list for an insurer name or payer ID"""
+        return self.payer_directory.search(insurer_name, limit=limit)
+    
     async def search_providers(self, search_term: str) -> List[Dict[str, Any]]:
         """
         Search for providers in the EHR directory
-        Used for care team provider lookup
+        Used for care team provider lookup; served from the local directory index when it has
+        a match, otherwise from the provider cache or Charm
         """
+        if self.provider_directory.is_ready:
+            providers = self.provider_directory.search(search_term)
+            if providers:
+                return providers
+        
+        params = {"search": search_term}
+        cached_providers = self.provider_cache.get(params)
+        if cached_providers is not None:
+            return cached_providers
+        
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/settings/directory/providers",
-                    params={"search": search_term},
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                logger.info(f"Found {len(data)} providers for search term: {search_term}")
-                return data
-                
+            client = self.http_client.client
+            response = await client.get(
+                f"{self.base_url}/settings/directory/providers",
+                params=params,
+                headers=headers,
+                timeout=self.http_client.timeout("search")
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            if data.get("code") != "0":
+                logger.warning("Provider search returned non-zero code: %s", data.get("code"))
+                return []
+            
+            providers = data.get("providers", [])
+            logger.info("Found %s providers for search term: %s", len(providers), PHI(search_term))
+            self.provider_cache.put(params, providers)
+            return providers
+            
         except Exception as e:
-            logger.error(f"Error searching providers for '{search_term}': {e}")
+            logger.error("Error searching providers for '%s': %s", PHI(search_term), e)
             raise
     
     async def add_provider(self, provider_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -188,22 +172,25 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/settings/directory/providers",
-                    json=provider_data,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                logger.info(f"Added new provider: {provider_data.get('name', 'Unknown')}")
-                return data
-                
+            client = self.http_client.client
+            response = await client.post(
+                f"{self.base_url}/settings/directory/providers",
+                json=provider_data,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            self.provider_cache.invalidate()
+            if isinstance(data, dict) and data.get("provider_details"):
+                await self.provider_directory.add({**provider_data, **data["provider_details"]})
+            
+            logger.info("Added new provider: %s", provider_data.get('name', 'Unknown'))
+            return data
+            
         except Exception as e:
-            logger.error(f"Error adding provider: {e}")
+            logger.error("Error adding provider: %s", e)
             raise
     
     async def update_patient_demographics(self, patient_id: str, demographics_data: Dict[str, Any]) -> bool:
@@ -213,20 +200,21 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
-                    f"{self.base_url}/patients/{patient_id}",
-                    json=demographics_data,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                logger.info(f"Updated demographics for patient {patient_id}")
-                return True
-                
+            client = self.http_client.client
+            response = await client.put(
+                f"{self.base_url}/patients/{patient_id}",
+                json=demographics_data,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            response.raise_for_status()
+            logger.info("Updated demographics for patient %s", patient_id)
+            self.patient_cache.invalidate(patient_id)
+            return True
+            
         except Exception as e:
-            logger.error(f"Error updating patient demographics for {patient_id}: {e}")
+            logger.error("Error updating patient demographics for %s: %s", patient_id, e)
             raise
     
     async def update_patient_insurance(self, patient_id: str, insurance_data: Dict[str, Any]) -> bool:
@@ -236,20 +224,20 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/patients/{patient_id}/insurance",
-                    json=insurance_data,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                logger.info(f"Updated insurance for patient {patient_id}")
-                return True
-                
+            client = self.http_client.client
+            response = await client.post(
+                f"{self.base_url}/patients/{patient_id}/insurance",
+                json=insurance_data,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            response.raise_for_status()
+            logger.info("Updated insurance for patient %s", patient_id)
+            return True
+            
         except Exception as e:
-            logger.error(f"Error updating patient insurance for {patient_id}: {e}")
+            logger.error("Error updating patient insurance for %s: %s", patient_id, e)
             raise
     
     async def add_patient_vitals(self, patient_id: str, vitals_data: Dict[str, Any]) -> bool:
@@ -259,20 +247,20 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/patients/{patient_id}/vitals",
-                    json=vitals_data,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                logger.info(f"Added vitals for patient {patient_id}")
-                return True
-                
+            client = self.http_client.client
+            response = await client.post(
+                f"{self.base_url}/patients/{patient_id}/vitals",
+                json=vitals_data,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            response.raise_for_status()
+            logger.info("Added vitals for patient %s", patient_id)
+            return True
+            
         except Exception as e:
-            logger.error(f"Error adding patient vitals for {patient_id}: {e}")
+            logger.error("Error adding patient vitals for %s: %s", patient_id, e)
             raise
     
     async def add_patient_medications(self, patient_id: str, medications_data: List[Dict[str, Any]]) -> bool:
@@ -282,21 +270,21 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                for medication in medications_data:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/medications",
-                        json=medication,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    response.raise_for_status()
-                
-                logger.info(f"Added {len(medications_data)} medications for patient {patient_id}")
-                return True
-                
+            client = self.http_client.client
+            for medication in medications_data:
+                response = await client.post(
+                    f"{self.base_url}/patients/{patient_id}/medications",
+                    json=medication,
+                    headers=headers,
+                    timeout=self.http_client.timeout("write")
+                )
+                response.raise_for_status()
+            
+            logger.info("Added %s medications for patient %s", len(medications_data), patient_id)
+            return True
+            
         except Exception as e:
-            logger.error(f"Error adding patient medications for {patient_id}: {e}")
+            logger.error("Error adding patient medications for %s: %s", patient_id, e)
             raise
     
     async def add_patient_allergies(self, patient_id: str, allergies_data: List[Dict[str, Any]]) -> bool:
@@ -306,22 +294,51 @@ class EHRService:
         try:
             headers = await get_charm_api_headers()
             
-            async with httpx.AsyncClient() as client:
-                for allergy in allergies_data:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/allergies",
-                        json=allergy,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    response.raise_for_status()
-                
-                logger.info(f"Added {len(allergies_data)} allergies for patient {patient_id}")
+            client = self.http_client.client
+            for allergy in allergies_data:
+                response = await client.post(
+                    f"{self.base_url}/patients/{patient_id}/allergies",
+                    json=allergy,
+                    headers=headers,
+                    timeout=self.http_client.timeout("write")
+                )
+                response.raise_for_status()
+            
+            logger.info("Added %s allergies for patient %s", len(allergies_data), patient_id)
+            return True
+            
+        except Exception as e:
+            logger.error("Error adding patient allergies for %s: %s", patient_id, e)
+            raise
+    
+    async def _post_item(self, url: str, payload: Dict[str, Any], headers: Dict[str, str], description: str) -> bool:
+        """POST a single item to Charm under the shared concurrency limit"""
+        return await self._send_item("POST", url, payload, headers, description)
+    
+    async def _send_item(self, method: str, url: str, payload: Any, headers: Dict[str, str], description: str) -> bool:
+        """Write one item (or one array of items) to Charm under the shared concurrency limit"""
+        verb = "update" if method == "PUT" else "add"
+        try:
+            async with self._request_semaphore:
+                response = await self.http_client.client.request(
+                    method,
+                    url,
+                    json=payload,
+                    headers=headers,
+                    timeout=self.http_client.timeout("write")
+                )
+            
+            if response.status_code in [200, 201]:
+                logger.info("%s %s", "Updated" if verb == "update" else "Added", description)
                 return True
+            else:
+                logger.error("Failed to %s %s: %s - %s", verb, description, response.status_code, response.text)
+                logger.error("Request payload was: %s", Payload(payload))
+                return False
                 
         except Exception as e:
-            logger.error(f"Error adding patient allergies for {patient_id}: {e}")
-            raise
+            logger.error("Error trying to %s %s: %s", verb, description, e)
+            return False
     
     async def push_intake_section(self, section_type: str, patient_id: str, section_data: Dict[str, Any]) -> bool:
         """
@@ -344,14 +361,14 @@ class EHRService:
                 return await self._push_weight_history_to_charm(patient_id, section_data)
             elif section_type == "insurance":
                 # TODO: Implement insurance push
-                logger.warning(f"Insurance push not yet implemented")
+                logger.warning("Insurance push not yet implemented")
                 return False
             else:
-                logger.error(f"Unknown section type: {section_type}")
+                logger.error("Unknown section type: %s", section_type)
                 return False
                 
         except Exception as e:
-            logger.error(f"Error pushing {section_type} section: {e}")
+            logger.error("Error pushing %s section: %s", section_type, e)
             return False
     
     async def _push_demographics_to_charm(self, patient_id: str, demographics_data: Dict[str, Any]) -> bool:
@@ -454,23 +471,24 @@ class EHRService:
                 charm_data["employment_status"] = demographics_data["employmentStatus"]
             
             # Make the API call to update patient
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
-                    f"{self.base_url}/patients/{patient_id}",
-                    json=charm_data,
-                    headers=headers,
-                    timeout=30.0
-                )
+            client = self.http_client.client
+            response = await client.put(
+                f"{self.base_url}/patients/{patient_id}",
+                json=charm_data,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            if response.status_code == 200:
+                logger.info("Successfully pushed demographics for patient %s", patient_id)
+                self.patient_cache.invalidate(patient_id)
+                return True
+            else:
+                logger.error("Failed to push demographics: %s - %s", response.status_code, response.text)
+                return False
                 
-                if response.status_code == 200:
-                    logger.info(f"Successfully pushed demographics for patient {patient_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to push demographics: {response.status_code} - {response.text}")
-                    return False
-                    
         except Exception as e:
-            logger.error(f"Error pushing demographics for patient {patient_id}: {e}")
+            logger.error("Error pushing demographics for patient %s: %s", patient_id, e)
             return False
     
     async def _push_weight_history_to_charm(self, patient_id: str, weight_history_data: Dict[str, Any]) -> bool:
@@ -490,9 +508,9 @@ class EHRService:
                 vitals_success = await self._push_vitals_to_charm(patient_id, current_vitals, headers)
                 if vitals_success:
                     success_count += 1
-                    logger.info(f"Successfully pushed vitals for patient {patient_id}")
+                    logger.info("Successfully pushed vitals for patient %s", patient_id)
                 else:
-                    logger.error(f"Failed to push vitals for patient {patient_id}")
+                    logger.error("Failed to push vitals for patient %s", patient_id)
             
             # 2. Push bariatric surgery info to Patient custom fields
             bariatric_history = weight_history_data.get("bariatricSurgeryHistory", {})
@@ -501,15 +519,15 @@ class EHRService:
                 surgery_success = await self._push_bariatric_surgery_to_patient(patient_id, bariatric_history, headers)
                 if surgery_success:
                     success_count += 1
-                    logger.info(f"Successfully pushed bariatric surgery info for patient {patient_id}")
+                    logger.info("Successfully pushed bariatric surgery info for patient %s", patient_id)
                 else:
-                    logger.error(f"Failed to push bariatric surgery info for patient {patient_id}")
+                    logger.error("Failed to push bariatric surgery info for patient %s", patient_id)
             
             # Return success if all operations succeeded
             return success_count == total_operations and total_operations > 0
             
         except Exception as e:
-            logger.error(f"Error pushing weight history for patient {patient_id}: {e}")
+            logger.error("Error pushing weight history for patient %s: %s", patient_id, e)
             return False
     
     async def _push_vitals_to_charm(self, patient_id: str, vitals_data: Dict[str, Any], headers: Dict[str, str]) -> bool:
@@ -570,50 +588,55 @@ class EHRService:
                 # Wrap in array as required by API
                 vitals_payload = [vitals_entry]
                 
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/vitals",
-                        json=vitals_payload,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        logger.info(f"Pushed vitals: Weight {weight} lbs, Height {feet}'{inches}\"")
-                        return True
-                    else:
-                        logger.error(f"Vitals API error: {response.status_code} - {response.text}")
-                        return False
+                client = self.http_client.client
+                response = await client.post(
+                    f"{self.base_url}/patients/{patient_id}/vitals",
+                    json=vitals_payload,
+                    headers=headers,
+                    timeout=self.http_client.timeout("write")
+                )
+                
+                if response.status_code in [200, 201]:
+                    logger.info("Pushed vitals: Weight %s lbs, Height %s'%s\"", weight, feet, inches)
+                    return True
+                else:
+                    logger.error("Vitals API error: %s - %s", response.status_code, response.text)
+                    return False
             
             return True  # No vitals to push is considered success
             
         except Exception as e:
-            logger.error(f"Error pushing vitals: {e}")
+            logger.error("Error pushing vitals: %s", e)
             return False
     
     async def _get_patient_details(self, patient_id: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-        """Get current patient details from Charm API"""
+        """Get current patient details from Charm API (cached)"""
+        cached_details = self.patient_cache.get_details(patient_id)
+        if cached_details is not None:
+            return cached_details
+        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/patients/{patient_id}",
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "0" and data.get("patient"):
-                        return data["patient"]
-                    else:
-                        logger.error(f"Failed to get patient details: {data}")
-                        return None
+            client = self.http_client.client
+            response = await client.get(
+                f"{self.base_url}/patients/{patient_id}",
+                headers=headers,
+                timeout=self.http_client.timeout("lookup")
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("code") == "0" and data.get("patient"):
+                    self.patient_cache.put_details(patient_id, data["patient"])
+                    return data["patient"]
                 else:
-                    logger.error(f"Failed to get patient details: {response.status_code} - {response.text}")
+                    logger.error("Failed to get patient details: %s", data)
                     return None
-                    
+            else:
+                logger.error("Failed to get patient details: %s - %s", response.status_code, response.text)
+                return None
+                
         except Exception as e:
-            logger.error(f"Error getting patient details: {e}")
+            logger.error("Error getting patient details: %s", e)
             return None
     
     async def _push_bariatric_surgery_to_patient(self, patient_id: str, bariatric_data: Dict[str, Any], headers: Dict[str, str]) -> bool:
@@ -629,7 +652,7 @@ class EHRService:
             # Get current patient details to include required fields
             patient_details = await self._get_patient_details(patient_id, headers)
             if not patient_details:
-                logger.error(f"Could not get patient details for {patient_id}, cannot update bariatric surgery info")
+                logger.error("Could not get patient details for %s, cannot update bariatric surgery info", patient_id)
                 return False
             
             # Prepare patient update payload with required fields
@@ -654,24 +677,27 @@ class EHRService:
                 patient_update["custom_field_2"] = str(surgery_year)
             
             # Make API call to update patient
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
-                    f"{self.base_url}/patients/{patient_id}",
-                    json=patient_update,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    surgery_name = ", ".join(surgery_types) if surgery_types else "N/A"
-                    logger.info(f"Added bariatric surgery info: {surgery_name} in {surgery_year if surgery_year else 'unknown year'}")
-                    return True
-                else:
-                    logger.error(f"Patient update API error: {response.status_code} - {response.text}")
-                    return False
+            client = self.http_client.client
+            response = await client.put(
+                f"{self.base_url}/patients/{patient_id}",
+                json=patient_update,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            if response.status_code == 200:
+                self.patient_cache.update_details(patient_id, {
+                    key: value for key, value in patient_update.items() if key.startswith("custom_field_")
+                })
+                surgery_name = ", ".join(surgery_types) if surgery_types else "N/A"
+                logger.info("Added bariatric surgery info: %s in %s", PHI(surgery_name), surgery_year if surgery_year else 'unknown year')
+                return True
+            else:
+                logger.error("Patient update API error: %s - %s", response.status_code, response.text)
+                return False
             
         except Exception as e:
-            logger.error(f"Error pushing bariatric surgery info: {e}")
+            logger.error("Error pushing bariatric surgery info: %s", e)
             return False
     
     async def _push_medical_history_to_charm(self, patient_id: str, medical_history_data: Dict[str, Any]) -> bool:
@@ -681,173 +707,406 @@ class EHRService:
         """
         try:
             headers = await get_charm_api_headers()
-            success_count = 0
-            total_operations = 0
+            
+            if self.settings.ehr_push_sync_mode:
+                diff = await self.sync_medical_history(patient_id, medical_history_data, headers=headers)
+                logger.info(
+                    "Synced medical history for patient %s: %s (fetch errors: %s, conflicts: %s)",
+                    patient_id, diff.summary(), diff.fetch_errors, diff.conflicts
+                )
+                return diff.succeeded and not diff.is_empty
+            
+            operations = []  # (description, coroutine) for each independent sub-push
             
             # 1. Push current medications to Medication API
             current_medications = medical_history_data.get("currentMedications", [])
             if current_medications:
-                total_operations += 1
-                meds_success = await self._push_medications_to_charm(patient_id, current_medications, headers)
-                if meds_success:
-                    success_count += 1
-                    logger.info(f"Successfully pushed {len(current_medications)} medications for patient {patient_id}")
-                else:
-                    logger.error(f"Failed to push medications for patient {patient_id}")
+                operations.append((f"{len(current_medications)} medications", self._push_medications_to_charm(patient_id, current_medications, headers)))
             
             # 2. Push allergies to Allergy API
             allergies = medical_history_data.get("allergies", [])
             if allergies:
-                total_operations += 1
-                allergies_success = await self._push_allergies_to_charm(patient_id, allergies, headers)
-                if allergies_success:
-                    success_count += 1
-                    logger.info(f"Successfully pushed {len(allergies)} allergies for patient {patient_id}")
-                else:
-                    logger.error(f"Failed to push allergies for patient {patient_id}")
+                operations.append((f"{len(allergies)} allergies", self._push_allergies_to_charm(patient_id, allergies, headers)))
             
             # 3. Push past medical history to Medical History API
             pmhx = medical_history_data.get("PMHx", [])
             pmhx_obesity = medical_history_data.get("PMHxObesityComorbid", [])
             if pmhx or pmhx_obesity:
-                total_operations += 1
                 # Combine regular PMHx and obesity-related conditions
                 all_conditions = (pmhx or []) + (pmhx_obesity or [])
-                pmhx_success = await self._push_past_medical_history_to_charm(patient_id, all_conditions, headers)
-                if pmhx_success:
-                    success_count += 1
-                    logger.info(f"Successfully pushed past medical history for patient {patient_id}")
-                else:
-                    logger.error(f"Failed to push past medical history for patient {patient_id}")
+                operations.append(("past medical history", self._push_past_medical_history_to_charm(patient_id, all_conditions, headers)))
             
             # 4. Push social history to Medical History API
             social_history = medical_history_data.get("socialHistory")
             if social_history:
-                total_operations += 1
-                social_success = await self._push_social_history_to_charm(patient_id, social_history, headers)
-                if social_success:
-                    success_count += 1
-                    logger.info(f"Successfully pushed social history for patient {patient_id}")
-                else:
-                    logger.error(f"Failed to push social history for patient {patient_id}")
+                operations.append(("social history", self._push_social_history_to_charm(patient_id, social_history, headers)))
             
             # 5. Push family history to Medical History API
             family_history = medical_history_data.get("familyHistory", [])
             if family_history:
-                total_operations += 1
-                family_success = await self._push_family_history_to_charm(patient_id, family_history, headers)
-                if family_success:
-                    success_count += 1
-                    logger.info(f"Successfully pushed {len(family_history)} family history entries for patient {patient_id}")
-                else:
-                    logger.error(f"Failed to push family history for patient {patient_id}")
+                operations.append((f"{len(family_history)} family history entries", self._push_family_history_to_charm(patient_id, family_history, headers)))
             
             # 6. Push past surgeries to Medical History API
             past_surgeries = medical_history_data.get("pastSurgicalHistory", [])
             if past_surgeries:
-                total_operations += 1
-                surgery_success = await self._push_past_surgeries_to_charm(patient_id, past_surgeries, headers)
-                if surgery_success:
+                operations.append((f"{len(past_surgeries)} past surgeries", self._push_past_surgeries_to_charm(patient_id, past_surgeries, headers)))
+            
+            # The sub-pushes are independent, so run them concurrently.
+            # Individual Charm requests are throttled by the shared semaphore.
+            results = await asyncio.gather(*(operation for _, operation in operations), return_exceptions=True)
+            
+            success_count = 0
+            total_operations = len(operations)
+            for (description, _), result in zip(operations, results):
+                if result is True:
                     success_count += 1
-                    logger.info(f"Successfully pushed {len(past_surgeries)} past surgeries for patient {patient_id}")
+                    logger.info("Successfully pushed %s for patient %s", description, patient_id)
                 else:
-                    logger.error(f"Failed to push past surgeries for patient {patient_id}")
+                    error = f": {result}" if isinstance(result, Exception) else ""
+                    logger.error("Failed to push %s for patient %s%s", description, patient_id, error)
             
             # Return success if all operations succeeded
             return success_count == total_operations and total_operations > 0
             
         except Exception as e:
-            logger.error(f"Error pushing medical history for patient {patient_id}: {e}")
+            logger.error("Error pushing medical history for patient %s: %s", patient_id, e)
             return False
     
+    async def _fetch_chart_data(self, patient_id: str, path: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        """GET one chart list or entry; raises when it cannot be read, so nothing is written blind"""
+        async with self._request_semaphore:
+            response = await self.http_client.client.get(
+                f"{self.base_url}/patients/{patient_id}/{path}",
+                headers=headers,
+                timeout=self.http_client.timeout("lookup")
+            )
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} - {response.text}")
+        data = response.json()
+        if str(data.get("code", "0")) != "0":
+            raise RuntimeError(data.get("message") or f"code {data.get('code')}")
+        return data
+    
+    async def diff_medical_history(self, patient_id: str, medical_history_data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> ChartDiff:
+        """
+        Compare intake medical history with the patient's chart without writing anything
+        
+        The chart lists the intake touches are fetched concurrently and keyed against the
+        intake entries (see chart_sync). A list that cannot be read is reported in
+        fetch_errors and gets no changes, so a later sync never duplicates its entries.
+        """
+        if headers is None:
+            headers = await get_charm_api_headers()
+        diff = ChartDiff(patient_id=patient_id)
+        
+        allergies = medical_history_data.get("allergies", [])
+        no_known_allergies = bool(allergies) and self._is_no_known_allergies(allergies)
+        conditions = (medical_history_data.get("PMHx") or []) + (medical_history_data.get("PMHxObesityComorbid") or [])
+        
+        # Payloads stay paired with the intake item so only the patient's own answers are compared
+        list_payloads = [
+            (chart_sync.MEDICATIONS, self._chart_entries(self._medication_entry, medical_history_data.get("currentMedications"))),
+            (chart_sync.ALLERGIES, [] if no_known_allergies else self._chart_entries(self._allergy_entry, allergies)),
+            (chart_sync.FAMILY_HISTORY, self._chart_entries(self._family_history_payload, medical_history_data.get("familyHistory"))),
+            (chart_sync.SURGERIES, self._chart_entries(self._surgery_payload, medical_history_data.get("pastSurgicalHistory"))),
+        ]
+        text_contents = [
+            (chart_sync.PAST_MEDICAL_HISTORY, self._past_medical_history_content(conditions)),
+            (chart_sync.SOCIAL_HISTORY, self._social_history_content(medical_history_data.get("socialHistory") or {})),
+        ]
+        
+        # Only the chart lists the intake has entries for are read
+        wanted = [(spec, payloads) for spec, payloads in list_payloads if payloads or (spec is chart_sync.ALLERGIES and no_known_allergies)]
+        wanted += [(spec, content) for spec, content in text_contents if content]
+        results = await asyncio.gather(
+            *(self._fetch_chart_data(patient_id, spec.path, headers) for spec, _ in wanted),
+            return_exceptions=True
+        )
+        
+        for (spec, intake), result in zip(wanted, results):
+            if isinstance(result, Exception):
+                logger.error("Could not read %s for patient %s: %s", spec.kind, patient_id, result)
+                diff.fetch_errors[spec.kind] = str(result)
+                continue
+            
+            if isinstance(spec, chart_sync.ChartTextSpec):
+                chart_data = result.get("data") if isinstance(result.get("data"), dict) else result
+                diff.add(spec.kind, *chart_sync.diff_text(spec, intake, chart_data))
+                continue
+            
+            records = result.get(spec.response_key) or []
+            if spec is chart_sync.ALLERGIES and no_known_allergies:
+                if records:
+                    diff.conflicts[spec.kind] = f"no known allergies, but {len(records)} allergies are on the chart"
+                    continue
+                diff.add(spec.kind, [ChartChange(
+                    kind=spec.kind, action="insert", key="no known allergies",
+                    payload={"type": "Medication", "status": "No Known"}, path="no_known_allergy"
+                )], 0)
+                continue
+            
+            diff.add(spec.kind, *chart_sync.diff_list(spec, intake, records))
+        
+        return diff
+    
+    async def sync_medical_history(self, patient_id: str, medical_history_data: Dict[str, Any], dry_run: bool = False, headers: Optional[Dict[str, str]] = None) -> ChartDiff:
+        """
+        Bring the chart in line with the intake medical history, sending only the difference
+        
+        Inserts are POSTed and updates PUT to the chart record, all concurrently under the
+        shared request limit; batchable inserts (medications) go in one array request.
+        Re-running a completed sync writes nothing. With dry_run the diff is only computed.
+        """
+        if headers is None:
+            headers = await get_charm_api_headers()
+        diff = await self.diff_medical_history(patient_id, medical_history_data, headers)
+        if dry_run:
+            return diff
+        diff.dry_run = False
+        
+        base_url = f"{self.base_url}/patients/{patient_id}"
+        requests = []
+        targets: List[List[ChartChange]] = []
+        batches: Dict[str, List[ChartChange]] = {}
+        for change in diff.changes:
+            if change.batch:
+                batches.setdefault(change.path, []).append(change)
+                continue
+            method = "PUT" if change.action == "update" else "POST"
+            requests.append(self._send_item(method, f"{base_url}/{change.endpoint}", change.payload, headers, f"{change.kind} ({change.action})"))
+            targets.append([change])
+        for path, changes in batches.items():
+            requests.append(self._send_item("POST", f"{base_url}/{path}", [change.payload for change in changes], headers, f"{len(changes)} {changes[0].kind}"))
+            targets.append(changes)
+        
+        results = await asyncio.gather(*requests)
+        for changes, ok in zip(targets, results):
+            for change in changes:
+                change.ok = ok
+        return diff
+    
+    @staticmethod
+    def _chart_entries(build: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]], items: Optional[List[Dict[str, Any]]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(Charm payload, intake item) for each intake item the builder accepts"""
+        entries = []
+        for item in items or []:
+            payload = build(item)
+            if payload:
+                entries.append((payload, item))
+        return entries
+    
+    @staticmethod
+    def _medication_entry(med: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Charm medication payload for an intake medication (None without a name)"""
+        med_name = med.get("medicationName", "")
+        if not med_name:
+            return None
+        
+        # Create medication entry according to API spec
+        return {
+            "drug_name": med_name,
+            "strength_description": med.get("strength", "") or "",
+            "directions": med.get("directions", "") or "Take as directed",
+            "is_active": True,
+            "is_custom_drug": True,  # Since we're adding custom medications from intake
+            "dispense": 30.0,  # Default 30-day supply
+            "refills": "0",  # Default no refills
+            "substitute_generic": True,
+            "manufacturing_type": "Manufactured"
+        }
+    
+    @staticmethod
+    def _allergy_entry(allergy: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Charm allergy payload for an intake allergy (None when empty, "no known allergies" or "NKDA")"""
+        allergen = allergy.get("allergen", "")
+        reaction = allergy.get("reaction", "")
+        severity = allergy.get("severity", "")
+        
+        if not allergen or allergy_classifier.is_no_known(allergen) or allergy_classifier.is_no_known_drug(allergen):
+            return None
+        
+        # Map severity - handle empty or None severity
+        if severity:
+            # Ensure proper capitalization
+            severity_map = {
+                "mild": "Mild",
+                "moderate": "Moderate", 
+                "severe": "Severe"
+            }
+            charm_severity = severity_map.get(severity.lower(), "Mild")
+        else:
+            charm_severity = "Moderate"  # Default severity
+        
+        # Create single allergy entry (NOT an array)
+        return {
+            "allergen": allergen.strip(),
+            "type": allergy_classifier.classify(allergen),  # API expects 'type' not 'allergy_type'
+            "severity": charm_severity,
+            "reactions": (reaction or "").strip(),
+            "status": "Active"  # Changed from is_active: True to status: "Active"
+        }
+    
+    @staticmethod
+    def _is_no_known_allergies(allergies: List[Dict[str, Any]]) -> bool:
+        return not allergies or (len(allergies) == 1 and allergy_classifier.is_no_known(allergies[0].get("allergen", "")))
+    
+    @staticmethod
+    def _past_medical_history_content(conditions: List[str]) -> Optional[str]:
+        if not conditions:
+            return None
+        # Format conditions into a readable text
+        return "Past Medical History:\\n" + "\\n".join([f"• {condition}" for condition in conditions])
+    
+    @staticmethod
+    def _social_history_content(social_history: Dict[str, Any]) -> Optional[str]:
+        # Format social history into readable text
+        social_content_parts = []
+        
+        smoking = social_history.get("smokingSummary", "")
+        if smoking:
+            social_content_parts.append(f"Smoking: {smoking}")
+        
+        alcohol = social_history.get("alcoholSummary", "")
+        if alcohol:
+            social_content_parts.append(f"Alcohol: {alcohol}")
+        
+        marijuana = social_history.get("marijuanaSummary", "")
+        if marijuana:
+            social_content_parts.append(f"Marijuana: {marijuana}")
+        
+        drugs = social_history.get("drugSummary", "")
+        if drugs:
+            social_content_parts.append(f"Recreational Drugs: {drugs}")
+        
+        employment = social_history.get("employmentStatus", "")
+        employment_details = social_history.get("employmentDetails", "")
+        if employment or employment_details:
+            emp_text = f"Employment: {employment}"
+            if employment_details:
+                emp_text += f" - {employment_details}"
+            social_content_parts.append(emp_text)
+        
+        financial = social_history.get("financialSituation", "")
+        if financial:
+            social_content_parts.append(f"Financial Situation: {financial}")
+        
+        education = social_history.get("educationBackground", "")
+        if education:
+            social_content_parts.append(f"Education: {education}")
+        
+        if not social_content_parts:
+            return None
+        return "Social History:\\n" + "\\n".join(social_content_parts)
+    
+    @staticmethod
+    def _family_history_payload(family_member: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Charm family history payload (None without a relative and a problem)"""
+        family_member_name = family_member.get("familyMember", "")
+        medical_problem = family_member.get("medicalProblem", "")
+        
+        if not family_member_name or not medical_problem:
+            return None
+        
+        # Map family member relationships to Charm API format
+        relationship_map = {
+            "father": "Natural Father",
+            "mother": "Natural Mother", 
+            "brother": "Natural Brother",
+            "sister": "Natural Sister",
+            "son": "Natural Son",
+            "daughter": "Natural Daughter",
+            "grandfather": "Paternal grandfather",
+            "grandmother": "Paternal grandmother"
+        }
+        
+        return {
+            "relationship": relationship_map.get(family_member_name.lower(), "Natural Father"),  # Default
+            "is_deceased": False,  # Default to alive
+            "comments": medical_problem
+        }
+    
+    @staticmethod
+    def _surgery_payload(surgery: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Charm procedure payload for a past surgery (None without a surgery type)"""
+        surgery_type = surgery.get("surgeryType", "")
+        if not surgery_type:
+            return None
+        
+        year = surgery.get("year")
+        return {
+            "procedure_type": "Surgeries",
+            "procedure": surgery_type,
+            "from_date": f"{year}-01-01" if year else None,  # Format date from year
+            "procedure_notes": ""
+        }
+    
     async def _push_medications_to_charm(self, patient_id: str, medications: List[Dict[str, Any]], headers: Dict[str, str]) -> bool:
         """Push medications to Charm Medication API"""
         try:
-            medication_entries = []
-            
-            for med in medications:
-                med_name = med.get("medicationName", "")
-                strength = med.get("strength", "")
-                directions = med.get("directions", "")
-                
-                if not med_name:
-                    continue
-                
-                # Create medication entry according to API spec
-                med_entry = {
-                    "drug_name": med_name,
-                    "strength_description": strength or "",
-                    "directions": directions or "Take as directed",
-                    "is_active": True,
-                    "is_custom_drug": True,  # Since we're adding custom medications from intake
-                    "dispense": 30.0,  # Default 30-day supply
-                    "refills": "0",  # Default no refills
-                    "substitute_generic": True,
-                    "manufacturing_type": "Manufactured"
-                }
-                medication_entries.append(med_entry)
+            medication_entries = [entry for entry in map(self._medication_entry, medications) if entry]
             
             # Send all medications in a single request (API expects array)
             if medication_entries:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/medications",
-                        json=medication_entries,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        logger.info(f"Added {len(medication_entries)} medications")
-                        return True
-                    else:
-                        logger.error(f"Failed to add medications: {response.status_code} - {response.text}")
-                        return False
+                return await self._send_item(
+                    "POST",
+                    f"{self.base_url}/patients/{patient_id}/medications",
+                    medication_entries,
+                    headers,
+                    f"{len(medication_entries)} medications"
+                )
             
             return True  # No medications to push is considered success
             
         except Exception as e:
-            logger.error(f"Error pushing medications: {e}")
+            logger.error("Error pushing medications: %s", e)
             return False
     
-    async def get_patient_allergies(self, patient_id: str) -> List[Dict[str, Any]]:
+    async def get_patient_allergies(self, patient_id: str, headers: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         """Get existing allergies for a patient"""
         try:
-            headers = await get_charm_api_headers()
+            if headers is None:
+                headers = await get_charm_api_headers()
+            
+            client = self.http_client.client
+            response = await client.get(
+                f"{self.base_url}/patients/{patient_id}/allergies",
+                headers=headers,
+                timeout=self.http_client.timeout("lookup")
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/patients/{patient_id}/allergies",
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "0" and "allergies" in data:
-                        return data["allergies"]
-                    else:
-                        logger.error(f"Unexpected response format: {data}")
-                        return []
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("code") == "0" and "allergies" in data:
+                    return data["allergies"]
                 else:
-                    logger.error(f"Failed to get allergies: {response.status_code} - {response.text}")
+                    logger.error("Unexpected response format: %s", data)
                     return []
-                    
+            else:
+                logger.error("Failed to get allergies: %s - %s", response.status_code, response.text)
+                return []
+                
         except Exception as e:
-            logger.error(f"Error getting patient allergies: {e}")
+            logger.error("Error getting patient allergies: %s", e)
             return []
 
     async def _push_allergies_to_charm(self, patient_id: str, allergies: List[Dict[str, Any]], headers: Dict[str, str]) -> bool:
-        """Push allergies to Charm Allergy API - one at a time"""
+        """
+        Push allergies to Charm Allergy API - one request per new allergy, sent concurrently
+        The chart's existing allergies are fetched once and used both to gate "no known
+        allergies" and to skip allergens already recorded, so a retried push is a no-op
+        """
         try:
+            # Runs alongside the other sub-pushes, so it counts against the same request limit
+            async with self._request_semaphore:
+                existing_allergies = await self.get_patient_allergies(patient_id, headers)
+            
             # Handle "no known allergies" case
-            if not allergies or (len(allergies) == 1 and allergies[0].get("allergen", "").lower() in ["none", "nka", "no known allergies"]):
-                logger.info(f"Patient has no known allergies, checking if we can mark as such")
+            if self._is_no_known_allergies(allergies):
+                logger.info("Patient has no known allergies, checking if we can mark as such")
                 
-                # First check if patient already has allergies
-                existing_allergies = await self.get_patient_allergies(patient_id)
                 if existing_allergies:
-                    logger.warning(f"Cannot mark 'no known allergies' - patient already has {len(existing_allergies)} allergies recorded")
+                    logger.warning("Cannot mark 'no known allergies' - patient already has %s allergies recorded", len(existing_allergies))
                     return False
                 
                 # Payload for no known allergies
@@ -856,301 +1115,141 @@ class EHRService:
                     "status": "No Known"
                 }
                 
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/no_known_allergy",
-                        json=no_known_payload,  # Send the required payload
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        logger.info(f"Successfully marked patient as having no known allergies")
-                        return True
-                    else:
-                        logger.error(f"Failed to mark no known allergies: {response.status_code} - {response.text}")
-                        return False
-            
-            # Process each allergy individually
-            success_count = 0
+                return await self._post_item(
+                    f"{self.base_url}/patients/{patient_id}/no_known_allergy",
+                    no_known_payload,  # Send the required payload
+                    headers,
+                    "no known allergies"
+                )
             
-            async with httpx.AsyncClient() as client:
-                for allergy in allergies:
-                    allergen = allergy.get("allergen", "")
-                    reaction = allergy.get("reaction", "")
-                    severity = allergy.get("severity", "")
-                    
-                    if not allergen:
-                        continue
-                    
-                    # Skip "none" entries
-                    if allergen.lower() in ["none", "nka", "no known allergies"]:
-                        continue
-                    
-                    # Determine allergy type based on common patterns
-                    allergen_lower = allergen.lower()
-                    
-                    # Check for specific types in order of specificity
-                    if any(food in allergen_lower for food in ["peanut", "shellfish", "milk", "egg", "wheat", "soy", "fish", "tree nut", "gluten", "dairy"]):
-                        allergy_type = "Food"
-                    elif any(latex in allergen_lower for latex in ["latex", "rubber", "glove"]):
-                        allergy_type = "Latex"
-                    elif any(animal in allergen_lower for animal in ["cat", "dog", "pet", "dander", "fur", "animal"]):
-                        allergy_type = "Animal"
-                    elif any(plant in allergen_lower for plant in ["grass", "pollen", "tree", "weed", "ragweed", "flower"]):
-                        allergy_type = "Plant"
-                    elif any(env in allergen_lower for env in ["dust", "mold", "smoke", "perfume", "chemical"]):
-                        allergy_type = "Environmental"
-                    elif any(drug in allergen_lower for drug in ["penicillin", "aspirin", "ibuprofen", "sulfa", "antibiotic", "nsaid", "codeine", "morphine", "amoxicillin"]):
-                        allergy_type = "Medication"  # Changed from "Drug" to "Medication"
-                    else:
-                        # Default to Medication for unrecognized allergens (most common)
-                        allergy_type = "Medication"
-                    
-                    # Map severity - handle empty or None severity
-                    if severity:
-                        # Ensure proper capitalization
-                        severity_map = {
-                            "mild": "Mild",
-                            "moderate": "Moderate", 
-                            "severe": "Severe"
-                        }
-                        charm_severity = severity_map.get(severity.lower(), "Mild")
-                    else:
-                        charm_severity = "Moderate"  # Default severity
-                    
-                    # Create single allergy entry (NOT an array)
-                    allergy_entry = {
-                        "allergen": allergen.strip(),
-                        "type": allergy_type,  # API expects 'type' not 'allergy_type'
-                        "severity": charm_severity,
-                        "reactions": (reaction or "").strip(),
-                        "status": "Active"  # Changed from is_active: True to status: "Active"
-                    }
-                    
-                    # Log what we're sending for debugging
-                    logger.info(f"Sending allergy: {allergy_entry}")
-                    
-                    # Send single allergy (not wrapped in array)
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/allergies",
-                        json=allergy_entry,  # Single object, not array
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        success_count += 1
-                        logger.info(f"Successfully added allergy: {allergen}")
-                    else:
-                        logger.error(f"Failed to add allergy {allergen}: {response.status_code} - {response.text}")
-                        logger.error(f"Request payload was: {allergy_entry}")
+            # Allergens already on the chart (or repeated in the intake) are not posted again
+            recorded = {normalize_allergen(allergy.get("allergen")) for allergy in existing_allergies}
+            
+            # Build one entry per allergy, then POST them concurrently
+            allergy_entries = []
+            for allergy_entry in filter(None, map(self._allergy_entry, allergies)):
+                key = normalize_allergen(allergy_entry["allergen"])
+                if key in recorded:
+                    logger.info("Allergy %s already recorded for patient %s", PHI(allergy_entry["allergen"]), patient_id)
+                    continue
+                recorded.add(key)
+                allergy_entries.append(allergy_entry)
+            
+            # Send each allergy as a single object (not wrapped in array)
+            results = await asyncio.gather(*(
+                self._post_item(
+                    f"{self.base_url}/patients/{patient_id}/allergies",
+                    entry,
+                    headers,
+                    "allergy"
+                )
+                for entry in allergy_entries
+            ))
             
             # Return success if all allergies were added successfully
-            total_allergies = len([a for a in allergies if a.get("allergen") and a.get("allergen").lower() not in ["none", "nka", "no known allergies"]])
-            return success_count == total_allergies
+            return all(results)
             
         except Exception as e:
-            logger.error(f"Error pushing allergies: {e}")
+            logger.error("Error pushing allergies: %s", e)
             return False
     
     async def _push_past_medical_history_to_charm(self, patient_id: str, conditions: List[str], headers: Dict[str, str]) -> bool:
         """Push past medical history to Charm Medical History API"""
         try:
-            if not conditions:
+            pmhx_content = self._past_medical_history_content(conditions)
+            if not pmhx_content:
                 return True
             
-            # Format conditions into a readable text
-            pmhx_content = "Past Medical History:\\n" + "\\n".join([f"• {condition}" for condition in conditions])
-            
             pmhx_payload = {
                 "content": pmhx_content,
                 "is_html": False
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/patients/{patient_id}/medicalhistory/pastmedicalhistory",
-                    json=pmhx_payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code in [200, 201]:
-                    logger.info(f"Added past medical history with {len(conditions)} conditions")
-                    return True
-                else:
-                    logger.error(f"Failed to add past medical history: {response.status_code} - {response.text}")
-                    return False
+            return await self._post_item(
+                f"{self.base_url}/patients/{patient_id}/medicalhistory/pastmedicalhistory",
+                pmhx_payload,
+                headers,
+                f"past medical history with {len(conditions)} conditions"
+            )
             
         except Exception as e:
-            logger.error(f"Error pushing past medical history: {e}")
+            logger.error("Error pushing past medical history: %s", e)
             return False
     
     async def _push_social_history_to_charm(self, patient_id: str, social_history: Dict[str, Any], headers: Dict[str, str]) -> bool:
         """Push social history to Charm Medical History API"""
         try:
-            # Format social history into readable text
-            social_content_parts = []
-            
-            smoking = social_history.get("smokingSummary", "")
-            if smoking:
-                social_content_parts.append(f"Smoking: {smoking}")
-            
-            alcohol = social_history.get("alcoholSummary", "")
-            if alcohol:
-                social_content_parts.append(f"Alcohol: {alcohol}")
-            
-            marijuana = social_history.get("marijuanaSummary", "")
-            if marijuana:
-                social_content_parts.append(f"Marijuana: {marijuana}")
-            
-            drugs = social_history.get("drugSummary", "")
-            if drugs:
-                social_content_parts.append(f"Recreational Drugs: {drugs}")
-            
-            employment = social_history.get("employmentStatus", "")
-            employment_details = social_history.get("employmentDetails", "")
-            if employment or employment_details:
-                emp_text = f"Employment: {employment}"
-                if employment_details:
-                    emp_text += f" - {employment_details}"
-                social_content_parts.append(emp_text)
-            
-            financial = social_history.get("financialSituation", "")
-            if financial:
-                social_content_parts.append(f"Financial Situation: {financial}")
-            
-            education = social_history.get("educationBackground", "")
-            if education:
-                social_content_parts.append(f"Education: {education}")
-            
-            if not social_content_parts:
+            social_content = self._social_history_content(social_history)
+            if not social_content:
                 return True  # No social history to push
             
-            social_content = "Social History:\\n" + "\\n".join(social_content_parts)
-            
             social_payload = {
                 "content": social_content,
                 "is_html": False
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/patients/{patient_id}/medicalhistory/socialhistory",
-                    json=social_payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code in [200, 201]:
-                    logger.info("Added social history")
-                    return True
-                else:
-                    logger.error(f"Failed to add social history: {response.status_code} - {response.text}")
-                    return False
+            return await self._post_item(
+                f"{self.base_url}/patients/{patient_id}/medicalhistory/socialhistory",
+                social_payload,
+                headers,
+                "social history"
+            )
             
         except Exception as e:
-            logger.error(f"Error pushing social history: {e}")
+            logger.error("Error pushing social history: %s", e)
             return False
     
     async def _push_family_history_to_charm(self, patient_id: str, family_history: List[Dict[str, Any]], headers: Dict[str, str]) -> bool:
-        """Push family history to Charm Medical History API"""
+        """Push family history to Charm Medical History API - entries are posted concurrently"""
         try:
-            success_count = 0
+            requests = []
             
             for family_member in family_history:
-                family_member_name = family_member.get("familyMember", "")
-                medical_problem = family_member.get("medicalProblem", "")
-                
-                if not family_member_name or not medical_problem:
+                family_payload = self._family_history_payload(family_member)
+                if not family_payload:
                     continue
                 
-                # Map family member relationships to Charm API format
-                relationship_map = {
-                    "father": "Natural Father",
-                    "mother": "Natural Mother", 
-                    "brother": "Natural Brother",
-                    "sister": "Natural Sister",
-                    "son": "Natural Son",
-                    "daughter": "Natural Daughter",
-                    "grandfather": "Paternal grandfather",
-                    "grandmother": "Paternal grandmother"
-                }
-                
-                relationship = relationship_map.get(family_member_name.lower(), "Natural Father")  # Default
-                
-                family_payload = {
-                    "relationship": relationship,
-                    "is_deceased": False,  # Default to alive
-                    "comments": medical_problem
-                }
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/medicalhistory/familyhistory",
-                        json=family_payload,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        success_count += 1
-                        logger.info(f"Added family history: {family_member_name} - {medical_problem}")
-                    else:
-                        logger.error(f"Failed to add family history for {family_member_name}: {response.status_code} - {response.text}")
-            
-            return success_count == len(family_history)
+                requests.append(self._post_item(
+                    f"{self.base_url}/patients/{patient_id}/medicalhistory/familyhistory",
+                    family_payload,
+                    headers,
+                    "family history entry"
+                ))
+            
+            results = await asyncio.gather(*requests)
+            return sum(1 for result in results if result) == len(family_history)
             
         except Exception as e:
-            logger.error(f"Error pushing family history: {e}")
+            logger.error("Error pushing family history: %s", e)
             return False
     
     async def _push_past_surgeries_to_charm(self, patient_id: str, past_surgeries: List[Dict[str, Any]], headers: Dict[str, str]) -> bool:
-        """Push past surgeries to Charm Medical History API procedure endpoint"""
+        """Push past surgeries to Charm Medical History API procedure endpoint - entries are posted concurrently"""
         try:
-            success_count = 0
+            requests = []
             
             for surgery in past_surgeries:
-                surgery_type = surgery.get("surgeryType", "")
-                year = surgery.get("year")
-                
-                if not surgery_type:
+                surgery_payload = self._surgery_payload(surgery)
+                if not surgery_payload:
                     continue
                 
-                # Format date from year
-                surgery_date = f"{year}-01-01" if year else None
-                
-                surgery_payload = {
-                    "procedure_type": "Surgeries",
-                    "procedure": surgery_type,
-                    "from_date": surgery_date,
-                    "procedure_notes": ""
-                }
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/patients/{patient_id}/medicalhistory/procedure",
-                        json=surgery_payload,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [200, 201]:
-                        success_count += 1
-                        logger.info(f"Added past surgery: {surgery_type} ({year})")
-                    else:
-                        logger.error(f"Failed to add surgery {surgery_type}: {response.status_code} - {response.text}")
-            
-            return success_count == len(past_surgeries)
+                requests.append(self._post_item(
+                    f"{self.base_url}/patients/{patient_id}/medicalhistory/procedure",
+                    surgery_payload,
+                    headers,
+                    "past surgery"
+                ))
+            
+            results = await asyncio.gather(*requests)
+            return sum(1 for result in results if result) == len(past_surgeries)
             
         except Exception as e:
-            logger.error(f"Error pushing past surgeries: {e}")
+            logger.error("Error pushing past surgeries: %s", e)
             return False
     
     async def push_diagnosis_to_charm(self, patient_id: str, intake_data: Dict[str, Any]) -> bool:
         """
-        Analyze intake data using Pydantic AI agent and push appropriate diagnoses to Charm
+        Analyze intake data with the diagnosis engine and push appropriate diagnoses to Charm
         
         Args:
             patient_id: Charm patient ID
@@ -1160,157 +1259,29 @@ class EHRService:
             bool: True if analysis and push was successful, False otherwise
         """
         try:
-            logger.info(f"Creating diagnosis agent...")
-            # Create the diagnosis agent with current diagnosis list
-            diagnosis_agent = _create_diagnosis_agent()
-            logger.info(f"Diagnosis agent created successfully")
-            
-            # Prepare intake data for analysis
-            logger.info(f"Preparing intake data for analysis...")
-            analysis_input = self._prepare_intake_for_diagnosis_analysis(intake_data)
-            logger.info(f"Intake data prepared successfully")
-            
-            # Use Pydantic AI agent to analyze intake data and recommend diagnoses
-            logger.info(f"Analyzing intake data for diagnosis recommendations for patient {patient_id}")
-            result = await diagnosis_agent.run(
-                f"Analyze this patient intake data and recommend appropriate diagnoses: {analysis_input}"
-            )
-            logger.info(f"Agent run completed successfully")
-            
-            diagnosis_analysis = result.output
-            logger.info(f"Diagnosis analysis completed. BMI: {diagnosis_analysis.bmi}, Recommended diagnoses: {len(diagnosis_analysis.recommended_diagnoses)}")
+            logger.info("Analyzing intake data for diagnosis recommendations for patient %s", patient_id)
+            diagnosis_analysis = await self.diagnosis_engine.analyze(intake_data)
+            logger.info("Diagnosis analysis completed. BMI: %s, Recommended diagnoses: %s", diagnosis_analysis.bmi, len(diagnosis_analysis.recommended_diagnoses))
             
             # Push recommended diagnoses to Charm API
             if diagnosis_analysis.recommended_diagnoses:
                 success = await self._push_diagnoses_to_charm_api(patient_id, diagnosis_analysis.recommended_diagnoses)
                 if success:
-                    logger.info(f"Successfully pushed {len(diagnosis_analysis.recommended_diagnoses)} diagnoses for patient {patient_id}")
+                    logger.info("Successfully pushed %s diagnoses for patient %s", len(diagnosis_analysis.recommended_diagnoses), patient_id)
                     return True
                 else:
-                    logger.error(f"Failed to push diagnoses to Charm API for patient {patient_id}")
+                    logger.error("Failed to push diagnoses to Charm API for patient %s", patient_id)
                     return False
             else:
-                logger.info(f"No diagnoses recommended for patient {patient_id}")
+                logger.info("No diagnoses recommended for patient %s", patient_id)
                 return True  # No diagnoses to push is considered success
                 
         except Exception as e:
             import traceback
-            logger.error(f"Error in push_diagnosis_to_charm for patient {patient_id}: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error("Error in push_diagnosis_to_charm for patient %s: %s", patient_id, e)
+            logger.error("Traceback: %s", traceback.format_exc())
             return False
     
-    def _prepare_intake_for_diagnosis_analysis(self, intake_data: Dict[str, Any]) -> str:
-        """Prepare intake data in a readable format for the diagnosis agent"""
-        try:
-            analysis_parts = []
-            
-            # Patient demographics
-            demographics = intake_data.get("intake_demographics", {})
-            if demographics:
-                analysis_parts.append("PATIENT DEMOGRAPHICS:")
-                analysis_parts.append(f"  Gender: {demographics.get('gender', 'Not specified')}")
-                analysis_parts.append(f"  Date of Birth: {demographics.get('dateOfBirth', 'Not specified')}")
-                analysis_parts.append("")
-            
-            # Weight and vitals
-            weight_history = intake_data.get("intake_weight_history", {})
-            if weight_history:
-                analysis_parts.append("WEIGHT AND VITALS:")
-                current_vitals = weight_history.get("currentVitals", {})
-                height = current_vitals.get("height", {})
-                weight = current_vitals.get("weight")
-                
-                if height and weight:
-                    feet = height.get("feet", 0)
-                    inches = height.get("inches", 0)
-                    total_inches = (feet * 12) + inches
-                    analysis_parts.append(f"  Height: {feet}' {inches}\" ({total_inches} inches)")
-                    analysis_parts.append(f"  Weight: {weight} lbs")
-                    
-                    # Calculate BMI
-                    if total_inches > 0 and weight > 0:
-                        bmi = (weight / (total_inches ** 2)) * 703
-                        analysis_parts.append(f"  Calculated BMI: {bmi:.1f}")
-                
-                # Weight history
-                weight_hist = weight_history.get("weightHistory", {})
-                if weight_hist:
-                    analysis_parts.append(f"  Max weight ever: {weight_hist.get('maxEverWeighed', 'Not specified')} lbs")
-                    analysis_parts.append(f"  Age at max weight: {weight_hist.get('ageAtMaxWeight', 'Not specified')}")
-                
-                # Bariatric surgery history
-                bariatric = weight_history.get("bariatricSurgeryHistory", {})
-                if bariatric.get("hasBariatricSurgeryHistory"):
-                    analysis_parts.append(f"  Bariatric surgery history: Yes")
-                    if bariatric.get("surgeryType"):
-                        analysis_parts.append(f"    Surgery type: {bariatric['surgeryType']}")
-                    if bariatric.get("surgeryYear"):
-                        analysis_parts.append(f"    Surgery year: {bariatric['surgeryYear']}")
-                
-                analysis_parts.append("")
-            
-            # Medical history
-            medical_history = intake_data.get("intake_medical_history", {})
-            if medical_history:
-                analysis_parts.append("MEDICAL HISTORY:")
-                
-                # Past medical history
-                pmhx = medical_history.get("PMHx", [])
-                pmhx_obesity = medical_history.get("PMHxObesityComorbid", [])
-                all_conditions = (pmhx or []) + (pmhx_obesity or [])
-                if all_conditions:
-                    analysis_parts.append("  Past Medical History:")
-                    for condition in all_conditions:
-                        analysis_parts.append(f"    - {condition}")
-                
-                # Current medications
-                medications = medical_history.get("currentMedications", [])
-                if medications:
-                    analysis_parts.append("  Current Medications:")
-                    for med in medications:
-                        med_name = med.get("medicationName", "Unknown")
-                        strength = med.get("strength", "")
-                        analysis_parts.append(f"    - {med_name} {strength}")
-                
-                # Specific conditions
-                specific = medical_history.get("specificConditions", {})
-                if specific:
-                    if specific.get("pancreatitis", {}).get("hasPancreatitis"):
-                        analysis_parts.append("  - Has history of pancreatitis")
-                    if specific.get("gerdHeartburn", {}).get("hasGerd"):
-                        analysis_parts.append("  - Has GERD/heartburn")
-                
-                # Family history
-                family_history = medical_history.get("familyHistory", [])
-                if family_history:
-                    analysis_parts.append("  Family History:")
-                    for fh in family_history:
-                        member = fh.get("familyMember", "Unknown")
-                        problem = fh.get("medicalProblem", "Unknown")
-                        analysis_parts.append(f"    - {member}: {problem}")
-                
-                analysis_parts.append("")
-            
-            # Weight loss medication history
-            if weight_history:
-                wl_meds = weight_history.get("weightLossMedicationHistory", {})
-                if wl_meds:
-                    analysis_parts.append("WEIGHT LOSS MEDICATION HISTORY:")
-                    glp1 = wl_meds.get("glp1Medications", {})
-                    if glp1.get("hasTriedGlp1"):
-                        analysis_parts.append("  Has tried GLP-1 medications:")
-                        if glp1.get("tirzepatide", {}).get("hasTried"):
-                            analysis_parts.append("    - Tirzepatide (Zepbound)")
-                        if glp1.get("semaglutide", {}).get("hasTried"):
-                            analysis_parts.append("    - Semaglutide")
-                    analysis_parts.append("")
-            
-            return "\n".join(analysis_parts)
-            
-        except Exception as e:
-            logger.error(f"Error preparing intake data for analysis: {e}")
-            return str(intake_data)  # Fallback to raw data
-    
     async def _push_diagnoses_to_charm_api(self, patient_id: str, diagnoses: List[DiagnosisRecommendation]) -> bool:
         """Push list of diagnoses to Charm Diagnosis API"""
         try:
@@ -1336,26 +1307,26 @@ class EHRService:
                 diagnosis_payload.append(diagnosis_entry)
             
             # Make API call to add diagnoses
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/patients/{patient_id}/diagnoses",
-                    json=diagnosis_payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                if response.status_code in [200, 201]:
-                    logger.info(f"Successfully pushed {len(diagnosis_payload)} diagnoses to Charm")
-                    # Log each diagnosis that was added
-                    for diag in diagnoses:
-                        logger.info(f"  Added diagnosis: {diag.name} ({diag.code}) - {diag.reasoning}")
-                    return True
-                else:
-                    logger.error(f"Failed to push diagnoses: {response.status_code} - {response.text}")
-                    return False
+            client = self.http_client.client
+            response = await client.post(
+                f"{self.base_url}/patients/{patient_id}/diagnoses",
+                json=diagnosis_payload,
+                headers=headers,
+                timeout=self.http_client.timeout("write")
+            )
+            
+            if response.status_code in [200, 201]:
+                logger.info("Successfully pushed %s diagnoses to Charm", len(diagnosis_payload))
+                # Log each diagnosis that was added
+                for diag in diagnoses:
+                    logger.info("  Added diagnosis: %s (%s) - %s", PHI(diag.name), diag.code, PHI(diag.reasoning))
+                return True
+            else:
+                logger.error("Failed to push diagnoses: %s - %s", response.status_code, response.text)
+                return False
             
         except Exception as e:
-            logger.error(f"Error pushing diagnoses to Charm API: {e}")
+            logger.error("Error pushing diagnoses to Charm API: %s", e)
             return False
 
 
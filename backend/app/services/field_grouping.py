@@ -0,0 +1,116 @@
+"""
+Indexed question groups from field_grouping.json
+Loaded once and reloaded only when the file changes on disk
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../models/field_grouping.json')
+
+
+@dataclass
+class SectionGroups:
+    """Question groups for one intake section"""
+    group_fields: Dict[int, List[str]] = field(default_factory=dict)  # group_id -> ordered fields
+    field_to_group: Dict[str, int] = field(default_factory=dict)  # field -> lowest group_id containing it
+    questions: Dict[str, str] = field(default_factory=dict)  # field -> question text
+
+
+class FieldGroupingIndex:
+    """
+    In-memory index over field_grouping.json
+
+    The file is parsed once into field -> group and group -> fields maps. Each
+    lookup only stats the file, and re-parses it when its mtime has changed.
+    """
+
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH):
+        self.config_path = config_path
+        self._sections: Dict[str, SectionGroups] = {}
+        self._mtime: Optional[float] = None
+
+    def _build(self, config: Dict) -> Dict[str, SectionGroups]:
+        sections = {}
+        for section_name, section_config in config.items():
+            section = SectionGroups()
+            for group in section_config.get("groups", []):
+                group_id = group["group_id"]
+                fields = [field_info["field"] for field_info in group["fields"]]
+                section.group_fields[group_id] = fields
+                for field_info in group["fields"]:
+                    field_name = field_info["field"]
+                    current = section.field_to_group.get(field_name)
+                    if current is None or group_id < current:
+                        section.field_to_group[field_name] = group_id
+                    if "question" in field_info:
+                        section.questions.setdefault(field_name, field_info["question"])
+            sections[section_name] = section
+        return sections
+
+    def _refresh(self) -> None:
+        """Reload the index if the config file changed since the last load"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except FileNotFoundError:
+            if self._mtime is not None or not self._sections:
+                logger.warning("field_grouping.json not found at %s", self.config_path)
+            self._sections = {}
+            self._mtime = None
+            return
+
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.config_path, 'r') as f:
+                config = json.load(f)
+        except json.JSONDecodeError:
+            # Keep serving the last good index until the file is fixed
+            logger.error("Invalid JSON in field_grouping.json")
+            self._mtime = mtime
+            return
+
+        self._sections = self._build(config)
+        self._mtime = mtime
+        logger.info("Loaded field_grouping.json for sections: %s", list(self._sections))
+
+    def get_section(self, section_name: str) -> Optional[SectionGroups]:
+        """Get the indexed groups for a section"""
+        self._refresh()
+        return self._sections.get(section_name)
+
+    def get_groups(self, section_name: str) -> Dict[int, List[str]]:
+        """Mapping of group numbers to lists of field paths for a section"""
+        section = self.get_section(section_name)
+        if not section:
+            return {}
+        return {group_id: list(fields) for group_id, fields in section.group_fields.items()}
+
+    def next_group_fields(self, unasked_fields: Iterable[str], section_name: str) -> List[str]:
+        """
+        Fields of the lowest numbered group that still has unasked fields
+        Falls back to the first unasked field when the section has no groups
+        """
+        unasked_fields = list(unasked_fields)
+        section = self.get_section(section_name)
+
+        if not section or not section.group_fields:
+            return [unasked_fields[0]] if unasked_fields else []
+
+        unasked = set(unasked_fields)
+        group_ids = [section.field_to_group[f] for f in unasked if f in section.field_to_group]
+        if not group_ids:
+            return []
+
+        next_group = min(group_ids)
+        return [f for f in section.group_fields[next_group] if f in unasked]
+
+
+# Global index instance
+field_grouping_index = FieldGroupingIndex()
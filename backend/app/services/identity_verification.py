@@ -4,114 +4,254 @@ Handles confirmation of patient last name and date of birth
 """
 
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
 import re
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12
+}
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+
+# (format, pattern, group order) - matched against the lowercased message, most specific first
+_DATE_PATTERNS = [
+    ("YYYY-MM-DD", re.compile(r"\b(\d{4})[/\-.](\d{1,2})[/\-.](\d{1,2})\b"), "ymd"),
+    ("MM/DD/YYYY", re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{4})\b"), "mdy"),
+    ("MM/DD/YY", re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2})\b"), "mdy"),
+    ("Month DD, YYYY", re.compile(rf"\b{_MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b"), "Mdy"),
+    ("DD Month YYYY", re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH},?\s+(\d{{4}})\b"), "dMy"),
+]
+
+_EXPLICIT_LAST_NAME = re.compile(r"\b(?:last\s*name|surname|family\s+name)(?:\s+is|\s*:|\s*-)?\s+([a-z][a-z'\-]*[a-z])")
+_NAME_TOKEN = re.compile(r"[a-z][a-z'\-]*[a-z]")
+_NAME_VALUE = re.compile(r"^[a-z][a-z'\-]*[a-z]$")
+
+# Words that surround a name and date in a verification reply but are never the name itself
+_FILLER_WORDS = frozenset({
+    "my", "last", "lastname", "name", "names", "surname", "family", "is", "and", "the", "a", "an",
+    "dob", "date", "of", "birth", "birthday", "birthdate", "born", "on", "in", "it", "it's", "its",
+    "i", "i'm", "im", "am", "was", "me", "mine", "sure", "yes", "yeah", "yep", "ok", "okay",
+    "hi", "hello", "hey", "there", "here", "thanks", "thank", "you", "please", "sorry", "oh", "um", "so"
+})
+
+# Confidence of each extraction route
+_CONFIDENCE_EXPLICIT_NAME = 0.95
+_CONFIDENCE_SINGLE_NAME = 0.9
+_CONFIDENCE_AMBIGUOUS_NAME = 0.5
+_CONFIDENCE_FULL_YEAR = 0.95
+_CONFIDENCE_SHORT_YEAR = 0.85
+_CONFIDENCE_AMBIGUOUS_DATE = 0.5
+_HISTORY_PENALTY = 0.05
+
+
+@dataclass
+class IdentityMatch:
+    """Last name and date of birth pulled from a verification reply"""
+    last_name: str = ""
+    date_of_birth: str = ""  # YYYY-MM-DD
+    original_date_format: str = ""
+    name_confidence: float = 0.0
+    date_confidence: float = 0.0
+    source: str = "local"  # "local" or "llm"
+
+    @property
+    def confidence(self) -> float:
+        return min(self.name_confidence, self.date_confidence)
+
+    @property
+    def is_complete(self) -> bool:
+        return bool(self.last_name and self.date_of_birth)
+
+
+@dataclass
+class IdentityFastPathStats:
+    """How often verification turns were answered by the local extractors instead of the LLM"""
+    local_hits: int = 0
+    llm_fallbacks: int = 0
+    local_seconds: float = 0.0
+    llm_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.local_hits + self.llm_fallbacks
+        mean_llm = self.llm_seconds / self.llm_fallbacks if self.llm_fallbacks else 0.0
+        stats["hit_ratio"] = round(self.local_hits / lookups, 3) if lookups else 0.0
+        stats["mean_local_ms"] = round(self.local_seconds / lookups * 1000, 3) if lookups else 0.0
+        stats["mean_llm_ms"] = round(mean_llm * 1000, 1)
+        # Each local hit saves roughly one LLM round trip
+        stats["estimated_seconds_saved"] = round(self.local_hits * mean_llm, 3)
+        return stats
+
 
 class IdentityVerificationService:
     """Service for verifying patient identity"""
     
     def __init__(self):
-        pass
+        self.settings = get_settings()
+        self.stats = IdentityFastPathStats()
     
     def extract_name_from_message(self, message: str) -> Optional[str]:
         """
         Extract a last name from a user message
         Looks for common patterns like "my last name is...", "Smith", etc.
         """
-        # Clean the message
-        message = message.strip().lower()
-        
-        # Common patterns for last name responses
-        patterns = [
-            r"my last name is\s+([a-zA-Z\-\']+)",
-            r"last name is\s+([a-zA-Z\-\']+)",
-            r"surname is\s+([a-zA-Z\-\']+)",
-            r"family name is\s+([a-zA-Z\-\']+)",
-            r"^([a-zA-Z\-\']+)$",  # Just the name alone
-            r"it\'s\s+([a-zA-Z\-\']+)",
-            r"name:\s*([a-zA-Z\-\']+)"
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message)
-            if match:
-                name = match.group(1).strip()
-                # Validate it looks like a name (2+ characters, no numbers)
-                if len(name) >= 2 and name.isalpha():
-                    return name.title()  # Capitalize properly
-        
-        return None
+        name, _ = self._match_name(message.strip().lower())
+        return name.title() if name else None
     
     def extract_date_from_message(self, message: str) -> Optional[str]:
         """
         Extract a date of birth from a user message
         Supports various formats: MM/DD/YYYY, MM-DD-YYYY, Month DD, YYYY, etc.
         """
-        # Clean the message
-        message = message.strip()
-        
-        # Date patterns to match
-        patterns = [
-            # MM/DD/YYYY or MM/DD/YY
-            r"(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{4}|\d{2})",
-            # Month DD, YYYY
-            r"(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2}),?\s+(\d{4})",
-            # DD Month YYYY
-            r"(\d{1,2})\s+(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{4})",
-            # YYYY-MM-DD
-            r"(\d{4})[\/\-](\d{1,2})[\/\-](\d{1,2})"
+        date_str, _, _, _ = self._match_date(message.strip().lower())
+        return date_str or None
+    
+    def extract_identity(self, message: str, conversation_history: Optional[List[Dict[str, str]]] = None) -> IdentityMatch:
+        """
+        Extract last name and date of birth locally, with a confidence per field
+        Fields missing from the current message are filled from earlier user messages
+        """
+        match = IdentityMatch()
+        texts = [(message, 0.0)] + [
+            (entry.get("content", ""), _HISTORY_PENALTY)
+            for entry in reversed(conversation_history or [])
+            if entry.get("role") == "user"
         ]
         
-        message_lower = message.lower()
-        
-        for i, pattern in enumerate(patterns):
-            match = re.search(pattern, message_lower)
-            if match:
-                try:
-                    if i == 0:  # MM/DD/YYYY or MM/DD/YY
-                        month, day, year = match.groups()
-                        if len(year) == 2:
-                            year = "19" + year if int(year) > 30 else "20" + year
-                        date_str = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                    elif i == 1:  # Month DD, YYYY
-                        month_name, day, year = match.groups()
-                        month_num = self._month_name_to_number(month_name)
-                        date_str = f"{year}-{month_num:02d}-{day.zfill(2)}"
-                    elif i == 2:  # DD Month YYYY
-                        day, month_name, year = match.groups()
-                        month_num = self._month_name_to_number(month_name)
-                        date_str = f"{year}-{month_num:02d}-{day.zfill(2)}"
-                    elif i == 3:  # YYYY-MM-DD
-                        year, month, day = match.groups()
-                        date_str = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                    
-                    # Validate the date
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
-                    
-                    # Sanity check: should be a reasonable birth date
-                    current_year = datetime.now().year
-                    birth_year = parsed_date.year
-                    
-                    if 1900 <= birth_year <= current_year - 1:  # At least 1 year old
-                        return date_str
-                        
-                except (ValueError, IndexError):
-                    continue
-        
-        return None
+        for text, penalty in texts:
+            lowered = text.strip().lower()
+            date_str, date_format, date_confidence, remainder = self._match_date(lowered)
+            if date_str and not match.date_of_birth:
+                match.date_of_birth = date_str
+                match.original_date_format = date_format
+                match.date_confidence = date_confidence - penalty
+            if not match.last_name:
+                name, name_confidence = self._match_name(remainder)
+                if name:
+                    match.last_name = name.title()
+                    match.name_confidence = name_confidence - penalty
+            if match.is_complete:
+                break
+        
+        return match
+    
+    async def resolve_identity(
+        self,
+        message: str,
+        load_history: Callable[[], Awaitable[List[Dict[str, str]]]],
+        llm_extract: Callable[[str, List[Dict[str, str]]], Awaitable[Any]]
+    ) -> IdentityMatch:
+        """
+        Local extraction first, LLM only when it cannot confidently produce both fields
+        History is loaded only if the current message alone is not enough
+        """
+        min_confidence = self.settings.identity_fast_path_min_confidence
+        started = time.perf_counter()
+        match = self.extract_identity(message)
+        history = None
+        if not (match.is_complete and match.confidence >= min_confidence):
+            history = await load_history()
+            match = self.extract_identity(message, history)
+        local_seconds = time.perf_counter() - started
+        self.stats.local_seconds += local_seconds
+        metrics.observe("identity.local_extract", local_seconds)
+        
+        if match.is_complete and match.confidence >= min_confidence:
+            self.stats.local_hits += 1
+            logger.debug("Identity extracted locally (%s, confidence %.2f)", match.original_date_format, match.confidence)
+            return match
+        
+        started = time.perf_counter()
+        extracted = await llm_extract(message, history or [])
+        self.stats.llm_fallbacks += 1
+        self.stats.llm_seconds += time.perf_counter() - started
+        logger.debug("Identity extraction fell back to the LLM (local confidence %.2f)", match.confidence)
+        return IdentityMatch(
+            last_name=extracted.last_name,
+            date_of_birth=extracted.date_of_birth,
+            original_date_format=extracted.original_date_format,
+            name_confidence=1.0 if extracted.last_name else 0.0,
+            date_confidence=1.0 if extracted.date_of_birth else 0.0,
+            source="llm"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return self.stats.as_dict()
+    
+    def _match_name(self, text: str) -> Tuple[Optional[str], float]:
+        """Last name and confidence from lowercased text (dates already removed)"""
+        explicit = _EXPLICIT_LAST_NAME.search(text)
+        if explicit and explicit.group(1) not in _FILLER_WORDS:
+            return explicit.group(1), _CONFIDENCE_EXPLICIT_NAME
+        
+        candidates = [token for token in _NAME_TOKEN.findall(text) if token not in _FILLER_WORDS and token not in _MONTHS]
+        if not candidates:
+            return None, 0.0
+        if len(candidates) == 1 and _NAME_VALUE.match(candidates[0]):
+            return candidates[0], _CONFIDENCE_SINGLE_NAME
+        # "My name is Jane Smith" - most likely the last word, but let the LLM decide
+        return candidates[-1], _CONFIDENCE_AMBIGUOUS_NAME
+    
+    def _match_date(self, text: str) -> Tuple[str, str, float, str]:
+        """(YYYY-MM-DD, original format, confidence, text with the dates removed) from lowercased text"""
+        found = []
+        remainder = text
+        for date_format, pattern, order in _DATE_PATTERNS:
+            for match in pattern.finditer(remainder):
+                date_str = self._normalize_date(match.groups(), order)
+                if date_str:
+                    found.append((date_str, date_format))
+            remainder = pattern.sub(" ", remainder)
+        
+        if not found:
+            return "", "", 0.0, remainder
+        date_str, date_format = found[0]
+        if len({date for date, _ in found}) > 1:
+            confidence = _CONFIDENCE_AMBIGUOUS_DATE
+        elif date_format == "MM/DD/YY":
+            confidence = _CONFIDENCE_SHORT_YEAR
+        else:
+            confidence = _CONFIDENCE_FULL_YEAR
+        return date_str, date_format, confidence, remainder
+    
+    def _normalize_date(self, groups: Tuple[str, ...], order: str) -> Optional[str]:
+        """YYYY-MM-DD for a plausible birth date, else None"""
+        try:
+            if order == "ymd":
+                year, month, day = groups
+            elif order == "mdy":
+                month, day, year = groups
+            elif order == "Mdy":
+                month_name, day, year = groups
+                month = str(self._month_name_to_number(month_name))
+            else:  # dMy
+                day, month_name, year = groups
+                month = str(self._month_name_to_number(month_name))
+            
+            if len(year) == 2:
+                year = "19" + year if int(year) > 30 else "20" + year
+            parsed_date = datetime(int(year), int(month), int(day))
+        except (ValueError, TypeError):
+            return None
+        
+        # Sanity check: should be a reasonable birth date (at least 1 year old)
+        if not 1900 <= parsed_date.year <= datetime.now().year - 1:
+            return None
+        return parsed_date.strftime("%Y-%m-%d")
     
     def _month_name_to_number(self, month_name: str) -> int:
         """Convert month name to number"""
-        months = {
-            "january": 1, "february": 2, "march": 3, "april": 4,
-            "may": 5, "june": 6, "july": 7, "august": 8,
-            "september": 9, "october": 10, "november": 11, "december": 12
-        }
-        return months.get(month_name.lower(), 1)
+        return _MONTHS.get(month_name.lower().rstrip("."), 1)
     
     def verify_identity(
         self, 
@@ -170,7 +310,7 @@ class IdentityVerificationService:
                 return False, "The date of birth provided does not match our records"
             
         except (ValueError, AttributeError) as e:
-            logger.error(f"Date parsing error in identity verification: {e}")
+            logger.error("Date parsing error in identity verification: %s", e)
             return False, "Unable to verify identity: date format error"
         
         return True, "Identity verified successfully"
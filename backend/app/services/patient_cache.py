@@ -0,0 +1,73 @@
+"""
+In-process cache of Charm patient records
+Serves both the MRN lookup (/patients?record_id=) and the detail GET (/patients/{id})
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core.ttl_cache import CacheStats, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PatientCacheStats(CacheStats):
+    """Hit/miss counters for the patient record cache"""
+    write_throughs: int = 0
+
+
+class PatientRecordCache:
+    """
+    TTL cache of patient records keyed by MRN and by Charm patient_id
+
+    MRN lookups and patient details are stored separately because Charm returns
+    different shapes for them; both are dropped when the patient is written.
+    Only found patients are cached, so a newly created chart is never hidden.
+    Returned records are copies and safe for callers to modify.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.stats = PatientCacheStats()
+        self._by_mrn: TTLCache[str, Dict[str, Any]] = TTLCache(ttl_seconds, max_entries, stats=self.stats)
+        self._by_patient_id: TTLCache[str, Dict[str, Any]] = TTLCache(ttl_seconds, max_entries, stats=self.stats)
+
+    def get_by_mrn(self, mrn: str) -> Optional[Dict[str, Any]]:
+        """Cached /patients?record_id= result for an MRN"""
+        return self._by_mrn.get(mrn)
+
+    def put_by_mrn(self, mrn: str, patient: Dict[str, Any]) -> None:
+        self._by_mrn.put(mrn, patient)
+
+    def get_details(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Cached /patients/{id} detail record"""
+        return self._by_patient_id.get(str(patient_id))
+
+    def put_details(self, patient_id: str, patient: Dict[str, Any]) -> None:
+        self._by_patient_id.put(str(patient_id), patient)
+
+    def update_details(self, patient_id: str, fields: Dict[str, Any]) -> None:
+        """Write through fields we just PUT to Charm into a cached detail record"""
+        if self._by_patient_id.update(str(patient_id), fields):
+            self.stats.write_throughs += 1
+
+    def invalidate(self, patient_id: str) -> None:
+        """Drop every cached record for a patient after we change their chart"""
+        patient_id = str(patient_id)
+        dropped_details = self._by_patient_id.discard(patient_id)
+        dropped_lookups = self._by_mrn.discard_where(lambda mrn, patient: str(patient.get("patient_id")) == patient_id)
+
+        if dropped_details or dropped_lookups:
+            self.stats.invalidations += 1
+            logger.debug("Invalidated cached patient record for %s", patient_id)
+
+    def clear(self) -> None:
+        self._by_mrn.clear()
+        self._by_patient_id.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache counters and current size"""
+        stats = self.stats.as_dict()
+        stats["entries"] = len(self._by_mrn) + len(self._by_patient_id)
+        return stats
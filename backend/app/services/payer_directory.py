@@ -0,0 +1,330 @@
+"""
+Preloaded Charm payer list
+Loaded at startup and refreshed on a schedule into an index by payer ID, normalized
+name and alias, so insurer names spoken by patients are matched without a Charm call
+"""
+
+import asyncio
+import copy
+import difflib
+import logging
+import re
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import get_settings
+from app.core.http_client import CharmHTTPClient, get_charm_http_client
+from app.core.token_manager import get_charm_api_headers
+
+logger = logging.getLogger(__name__)
+
+# Filler in insurer names as patients say them
+_STOPWORDS = frozenset({
+    "the", "of", "and", "inc", "co", "company", "insurance", "ins", "plan",
+    "i", "my", "is", "it", "its", "have", "has", "with", "through", "called"
+})
+
+# Abbreviations and common names -> payer-list wording appended to the query
+_ALIASES = {
+    "bcbs": "blue cross blue shield",
+    "blue cross": "blue cross blue shield",
+    "blue shield": "blue cross blue shield",
+    "anthem": "anthem blue cross",
+    "uhc": "unitedhealthcare",
+    "united": "unitedhealthcare",
+    "united health": "unitedhealthcare",
+    "united healthcare": "unitedhealthcare",
+    "aarp": "unitedhealthcare aarp",
+    "optum": "unitedhealthcare optum",
+    "humana": "humana",
+    "cigna": "cigna",
+    "evernorth": "cigna",
+    "aetna": "aetna",
+    "cvs": "aetna",
+    "medicare": "medicare",
+    "medicaid": "medicaid",
+    "ahcccs": "ahcccs medicaid",
+    "tricare": "tricare",
+    "va": "veterans affairs",
+    "bcbsaz": "blue cross blue shield arizona",
+}
+_ALIAS_PATTERNS = [(re.compile(rf"\b{re.escape(alias)}\b"), expansion) for alias, expansion in _ALIASES.items()]
+
+# Fields that identify a payer exactly
+_ID_FIELDS = ("practice_payer_id", "payer_id")
+
+
+def normalize_payer_name(text: Optional[str]) -> str:
+    """Lowercase words and numbers only - "Blue Cross/Blue Shield" and "blue cross blue shield" normalize alike"""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in normalize_payer_name(text).split() if token not in _STOPWORDS]
+
+
+def _payer_name(payer: Dict[str, Any]) -> str:
+    return str(payer.get("payer_name") or payer.get("name") or "")
+
+
+class PayerIndex:
+    """
+    In-memory payer index
+
+    Payers are indexed by ID, by normalized name and by name token, with every token
+    prefix indexed as well so partial insurer names ("united health") match as they are
+    typed or spoken. Each payer also gets a compact token (its name without spaces) so
+    "UnitedHealthcare" and "United Healthcare" find each other.
+    """
+
+    def __init__(self, payers: Iterable[Dict[str, Any]] = ()):
+        self.payers: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self._payer_tokens: List[Set[str]] = []
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._token_index: Dict[str, Set[int]] = {}
+
+        for payer in payers:
+            position = len(self.payers)
+            self.payers.append(payer)
+            for field in _ID_FIELDS:
+                if payer.get(field) not in (None, ""):
+                    self.by_id.setdefault(normalize_payer_name(str(payer[field])), position)
+            name = _payer_name(payer)
+            self.by_name.setdefault(normalize_payer_name(name), position)
+
+            tokens = set(_tokens(name))
+            if len(tokens) > 1:
+                tokens.add("".join(_tokens(name)))
+            self._payer_tokens.append(tokens)
+            for token in tokens:
+                self._token_index.setdefault(token, set()).add(position)
+                for end in range(2, len(token)):
+                    self._prefixes.setdefault(token[:end], set()).add(token)
+        self._vocabulary = sorted(self._token_index)
+
+    def __len__(self) -> int:
+        return len(self.payers)
+
+    def lookup_id(self, payer_id: Any) -> Optional[Dict[str, Any]]:
+        position = self.by_id.get(normalize_payer_name(str(payer_id)))
+        return copy.deepcopy(self.payers[position]) if position is not None else None
+
+    def search(self, text: str, limit: int = 5, min_score: float = 0.5) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Ranked (payer, score) matches for an insurer name or payer ID; scores are 0-1
+        Exact IDs and names score 1.0; otherwise tokens match exactly, as a prefix of a
+        payer-name token or as a close spelling. Returned payers are copies.
+        """
+        lowered = normalize_payer_name(text)
+        if not lowered:
+            return []
+        if lowered in self.by_id or lowered in self.by_name:
+            position = self.by_id.get(lowered, self.by_name.get(lowered))
+            return [(copy.deepcopy(self.payers[position]), 1.0)]
+
+        expanded = " ".join([lowered] + [expansion for pattern, expansion in _ALIAS_PATTERNS if pattern.search(lowered)])
+        query = set(_tokens(expanded))
+        spoken = _tokens(lowered)
+        if len(spoken) > 1:
+            query.add("".join(spoken))
+        if not query:
+            return []
+
+        weights: Dict[int, Dict[str, float]] = {}
+        for token in query:
+            for vocabulary_token, weight in self._match_token(token):
+                for position in self._token_index.get(vocabulary_token, ()):
+                    matched = weights.setdefault(position, {})
+                    matched[vocabulary_token] = max(matched.get(vocabulary_token, 0.0), weight)
+
+        # The compact token duplicates the others, so coverage is counted over the spoken words
+        query_size = max(len(query) - (1 if len(spoken) > 1 else 0), 1)
+        scored = []
+        for position, matched in weights.items():
+            total = sum(matched.values())
+            score = 0.7 * min(total / query_size, 1.0) + 0.3 * min(len(matched) / max(len(self._payer_tokens[position]), 1), 1.0)
+            if score >= min_score:
+                scored.append((position, round(score, 3)))
+        scored.sort(key=lambda item: (-item[1], _payer_name(self.payers[item[0]])))
+        return [(copy.deepcopy(self.payers[position]), score) for position, score in scored[:limit]]
+
+    def _match_token(self, token: str) -> List[Tuple[str, float]]:
+        """Vocabulary tokens matching a query token: exact, prefix of a longer word, else close spellings"""
+        if token in self._token_index:
+            return [(token, 1.0)]
+        prefixed = self._prefixes.get(token)
+        if prefixed:
+            return [(word, 0.6 + 0.4 * len(token) / len(word)) for word in prefixed]
+        if len(token) < 4:
+            return []
+        return [
+            (close, difflib.SequenceMatcher(None, token, close).ratio())
+            for close in difflib.get_close_matches(token, self._vocabulary, n=3, cutoff=0.8)
+        ]
+
+
+@dataclass
+class PayerDirectoryStats:
+    """Refresh and lookup counters for the preloaded payer list"""
+    refreshes: int = 0
+    refresh_errors: int = 0
+    searches: int = 0
+    matched: int = 0
+    search_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["search_seconds"] = round(self.search_seconds, 6)
+        stats["match_ratio"] = round(self.matched / self.searches, 3) if self.searches else 0.0
+        stats["mean_search_us"] = round(self.search_seconds / self.searches * 1e6, 1) if self.searches else 0.0
+        return stats
+
+
+class PayerDirectory:
+    """
+    Charm /payers list held in a PayerIndex
+
+    start() loads the list and re-fetches it every payer_directory_refresh_interval
+    seconds in the background (every payer_directory_retry_interval seconds until
+    the first load succeeds); a refresh builds a new index and swaps it in, so a
+    failed refresh keeps serving the previous list. Concurrent refreshes share one
+    fetch.
+    """
+
+    def __init__(self, http_client: Optional[CharmHTTPClient] = None):
+        self.settings = get_settings()
+        self.http_client = http_client or get_charm_http_client()
+        self.index = PayerIndex()
+        self.stats = PayerDirectoryStats()
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def payers(self) -> List[Dict[str, Any]]:
+        """Copy of the full payer list"""
+        return copy.deepcopy(self.index.payers)
+
+    def search(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Ranked payers for an insurer name or payer ID, each with its match_score"""
+        started = time.perf_counter()
+        matches = self.index.search(text, limit=limit, min_score=self.settings.payer_directory_min_score)
+        self.stats.searches += 1
+        self.stats.search_seconds += time.perf_counter() - started
+        if matches:
+            self.stats.matched += 1
+
+        payers = []
+        for payer, score in matches:
+            payer["match_score"] = score
+            payers.append(payer)
+        return payers
+
+    async def fetch_all(self) -> List[Dict[str, Any]]:
+        """Every payer configured in Charm, read in start_index/count pages"""
+        headers = await get_charm_api_headers()
+        client = self.http_client.client
+        page_size = self.settings.payer_directory_page_size
+        payers: List[Dict[str, Any]] = []
+        while True:
+            response = await client.get(
+                f"{self.settings.charm_api_base_url}/payers",
+                params={"facility_id": "ALL", "start_index": len(payers), "count": page_size},
+                headers=headers,
+                timeout=self.http_client.timeout("search")
+            )
+            response.raise_for_status()
+            data = response.json()
+            if data.get("code") not in (None, "0"):
+                raise RuntimeError(f"Payers list returned code {data.get('code')}: {data.get('message')}")
+
+            page = data.get("payers", [])
+            if page and page[0] in payers:
+                # Paging parameters ignored - the whole list came back again
+                return payers
+            payers.extend(page)
+            has_more = (data.get("page_context") or {}).get("has_more_page")
+            if not page or has_more is False or (has_more is None and len(page) < page_size):
+                return payers
+
+    async def _load(self) -> int:
+        try:
+            self.index = PayerIndex(await self.fetch_all())
+        except Exception:
+            self.stats.refresh_errors += 1
+            raise
+        self.loaded_at = time.time()
+        self.stats.refreshes += 1
+        logger.info("Loaded %s payers into the payer index", len(self.index))
+        return len(self.index)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refresh_task = None
+        if not task.cancelled():
+            task.exception()  # retrieved here as well, in case every waiter was cancelled
+
+    async def refresh(self) -> int:
+        """Re-fetch the payer list into a new index, or join the fetch in flight; returns the payer count"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._load())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return await asyncio.shield(self._refresh_task)
+
+    async def ensure_loaded(self) -> None:
+        """
+        Wait until the payer list is available
+
+        Without the background loop (scripts, tests) the first caller loads it. Once
+        start() has run, callers only join a load already in flight and never start
+        a fetch of their own on the request path; until the loop's first load
+        succeeds they get an error instead.
+        """
+        if self.is_ready:
+            return
+        if self._task is None or self._refresh_task is not None:
+            await self.refresh()
+            return
+        raise RuntimeError("Payer list is not loaded yet")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Payer list refresh failed: %s", e)
+            if self.is_ready:
+                await asyncio.sleep(self.settings.payer_directory_refresh_interval)
+            else:
+                await asyncio.sleep(self.settings.payer_directory_retry_interval)
+
+    async def start(self) -> None:
+        """Load the payer list and keep it refreshed (called from the application lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Refresh/search counters, list size and age"""
+        stats = self.stats.as_dict()
+        stats["payers"] = len(self.index)
+        stats["age_seconds"] = round(time.time() - self.loaded_at, 1) if self.loaded_at else None
+        return stats
+
+
+# Global payer directory (shared by the agent tools and EHRService)
+payer_directory = PayerDirectory()
@@ -0,0 +1,311 @@
+"""
+Prompt compilation for the intake agents
+Prompts are assembled from named, versioned fragments with per-fragment token accounting
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count for the OpenAI models (o200k_base)
+    Uses tiktoken when it is installed; otherwise ~4 characters per token
+    """
+    global _encoding, _encoding_loaded
+    if not text:
+        return 0
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def prune_empty(value: Any) -> Any:
+    """Drop None, empty strings and empty containers, recursively"""
+    if isinstance(value, dict):
+        pruned = {key: prune_empty(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        pruned = [prune_empty(item) for item in value]
+        return [item for item in pruned if item not in (None, "", [], {})]
+    return value
+
+
+def compact_json(value: Any) -> str:
+    """Minified JSON without empty fields"""
+    return json.dumps(prune_empty(value), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+@dataclass(frozen=True)
+class PromptFragment:
+    """
+    One named piece of a prompt
+
+    The template uses $placeholders (string.Template), so JSON braces need no escaping.
+    Bump version whenever the text changes so token counts can be compared across
+    releases. Optional fragments are left out when all of their values are empty.
+    """
+    name: str
+    version: int
+    template: str
+    optional: bool = False
+
+    @property
+    def placeholders(self) -> List[str]:
+        return [
+            match.group("named") or match.group("braced")
+            for match in Template.pattern.finditer(self.template)
+            if match.group("named") or match.group("braced")
+        ]
+
+
+@dataclass
+class CompiledPrompt:
+    """Rendered prompt text and the token count of each fragment in it"""
+    name: str
+    text: str
+    fragments: List[Tuple[str, int, int]] = field(default_factory=list)  # (name, version, tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(tokens for _, _, tokens in self.fragments)
+
+    def token_breakdown(self) -> Dict[str, int]:
+        return {f"{name}@v{version}": tokens for name, version, tokens in self.fragments}
+
+
+@dataclass
+class _FragmentStats:
+    version: int
+    sent: int = 0
+    total_tokens: int = 0
+    last_tokens: int = 0
+
+
+class PromptCompiler:
+    """
+    Registry of prompt fragments with token accounting
+
+    compile() renders a prompt from fragment names and values: strings are inserted
+    as-is, everything else as compact JSON. record() adds a compiled prompt to the
+    per-fragment counters each time it is sent (compile() records automatically).
+    """
+
+    def __init__(self, fragments: Iterable[PromptFragment] = ()):
+        self._fragments: Dict[str, PromptFragment] = {}
+        self._stats: Dict[str, _FragmentStats] = {}
+        self._prompts: Dict[str, Dict[str, int]] = {}
+        for fragment in fragments:
+            self.register(fragment)
+
+    def register(self, fragment: PromptFragment) -> None:
+        self._fragments[fragment.name] = fragment
+
+    def get(self, name: str) -> PromptFragment:
+        return self._fragments[name]
+
+    @staticmethod
+    def _render_value(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)):
+            return str(value)
+        return compact_json(value)
+
+    def compile(self, prompt_name: str, fragment_names: Sequence[str], values: Optional[Dict[str, Any]] = None, record: bool = True) -> CompiledPrompt:
+        """Render the named fragments in order, separated by blank lines"""
+        rendered_values = {key: self._render_value(value) for key, value in (values or {}).items()}
+        compiled = CompiledPrompt(name=prompt_name, text="")
+        parts = []
+
+        for name in fragment_names:
+            fragment = self._fragments[name]
+            placeholders = fragment.placeholders
+            if fragment.optional and placeholders and not any(rendered_values.get(key) for key in placeholders):
+                continue
+            text = Template(fragment.template).substitute(rendered_values).strip()
+            parts.append(text)
+            compiled.fragments.append((fragment.name, fragment.version, count_tokens(text)))
+
+        compiled.text = "\n\n".join(parts)
+        if record:
+            self.record(compiled)
+        return compiled
+
+    def record(self, compiled: CompiledPrompt) -> None:
+        """Count one send of a compiled prompt"""
+        for name, version, tokens in compiled.fragments:
+            stats = self._stats.get(name)
+            if stats is None or stats.version != version:
+                stats = self._stats[name] = _FragmentStats(version=version)
+            stats.sent += 1
+            stats.total_tokens += tokens
+            stats.last_tokens = tokens
+
+        prompt = self._prompts.setdefault(compiled.name, {"sent": 0, "total_tokens": 0, "last_tokens": 0})
+        prompt["sent"] += 1
+        prompt["total_tokens"] += compiled.total_tokens
+        prompt["last_tokens"] = compiled.total_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-prompt and per-fragment token counts (last, mean and total per send)"""
+        fragments = {
+            name: {
+                "version": stats.version,
+                "sent": stats.sent,
+                "last_tokens": stats.last_tokens,
+                "mean_tokens": round(stats.total_tokens / stats.sent, 1) if stats.sent else 0.0,
+                "total_tokens": stats.total_tokens,
+            }
+            for name, stats in sorted(self._stats.items())
+        }
+        return {"prompts": {name: dict(stats) for name, stats in sorted(self._prompts.items())}, "fragments": fragments}
+
+
+# =============================================================================
+# Conversation agent fragments
+# =============================================================================
+
+CONVERSATION_SYSTEM = PromptFragment("conversation.system", 3, """
+You are a friendly, empathetic medical-intake assistant.
+Use firstName only. Ask related questions together using bullet points for efficiency.
+Ask 2-3 related questions from the same group to streamline the conversation.
+
+Schema:
+intake_demographics: {
+  firstName, middleName?, lastName,
+  email, mobilePhone, homePhone?, workPhone?,
+  address: { addressLine1, city, state, zipCode, country="us" },
+  emergencyContact: { name, relationship, phone },
+  careTeamProviders: [ { providerName, phone?, practiceName?, specialty?, relationshipType?, isPrimaryCarePhysician? } ]
+}
+intake_weight_history: {
+  currentHeight, currentWeight,
+  maxWeight, ageAtMaxWeight,
+  largestDietWeightLoss,
+  dietHistory: [ { dietName, startDate?, endDate?, challenges? } ],
+  mealPatterns, weightFactors, familyObesityHistory,
+  exercise, treatmentPreferences,
+  bariatricSurgeryHistory, glp1History
+}
+intake_medical_history: {
+  medications: [ { name, dosage, frequency } ],
+  allergies,
+  diagnosedConditions,
+  socialHistory: { smoking?, alcohol?, otherSubstances? },
+  familyMedicalHistory,
+  surgicalHistory: [ { procedureName, approximateYear } ]
+}
+
+CRITICAL:
+- On every turn, load the prior `updated_data` state.
+- Parse the user message and merge any newly provided values into that state.
+- Always return the **entire** `updated_data` object (including previously collected fields) before asking your next question.
+- If the user corrects or references past data ("you forgot X"), re-emit that field in `updated_data` to confirm it's saved.
+
+Loop (per turn):
+1. Identify the next group of missing fields in `current_section`.
+2. Ask 2-3 related questions from that group using bullet points.
+3. If section complete → respond "✅ {section} complete. Moving to {next_section}."
+4. Repeat until all sections done; then ask for star rating + comments.
+
+Provider sub-flow:
+1. Ask "What's your provider's name?" → call `search_providers(name)`
+2. If matches → present list & confirm → store `provider_id` → ask "Any more providers?"
+3. Else ask "What's their phone?" → `search_providers(name, phone)` → confirm or…
+4. Else ask "Practice name?" → `search_providers(name, phone, practiceName)` or fallback to `web_search_provider` → confirm → `add_provider_to_charm`
+
+Insurance: when the patient names their insurer → `search_payers(name)` → confirm the payer → store `practice_payer_id` and `payer_name`
+
+Tools:
+search_providers, web_search_provider, add_provider_to_charm, search_payers, complete_intake_session
+
+Response format (JSON):
+{"response": "...?", "current_section": "...", "updated_data": { /* full state with all collected fields */ }, "agent_actions": [ /* e.g. "extracted_address", "merged_state" */ ]}
+""")
+
+# Stable per section - placed first so the shared prompt prefix can be cached by the model provider
+CONVERSATION_INSTRUCTIONS = PromptFragment("conversation.instructions", 2, """
+DATA EXTRACTION RULES:
+1. Extract every value in the user's message that matches a $current_section schema field, even if not asked, into updated_data.$current_section with the exact schema field names and nesting (e.g. middleName, email, phone.work).
+2. Never say data was saved unless it is in updated_data.
+3. Also return $tracking_key: unasked_fields minus every field you collected or asked about, plus isComplete and pushed_to_charm.
+4. Acknowledge what you collected, then ask about the next question group using bullet points.
+Example: "Jeremy, jeremy@example.com, work is 5205550100" → middleName "Jeremy", email "jeremy@example.com", phone.work "5205550100"; remove ["middleName","email","phone.work"] from unasked_fields.
+Format: {"updated_data":{"$current_section":{...},"$tracking_key":{"unasked_fields":[...],"isComplete":false,"pushed_to_charm":false}}}
+""")
+
+CONVERSATION_SCHEMA = PromptFragment("conversation.schema", 1, "$schema_info")
+
+CONVERSATION_SESSION = PromptFragment("conversation.session", 1, """
+Session ID: $session_id
+Current Section: $current_section
+""")
+
+CONVERSATION_SECTION_DATA = PromptFragment("conversation.section_data", 1, """
+Current Section Data (JSON): $current_data
+""")
+
+CONVERSATION_TRACKING = PromptFragment("conversation.tracking", 1, """
+FIELD TRACKING:
+Unasked fields remaining: $unasked_fields
+Next question group to ask about: $next_question_group
+Total remaining fields: $remaining_fields
+""")
+
+CONVERSATION_SUMMARY = PromptFragment("conversation.summary", 1, """
+Earlier Conversation Summary:
+$conversation_summary
+""", optional=True)
+
+CONVERSATION_HISTORY = PromptFragment("conversation.history", 1, """
+Conversation History:
+$conversation_history
+""")
+
+CONVERSATION_USER_MESSAGE = PromptFragment("conversation.user_message", 1, """
+User Message: $message
+""")
+
+# Fragment order of the per-turn conversation prompt
+CONVERSATION_TURN_FRAGMENTS = (
+    CONVERSATION_INSTRUCTIONS.name,
+    CONVERSATION_SCHEMA.name,
+    CONVERSATION_SESSION.name,
+    CONVERSATION_SECTION_DATA.name,
+    CONVERSATION_TRACKING.name,
+    CONVERSATION_SUMMARY.name,
+    CONVERSATION_HISTORY.name,
+    CONVERSATION_USER_MESSAGE.name,
+)
+
+
+# Global prompt compiler
+prompt_compiler = PromptCompiler([
+    CONVERSATION_SYSTEM,
+    CONVERSATION_INSTRUCTIONS,
+    CONVERSATION_SCHEMA,
+    CONVERSATION_SESSION,
+    CONVERSATION_SECTION_DATA,
+    CONVERSATION_TRACKING,
+    CONVERSATION_SUMMARY,
+    CONVERSATION_HISTORY,
+    CONVERSATION_USER_MESSAGE,
+])
@@ -0,0 +1,421 @@
+"""
+Local mirror of the Charm referral (provider) directory
+A background sync keeps Supabase and an in-memory fuzzy index in step with Charm,
+so care-team searches are answered locally instead of by exact-name API lookups
+"""
+
+import asyncio
+import copy
+import logging
+import re
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import get_settings
+from app.core.http_client import CharmHTTPClient, get_charm_http_client
+from app.core.token_manager import get_charm_api_headers
+from app.repositories.provider_directory_repository import ProviderDirectoryRepository, provider_directory_repository
+
+logger = logging.getLogger(__name__)
+
+# Titles and credentials patients and the agent attach to provider names
+_TITLES = frozenset({
+    "dr", "doctor", "md", "do", "np", "fnp", "aprn", "arnp", "pa", "pac", "rn", "dnp", "phd",
+    "mph", "facp", "facs", "jr", "sr", "ii", "iii"
+})
+
+# Phone fields compared as their last ten digits
+_PHONE_FIELDS = ("mobile", "phone", "fax")
+
+# Relative weight of each search criterion in the combined score
+_WEIGHTS = {"name": 0.6, "phone": 0.25, "practice": 0.1, "specialty": 0.05}
+
+# Below this a name alone does not make a provider a candidate
+_MIN_NAME_SCORE = 0.45
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def _trigrams(words: Iterable[str]) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two leading blanks and one trailing"""
+    grams: Set[str] = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _name_words(text: Optional[str]) -> List[str]:
+    return [word for word in _words(text) if word not in _TITLES]
+
+
+def normalize_provider_name(text: Optional[str]) -> str:
+    """Lowercase name words without titles - "Dr. Ann Lee, MD" and "ann lee" normalize alike"""
+    return " ".join(_name_words(text))
+
+
+def phone_digits(value: Any) -> str:
+    """Last ten digits of a phone number ("" when too short to compare)"""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-10:] if len(digits) >= 10 else ""
+
+
+def _provider_name(provider: Dict[str, Any]) -> str:
+    return " ".join(
+        str(provider.get(field) or "")
+        for field in ("first_name", "middle_name", "last_name")
+    )
+
+
+class _TrigramField:
+    """Trigram postings for one text field; scores favour covering the query"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def add(self, provider_id: str, grams: Set[str]) -> None:
+        if not grams:
+            return
+        self._grams[provider_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(provider_id)
+
+    def remove(self, provider_id: str) -> None:
+        for gram in self._grams.pop(provider_id, ()):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(provider_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def match(self, query: Set[str]) -> Dict[str, float]:
+        """Provider id -> 0-1 similarity, mostly how much of the query matched"""
+        shared: Dict[str, int] = {}
+        for gram in query:
+            for provider_id in self._postings.get(gram, ()):
+                shared[provider_id] = shared.get(provider_id, 0) + 1
+        return {
+            provider_id: 0.7 * count / len(query) + 0.3 * count / len(self._grams[provider_id])
+            for provider_id, count in shared.items()
+        }
+
+    def score(self, provider_id: str, query: Set[str]) -> float:
+        grams = self._grams.get(provider_id)
+        if not grams or not query:
+            return 0.0
+        count = len(grams & query)
+        return 0.7 * count / len(query) + 0.3 * count / len(grams)
+
+
+class ProviderIndex:
+    """
+    In-memory search index over directory providers
+
+    Names, practice names and specialties are indexed by trigram, so misspellings,
+    missing middle names and partial names still match; phone numbers are indexed
+    by their last ten digits. Providers are replaced in place by provider_id.
+    """
+
+    def __init__(self, providers: Iterable[Dict[str, Any]] = ()):
+        self._providers: Dict[str, Dict[str, Any]] = {}
+        self._names = _TrigramField()
+        self._practices = _TrigramField()
+        self._specialties = _TrigramField()
+        self._phones: Dict[str, Set[str]] = {}
+        self._provider_phones: Dict[str, Set[str]] = {}
+        for provider in providers:
+            self.upsert(provider)
+
+    def __len__(self) -> int:
+        return len(self._providers)
+
+    def upsert(self, provider: Dict[str, Any]) -> bool:
+        """Add or replace a provider; providers without an id are ignored"""
+        provider_id = str(provider.get("provider_id") or "")
+        if not provider_id:
+            return False
+        self.remove(provider_id)
+
+        self._providers[provider_id] = copy.deepcopy(provider)
+        self._names.add(provider_id, _trigrams(_name_words(_provider_name(provider))))
+        self._practices.add(provider_id, _trigrams(_words(provider.get("practice_name"))))
+        self._specialties.add(provider_id, _trigrams(_words(provider.get("speciality") or provider.get("specialty"))))
+        phones = {digits for digits in (phone_digits(provider.get(field)) for field in _PHONE_FIELDS) if digits}
+        self._provider_phones[provider_id] = phones
+        for digits in phones:
+            self._phones.setdefault(digits, set()).add(provider_id)
+        return True
+
+    def remove(self, provider_id: str) -> None:
+        if self._providers.pop(provider_id, None) is None:
+            return
+        self._names.remove(provider_id)
+        self._practices.remove(provider_id)
+        self._specialties.remove(provider_id)
+        for digits in self._provider_phones.pop(provider_id, ()):
+            ids = self._phones.get(digits)
+            if ids is not None:
+                ids.discard(provider_id)
+                if not ids:
+                    del self._phones[digits]
+
+    def search(
+        self,
+        name: str,
+        phone: Optional[str] = None,
+        practice_name: Optional[str] = None,
+        specialty: Optional[str] = None,
+        limit: int = 5,
+        min_score: float = 0.6
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Ranked (provider, score) matches; scores are 0-1
+        Candidates come from the name or the phone number, the other criteria
+        only re-rank them. Returned providers are copies.
+        """
+        name_query = _trigrams(_name_words(name))
+        digits = phone_digits(phone)
+        practice_query = _trigrams(_words(practice_name))
+        specialty_query = _trigrams(_words(specialty))
+
+        name_scores = {
+            provider_id: score
+            for provider_id, score in (self._names.match(name_query) if name_query else {}).items()
+            if score >= _MIN_NAME_SCORE
+        }
+        phone_matches = self._phones.get(digits, set()) if digits else set()
+
+        weight_total = _WEIGHTS["name"]
+        if digits:
+            weight_total += _WEIGHTS["phone"]
+        if practice_query:
+            weight_total += _WEIGHTS["practice"]
+        if specialty_query:
+            weight_total += _WEIGHTS["specialty"]
+
+        scored = []
+        for provider_id in set(name_scores) | phone_matches:
+            score = _WEIGHTS["name"] * name_scores.get(provider_id, self._names.score(provider_id, name_query))
+            if provider_id in phone_matches:
+                score += _WEIGHTS["phone"]
+            if practice_query:
+                score += _WEIGHTS["practice"] * self._practices.score(provider_id, practice_query)
+            if specialty_query:
+                score += _WEIGHTS["specialty"] * self._specialties.score(provider_id, specialty_query)
+            score /= weight_total
+            if score >= min_score:
+                scored.append((provider_id, round(score, 3)))
+
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return [(copy.deepcopy(self._providers[provider_id]), score) for provider_id, score in scored[:limit]]
+
+
+@dataclass
+class ProviderDirectoryStats:
+    """Sync and search counters for the local provider directory"""
+    syncs: int = 0
+    sync_errors: int = 0
+    incremental_updates: int = 0
+    searches: int = 0
+    index_hits: int = 0
+    search_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["search_seconds"] = round(self.search_seconds, 6)
+        stats["hit_ratio"] = round(self.index_hits / self.searches, 3) if self.searches else 0.0
+        stats["mean_search_us"] = round(self.search_seconds / self.searches * 1e6, 1) if self.searches else 0.0
+        return stats
+
+
+class ProviderDirectory:
+    """
+    Charm referral directory mirrored into Supabase and a ProviderIndex
+
+    start() builds the index from the Supabase mirror and starts a background task
+    that re-lists the directory from Charm every provider_directory_sync_interval
+    seconds. A sync builds a fresh index and swaps it in; providers added while the
+    listing was in flight are re-applied so they are not lost. Until the mirror has
+    loaded (is_ready is False) callers fall back to Charm's own search.
+    """
+
+    def __init__(
+        self,
+        repository: Optional[ProviderDirectoryRepository] = None,
+        http_client: Optional[CharmHTTPClient] = None
+    ):
+        self.settings = get_settings()
+        self.repository = repository or provider_directory_repository
+        self.http_client = http_client or get_charm_http_client()
+        self.index = ProviderIndex()
+        self.stats = ProviderDirectoryStats()
+        self.last_synced_at: Optional[str] = None
+        self._ready = False
+        self._task: Optional[asyncio.Task] = None
+        self._sync_lock = asyncio.Lock()
+        self._added_during_sync: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def search(
+        self,
+        name: str,
+        phone: Optional[str] = None,
+        practice_name: Optional[str] = None,
+        specialty: Optional[str] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Ranked providers from the local index, each with its match_score"""
+        started = time.perf_counter()
+        matches = self.index.search(
+            name,
+            phone=phone,
+            practice_name=practice_name,
+            specialty=specialty,
+            limit=limit,
+            min_score=self.settings.provider_directory_min_score
+        )
+        self.stats.searches += 1
+        self.stats.search_seconds += time.perf_counter() - started
+        if matches:
+            self.stats.index_hits += 1
+
+        providers = []
+        for provider, score in matches:
+            provider["match_score"] = score
+            providers.append(provider)
+        return providers
+
+    async def add(self, provider: Dict[str, Any]) -> None:
+        """Apply a provider created or found in Charm to the index and the mirror"""
+        await self.add_many([provider])
+
+    async def add_many(self, providers: List[Dict[str, Any]]) -> None:
+        """Apply providers found in Charm to the index, then mirror them in one upsert"""
+        added = []
+        for provider in providers:
+            provider_id = str(provider.get("provider_id") or "")
+            if not provider_id:
+                continue
+            if self._added_during_sync is not None:
+                self._added_during_sync[provider_id] = provider
+            if self._ready:
+                self.index.upsert(provider)
+                added.append(provider)
+        if not added:
+            return
+
+        self.stats.incremental_updates += len(added)
+        try:
+            await self.repository.upsert_providers(added, datetime.utcnow().isoformat())
+        except Exception as e:
+            logger.warning("Could not mirror %s providers: %s", len(added), e)
+
+    async def fetch_all(self) -> List[Dict[str, Any]]:
+        """Every provider in the Charm referral directory, following page_context if present"""
+        headers = await get_charm_api_headers()
+        client = self.http_client.client
+        providers: List[Dict[str, Any]] = []
+        page = 1
+        while True:
+            response = await client.get(
+                f"{self.settings.charm_api_base_url}/settings/directory/providers",
+                params={"page": page, "per_page": self.settings.provider_directory_page_size},
+                headers=headers,
+                timeout=self.http_client.timeout("search")
+            )
+            response.raise_for_status()
+            data = response.json()
+            if data.get("code") != "0":
+                raise RuntimeError(f"Provider directory listing returned code {data.get('code')}: {data.get('message')}")
+
+            providers.extend(data.get("providers", []))
+            if not (data.get("page_context") or {}).get("has_more_page"):
+                return providers
+            page += 1
+
+    async def sync(self) -> int:
+        """Re-list the directory from Charm into the index and the mirror; returns the provider count"""
+        async with self._sync_lock:
+            synced_at = datetime.utcnow().isoformat()
+            self._added_during_sync = added = {}
+            try:
+                providers = await self.fetch_all()
+                # Providers added after Charm listed its page are not in the listing
+                listed = {str(provider.get("provider_id")) for provider in providers}
+                providers.extend(provider for provider_id, provider in added.items() if provider_id not in listed)
+                self.index = ProviderIndex(providers)
+                self._ready = True
+            except Exception:
+                self.stats.sync_errors += 1
+                raise
+            finally:
+                self._added_during_sync = None
+
+            self.stats.syncs += 1
+            self.last_synced_at = synced_at
+            logger.info("Synced %s providers from the Charm directory", len(self.index))
+
+            try:
+                await self.repository.upsert_providers(providers, synced_at)
+                removed = await self.repository.delete_stale(synced_at)
+                if removed:
+                    logger.info("Removed %s providers no longer in the Charm directory", removed)
+            except Exception as e:
+                logger.warning("Could not update the provider directory mirror: %s", e)
+            return len(self.index)
+
+    async def load(self) -> int:
+        """Build the index from the Supabase mirror; returns the provider count"""
+        providers = await self.repository.load_all()
+        if providers:
+            self.index = ProviderIndex(providers)
+            self._ready = True
+        logger.info("Loaded %s mirrored providers into the directory index", len(providers))
+        return len(providers)
+
+    async def _sync_loop(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Provider directory sync failed: %s", e)
+            await asyncio.sleep(self.settings.provider_directory_sync_interval)
+
+    async def start(self) -> None:
+        """Load the mirror and start the background sync (called from the application lifespan)"""
+        if self._task is not None:
+            return
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning("Could not load the provider directory mirror: %s", e)
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sync/search counters, index size and last sync time"""
+        stats = self.stats.as_dict()
+        stats["providers"] = len(self.index)
+        stats["ready"] = self._ready
+        stats["last_synced_at"] = self.last_synced_at
+        return stats
+
+
+# Global provider directory (shared by the agent tools and EHRService)
+provider_directory = ProviderDirectory()
@@ -0,0 +1,76 @@
+"""
+In-process cache of Charm provider-directory searches
+Serves repeated /settings/directory/providers lookups within and across sessions
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Search parameters compared as digits only
+_PHONE_PARAMS = frozenset({"mobile", "phone", "fax"})
+
+CacheKey = Tuple[Tuple[str, str], ...]
+
+
+def normalize_search_params(params: Dict[str, Any]) -> CacheKey:
+    """
+    Cache key for a provider search
+    Names and text are case-folded with whitespace collapsed, phone numbers reduced to digits
+    """
+    key = []
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name in _PHONE_PARAMS:
+            normalized = re.sub(r"\D", "", str(value))
+        else:
+            normalized = " ".join(str(value).split()).casefold()
+        if normalized:
+            key.append((name, normalized))
+    return tuple(sorted(key))
+
+
+class ProviderSearchCache:
+    """
+    TTL + LRU cache of provider search results keyed by normalized search parameters
+
+    Empty results are cached as well - the progressive search flow repeats the same
+    misses - so the whole cache is dropped whenever a provider is added to the
+    directory. Returned lists are copies and safe for callers to modify.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 500):
+        self._searches: TTLCache[CacheKey, List[Dict[str, Any]]] = TTLCache(ttl_seconds, max_entries)
+        self.stats = self._searches.stats
+
+    def get(self, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Cached providers for a search, or None"""
+        return self._searches.get(normalize_search_params(params))
+
+    def put(self, params: Dict[str, Any], providers: List[Dict[str, Any]]) -> None:
+        self._searches.put(normalize_search_params(params), providers)
+
+    def invalidate(self) -> None:
+        """Drop every cached search after the directory changes"""
+        if self._searches.clear():
+            self.stats.invalidations += 1
+            logger.debug("Invalidated cached provider searches")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache counters and current size"""
+        stats = self.stats.as_dict()
+        stats["entries"] = len(self._searches)
+        return stats
+
+
+# Global provider search cache (shared by the agent tools and EHRService)
+provider_search_cache = ProviderSearchCache(
+    ttl_seconds=get_settings().provider_search_cache_ttl,
+    max_entries=get_settings().provider_search_cache_max_entries
+)
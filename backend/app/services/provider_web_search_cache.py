@@ -0,0 +1,132 @@
+"""
+Persistent cache of provider web searches
+Perplexity answers are kept in Supabase (with an in-process front) so the same doctor
+in the same city is searched once per TTL across sessions and instances
+"""
+
+import logging
+import re
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.ttl_cache import TTLCache
+from app.repositories.provider_web_search_repository import ProviderWebSearchRepository, provider_web_search_repository
+from app.services.provider_directory import normalize_provider_name
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_text(value: Optional[str]) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (value or "").lower()))
+
+
+def web_search_key(provider_name: str, city: Optional[str] = None, state: Optional[str] = None, specialty: Optional[str] = None) -> str:
+    """Cache key for a provider web search - titles, case and punctuation are ignored"""
+    return "|".join([
+        normalize_provider_name(provider_name),
+        _normalize_text(city),
+        _normalize_text(state),
+        _normalize_text(specialty)
+    ])
+
+
+def _seconds_until(timestamp: Any) -> float:
+    """Seconds from now until a stored (UTC) timestamp"""
+    moment = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - datetime.utcnow()).total_seconds()
+
+
+@dataclass
+class ProviderWebSearchCacheStats:
+    """Hit/miss counters for the provider web search cache"""
+    memory_hits: int = 0
+    store_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    errors: int = 0  # store reads/writes that failed (treated as misses)
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.memory_hits + self.store_hits + self.misses
+        stats["hit_ratio"] = round((self.memory_hits + self.store_hits) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class ProviderWebSearchCache:
+    """
+    TTL-bounded cache of web search answers keyed by web_search_key
+
+    Lookups check a small in-process LRU first, then the Supabase table; store
+    failures are logged and treated as misses so a search is never blocked on the
+    cache. Only successful answers are cached - failures are retried next time.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        repository: Optional[ProviderWebSearchRepository] = None,
+        max_memory_entries: int = 200
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.repository = repository or provider_web_search_repository
+        self._memory: TTLCache[str, str] = TTLCache(ttl_seconds, max_memory_entries)
+        self.stats = ProviderWebSearchCacheStats()
+
+    async def get(self, provider_name: str, city: Optional[str] = None, state: Optional[str] = None, specialty: Optional[str] = None) -> Optional[str]:
+        """Cached search content, or None"""
+        key = web_search_key(provider_name, city, state, specialty)
+        content = self._memory.get(key)
+        if content is not None:
+            self.stats.memory_hits += 1
+            return content
+
+        try:
+            row = await self.repository.get_unexpired(key)
+        except Exception as e:
+            logger.warning("Web search cache lookup failed for %s: %s", key, e)
+            self.stats.errors += 1
+            row = None
+
+        if not row:
+            self.stats.misses += 1
+            return None
+
+        # The in-process copy expires with the stored row, not a fresh TTL
+        self._memory.put(key, row["content"], ttl_seconds=max(_seconds_until(row["expires_at"]), 0.0))
+        self.stats.store_hits += 1
+        return row["content"]
+
+    async def put(self, provider_name: str, content: str, city: Optional[str] = None, state: Optional[str] = None, specialty: Optional[str] = None) -> None:
+        """Cache a successful search for ttl_seconds"""
+        key = web_search_key(provider_name, city, state, specialty)
+        self._memory.put(key, content)
+        now = datetime.utcnow()
+        try:
+            await self.repository.save({
+                "cache_key": key,
+                "provider_name": provider_name,
+                "city": city,
+                "state": state,
+                "specialty": specialty,
+                "content": content,
+                "created_at": now.isoformat(),
+                "expires_at": (now + timedelta(seconds=self.ttl_seconds)).isoformat()
+            })
+            self.stats.writes += 1
+        except Exception as e:
+            logger.warning("Could not persist web search for %s: %s", key, e)
+            self.stats.errors += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache counters and in-process size"""
+        stats = self.stats.as_dict()
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+# Global provider web search cache
+provider_web_search_cache = ProviderWebSearchCache(ttl_seconds=get_settings().provider_web_search_cache_ttl)
@@ -3,18 +3,32 @@ Pydantic AI-based intake agent for intelligent conversation management
 Replaces LangChain with type-safe, structured data collection
 """
 
+import json
 import logging
-from typing import Dict, Any, List, Optional, Union
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Union
 from datetime import datetime
 import httpx
 
 from pydantic import BaseModel, Field
+from pydantic_core import from_json
 from pydantic_ai import Agent # type: ignore
+from pydantic_ai.messages import ModelResponse, ToolCallPart
 from pydantic_ai.models.openai import OpenAIModel
 
 from app.core.config import get_settings
 from app.core.token_manager import get_charm_api_headers
-from app.models.intake_schemas import IntakeSession, IntakeDemographics, IntakeWeightHistory, IntakeMedicalHistory
+from app.core.http_client import get_charm_http_client
+from app.core.metrics import metrics, timed
+from app.core.log_pipeline import PHI, Payload
+from app.models.intake_schemas import IntakeSession
+from app.services.schema_registry import schema_registry
+from app.services.field_grouping import field_grouping_index
+from app.services.provider_search_cache import provider_search_cache
+from app.services.provider_directory import provider_directory
+from app.services.provider_web_search_cache import provider_web_search_cache
+from app.services.payer_directory import payer_directory
+from app.services.prompt_compiler import CONVERSATION_SYSTEM, CONVERSATION_TURN_FRAGMENTS, prompt_compiler
 from app.repositories.intake_repository import intake_repository
 
 logger = logging.getLogger(__name__)
@@ -22,252 +36,31 @@ logger = logging.getLogger(__name__)
 
 def _get_pydantic_schema_info(section_name: str) -> str:
     """
-    Dynamically extract schema information from Pydantic models
+    Get the precompiled schema description for a section
     """
-    # Map section names to their corresponding Pydantic models
-    section_model_map = {
-        "intake_demographics": IntakeDemographics,
-        "intake_weight_history": IntakeWeightHistory,
-        "intake_medical_history": IntakeMedicalHistory
-    }
-    
-    model_class = section_model_map.get(section_name)
-    if not model_class:
-        return f"Unknown section: {section_name}"
-    
-    # Get the model's JSON schema
-    schema = model_class.model_json_schema()
-    
-    # Extract field information in a readable format
-    schema_info = f"Schema for {section_name}:\n"
-    required_fields = schema.get("required", [])
-    schema_info += _format_schema_properties(schema.get("properties", {}), required_fields, indent=0)
-    
-    return schema_info
-
-
-def _format_schema_properties(properties: dict, required_fields: list = None, indent: int = 0) -> str: # type: ignore
-    """
-    Format schema properties into a readable structure for the AI agent
-    """
-    formatted = ""
-    indent_str = "  " * indent
-    required_fields = required_fields or []
-    
-    for field_name, field_info in properties.items():
-        # Skip system fields
-        if field_name in ["isComplete"]:
-            continue
-            
-        field_type = field_info.get("type", "unknown")
-        description = field_info.get("description", "")
-        
-        # Check if field is required
-        is_required = field_name in required_fields
-        required_marker = " (REQUIRED)" if is_required else " (optional)"
-        
-        # Handle different field types
-        if field_type == "object":
-            # Nested object - recurse into properties
-            formatted += f"{indent_str}{field_name} (object){required_marker}:\n"
-            nested_props = field_info.get("properties", {})
-            nested_required = field_info.get("required", [])
-            formatted += _format_schema_properties(nested_props, nested_required, indent + 1)
-        elif field_type == "array":
-            # Array field
-            items = field_info.get("items", {})
-            if "properties" in items:
-                # Array of objects
-                formatted += f"{indent_str}{field_name} (array of objects){required_marker}:\n"
-                array_props = items.get("properties", {})
-                array_required = items.get("required", [])
-                formatted += _format_schema_properties(array_props, array_required, indent + 1)
-            else:
-                items_type = items.get("type", "unknown")
-                formatted += f"{indent_str}{field_name} (array of {items_type}){required_marker}\n"
-        else:
-            # Simple field
-            formatted += f"{indent_str}{field_name} ({field_type}){required_marker}\n"
-        
-        # Add description with AI Agent instructions
-        if description:
-            if "AI Agent:" in description:
-                ai_instruction = description.split("AI Agent:")[-1].strip()
-                formatted += f"{indent_str}  → {ai_instruction}\n"
-            
-    return formatted
+    return schema_registry.schema_info(section_name)
 
 
 def _get_all_field_paths(section_name: str) -> List[str]:
     """
     Get all possible field paths for a section (including nested fields)
     """
-    section_model_map = {
-        "intake_demographics": IntakeDemographics,
-        "intake_weight_history": IntakeWeightHistory,
-        "intake_medical_history": IntakeMedicalHistory
-    }
-    
-    model_class = section_model_map.get(section_name)
-    if not model_class:
-        return []
-    
-    schema = model_class.model_json_schema()
-    return _extract_field_paths(schema.get("properties", {}), "", schema)
+    return schema_registry.field_paths(section_name)
 
 
 def _get_field_question_groups(section_name: str) -> Dict[int, List[str]]:
     """
-    Load question groups from field_grouping.json configuration file
+    Get question groups from the field_grouping.json index
     Returns a dictionary mapping group numbers to lists of field paths
     """
-    import json
-    import os
-    
-    # Load configuration from JSON file
-    config_path = os.path.join(os.path.dirname(__file__), '../models/field_grouping.json')
-    
-    try:
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-    except FileNotFoundError:
-        logger.warning(f"field_grouping.json not found at {config_path}")
-        return {}
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in field_grouping.json")
-        return {}
-    
-    # Extract groups for the specified section
-    groups = {}
-    section_config = config.get(section_name, {})
-    
-    for group in section_config.get("groups", []):
-        group_id = group["group_id"]
-        fields = [field_info["field"] for field_info in group["fields"]]
-        groups[group_id] = fields
-    
-    return groups
+    return field_grouping_index.get_groups(section_name)
 
 
 def _get_next_question_group_fields(unasked_fields: List[str], section_name: str) -> List[str]:
     """
     Get the fields for the next question group to ask about
     """
-    question_groups = _get_field_question_groups(section_name)
-    
-    if not question_groups:
-        # Fallback to single field if no groups defined
-        return [unasked_fields[0]] if unasked_fields else []
-    
-    # Find the lowest numbered group that has unasked fields
-    for group_num in sorted(question_groups.keys()):
-        group_fields = question_groups[group_num]
-        group_unasked = [field for field in group_fields if field in unasked_fields]
-        
-        if group_unasked:
-            return group_unasked
-    
-    # No groups with unasked fields found
-    return []
-
-
-def _extract_field_paths(properties: dict, prefix: str = "", schema: dict = None) -> List[str]: # type: ignore
-    """
-    Recursively extract all field paths from schema properties
-    """
-    paths = []
-    
-    for field_name, field_info in properties.items():
-        # Skip system fields
-        if field_name in ["isComplete"]:
-            continue
-            
-        current_path = f"{prefix}.{field_name}" if prefix else field_name
-        
-        # Handle $ref references
-        if "$ref" in field_info:
-            ref_path = field_info["$ref"]
-            if ref_path.startswith("#/$defs/") and schema:
-                def_name = ref_path.split("/")[-1]
-                ref_definition = schema.get("$defs", {}).get(def_name, {})
-                if ref_definition.get("type") == "object" and "properties" in ref_definition:
-                    # Recursively extract from referenced definition
-                    nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
-                    paths.extend(nested_paths)
-                else:
-                    # Simple referenced type, add as field
-                    paths.append(current_path)
-            else:
-                # Unknown reference, treat as simple field
-                paths.append(current_path)
-        elif "anyOf" in field_info:
-            # Handle anyOf (like nullable fields)
-            for any_option in field_info["anyOf"]:
-                if "$ref" in any_option:
-                    ref_path = any_option["$ref"]
-                    if ref_path.startswith("#/$defs/") and schema:
-                        def_name = ref_path.split("/")[-1]
-                        ref_definition = schema.get("$defs", {}).get(def_name, {})
-                        if ref_definition.get("type") == "object" and "properties" in ref_definition:
-                            # Recursively extract from referenced definition
-                            nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
-                            paths.extend(nested_paths)
-                            break
-                elif any_option.get("type") == "array" and "items" in any_option:
-                    items = any_option["items"]
-                    if "$ref" in items:
-                        ref_path = items["$ref"]
-                        if ref_path.startswith("#/$defs/") and schema:
-                            def_name = ref_path.split("/")[-1]
-                            ref_definition = schema.get("$defs", {}).get(def_name, {})
-                            if ref_definition.get("type") == "object" and "properties" in ref_definition:
-                                # Array of objects - extract nested paths
-                                nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
-                                paths.extend(nested_paths)
-                                break
-            else:
-                # No object found in anyOf, treat as simple field
-                paths.append(current_path)
-        else:
-            field_type = field_info.get("type", "unknown")
-            
-            if field_type == "object":
-                # Don't add the object itself, only its nested fields
-                nested_props = field_info.get("properties", {})
-                if nested_props:
-                    nested_paths = _extract_field_paths(nested_props, current_path, schema)
-                    paths.extend(nested_paths)
-                else:
-                    # If object has no properties, treat it as a simple field
-                    paths.append(current_path)
-            elif field_type == "array":
-                # Check if array of objects with properties
-                items = field_info.get("items", {})
-                if "properties" in items:
-                    nested_paths = _extract_field_paths(items["properties"], current_path, schema)
-                    paths.extend(nested_paths)
-                elif "$ref" in items:
-                    ref_path = items["$ref"]
-                    if ref_path.startswith("#/$defs/") and schema:
-                        def_name = ref_path.split("/")[-1]
-                        ref_definition = schema.get("$defs", {}).get(def_name, {})
-                        if ref_definition.get("type") == "object" and "properties" in ref_definition:
-                            # Array of objects - extract nested paths
-                            nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
-                            paths.extend(nested_paths)
-                        else:
-                            # Simple array, add as field
-                            paths.append(current_path)
-                    else:
-                        paths.append(current_path)
-                else:
-                    # Simple array, add as field
-                    paths.append(current_path)
-            else:
-                # Simple field
-                paths.append(current_path)
-    
-    return paths
+    return field_grouping_index.next_group_fields(unasked_fields, section_name)
 
 
 def _initialize_unasked_fields(section_name: str, existing_data: Dict[str, Any] = None) -> List[str]: # type: ignore
@@ -282,8 +75,8 @@ def _initialize_unasked_fields(section_name: str, existing_data: Dict[str, Any]
     unasked_fields = [field for field in all_field_paths if "isComplete" not in field]
     
     # Debug logging to understand field generation
-    logger.info(f"Schema field paths for {section_name}: {sorted(all_field_paths)}")
-    logger.info(f"After removing system fields: {sorted(unasked_fields)}")
+    logger.debug("Schema field paths for %s: %s", section_name, Payload(all_field_paths))
+    logger.debug("After removing system fields: %s", Payload(unasked_fields))
     
     # Remove fields that already have data from EHR
     if existing_data:
@@ -291,15 +84,15 @@ def _initialize_unasked_fields(section_name: str, existing_data: Dict[str, Any]
         fields_to_remove = []
         for field in unasked_fields:
             has_data = _field_has_data(existing_data, field)
-            logger.info(f"Field '{field}': has_data={has_data}")
+            logger.debug("Field '%s': has_data=%s", field, has_data)
             if has_data:
                 fields_to_remove.append(field)
         
-        logger.info(f"Removing fields with data: {fields_to_remove}")
+        logger.debug("Removing fields with data: %s", fields_to_remove)
         unasked_fields = [field for field in unasked_fields 
                          if not _field_has_data(existing_data, field)]
     
-    logger.info(f"Final unasked_fields for {section_name}: {sorted(unasked_fields)}")
+    logger.debug("Final unasked_fields for %s: %s", section_name, Payload(unasked_fields))
     return unasked_fields
 
 
@@ -314,7 +107,7 @@ def _check_for_empty_fields(section_name: str, section_data: Dict[str, Any]) ->
         if "isComplete" not in field_path and not _field_has_data(section_data, field_path):
             empty_fields.append(field_path)
     
-    logger.info(f"Empty fields found in {section_name}: {sorted(empty_fields)}")
+    logger.debug("Empty fields found in %s: %s", section_name, Payload(empty_fields))
     return empty_fields
 
 
@@ -327,7 +120,7 @@ def _update_tracking_for_completeness(tracking_data: Dict[str, Any], section_nam
     # Check if section should be marked complete (when no unasked fields remain)
     if len(unasked_fields) == 0:
         tracking_data["isComplete"] = True
-        logger.info(f"Marked {section_name} as complete - all fields have been asked")
+        logger.info("Marked %s as complete - all fields have been asked", section_name)
     else:
         tracking_data["isComplete"] = False
     
@@ -526,6 +319,9 @@ class IntakeContext(BaseModel):
     patient_data: Optional[Dict[str, Any]] = None
     intake_data: Dict[str, Any] = Field(default_factory=dict)
     conversation_history: List[Dict[str, str]] = Field(default_factory=list)
+    # Rolling summary of messages older than conversation_history, and the chat history ids of those messages
+    conversation_summary: str = ""
+    conversation_message_ids: List[int] = Field(default_factory=list)
 
 
 # Tool functions for the conversation agent
@@ -540,9 +336,16 @@ async def search_providers(provider_name: str, phone: str = None, practice_name:
         specialty: Provider's specialty (optional)
     
     Returns:
-        List of matching providers from Charm API
+        List of matching providers, best match first
     """
     try:
+        # The local directory mirror tolerates typos, partial names and formatting
+        if provider_directory.is_ready:
+            providers = provider_directory.search(provider_name, phone=phone, practice_name=practice_name, specialty=specialty)
+            if providers:
+                logger.info("Found %s providers in the local directory index", len(providers))
+                return providers
+        
         settings = get_settings()
         headers = await get_charm_api_headers()
         
@@ -569,34 +372,47 @@ async def search_providers(provider_name: str, phone: str = None, practice_name:
         if specialty:
             params["speciality"] = specialty
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.charm_api_base_url}/settings/directory/providers",
-                params=params,
-                headers=headers,
-                timeout=30.0
-            )
-
-            print (f"Here's the search response: {response.text}")
+        cached_providers = provider_search_cache.get(params)
+        if cached_providers is not None:
+            logger.info("Found %s cached providers matching search criteria", len(cached_providers))
+            return cached_providers
+        
+        charm_http = get_charm_http_client()
+        client = charm_http.client
+        response = await client.get(
+            f"{settings.charm_api_base_url}/settings/directory/providers",
+            params=params,
+            headers=headers,
+            timeout=charm_http.timeout("search")
+        )
 
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "0":
-                    providers = data.get("providers", [])
-                    logger.info(f"Found {len(providers)} providers matching search criteria")
-                    return providers
-                else:
-                    logger.warning(f"Provider search returned non-zero code: {data}")
-                    return []
+        logger.debug("Provider search response: %s", Payload(response))
+
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("code") == "0":
+                providers = data.get("providers", [])
+                logger.info("Found %s providers matching search criteria", len(providers))
+                provider_search_cache.put(params, providers)
+                # Charm found what the index missed (e.g. added since the last sync)
+                await provider_directory.add_many(providers)
+                return providers
             else:
-                logger.error(f"Provider search failed: {response.status_code} - {response.text}")
+                logger.warning("Provider search returned non-zero code: %s", data)
                 return []
-                
+        else:
+            logger.error("Provider search failed: %s - %s", response.status_code, response.text)
+            return []
+            
     except Exception as e:
-        logger.error(f"Error searching providers: {e}")
+        logger.error("Error searching providers: %s", e)
         return []
 
 
+def _format_web_search_result(provider_name: str, content: str) -> str:
+    return f"Web search results for {provider_name}:\n\n{content}\n\nPlease verify this information with the patient before adding to their care team."
+
+
 async def web_search_provider(provider_name: str, city: str = None, state: str = None, specialty: str = None) -> str: # type: ignore
     """
     Search the web for provider information using Perplexity API
@@ -611,6 +427,12 @@ async def web_search_provider(provider_name: str, city: str = None, state: str =
         String summary of web search results
     """
     try:
+        # Another session may already have searched for this provider
+        cached_content = await provider_web_search_cache.get(provider_name, city, state, specialty)
+        if cached_content:
+            logger.info("Using cached web search for %s", provider_name)
+            return _format_web_search_result(provider_name, cached_content)
+        
         settings = get_settings()
         perplexity_api_key = settings.get_perplexity_api_key()
         
@@ -658,16 +480,17 @@ async def web_search_provider(provider_name: str, city: str = None, state: str =
                 content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
                 
                 if content:
-                    logger.info(f"Web search completed for {provider_name}")
-                    return f"Web search results for {provider_name}:\n\n{content}\n\nPlease verify this information with the patient before adding to their care team."
+                    logger.info("Web search completed for %s", provider_name)
+                    await provider_web_search_cache.put(provider_name, content, city, state, specialty)
+                    return _format_web_search_result(provider_name, content)
                 else:
                     return f"Web search completed but no detailed information found for {provider_name}. Please gather provider information manually."
             else:
-                logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
+                logger.error("Perplexity API error: %s - %s", response.status_code, response.text)
                 return f"Web search failed for {provider_name}. Please gather provider information manually."
         
     except Exception as e:
-        logger.error(f"Error in web search: {e}")
+        logger.error("Error in web search: %s", e)
         return f"Unable to perform web search for {provider_name}. Please gather provider information manually."
 
 
@@ -689,37 +512,61 @@ async def add_provider_to_charm(provider_data: Dict[str, Any]) -> Dict[str, Any]
         if not provider_data.get("first_name") or not provider_data.get("last_name"):
             return {"success": False, "error": "First name and last name are required"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.charm_api_base_url}/settings/directory/providers",
-                json=provider_data,
-                headers=headers,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "0":
-                    provider_details = data.get("provider_details", {})
-                    provider_id = provider_details.get("provider_id")
-                    logger.info(f"Successfully added provider with ID: {provider_id}")
-                    return {
-                        "success": True,
-                        "provider_id": provider_id,
-                        "provider_details": provider_details
-                    }
-                else:
-                    logger.error(f"Add provider returned non-zero code: {data}")
-                    return {"success": False, "error": f"API error: {data.get('message', 'Unknown error')}"}
+        charm_http = get_charm_http_client()
+        client = charm_http.client
+        response = await client.post(
+            f"{settings.charm_api_base_url}/settings/directory/providers",
+            json=provider_data,
+            headers=headers,
+            timeout=charm_http.timeout("write")
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("code") == "0":
+                provider_details = data.get("provider_details", {})
+                provider_id = provider_details.get("provider_id")
+                logger.info("Successfully added provider with ID: %s", provider_id)
+                # Earlier searches (including empty ones) may now match the new provider
+                provider_search_cache.invalidate()
+                await provider_directory.add({**provider_data, **provider_details})
+                return {
+                    "success": True,
+                    "provider_id": provider_id,
+                    "provider_details": provider_details
+                }
             else:
-                logger.error(f"Add provider failed: {response.status_code} - {response.text}")
-                return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
-                
+                logger.error("Add provider returned non-zero code: %s", data)
+                return {"success": False, "error": f"API error: {data.get('message', 'Unknown error')}"}
+        else:
+            logger.error("Add provider failed: %s - %s", response.status_code, response.text)
+            return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+            
     except Exception as e:
-        logger.error(f"Error adding provider: {e}")
+        logger.error("Error adding provider: %s", e)
         return {"success": False, "error": str(e)}
 
 
+async def search_payers(insurer_name: str) -> List[Dict[str, Any]]:
+    """
+    Match an insurance company name (or payer ID) against Charm's payer list
+    
+    Args:
+        insurer_name: Insurer as the patient said it, e.g. "BCBS", "United Healthcare", "Aetna"
+    
+    Returns:
+        Matching payers, best match first, each with practice_payer_id, payer_name and match_score
+    """
+    try:
+        await payer_directory.ensure_loaded()
+        payers = payer_directory.search(insurer_name)
+        logger.info("Found %s payers matching %s", len(payers), PHI(insurer_name))
+        return payers
+    except Exception as e:
+        logger.error("Error searching payers: %s", e)
+        return []
+
+
 async def complete_intake_session(session_id: str, rating: int, comments: str = None) -> Dict[str, Any]: # type: ignore
     """
     Complete the intake session with rating and comments
@@ -741,20 +588,39 @@ async def complete_intake_session(session_id: str, rating: int, comments: str =
         success = await intake_repository.complete_session(session_id, rating, comments)
         
         if success:
-            logger.info(f"Successfully completed session {session_id} with rating {rating}")
+            logger.info("Successfully completed session %s with rating %s", session_id, rating)
             return {
                 "success": True,
                 "message": f"Thank you for your feedback! You rated your experience {rating}/5 stars."
             }
         else:
-            logger.error(f"Failed to complete session {session_id}")
+            logger.error("Failed to complete session %s", session_id)
             return {"success": False, "error": "Failed to save completion data"}
             
     except Exception as e:
-        logger.error(f"Error completing session {session_id}: {e}")
+        logger.error("Error completing session %s: %s", session_id, e)
         return {"success": False, "error": str(e)}
 
 
+def _partial_response_text(structured_message: ModelResponse) -> str:
+    """
+    Extract the `response` text generated so far from a partially streamed structured output
+    The output arrives as tool-call JSON, so parse it leniently and allow a truncated trailing string
+    """
+    for part in structured_message.parts:
+        if not isinstance(part, ToolCallPart) or not part.args:
+            continue
+        args = part.args
+        if isinstance(args, str):
+            try:
+                args = from_json(args, allow_partial="trailing-strings")
+            except ValueError:
+                continue
+        if isinstance(args, dict) and isinstance(args.get("response"), str):
+            return args["response"]
+    return ""
+
+
 class PydanticIntakeAgent:
     """
     Pydantic AI agent for managing patient intake conversations
@@ -837,208 +703,25 @@ Follow these rules exactly. Always emit only the two-key JSON—no extra text.
             """
         )
         
+        # Rolling conversation summary agent (folds older turns into a bounded summary)
+        self.summary_agent = Agent(
+            self.model,
+            system_prompt="""
+            You maintain a running summary of a medical intake conversation.
+            You are given the current summary and the messages that follow it.
+            Return an updated summary that keeps every fact the patient provided, corrections
+            they made, questions still open, and providers or tools already discussed.
+            Drop greetings and filler. Write plain sentences, at most 150 words, no preamble.
+            """
+        )
+        
         # Main conversation agent with tools
+        self.conversation_system_prompt = prompt_compiler.compile("conversation.system", [CONVERSATION_SYSTEM.name], record=False)
         self.conversation_agent = Agent(
             self.model,
             result_type=IntakeAgentResponse,
-            system_prompt="""
-            You are a friendly, empathetic medical-intake assistant.  
-Use firstName only. Ask related questions together using bullet points for efficiency.
-Ask 2-3 related questions from the same group to streamline the conversation.
-
-Schema:
-intake_demographics: {
-  firstName, middleName?, lastName,
-  email, mobilePhone, homePhone?, workPhone?,
-  address: { addressLine1, city, state, zipCode, country="us" },
-  emergencyContact: { name, relationship, phone },
-  careTeamProviders: [ { providerName, phone?, practiceName?, specialty?, relationshipType?, isPrimaryCarePhysician? } ]
-}
-intake_weight_history: {
-  currentHeight, currentWeight,
-  maxWeight, ageAtMaxWeight,
-  largestDietWeightLoss,
-  dietHistory: [ { dietName, startDate?, endDate?, challenges? } ],
-  mealPatterns, weightFactors, familyObesityHistory,
-  exercise, treatmentPreferences,
-  bariatricSurgeryHistory, glp1History
-}
-intake_medical_history: {
-  medications: [ { name, dosage, frequency } ],
-  allergies,
-  diagnosedConditions,
-  socialHistory: { smoking?, alcohol?, otherSubstances? },
-  familyMedicalHistory,
-  surgicalHistory: [ { procedureName, approximateYear } ]
-}
-
-CRITICAL:
-- On every turn, load the prior `updated_data` state.
-- Parse the user message and merge any newly provided values into that state.
-- Always return the **entire** `updated_data` object (including previously collected fields) before asking your next question.
-- If the user corrects or references past data (“you forgot X”), re-emit that field in `updated_data` to confirm it’s saved.
-
-Loop (per turn):
-1. Identify the next group of missing fields in `current_section`.
-2. Ask 2-3 related questions from that group using bullet points.
-3. If section complete → respond "✅ {section} complete. Moving to {next_section}."
-4. Repeat until all sections done; then ask for star rating + comments.
-
-Provider sub-flow:
-1. Ask “What’s your provider’s name?” → call `search_providers(name)`
-2. If matches → present list & confirm → store `provider_id` → ask “Any more providers?”
-3. Else ask “What’s their phone?” → `search_providers(name, phone)` → confirm or…
-4. Else ask “Practice name?” → `search_providers(name, phone, practiceName)` or fallback to `web_search_provider` → confirm → `add_provider_to_charm`
-
-Tools:
-search_providers, web_search_provider, add_provider_to_charm, complete_intake_session
-
-Response format (JSON):
-```json
-{
-  "response": "...?",
-  "current_section": "...",
-  "updated_data": { /* full state with all collected fields */ },
-  "agent_actions": [ /* e.g. "extracted_address", "merged_state" */ ]
-}
-
-
-            # You are a friendly, professional medical intake assistant for Pound of Cure Weight Loss clinic.
-            
-            # Your role is to:
-            # 1. Guide patients through their intake form completion
-            # 2. Ask relevant follow-up questions for missing information
-            # 3. Confirm and validate information provided
-            # 4. Extract and structure data from user responses
-            # 5. Maintain a conversational, empathetic tone, addressing the user by their first name (first_name), do not address the user by their middle name.
-            # 6. Be sure to end any message with a question to keep the conversation going
-            # 7. Handle care team provider searches and additions using available tools
-            
-            # CRITICAL: When users provide information, you MUST extract it and return it in the updated_data field.
-            # YOU MUST ALWAYS EXTRACT DATA FROM USER RESPONSES. DO NOT IGNORE ANY PROVIDED INFORMATION.
-            
-            # Current intake sections (insurance is temporarily disabled):
-            # - intake_demographics: Basic patient information (contact info, address, emergency contact, care team providers)
-            # - intake_weight_history: Weight and diet history
-            # - intake_medical_history: Medical conditions, medications, allergies
-            
-            # CARE TEAM PROVIDER WORKFLOW:
-            # When collecting care team provider information, follow this progressive search approach:
-            
-            # 1. **Start with name only**: Ask "What is your provider's name?" 
-            # 2. **Search by name**: Use search_providers tool with just the provider name
-            # 3. **If results found**: Present them to user for confirmation
-            # 4. **If no suitable results**: Ask "What is their phone number?" and search again with name + phone
-            # 5. **If still no suitable results**: Ask "What is the name of their practice or clinic?" and search with name + phone + practice
-            # 6. **If still no suitable results**: Use web_search_provider tool with all available information
-            # 7. **Present web search results**: Show findings to user and ask for confirmation
-            # 8. **If user confirms**: Use add_provider_to_charm tool to add the new provider
-            # 9. **Store provider_id**: Save the provider_id in careTeamProviders data
-            # 10. **Ask for more**: "Do you have any other healthcare providers you'd like to add?"
-            
-            # IMPORTANT SEARCH STRATEGY:
-            # - Always search with minimal information first (just name)
-            # - Only ask for additional details if no suitable matches are found
-            # - Present ANY found providers to the user for confirmation before asking for more details
-            # - Use progressive disclosure - don't overwhelm the user with multiple questions at once
-            # - When presenting search results, show provider name, practice, specialty, and location if available
-            
-            # Available Tools:
-            # - search_providers(provider_name, phone=None, practice_name=None, specialty=None): Search existing providers
-            # - web_search_provider(provider_name, city=None, state=None, specialty=None): Web search for provider info
-            # - add_provider_to_charm(provider_data): Add new provider to Charm directory
-            # - complete_intake_session(session_id, rating, comments=None): Complete the session with rating and comments
-            
-            # Data Extraction Rules:
-            # - When user provides address information, parse it into addressLine1, city, state, zipCode
-            # - Example: "3010 E Camino Juan Paisano, Tucson AZ 85718" becomes:
-            #   addressLine1: "3010 E Camino Juan Paisano", city: "Tucson", state: "AZ", zipCode: "85718"
-            # - When user provides phone numbers, extract mobile, home, work
-            # - When user provides emergency contact info, extract name, phone, relationship
-            # - For care team providers: extract providerName, phone, practiceName, specialty, relationshipType, isPrimaryCarePhysician
-            # - Always set country to "us" unless ZIP code suggests international format
-            # - Return ALL extracted data in the updated_data field with proper nesting
-            # - When storing data in the schema, convert any statements into third person
-            
-            # Response Structure:
-            # - response: Your conversational message to the user
-            # - current_section: The current intake section being worked on
-            # - updated_data: MUST contain any data extracted from user's message, properly nested
-            # - agent_actions: List actions taken (e.g., "extracted_address", "searched_provider", "added_provider")
-            
-            # CONVERSATION STRATEGY - GROUPED QUESTIONS:
-            
-            # DEMOGRAPHICS (ask related fields together):
-            # Group 2 - Contact Info: "I need your contact information:
-            #   • What's your email address?
-            #   • What's your mobile phone number?
-            #   • Do you have a work or home phone number?"
-            # Group 3 - Address: "Now I need your home address:
-            #   • What's your street address?
-            #   • What city and state do you live in?
-            #   • What's your ZIP code?"
-            # Group 4 - Emergency Contact: "For emergency contact information:
-            #   • Who should we contact in an emergency?
-            #   • What's their phone number?
-            #   • What's their relationship to you?"
-            
-            # WEIGHT HISTORY:
-            # - Vitals: "What's your current height and weight?"
-            # - Weight History: "What's the most you've ever weighed, at what age?"
-            # - Weight Loss History: "What's the most weight you've lost through dieting? In the last few years, what diets have you tried and what struggles have you faced?"
-            # - Diet Patterns: "What do you typically eat for breakfast, lunch, and dinner? What about beverages and snacks throughout the day?"
-            # - Weight Factors: "Have medications, injuries, or stress contributed to your weight gain? Tell me about any factors that have affected your weight."
-            # - Obesity Family History: "Does anyone in your family have a history of obesity? Which side of the family?"
-            # - Weight Factors - Female, only ask if female gender, "Has pregnancy or menopause affected your weight?"
-            # - Exercise: "What types of exercise do you currently do? How often?"
-            # - Treatment Preferences: "What treatment approach are you most interested in? Do you prefer medication, lifestyle changes or Bariatric Surgery, or a combination?"
-            # - Bariatric Surgery: "Have you had any bariatric surgery in the past? If so, what type and when?"
-            # - GLP-1 Medications: "Have you tried any GLP-1 medications like semaglutide or tirzepatide? If so, which ones and when?"
-            # - GLP-1 Medications detailed if they have tried in the past: "What was the highest dose you took? How long did you take it? Did you experience any side effects? How much weight did you lose?"
-
-            # MEDICAL HISTORY:
-            # - Medications & Allergies: "What medications are you currently taking? Please include names, dosages, and directions. Also, do you have any allergies to medications or foods?"
-            # - Medical Conditions: "What medical conditions have you been diagnosed with? This includes both general conditions and any weight-related health issues."
-            # - Are there any other medical conditions that you have been diagnosed with that are related to your weight like diabetes, high blood pressure, sleep apnea, high cholesterol? Others?"
-            # - Social History: "Tell me about your smoking history, have you ever smoked? Do you currently smoke?"
-            # - Alcohol Use: "How much alcohol do you drink in an average week? Do you use Marijuana?"
-            # - Illegal Drug Use: "Do you have any history of illegal drug use? When was the last time you used?"
-            # - Family History: "What medical conditions run in your family? 
-            # - Surgical History: "Have you had any surgeries in the past? Make sure to include all abdominal surgeries. List them and give the approximate year they were performed."
-
-            
-            # EXTRACTION STRATEGY:
-            # - Always extract ALL information provided in a response, even if not directly asked
-            # - If user provides address as "123 Main St, Phoenix AZ 85001", extract: addressLine1, city, state, zipCode
-            # - If user says "My PCP is Dr. Smith at Phoenix Medical", extract: providerName, practiceName, relationshipType
-            # - Parse comprehensive responses and populate multiple fields simultaneously
-            # - Don't ask for information already provided in previous responses
-            # - If there is significant ambiguity, ask clarifying questions to ensure accuracy
-            
-            # Guidelines:
-            # - Ask 2-3 related questions from the same group using bullet points
-            # - Extract every piece of information from user responses
-            # - Be specific about what information you need
-            # - Move through question groups systematically
-            # - When a section is complete, acknowledge completion and transition to the next section
-            # - Use natural, conversational language
-            # - Show empathy for sensitive topics (weight, medical conditions)
-            # - Focus on the next group of related fields in the current section
-            # - If you detect that all required fields in a section are complete, mention this to the user
-            # - For addresses: assume US location, set country to "us" automatically
-            # - Only ask about country if ZIP/postal code contains letters or unusual format suggesting international address
-            # - When all fields are complete, make sure to collect a star rating (1-5) rating their experience with the intake process compared to traditional doctor's office forms and any comments about the process they have.
-            
-            # CARE TEAM PROVIDER SPECIFIC GUIDELINES:
-            # - Start with ONLY the provider name - don't ask for phone/practice initially
-            # - Search immediately after getting the name - don't wait to collect more info
-            # - If search returns results, present them clearly: "I found these providers in our directory: [list with name, practice, specialty]. Is one of these your provider?"
-            # - Only ask for phone number if name search returns no suitable matches
-            # - Only ask for practice name if name + phone search returns no suitable matches
-            # - Always confirm provider details with the user before adding to avoid mistakes
-            # - Use progressive disclosure - reveal search strategy step by step, don't explain the whole process upfront
-            """,
-            tools=[search_providers, web_search_provider, add_provider_to_charm] # type: ignore
+            system_prompt=self.conversation_system_prompt.text,
+            tools=[search_providers, web_search_provider, add_provider_to_charm, search_payers] # type: ignore
         )
     
     async def extract_identity(self, message: str, conversation_history: List[Dict[str, str]] = None) -> IdentityExtraction: # type: ignore
@@ -1053,10 +736,12 @@ Response format (JSON):
                     content = entry.get("content", "")
                     context += f"{role}: {content}\n"
             
-            result = await self.identity_agent.run(context)
+            # Timed inside the try so failed runs count as errors, not latencies
+            with metrics.timer("agent.identity"):
+                result = await self.identity_agent.run(context)
             return result.data
         except Exception as e:
-            logger.error(f"Error extracting identity: {e}")
+            logger.error("Error extracting identity: %s", e)
             return IdentityExtraction(
                 last_name="",
                 date_of_birth="",
@@ -1072,131 +757,156 @@ Response format (JSON):
             
             Extract any demographic information updates from the user's message.
             """
-            result = await self.demographics_agent.run(prompt)
+            with metrics.timer("agent.demographics"):
+                result = await self.demographics_agent.run(prompt)
             return result.data
         except Exception as e:
-            logger.error(f"Error processing demographics update: {e}")
+            logger.error("Error processing demographics update: %s", e)
             return DemographicsUpdate(
                 field_name="",
                 new_value=""
             )
     
+    def _build_conversation_prompt(self, message: str, context: IntakeContext) -> str:
+        """Build the conversation agent prompt for the current turn"""
+        # Build conversation prompt with context
+        current_data = context.intake_data.get(context.current_section, {})
+        tracking_key = f"{context.current_section}_tracking"
+        tracking_data = context.intake_data.get(tracking_key, {})
+        
+        # Initialize tracking data if not present
+        if "unasked_fields" not in tracking_data:
+            tracking_data["unasked_fields"] = _initialize_unasked_fields(context.current_section, current_data)
+        if "isComplete" not in tracking_data:
+            tracking_data["isComplete"] = False
+        if "pushed_to_charm" not in tracking_data:
+            tracking_data["pushed_to_charm"] = False
+        
+        unasked_fields = tracking_data.get("unasked_fields", [])
+        
+        # Get dynamic schema information for the current section
+        schema_info = _get_pydantic_schema_info(context.current_section)
+        
+        # Determine what group of fields to ask about next (grouped question approach)
+        next_question_group = _get_next_question_group_fields(unasked_fields, context.current_section)
+        
+        compiled = prompt_compiler.compile("conversation.turn", CONVERSATION_TURN_FRAGMENTS, {
+            "session_id": context.session_id,
+            "current_section": context.current_section,
+            "tracking_key": tracking_key,
+            "schema_info": schema_info,
+            "current_data": current_data,
+            "unasked_fields": unasked_fields,
+            "next_question_group": next_question_group,
+            "remaining_fields": len(unasked_fields),
+            "conversation_summary": context.conversation_summary,
+            "conversation_history": self._format_conversation_history(context.conversation_history),
+            "message": json.dumps(message, ensure_ascii=False)
+        })
+        # The system prompt goes out with every turn, so count it per turn too
+        prompt_compiler.record(self.conversation_system_prompt)
+        logger.debug(
+            "Conversation prompt for session %s: %s system + %s turn tokens %s",
+            context.session_id, self.conversation_system_prompt.total_tokens, compiled.total_tokens, compiled.token_breakdown()
+        )
+        return compiled.text
+    
+    def _apply_agent_updates(self, agent_response: IntakeAgentResponse, context: IntakeContext) -> IntakeAgentResponse:
+        """Merge the agent's extracted data with the existing intake data"""
+        if agent_response.updated_data:
+            merged_data = self._merge_intake_data(
+                existing_data=context.intake_data,
+                new_data=agent_response.updated_data,
+                current_section=context.current_section
+            )
+            # Update the response with merged data
+            agent_response.updated_data = merged_data
+        
+        return agent_response
+    
+    def _error_response(self, context: IntakeContext) -> IntakeAgentResponse:
+        """Fallback response when the conversation agent fails"""
+        return IntakeAgentResponse(
+            response="I apologize, but I'm having trouble processing your message. Could you please try again?",
+            current_section=context.current_section,
+            updated_data={},
+            agent_actions=["error_recovery"],
+            needs_followup=True
+        )
+    
     async def process_conversation(self, message: str, context: IntakeContext) -> IntakeAgentResponse:
         """Process the main intake conversation"""
         try:
-            # Build conversation prompt with context
-            current_data = context.intake_data.get(context.current_section, {})
-            tracking_key = f"{context.current_section}_tracking"
-            tracking_data = context.intake_data.get(tracking_key, {})
-            
-            # Initialize tracking data if not present
-            if "unasked_fields" not in tracking_data:
-                tracking_data["unasked_fields"] = _initialize_unasked_fields(context.current_section, current_data)
-            if "isComplete" not in tracking_data:
-                tracking_data["isComplete"] = False
-            if "pushed_to_charm" not in tracking_data:
-                tracking_data["pushed_to_charm"] = False
-            
-            unasked_fields = tracking_data.get("unasked_fields", [])
-            
-            # Get dynamic schema information for the current section
-            schema_info = _get_pydantic_schema_info(context.current_section)
-            
-            # Determine what group of fields to ask about next (grouped question approach)
-            next_question_group = _get_next_question_group_fields(unasked_fields, context.current_section)
-            
-            prompt = f"""
-            Session ID: {context.session_id}
-            Current Section: {context.current_section}
-            
-            {schema_info}
+            prompt = self._build_conversation_prompt(message, context)
+            # Timed inside the try so failed runs count as errors, not latencies
+            with metrics.timer("agent.conversation"):
+                result = await self.conversation_agent.run(prompt)
+            return self._apply_agent_updates(result.data, context)
             
-            Current Section Data: {current_data}
-            
-            FIELD TRACKING:
-            Unasked fields remaining: {unasked_fields}
-            Next question group to ask about: {next_question_group}
-            Total remaining fields: {len(unasked_fields)}
-            
-            Conversation History:
-            {self._format_conversation_history(context.conversation_history)}
-            
-            User Message: "{message}"
-            
-            CRITICAL DATA EXTRACTION REQUIREMENTS:
-            1. You MUST extract data from the user's message into the updated_data field
-            2. NEVER say you've saved data unless you actually extract it
-            3. Use the schema above to understand the exact field structure for {context.current_section}
-            4. ALWAYS parse the user's message for any information that matches schema fields
-            5. Extract EVERY piece of information provided, even if not directly asked
-            6. Map extracted data to exact schema field names (e.g., middleName, email, phone.work)
-            7. Return ALL extracted data in the updated_data field with proper nesting
-            8. Use this exact format: updated_data should contain {context.current_section} as the top level
-            9. ALSO include tracking data in {tracking_key} with updated unasked_fields list
-            10. Remove any field you extracted data for from the unasked_fields list
-            11. Ask about the NEXT GROUP of related fields from next_question_group using bullet points
-            12. Provide a conversational response acknowledging what you collected
-            
-            EXAMPLE DATA EXTRACTION:
-            If user says "3010 E Camino Juan Paisano":
-            - Extract address.addressLine1: "3010 E Camino Juan Paisano"
-            - Remove "address.addressLine1" from unasked_fields
-            
-            If user says "drweiner@gmail.com":
-            - Extract email: "drweiner@gmail.com" 
-            - Remove "email" from unasked_fields
-            
-            If user says "Jeremy, matthew.weiner@poundofcureweightloss.com, work is 5202983300":
-            - Extract middleName: "Jeremy"
-            - Extract email: "matthew.weiner@poundofcureweightloss.com"  
-            - Extract phone.work: "5202983300"
-            - Remove these fields from unasked_fields: ["middleName", "email", "phone.work"]
-            
-            TRACKING FORMAT:
-            "updated_data": {{
-                "{context.current_section}": {{ /* actual data */ }},
-                "{tracking_key}": {{
-                    "unasked_fields": ["remaining", "field", "paths"],
-                    "isComplete": false,
-                    "pushed_to_charm": false
-                }}
-            }}
-            
-            CRITICAL: Always remove fields from unasked_fields when you ask about them or collect data for them.
-            """
-            
-            result = await self.conversation_agent.run(prompt)
-            agent_response = result.data
+        except Exception as e:
+            logger.error("Error processing conversation: %s", e)
+            return self._error_response(context)
+    
+    async def process_conversation_stream(self, message: str, context: IntakeContext) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the main intake conversation
+        Yields {"type": "delta", "text": ...} as the response text is generated, then a single
+        {"type": "final", "response": IntakeAgentResponse} once the structured output is complete
+        """
+        streamed_text = ""
+        started = time.perf_counter()
+        timed_run = False  # the agent run is recorded once, as a latency or as an error
+        try:
+            prompt = self._build_conversation_prompt(message, context)
+            async with self.conversation_agent.run_stream(prompt) as result:
+                final_message = None
+                async for structured_message, is_last in result.stream_structured(debounce_by=0.05):
+                    final_message = structured_message
+                    text = _partial_response_text(structured_message)
+                    if len(text) > len(streamed_text) and text.startswith(streamed_text):
+                        if not streamed_text:
+                            metrics.observe("agent.conversation_first_token", time.perf_counter() - started)
+                        yield {"type": "delta", "text": text[len(streamed_text):]}
+                        streamed_text = text
+                
+                if final_message is None:
+                    raise ValueError("Conversation agent returned no output")
+                agent_response = await result.validate_structured_output(final_message)
+            metrics.observe("agent.conversation_stream", time.perf_counter() - started)
+            timed_run = True
             
-            # Merge new data with existing data
-            if agent_response.updated_data:
-                merged_data = self._merge_intake_data(
-                    existing_data=context.intake_data,
-                    new_data=agent_response.updated_data,
-                    current_section=context.current_section
-                )
-                # Update the response with merged data
-                agent_response.updated_data = merged_data
+            # Flush any text that arrived with the last chunk
+            if agent_response.response != streamed_text and agent_response.response.startswith(streamed_text):
+                yield {"type": "delta", "text": agent_response.response[len(streamed_text):]}
             
-            return agent_response
+            yield {"type": "final", "response": self._apply_agent_updates(agent_response, context)}
             
         except Exception as e:
-            logger.error(f"Error processing conversation: {e}")
-            return IntakeAgentResponse(
-                response="I apologize, but I'm having trouble processing your message. Could you please try again?",
-                current_section=context.current_section,
-                updated_data={},
-                agent_actions=["error_recovery"],
-                needs_followup=True
-            )
+            logger.error("Error streaming conversation: %s", e)
+            if not timed_run:
+                metrics.observe("agent.conversation_stream", time.perf_counter() - started, error=True)
+            yield {"type": "final", "response": self._error_response(context)}
+    
+    @timed("agent.summary")
+    async def summarize_conversation(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """Fold messages into the rolling conversation summary"""
+        prompt = f"""
+        Current summary:
+        {previous_summary or "None"}
+        
+        New messages:
+        {self._format_conversation_history(messages)}
+        """
+        result = await self.summary_agent.run(prompt)
+        return result.data.strip()[:get_settings().conversation_summary_max_chars]
     
     def _format_conversation_history(self, history: List[Dict[str, str]]) -> str:
-        """Format conversation history for context"""
+        """Format conversation history for context (the caller bounds the window)"""
         if not history:
             return "No previous conversation"
         
         formatted = []
-        for entry in history[-5:]:  # Last 5 exchanges
+        for entry in history[-get_settings().conversation_history_max_messages:]:
             role = entry.get("role", "unknown")
             content = entry.get("content", "")
             formatted.append(f"{role.capitalize()}: {content}")
@@ -1224,7 +934,7 @@ Response format (JSON):
                 # Update the merged data with the new section
                 merged_data[current_section] = merged_section_data
                 
-                logger.debug(f"Merged data for {current_section}: existing={existing_section_data}, new={new_section_data}, merged={merged_section_data}")
+                logger.debug("Merged data for %s: existing=%s, new=%s, merged=%s", current_section, Payload(existing_section_data), Payload(new_section_data), Payload(merged_section_data))
             
             # Merge tracking data if present
             tracking_key = f"{current_section}_tracking"
@@ -1249,12 +959,12 @@ Response format (JSON):
                 
                 merged_data[tracking_key] = merged_tracking
                 
-                logger.debug(f"Merged tracking for {current_section}: {merged_tracking}")
+                logger.debug("Merged tracking for %s: %s", current_section, merged_tracking)
             
             return merged_data
             
         except Exception as e:
-            logger.error(f"Error merging intake data: {e}")
+            logger.error("Error merging intake data: %s", e)
             # Fallback to just returning new data if merge fails
             return new_data
     
@@ -0,0 +1,294 @@
+"""
+Precompiled schema metadata for the intake sections
+Built once at import - the Pydantic models never change at runtime
+"""
+
+import copy
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from app.models.intake_schemas import IntakeDemographics, IntakeWeightHistory, IntakeMedicalHistory
+
+logger = logging.getLogger(__name__)
+
+# Map section names to their corresponding Pydantic models
+SECTION_MODELS: Dict[str, Type[BaseModel]] = {
+    "intake_demographics": IntakeDemographics,
+    "intake_weight_history": IntakeWeightHistory,
+    "intake_medical_history": IntakeMedicalHistory
+}
+
+
+@dataclass(frozen=True)
+class SectionSchema:
+    """Everything the intake agent needs to know about one section's schema"""
+    section_name: str
+    model_class: Type[BaseModel]
+    json_schema: Dict[str, Any]
+    resolved_schema: Dict[str, Any]  # json_schema with every $ref inlined
+    schema_info: str  # formatted schema text for the agent prompt
+    field_paths: List[str] = field(default_factory=list)  # ordered dotted paths
+    required_fields: Dict[str, bool] = field(default_factory=dict)  # field path -> required
+
+
+def _format_schema_properties(properties: dict, required_fields: list = None, indent: int = 0) -> str: # type: ignore
+    """
+    Format schema properties into a readable structure for the AI agent
+    """
+    formatted = ""
+    indent_str = "  " * indent
+    required_fields = required_fields or []
+    
+    for field_name, field_info in properties.items():
+        # Skip system fields
+        if field_name in ["isComplete"]:
+            continue
+            
+        field_type = field_info.get("type", "unknown")
+        description = field_info.get("description", "")
+        
+        # Check if field is required
+        is_required = field_name in required_fields
+        required_marker = " (REQUIRED)" if is_required else " (optional)"
+        
+        # Handle different field types
+        if field_type == "object":
+            # Nested object - recurse into properties
+            formatted += f"{indent_str}{field_name} (object){required_marker}:\n"
+            nested_props = field_info.get("properties", {})
+            nested_required = field_info.get("required", [])
+            formatted += _format_schema_properties(nested_props, nested_required, indent + 1)
+        elif field_type == "array":
+            # Array field
+            items = field_info.get("items", {})
+            if "properties" in items:
+                # Array of objects
+                formatted += f"{indent_str}{field_name} (array of objects){required_marker}:\n"
+                array_props = items.get("properties", {})
+                array_required = items.get("required", [])
+                formatted += _format_schema_properties(array_props, array_required, indent + 1)
+            else:
+                items_type = items.get("type", "unknown")
+                formatted += f"{indent_str}{field_name} (array of {items_type}){required_marker}\n"
+        else:
+            # Simple field
+            formatted += f"{indent_str}{field_name} ({field_type}){required_marker}\n"
+        
+        # Add description with AI Agent instructions
+        if description:
+            if "AI Agent:" in description:
+                ai_instruction = description.split("AI Agent:")[-1].strip()
+                formatted += f"{indent_str}  → {ai_instruction}\n"
+            
+    return formatted
+
+
+def _extract_field_paths(properties: dict, prefix: str = "", schema: dict = None) -> List[str]: # type: ignore
+    """
+    Recursively extract all field paths from schema properties
+    """
+    paths = []
+    
+    for field_name, field_info in properties.items():
+        # Skip system fields
+        if field_name in ["isComplete"]:
+            continue
+            
+        current_path = f"{prefix}.{field_name}" if prefix else field_name
+        
+        # Handle $ref references
+        if "$ref" in field_info:
+            ref_path = field_info["$ref"]
+            if ref_path.startswith("#/$defs/") and schema:
+                def_name = ref_path.split("/")[-1]
+                ref_definition = schema.get("$defs", {}).get(def_name, {})
+                if ref_definition.get("type") == "object" and "properties" in ref_definition:
+                    # Recursively extract from referenced definition
+                    nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
+                    paths.extend(nested_paths)
+                else:
+                    # Simple referenced type, add as field
+                    paths.append(current_path)
+            else:
+                # Unknown reference, treat as simple field
+                paths.append(current_path)
+        elif "anyOf" in field_info:
+            # Handle anyOf (like nullable fields)
+            for any_option in field_info["anyOf"]:
+                if "$ref" in any_option:
+                    ref_path = any_option["$ref"]
+                    if ref_path.startswith("#/$defs/") and schema:
+                        def_name = ref_path.split("/")[-1]
+                        ref_definition = schema.get("$defs", {}).get(def_name, {})
+                        if ref_definition.get("type") == "object" and "properties" in ref_definition:
+                            # Recursively extract from referenced definition
+                            nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
+                            paths.extend(nested_paths)
+                            break
+                elif any_option.get("type") == "array" and "items" in any_option:
+                    items = any_option["items"]
+                    if "$ref" in items:
+                        ref_path = items["$ref"]
+                        if ref_path.startswith("#/$defs/") and schema:
+                            def_name = ref_path.split("/")[-1]
+                            ref_definition = schema.get("$defs", {}).get(def_name, {})
+                            if ref_definition.get("type") == "object" and "properties" in ref_definition:
+                                # Array of objects - extract nested paths
+                                nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
+                                paths.extend(nested_paths)
+                                break
+            else:
+                # No object found in anyOf, treat as simple field
+                paths.append(current_path)
+        else:
+            field_type = field_info.get("type", "unknown")
+            
+            if field_type == "object":
+                # Don't add the object itself, only its nested fields
+                nested_props = field_info.get("properties", {})
+                if nested_props:
+                    nested_paths = _extract_field_paths(nested_props, current_path, schema)
+                    paths.extend(nested_paths)
+                else:
+                    # If object has no properties, treat it as a simple field
+                    paths.append(current_path)
+            elif field_type == "array":
+                # Check if array of objects with properties
+                items = field_info.get("items", {})
+                if "properties" in items:
+                    nested_paths = _extract_field_paths(items["properties"], current_path, schema)
+                    paths.extend(nested_paths)
+                elif "$ref" in items:
+                    ref_path = items["$ref"]
+                    if ref_path.startswith("#/$defs/") and schema:
+                        def_name = ref_path.split("/")[-1]
+                        ref_definition = schema.get("$defs", {}).get(def_name, {})
+                        if ref_definition.get("type") == "object" and "properties" in ref_definition:
+                            # Array of objects - extract nested paths
+                            nested_paths = _extract_field_paths(ref_definition["properties"], current_path, schema)
+                            paths.extend(nested_paths)
+                        else:
+                            # Simple array, add as field
+                            paths.append(current_path)
+                    else:
+                        paths.append(current_path)
+                else:
+                    # Simple array, add as field
+                    paths.append(current_path)
+            else:
+                # Simple field
+                paths.append(current_path)
+    
+    return paths
+
+
+def _resolve_refs(node: Any, defs: Dict[str, Any], seen: tuple = ()) -> Any:
+    """
+    Return a copy of a schema node with local $ref pointers replaced by their definitions
+    """
+    if isinstance(node, list):
+        return [_resolve_refs(item, defs, seen) for item in node]
+    if not isinstance(node, dict):
+        return node
+    
+    ref_path = node.get("$ref")
+    if isinstance(ref_path, str) and ref_path.startswith("#/$defs/"):
+        def_name = ref_path.split("/")[-1]
+        if def_name in seen or def_name not in defs:
+            # Self-referencing or unknown definition - leave the pointer in place
+            return copy.deepcopy(node)
+        resolved = _resolve_refs(defs[def_name], defs, seen + (def_name,))
+        siblings = {key: value for key, value in node.items() if key != "$ref"}
+        return {**resolved, **_resolve_refs(siblings, defs, seen)}
+    
+    return {key: _resolve_refs(value, defs, seen) for key, value in node.items() if key != "$defs"}
+
+
+def _collect_required_flags(properties: dict, required: list, prefix: str = "", parent_required: bool = True) -> Dict[str, bool]:
+    """
+    Walk a resolved schema and flag each leaf field path as required or optional
+    A nested field is only required if every parent on its path is required too
+    """
+    flags = {}
+    
+    for field_name, field_info in properties.items():
+        if field_name in ["isComplete"]:
+            continue
+        
+        current_path = f"{prefix}.{field_name}" if prefix else field_name
+        is_required = parent_required and field_name in (required or [])
+        
+        # Unwrap nullable anyOf and arrays to the object they describe, if any
+        candidates = field_info.get("anyOf", [field_info])
+        nested = None
+        for candidate in candidates:
+            target = candidate.get("items", {}) if candidate.get("type") == "array" else candidate
+            if target.get("properties"):
+                nested = target
+                break
+        
+        if nested:
+            flags.update(_collect_required_flags(nested["properties"], nested.get("required", []), current_path, is_required))
+        else:
+            flags[current_path] = is_required
+    
+    return flags
+
+
+class SchemaRegistry:
+    """Per-section schema metadata, compiled once from the Pydantic models"""
+    
+    def __init__(self, section_models: Optional[Dict[str, Type[BaseModel]]] = None):
+        self._sections: Dict[str, SectionSchema] = {}
+        for section_name, model_class in (section_models or SECTION_MODELS).items():
+            self._sections[section_name] = self._compile(section_name, model_class)
+        logger.info("Schema registry compiled for sections: %s", list(self._sections))
+    
+    @staticmethod
+    def _compile(section_name: str, model_class: Type[BaseModel]) -> SectionSchema:
+        schema = model_class.model_json_schema()
+        resolved = _resolve_refs(schema, schema.get("$defs", {}))
+        required_fields = schema.get("required", [])
+        
+        schema_info = f"Schema for {section_name}:\n"
+        schema_info += _format_schema_properties(schema.get("properties", {}), required_fields, indent=0)
+        
+        field_paths = _extract_field_paths(schema.get("properties", {}), "", schema)
+        required_flags = _collect_required_flags(resolved.get("properties", {}), resolved.get("required", []))
+        
+        return SectionSchema(
+            section_name=section_name,
+            model_class=model_class,
+            json_schema=schema,
+            resolved_schema=resolved,
+            schema_info=schema_info,
+            field_paths=field_paths,
+            required_fields={path: required_flags.get(path, False) for path in field_paths}
+        )
+    
+    def get(self, section_name: str) -> Optional[SectionSchema]:
+        """Get the compiled schema for a section, or None for unknown sections"""
+        return self._sections.get(section_name)
+    
+    def schema_info(self, section_name: str) -> str:
+        """Formatted schema text for the agent prompt"""
+        section = self._sections.get(section_name)
+        if not section:
+            return f"Unknown section: {section_name}"
+        return section.schema_info
+    
+    def field_paths(self, section_name: str) -> List[str]:
+        """All field paths for a section (a new list the caller may modify)"""
+        section = self._sections.get(section_name)
+        return list(section.field_paths) if section else []
+    
+    @property
+    def sections(self) -> List[str]:
+        return list(self._sections)
+
+
+# Global registry instance
+schema_registry = SchemaRegistry()
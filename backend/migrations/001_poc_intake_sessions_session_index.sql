@@ -0,0 +1,56 @@
+-- Session lookup index for poc_intake_sessions
+--
+-- IntakeSessionRepository.verify_session finds the record that owns a session_id with
+-- a JSONB containment filter:
+--
+--     sessions @> '[{"session_id": "<uuid>"}]'
+--
+-- A GIN index with jsonb_path_ops answers that in O(log n) instead of a full table scan.
+-- Run from the Supabase SQL editor. The statements are idempotent and can be re-run.
+-- The GIN index itself is built CONCURRENTLY, which cannot run inside a transaction
+-- block, so it lives in 001b_poc_intake_sessions_sessions_gin.sql: run that file on
+-- its own once this one has succeeded.
+
+-- 1. Migrate existing sessions arrays.
+--    Older rows may hold the column as json (not jsonb) or NULL instead of an empty
+--    array. Containment and the GIN index both require jsonb. NULLs become empty
+--    arrays; any other non-array value stops the migration so it can be fixed by hand.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'poc_intake_sessions'
+          AND column_name = 'sessions'
+          AND data_type <> 'jsonb'
+    ) THEN
+        ALTER TABLE poc_intake_sessions
+            ALTER COLUMN sessions TYPE jsonb USING sessions::jsonb;
+    END IF;
+END $$;
+
+DO $$
+DECLARE
+    non_array_rows bigint;
+BEGIN
+    SELECT count(*) INTO non_array_rows
+    FROM poc_intake_sessions
+    WHERE sessions IS NOT NULL AND jsonb_typeof(sessions) <> 'array';
+
+    IF non_array_rows > 0 THEN
+        RAISE EXCEPTION 'poc_intake_sessions has % rows whose sessions value is not an array; fix them before re-running', non_array_rows;
+    END IF;
+END $$;
+
+UPDATE poc_intake_sessions
+SET sessions = '[]'::jsonb
+WHERE sessions IS NULL;
+
+ALTER TABLE poc_intake_sessions
+    ALTER COLUMN sessions SET DEFAULT '[]'::jsonb;
+
+-- 2. The sessions GIN index is created by 001b_poc_intake_sessions_sessions_gin.sql.
+
+-- 3. Lookup by MRN (get_session_by_mrn / create_session_with_verification).
+CREATE INDEX IF NOT EXISTS idx_poc_intake_sessions_charm_mrn_created_at
+    ON poc_intake_sessions (charm_mrn, created_at DESC);
@@ -0,0 +1,11 @@
+-- GIN index on poc_intake_sessions.sessions (second part of 001)
+--
+-- Answers the verify_session containment lookup (sessions @> '[{"session_id": ...}]')
+-- without a full table scan. CONCURRENTLY avoids locking writes on the live table but
+-- cannot run inside a transaction block, and the Supabase SQL editor runs a multi-
+-- statement script as one transaction. Run this single statement on its own (or with
+-- psql in autocommit mode) after 001 has succeeded. It is idempotent; if a previous
+-- concurrent build failed, drop the INVALID index and re-run.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poc_intake_sessions_sessions_gin
+    ON poc_intake_sessions USING GIN (sessions jsonb_path_ops);
@@ -0,0 +1,34 @@
+-- Durable queue for background Charm EHR pushes
+--
+-- EHRPushQueue (app/services/ehr_push_queue.py) enqueues one row per completed intake
+-- section (and one for the end-of-intake diagnosis push). Workers claim due rows by
+-- flipping status pending -> running, retry failures with exponential backoff and write
+-- the outcome back to <section>_tracking.pushed_to_charm on poc_intake_sessions.
+-- Run from the Supabase SQL editor. The statements are idempotent and can be re-run.
+
+CREATE TABLE IF NOT EXISTS ehr_push_jobs (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    record_id uuid NOT NULL REFERENCES poc_intake_sessions (id) ON DELETE CASCADE,
+    session_id text NOT NULL,
+    section text NOT NULL,
+    status text NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'succeeded', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL DEFAULT 5,
+    next_attempt_at timestamptz NOT NULL DEFAULT now(),
+    locked_at timestamptz,
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Workers poll for due pending jobs in creation order.
+CREATE INDEX IF NOT EXISTS idx_ehr_push_jobs_due
+    ON ehr_push_jobs (next_attempt_at, created_at)
+    WHERE status = 'pending';
+
+-- At most one active job per session section, so repeated chat turns do not enqueue
+-- duplicate pushes while one is waiting or running.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ehr_push_jobs_active_section
+    ON ehr_push_jobs (record_id, section)
+    WHERE status IN ('pending', 'running');
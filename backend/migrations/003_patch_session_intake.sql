@@ -0,0 +1,69 @@
+-- Partial intake writes with optimistic concurrency for poc_intake_sessions
+--
+-- IntakeSessionRepository used to SELECT the whole intake blob, merge in Python and write
+-- the whole blob back, losing one of two overlapping writes (e.g. a chat turn and a
+-- confirm-section call). patch_session_intake merges only the given top-level keys in a
+-- single UPDATE:
+--
+--     intake = intake || p_patch
+--
+-- Every write bumps intake_version. Callers doing read-modify-write pass the version they
+-- read as p_expected_version; if another write landed first no row matches and NULL is
+-- returned, so the caller can re-read and retry. Only the new version is returned.
+-- Run from the Supabase SQL editor. The statements are idempotent and can be re-run.
+
+-- 1. The || merge requires jsonb; older rows may hold json or NULL. NULLs become empty
+--    objects; any other non-object value stops the migration so it can be fixed by hand.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'poc_intake_sessions'
+          AND column_name = 'intake'
+          AND data_type <> 'jsonb'
+    ) THEN
+        ALTER TABLE poc_intake_sessions
+            ALTER COLUMN intake TYPE jsonb USING intake::jsonb;
+    END IF;
+END $$;
+
+DO $$
+DECLARE
+    non_object_rows bigint;
+BEGIN
+    SELECT count(*) INTO non_object_rows
+    FROM poc_intake_sessions
+    WHERE intake IS NOT NULL AND jsonb_typeof(intake) <> 'object';
+
+    IF non_object_rows > 0 THEN
+        RAISE EXCEPTION 'poc_intake_sessions has % rows whose intake value is not an object; fix them before re-running', non_object_rows;
+    END IF;
+END $$;
+
+UPDATE poc_intake_sessions
+SET intake = '{}'::jsonb
+WHERE intake IS NULL;
+
+-- 2. Version counter for compare-and-swap.
+ALTER TABLE poc_intake_sessions
+    ADD COLUMN IF NOT EXISTS intake_version bigint NOT NULL DEFAULT 0;
+
+-- 3. Partial patch. Returns the new intake_version, or NULL if the record does not exist
+--    or p_expected_version is stale.
+CREATE OR REPLACE FUNCTION patch_session_intake(
+    p_record_id uuid,
+    p_patch jsonb,
+    p_expected_version bigint DEFAULT NULL
+)
+RETURNS bigint
+LANGUAGE sql
+AS $$
+    UPDATE poc_intake_sessions
+    SET intake = COALESCE(intake, '{}'::jsonb) || p_patch,
+        intake_version = intake_version + 1,
+        last_updated = now()
+    WHERE id = p_record_id
+      AND (p_expected_version IS NULL OR intake_version = p_expected_version)
+    RETURNING intake_version;
+$$;
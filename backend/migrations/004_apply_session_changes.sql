@@ -0,0 +1,49 @@
+-- Single-write flush for the per-request session unit of work
+--
+-- A confirmed /chat turn used to read its poc_intake_sessions record four times
+-- (verify_session from the router, mark_section_complete, update_session_intake and the
+-- completion check) and write it two or three times. SessionUnitOfWork now loads the
+-- record once and flushes everything the request changed with one call:
+--
+--     intake   = intake || p_intake_patch
+--     sessions = the entry for p_session_id merged with p_session_updates
+--
+-- intake_version is bumped only when intake keys are written. p_expected_version makes the
+-- write a compare-and-swap as in patch_session_intake (migration 003): if another write
+-- landed first no row matches and NULL is returned, so the caller can re-read and retry.
+-- Run from the Supabase SQL editor after 001 and 003. The statement is idempotent.
+
+CREATE OR REPLACE FUNCTION apply_session_changes(
+    p_record_id uuid,
+    p_session_id text,
+    p_intake_patch jsonb DEFAULT '{}'::jsonb,
+    p_session_updates jsonb DEFAULT '{}'::jsonb,
+    p_expected_version bigint DEFAULT NULL
+)
+RETURNS bigint
+LANGUAGE sql
+AS $$
+    UPDATE poc_intake_sessions
+    SET intake = COALESCE(intake, '{}'::jsonb) || p_intake_patch,
+        intake_version = CASE
+            WHEN p_intake_patch = '{}'::jsonb THEN intake_version
+            ELSE intake_version + 1
+        END,
+        sessions = CASE
+            WHEN p_session_updates = '{}'::jsonb THEN sessions
+            ELSE (
+                SELECT jsonb_agg(
+                    CASE
+                        WHEN entry->>'session_id' = p_session_id THEN entry || p_session_updates
+                        ELSE entry
+                    END
+                    ORDER BY position
+                )
+                FROM jsonb_array_elements(sessions) WITH ORDINALITY AS s(entry, position)
+            )
+        END,
+        last_updated = now()
+    WHERE id = p_record_id
+      AND (p_expected_version IS NULL OR intake_version = p_expected_version)
+    RETURNING intake_version;
+$$;
@@ -0,0 +1,18 @@
+-- Local mirror of the Charm referral (provider) directory
+--
+-- ProviderDirectory (app/services/provider_directory.py) periodically lists
+-- /settings/directory/providers, upserts every provider here stamped with the sync time
+-- and deletes rows the sync no longer saw. On startup the in-memory search index is built
+-- from this table, so care-team searches are served locally before the first sync
+-- finishes. Providers added through the intake agent are upserted as they are created.
+-- Run from the Supabase SQL editor. The statements are idempotent and can be re-run.
+
+CREATE TABLE IF NOT EXISTS charm_provider_directory (
+    provider_id text PRIMARY KEY,
+    provider jsonb NOT NULL,
+    synced_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Rows left behind by a completed sync are removed by synced_at.
+CREATE INDEX IF NOT EXISTS idx_charm_provider_directory_synced_at
+    ON charm_provider_directory (synced_at);
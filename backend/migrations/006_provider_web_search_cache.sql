@@ -0,0 +1,24 @@
+-- Persistent cache of provider web searches (Perplexity)
+--
+-- web_search_provider (app/services/pydantic_intake_agent.py) looks up providers that are
+-- not in the Charm directory. ProviderWebSearchCache (app/services/provider_web_search_cache.py)
+-- stores each successful answer keyed by the normalized provider name, city, state and
+-- specialty, and serves it to any later session until expires_at, so the same doctor in
+-- the same city is only searched once per TTL.
+-- Run from the Supabase SQL editor. The statements are idempotent and can be re-run.
+
+CREATE TABLE IF NOT EXISTS provider_web_search_cache (
+    cache_key text PRIMARY KEY,
+    provider_name text NOT NULL,
+    city text,
+    state text,
+    specialty text,
+    content text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL
+);
+
+-- Expired rows can be purged with:
+--     DELETE FROM provider_web_search_cache WHERE expires_at < now();
+CREATE INDEX IF NOT EXISTS idx_provider_web_search_cache_expires_at
+    ON provider_web_search_cache (expires_at);
@@ -0,0 +1,56 @@
+"""
+Shared test fixtures: an in-process Charm API for the service tests
+"""
+
+import inspect
+from typing import Callable, List
+
+import httpx
+import pytest
+
+from app.core.http_client import CharmHTTPClient
+from app.services import ehr_service
+
+
+class MockCharmHTTPClient(CharmHTTPClient):
+    """Shared Charm client answered in-process by a handler; every request is kept in order"""
+
+    def __init__(self, handler: Callable[[httpx.Request], httpx.Response]):
+        super().__init__()
+        self.handler = handler
+        self.requests: List[httpx.Request] = []
+        self.clients_created = 0
+
+    def _create_client(self) -> httpx.AsyncClient:
+        self.clients_created += 1
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(self._handle),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.handler(request)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+
+async def _fake_headers():
+    return {"Authorization": "Bearer test"}
+
+
+@pytest.fixture
+def mock_charm(monkeypatch):
+    """
+    Build a MockCharmHTTPClient: mock_charm(handler, *modules)
+
+    get_charm_api_headers is replaced with test headers in each given module
+    (ehr_service when none are given).
+    """
+    def build(handler, *modules) -> MockCharmHTTPClient:
+        for module in modules or (ehr_service,):
+            monkeypatch.setattr(module, "get_charm_api_headers", _fake_headers)
+        return MockCharmHTTPClient(handler)
+
+    return build
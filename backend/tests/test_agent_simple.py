@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-from app.services.ehr_service import _create_diagnosis_agent
+from app.services.diagnosis_engine import _create_diagnosis_agent
 
 async def test_agent():
     print("Testing diagnosis agent creation...")
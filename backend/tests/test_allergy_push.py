@@ -0,0 +1,90 @@
+"""
+Test allergen classification and the allergy push: one existing-allergy fetch, no duplicate POSTs
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from app.services.allergy_classifier import AllergyClassifier, allergy_classifier
+from app.services.ehr_service import EHRService
+
+
+def _allergies_handler(existing):
+    """Holds a chart's allergies"""
+    def handler(request):
+        if request.method == "GET":
+            return httpx.Response(200, json={"code": "0", "allergies": existing})
+        return httpx.Response(200, json={"code": "0"})
+
+    return handler
+
+
+def _calls(charm_http):
+    return [(request.method, request.url.path, json.loads(request.content) if request.content else None) for request in charm_http.requests]
+
+
+def test_classifier_keeps_precedence_and_matches_whole_words():
+    assert allergy_classifier.classify("Peanuts") == "Food"
+    assert allergy_classifier.classify("tree nuts") == "Food"
+    assert allergy_classifier.classify("Tree pollen") == "Plant"
+    assert allergy_classifier.classify("Latex gloves") == "Latex"
+    assert allergy_classifier.classify("Cat dander") == "Animal"
+    assert allergy_classifier.classify("dust mites") == "Environmental"
+    # Substring scans used to call these Animal ("fur", "cat")
+    assert allergy_classifier.classify("Furosemide") == "Medication"
+    assert allergy_classifier.classify("Sulfa medication") == "Medication"
+    assert allergy_classifier.is_no_known("NKA") and allergy_classifier.is_no_known(" None ")
+    assert allergy_classifier.is_no_known_drug("NKDA") and not allergy_classifier.is_no_known("NKDA")
+
+
+def test_classifier_is_built_from_data():
+    classifier = AllergyClassifier({"Food": ["kiwi"], "Plant": ["vine"]}, default_type="Other")
+
+    assert classifier.classify("kiwi vine") == "Food"
+    assert classifier.classify("Grape vines") == "Plant"
+    assert classifier.classify("penicillin") == "Other"
+
+
+def test_push_skips_recorded_and_repeated_allergens(mock_charm):
+    charm_http = mock_charm(_allergies_handler([{"allergen": "Penicillin", "allergy_type": "Medication"}]))
+    service = EHRService(http_client=charm_http)
+    allergies = [
+        {"allergen": "penicillin", "severity": "severe"},
+        {"allergen": "Peanuts", "reaction": "Hives", "severity": "severe"},
+        {"allergen": "peanuts.", "severity": "mild"},
+        {"allergen": "Furosemide"},
+    ]
+
+    assert asyncio.run(service._push_allergies_to_charm("patient-1", allergies, {})) is True
+
+    methods = [method for method, _, _ in _calls(charm_http)]
+    posted = [(body["allergen"], body["type"]) for method, _, body in _calls(charm_http) if method == "POST"]
+    assert methods.count("GET") == 1
+    assert sorted(posted) == [("Furosemide", "Medication"), ("Peanuts", "Food")]
+
+
+def test_no_known_allergies_reuses_the_same_fetch(mock_charm):
+    recorded = mock_charm(_allergies_handler([{"allergen": "Penicillin"}]))
+    empty = mock_charm(_allergies_handler([]))
+
+    blocked = asyncio.run(EHRService(http_client=recorded)._push_allergies_to_charm("patient-1", [{"allergen": "NKA"}], {}))
+    marked = asyncio.run(EHRService(http_client=empty)._push_allergies_to_charm("patient-1", [{"allergen": "none"}], {}))
+
+    assert blocked is False and [method for method, _, _ in _calls(recorded)] == ["GET"]
+    assert marked is True
+    assert [(method, path.rsplit("/", 1)[-1]) for method, path, _ in _calls(empty)] == [("GET", "allergies"), ("POST", "no_known_allergy")]
+
+
+def test_nkda_never_marks_every_allergy_type_no_known(mock_charm):
+    alone = mock_charm(_allergies_handler([]))
+    with_food = mock_charm(_allergies_handler([]))
+
+    assert asyncio.run(EHRService(http_client=alone)._push_allergies_to_charm("patient-1", [{"allergen": "NKDA"}], {})) is True
+    asyncio.run(EHRService(http_client=with_food)._push_allergies_to_charm(
+        "patient-1", [{"allergen": "No known drug allergies"}, {"allergen": "Peanuts"}], {}
+    ))
+
+    assert [method for method, _, _ in _calls(alone)] == ["GET"]
+    assert [body["allergen"] for method, _, body in _calls(with_food) if method == "POST"] == ["Peanuts"]
@@ -0,0 +1,59 @@
+"""
+Test that EHRService reuses the shared Charm HTTP client
+instead of opening a new connection per call
+"""
+
+import asyncio
+
+import httpx
+
+from app.core.http_client import CharmHTTPClient
+from app.services.ehr_service import EHRService
+
+
+def _allergies_handler(request):
+    return httpx.Response(200, json={"code": "0", "allergies": [{"allergen": "Penicillin"}]})
+
+
+def test_ehr_service_reuses_injected_client(mock_charm):
+    charm_http = mock_charm(_allergies_handler)
+    service = EHRService(http_client=charm_http)
+
+    async def run():
+        first = await service.get_patient_allergies("patient-1")
+        second = await service.get_patient_allergies("patient-1")
+        await charm_http.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second == [{"allergen": "Penicillin"}]
+    assert charm_http.clients_created == 1
+    assert charm_http.get_stats()["requests"] == 2
+
+
+def test_connection_stats_count_reuse():
+    charm_http = CharmHTTPClient()
+
+    async def run():
+        for _ in range(4):
+            await charm_http._on_request(httpx.Request("GET", "https://ehr.charmtracker.com/api"))
+        await charm_http._trace("connection.connect_tcp.complete", {})
+        await charm_http._trace("connection.start_tls.complete", {})
+
+    asyncio.run(run())
+    stats = charm_http.get_stats()
+
+    assert stats["connections_opened"] == 1
+    assert stats["tls_handshakes"] == 1
+    assert stats["reused_requests"] == 3
+    assert stats["reuse_ratio"] == 0.75
+
+
+def test_endpoint_timeouts():
+    charm_http = CharmHTTPClient()
+    settings = charm_http.settings
+
+    assert charm_http.timeout("lookup").read == settings.charm_lookup_timeout
+    assert charm_http.timeout("write").read == settings.charm_write_timeout
+    assert charm_http.timeout("search").connect == settings.charm_connect_timeout
@@ -0,0 +1,178 @@
+"""
+Test the keyed chart diff: dry-run reports, writing only changes, retry safety
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from app.services import chart_sync
+from app.services.ehr_service import EHRService
+
+MEDICAL_HISTORY = {
+    "currentMedications": [
+        {"medicationName": "Metformin", "strength": "500 mg", "directions": "Twice daily"},
+        {"medicationName": "Lisinopril", "strength": "10 mg", "directions": "Once daily"},
+    ],
+    "allergies": [
+        {"allergen": "Penicillin", "reaction": "Hives", "severity": "severe"},
+        {"allergen": "Peanuts", "reaction": "Swelling", "severity": "moderate"},
+    ],
+    "familyHistory": [{"familyMember": "mother", "medicalProblem": "Diabetes"}],
+    "pastSurgicalHistory": [{"surgeryType": "Appendectomy", "year": 2004}],
+    "PMHx": ["Hypertension"],
+}
+
+LIST_KEYS = {
+    "medications": ("medications", "patient_medication_id"),
+    "allergies": ("allergies", "patient_allergy_id"),
+    "medicalhistory/familyhistory": ("data", "family_history_id"),
+    "medicalhistory/procedure": ("data", "procedure_id"),
+}
+
+
+class FakeChart:
+    """In-memory patient chart answering Charm reads and applying writes"""
+
+    def __init__(self, chart=None, failing_reads=()):
+        self.chart = chart or {}
+        self.failing_reads = set(failing_reads)
+        self.writes = []
+        self.next_id = 1000
+
+    def handle(self, request):
+        path = request.url.path.split("/patients/patient-1/", 1)[1]
+        if request.method == "GET":
+            if path in self.failing_reads:
+                return httpx.Response(503, text="unavailable")
+            if path in LIST_KEYS:
+                return httpx.Response(200, json={"code": "0", LIST_KEYS[path][0]: self.chart.get(path, [])})
+            return httpx.Response(200, json={"code": "0", "data": self.chart.get(path, {})})
+
+        payload = json.loads(request.content)
+        self.writes.append((request.method, path, payload))
+        list_path, _, record_id = path.rpartition("/") if request.method == "PUT" else (path, "", "")
+        if list_path in LIST_KEYS:
+            id_field = LIST_KEYS[list_path][1]
+            records = self.chart.setdefault(list_path, [])
+            if record_id:
+                next(record for record in records if str(record[id_field]) == record_id).update(payload)
+            for item in payload if isinstance(payload, list) else [payload] if not record_id else []:
+                self.next_id += 1
+                records.append(dict(item, **{id_field: self.next_id}))
+        elif path.startswith("medicalhistory/"):
+            field = path.rsplit("/", 1)[1].replace("pastmedicalhistory", "past_medical_history").replace("socialhistory", "social_history")
+            self.chart.setdefault(path, {})[field] = payload["content"]
+        return httpx.Response(200, json={"code": "0"})
+
+
+def _service(mock_charm, chart):
+    return EHRService(http_client=mock_charm(chart.handle))
+
+
+def test_diff_list_pairs_by_key_and_compares_fields():
+    records = [
+        {"patient_medication_id": 7, "trade_name": "Glucophage", "generic_drug_name": "Metformin", "strength_description": "500 mg", "directions": "Twice daily"},
+        {"patient_medication_id": 8, "trade_name": "Lisinopril", "strength_description": "5 mg", "directions": "Once daily"},
+    ]
+    payloads = [
+        {"drug_name": "metformin", "strength_description": "500mg ", "directions": "twice daily"},
+        {"drug_name": "Lisinopril", "strength_description": "10 mg", "directions": "Once daily"},
+        {"drug_name": "Atorvastatin", "strength_description": "20 mg", "directions": ""},
+        {"drug_name": "atorvastatin", "strength_description": "20 mg", "directions": ""},
+    ]
+    entries = [(payload, {"strength": payload["strength_description"], "directions": payload["directions"]}) for payload in payloads]
+
+    changes, unchanged = chart_sync.diff_list(chart_sync.MEDICATIONS, entries, records)
+
+    assert unchanged == 1
+    assert [(change.action, change.key, change.changed) for change in changes] == [
+        ("update", "lisinopril", ["strength_description"]),
+        ("insert", "atorvastatin", []),
+    ]
+    assert changes[0].endpoint == "medications/8"
+    assert changes[0].payload == {"strength_description": "10 mg"}
+
+
+def test_dry_run_reports_the_diff_without_writing(mock_charm):
+    chart = FakeChart(chart={
+        "allergies": [{"patient_allergy_id": 1, "allergen": "Penicillin", "severity": "Mild", "reactions": "Hives"}],
+        "medicalhistory/pastmedicalhistory": {"past_medical_history": "Past Medical History: • Hypertension"},
+    })
+    service = _service(mock_charm, chart)
+
+    diff = asyncio.run(service.sync_medical_history("patient-1", MEDICAL_HISTORY, dry_run=True))
+    report = diff.as_report()
+
+    assert chart.writes == []
+    assert report["dry_run"] is True
+    assert report["summary"]["allergies"] == {"insert": 1, "update": 1, "unchanged": 0}
+    assert report["summary"]["medications"] == {"insert": 2, "update": 0, "unchanged": 0}
+    assert report["summary"]["past_medical_history"] == {"insert": 0, "update": 0, "unchanged": 1}
+    update = next(change for change in report["changes"] if change["action"] == "update")
+    assert update["record_id"] == "1" and update["changed"] == ["severity"]
+
+
+def test_builder_defaults_never_overwrite_the_chart(mock_charm):
+    chart = FakeChart(chart={
+        "allergies": [{"patient_allergy_id": 1, "allergen": "Penicillin", "severity": "Severe", "reactions": "Anaphylaxis"}],
+        "medications": [{
+            "patient_medication_id": 7, "trade_name": "Metformin", "strength_description": "500 mg",
+            "directions": "1 tablet twice daily with meals", "dispense": 180.0, "refills": "3", "is_custom_drug": False,
+        }],
+    })
+    service = _service(mock_charm, chart)
+
+    # The patient named the allergy and the drug but gave no severity, reaction or directions
+    unanswered = asyncio.run(service.sync_medical_history("patient-1", {
+        "allergies": [{"allergen": "penicillin"}],
+        "currentMedications": [{"medicationName": "Metformin"}],
+    }))
+    assert unanswered.changes == [] and chart.writes == []
+
+    changed = asyncio.run(service.sync_medical_history("patient-1", {
+        "currentMedications": [{"medicationName": "Metformin", "strength": "1000 mg"}],
+    }))
+
+    assert [change.changed for change in changed.changes] == [["strength_description"]]
+    assert chart.writes == [("PUT", "medications/7", {"strength_description": "1000 mg"})]
+    medication = chart.chart["medications"][0]
+    assert medication["directions"] == "1 tablet twice daily with meals"
+    assert (medication["dispense"], medication["refills"], medication["is_custom_drug"]) == (180.0, "3", False)
+
+
+def test_sync_writes_only_changes_and_a_retry_writes_nothing(mock_charm):
+    chart = FakeChart(chart={
+        "medicalhistory/familyhistory": [{"family_history_id": 3, "relationship": "Natural Mother", "comments": "Diabetes"}],
+    })
+    service = _service(mock_charm, chart)
+
+    first = asyncio.run(service.sync_medical_history("patient-1", MEDICAL_HISTORY))
+    writes = list(chart.writes)
+    second = asyncio.run(service.sync_medical_history("patient-1", MEDICAL_HISTORY))
+
+    assert first.succeeded and first.dry_run is False
+    assert first.summary()["family_history"] == {"insert": 0, "update": 0, "unchanged": 1}
+    # Medications in one array POST, then two allergies, one surgery and the PMHx text
+    assert sorted((method, path) for method, path, _ in writes) == [
+        ("POST", "allergies"),
+        ("POST", "allergies"),
+        ("POST", "medicalhistory/pastmedicalhistory"),
+        ("POST", "medicalhistory/procedure"),
+        ("POST", "medications"),
+    ]
+    assert len(next(payload for _, path, payload in writes if path == "medications")) == 2
+    assert second.changes == [] and second.succeeded
+    assert len(chart.writes) == len(writes)
+
+
+def test_unreadable_list_is_not_written(mock_charm):
+    chart = FakeChart(failing_reads={"allergies"})
+    service = _service(mock_charm, chart)
+
+    diff = asyncio.run(service.sync_medical_history("patient-1", {"allergies": MEDICAL_HISTORY["allergies"]}))
+
+    assert "allergies" in diff.fetch_errors
+    assert chart.writes == []
+    assert asyncio.run(service._push_medical_history_to_charm("patient-1", {"allergies": MEDICAL_HISTORY["allergies"]})) is False
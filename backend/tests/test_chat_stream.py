@@ -0,0 +1,93 @@
+"""
+Test streaming of chat replies: partial response deltas from the agent and the SSE endpoint
+"""
+
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+from fastapi import FastAPI
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+from app.routers import chat as chat_module
+from app.services.pydantic_intake_agent import IntakeAgentResponse, IntakeContext, pydantic_intake_agent
+
+CHUNKS = [
+    '{"response": "Hello ',
+    'there, what is',
+    ' your email?", "current_section": "intake_demographics", "updated_data": {}, "agent_actions": ["asked"]}',
+]
+
+
+async def _stream_output(messages, info):
+    tool_name = info.output_tools[0].name
+    for i, chunk in enumerate(CHUNKS):
+        await asyncio.sleep(0.08)
+        yield {0: DeltaToolCall(name=tool_name if i == 0 else None, json_args=chunk)}
+
+
+def test_agent_streams_response_text_before_final():
+    context = IntakeContext(session_id="session-1", current_section="intake_demographics", intake_data={})
+
+    async def run():
+        events = []
+        with pydantic_intake_agent.conversation_agent.override(model=FunctionModel(stream_function=_stream_output)):
+            async for event in pydantic_intake_agent.process_conversation_stream("hi", context):
+                events.append(event)
+        return events
+
+    events = asyncio.run(run())
+    deltas = [event["text"] for event in events if event["type"] == "delta"]
+
+    assert len(deltas) > 1
+    assert "".join(deltas) == "Hello there, what is your email?"
+    assert events[-1]["type"] == "final"
+    assert events[-1]["response"].agent_actions == ["asked"]
+
+
+def test_stream_endpoint_sends_deltas_then_final(monkeypatch):
+    saved = []
+
+    async def fake_verify_session(session_id):
+        return {"id": "record-1", "current_session": {"confirmed": True}}
+
+    async def fake_build_context(request, session_record):
+        return IntakeContext(session_id=request.session_id, current_section="intake_demographics", intake_data={})
+
+    async def fake_stream(message, context):
+        yield {"type": "delta", "text": "Hi "}
+        yield {"type": "delta", "text": "Jane"}
+        yield {"type": "final", "response": IntakeAgentResponse(response="Hi Jane", current_section="intake_demographics")}
+
+    async def fake_save(request, session_record, context, agent_response):
+        saved.append(agent_response.response)
+
+    monkeypatch.setattr(chat_module.intake_repository, "verify_session", fake_verify_session)
+    monkeypatch.setattr(chat_module, "_build_intake_context", fake_build_context)
+    monkeypatch.setattr(chat_module.pydantic_intake_agent, "process_conversation_stream", fake_stream)
+    monkeypatch.setattr(chat_module, "_save_conversation_turn", fake_save)
+
+    app = FastAPI()
+    app.include_router(chat_module.router, prefix="/api/v1")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/v1/chat/stream", json={"session_id": "session-1", "message": "hello"})
+        await asyncio.gather(*chat_module._background_saves)
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[:2] == [("delta", {"text": "Hi "}), ("delta", {"text": "Jane"})]
+    assert events[2][0] == "final"
+    assert events[2][1]["response"] == "Hi Jane"
+    assert saved == ["Hi Jane"]
@@ -0,0 +1,92 @@
+"""
+Test the rolling conversation summary: incremental history fetches and background folding
+"""
+
+import asyncio
+
+from app.repositories.intake_repository import SessionUnitOfWork
+from app.services.conversation_memory import ConversationMemory, SUMMARY_KEY
+
+
+class FakeHistory:
+    def __init__(self, count):
+        self.records = [
+            {"id": i, "message": {"role": "user" if i % 2 else "assistant", "content": f"message {i}", "timestamp": "t"}}
+            for i in range(1, count + 1)
+        ]
+        self.calls = []
+
+    async def get_messages_after(self, session_id, after_id=None, limit=20):
+        self.calls.append((after_id, limit))
+        newer = [record for record in self.records if after_id is None or record["id"] > after_id]
+        return newer[-limit:]
+
+
+class FakeSessions:
+    def __init__(self, current_session):
+        self.record = {"id": "record-1", "intake": {}, "current_session": current_session}
+        self.flushed = []
+
+    async def verify_session(self, session_id):
+        return self.record
+
+    async def apply_session_changes(self, unit_of_work):
+        self.flushed.append(dict(unit_of_work.session_updates))
+        return 1
+
+
+def test_window_fetches_only_messages_after_summary():
+    history = FakeHistory(30)
+    memory = ConversationMemory(history_repository=history, summarizer=None)
+    current_session = {SUMMARY_KEY: {"text": "Jane gave her address.", "last_message_id": 25}}
+
+    window = asyncio.run(memory.load_window("session-1", current_session))
+
+    assert history.calls == [(25, memory.settings.conversation_history_max_messages)]
+    assert window.summary == "Jane gave her address."
+    assert window.message_ids == [26, 27, 28, 29, 30]
+    assert window.messages[0] == {"role": "assistant", "content": "message 26"}
+
+
+def test_refresh_folds_older_messages_after_commit():
+    history = FakeHistory(14)
+    summarized = []
+
+    async def summarizer(previous, messages):
+        summarized.append((previous, [m["content"] for m in messages]))
+        return "Jane is 5'6\" and wants medication."
+
+    memory = ConversationMemory(history_repository=history, summarizer=summarizer)
+    sessions = FakeSessions({})
+
+    async def turn():
+        unit_of_work = SessionUnitOfWork(sessions, "session-1")
+        await unit_of_work.load()
+        window = await memory.load_window("session-1", unit_of_work.current_session)
+        assert memory.schedule_refresh(unit_of_work, window) is True
+        assert summarized == []  # nothing runs before the turn is stored
+        await unit_of_work.commit()
+        await asyncio.gather(*memory._tasks)
+        return unit_of_work
+
+    unit_of_work = asyncio.run(turn())
+
+    keep = memory.settings.conversation_window_messages
+    assert summarized == [("", [f"message {i}" for i in range(1, 15 - keep)])]
+    stored = unit_of_work.current_session[SUMMARY_KEY]
+    assert stored["text"] == "Jane is 5'6\" and wants medication."
+    assert stored["last_message_id"] == 14 - keep
+    assert stored["summarized_messages"] == 14 - keep
+    assert sessions.flushed[-1][SUMMARY_KEY]["last_message_id"] == 14 - keep
+
+
+def test_short_conversations_are_not_summarized():
+    memory = ConversationMemory(history_repository=FakeHistory(4), summarizer=None)
+    unit_of_work = SessionUnitOfWork(FakeSessions({}), "session-1")
+
+    async def run():
+        await unit_of_work.load()
+        window = await memory.load_window("session-1", {})
+        return memory.schedule_refresh(unit_of_work, window)
+
+    assert asyncio.run(run()) is False
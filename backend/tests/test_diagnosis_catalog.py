@@ -0,0 +1,100 @@
+"""
+Test the parsed diagnosis catalog: indexing, fuzzy candidate search and validation of model output
+"""
+
+import asyncio
+
+from app.services.diagnosis_catalog import DiagnosisCatalog
+from app.services.diagnosis_engine import ComorbidityMapping, DiagnosisEngine, DiagnosisRecommendation
+
+SAMPLE_LIST = """POCWL DX
+
+##Essential (primary) hypertension
+I10 ( ICD10)
+
+##Hyperlipidemia, unspecified
+E78.5 ( ICD10)
+\f##Obstructive sleep apnea (adult) (pediatric)
+G47.33 ( ICD10)
+
+##Iron deficiency anemia, unspecifiedD50.9 ( ICD10)
+
+##History of gastric bypass
+Z98.84 ( ICD10)
+
+##History of vertical sleeve gastrectomy
+Z98.84 ( ICD10)
+
+##Heartburn
+R12
+"""
+
+
+class FakeResult:
+    def __init__(self, output):
+        self.output = output
+
+
+class FakeAgent:
+    def __init__(self, diagnoses):
+        self.diagnoses = diagnoses
+        self.prompts = []
+
+    async def run(self, prompt):
+        self.prompts.append(prompt)
+        return FakeResult(ComorbidityMapping(recommended_diagnoses=self.diagnoses))
+
+
+def test_parse_indexes_codes_and_names():
+    catalog = DiagnosisCatalog.parse(SAMPLE_LIST)
+
+    assert len(catalog) == 7
+    assert catalog.lookup_code("D50.9")[0].name == "Iron deficiency anemia, unspecified"
+    assert catalog.lookup_code("G47.33")[0].name == "Obstructive sleep apnea (adult) (pediatric)"
+    assert [entry.name for entry in catalog.lookup_code("Z98.84")] == ["History of gastric bypass", "History of vertical sleeve gastrectomy"]
+    assert catalog.lookup_name("heartburn").code == "R12"
+
+
+def test_search_expands_lay_terms_and_tolerates_typos():
+    catalog = DiagnosisCatalog.parse(SAMPLE_LIST)
+
+    assert catalog.search("high blood pressure")[0][0].code == "I10"
+    assert catalog.search("hypertention")[0][0].code == "I10"
+    assert catalog.search("sleep apnea")[0][0].code == "G47.33"
+    assert catalog.search("asthma") == []
+    assert [entry.code for entry in catalog.candidates(["High cholesterol", "asthma"])] == ["E78.5"]
+
+
+def test_resolve_corrects_names_and_codes():
+    catalog = DiagnosisCatalog.parse(SAMPLE_LIST)
+
+    assert catalog.resolve("Gastric bypass status", "Z98.84").name == "History of gastric bypass"
+    assert catalog.resolve("Essential (primary) hypertension", "I10.0").code == "I10"
+    assert catalog.resolve("Asthma", "J45.909") is None
+
+
+def test_engine_sends_only_candidates_and_validates_output():
+    agent = FakeAgent([
+        DiagnosisRecommendation(name="Hypertension", code="I10", reasoning="Mapped high blood pressure"),
+        DiagnosisRecommendation(name="Asthma, unspecified", code="J45.909", reasoning="Mapped asthma"),
+    ])
+    engine = DiagnosisEngine(catalog=DiagnosisCatalog.parse(SAMPLE_LIST), agent=agent)
+    intake = {"intake_medical_history": {"PMHx": ["high blood pressure", "asthma"]}}
+
+    analysis = asyncio.run(engine.analyze(intake))
+
+    assert [(d.name, d.code) for d in analysis.recommended_diagnoses] == [("Essential (primary) hypertension", "I10")]
+    assert "I10: Essential (primary) hypertension" in agent.prompts[0]
+    assert "Heartburn" not in agent.prompts[0]
+    stats = engine.get_stats()
+    assert stats["corrected"] == 1 and stats["dropped"] == 1
+
+
+def test_engine_skips_llm_when_no_condition_matches_the_catalog():
+    agent = FakeAgent([])
+    engine = DiagnosisEngine(catalog=DiagnosisCatalog.parse(SAMPLE_LIST), agent=agent)
+
+    asyncio.run(engine.analyze({"intake_medical_history": {"PMHx": ["asthma"]}}))
+
+    assert agent.prompts == []
+    assert engine.get_stats()["llm_skipped"] == 1
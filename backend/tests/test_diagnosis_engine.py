@@ -0,0 +1,82 @@
+"""
+Test the diagnosis engine: deterministic BMI/history rules and the conditional LLM call
+"""
+
+import asyncio
+
+from app.services.diagnosis_engine import ComorbidityMapping, DiagnosisEngine, DiagnosisRecommendation
+
+
+class FakeResult:
+    def __init__(self, output):
+        self.output = output
+
+
+class FakeAgent:
+    def __init__(self, diagnoses):
+        self.diagnoses = diagnoses
+        self.prompts = []
+
+    async def run(self, prompt):
+        self.prompts.append(prompt)
+        return FakeResult(ComorbidityMapping(recommended_diagnoses=self.diagnoses))
+
+
+def _intake(feet, inches, weight, conditions=None, surgery_types=None, gerd=False, medications=None):
+    return {
+        "intake_demographics": {"gender": "female", "dateOfBirth": "1980-05-01"},
+        "intake_weight_history": {
+            "currentVitals": {"height": {"feet": feet, "inches": inches}, "weight": weight},
+            "bariatricSurgeryHistory": {"hasBariatricSurgeryHistory": bool(surgery_types), "surgeryType": surgery_types},
+        },
+        "intake_medical_history": {
+            "PMHx": conditions or [],
+            "specificConditions": {"gerdHeartburn": {"hasGerd": gerd}},
+            "currentMedications": [{"medicationName": name} for name in medications or []],
+        },
+    }
+
+
+def _codes(analysis):
+    return [diagnosis.code for diagnosis in analysis.recommended_diagnoses]
+
+
+def test_rules_only_intake_skips_the_llm():
+    agent = FakeAgent([])
+    engine = DiagnosisEngine(agent=agent)
+
+    analysis = asyncio.run(engine.analyze(_intake(5, 6, 250, surgery_types=["Sleeve gastrectomy"], gerd=True, medications=["Lantus"])))
+
+    assert analysis.bmi == 40.3
+    assert analysis.bmi_category == "Obese Class III"
+    assert _codes(analysis) == ["E66.01", "Z68.41", "Z98.84", "K21.9", "Z79.4"]
+    assert analysis.recommended_diagnoses[2].name == "History of vertical sleeve gastrectomy"
+    assert agent.prompts == []
+    assert engine.get_stats()["llm_skipped"] == 1
+
+
+def test_free_text_conditions_go_to_the_llm_and_drive_obesity_class():
+    agent = FakeAgent([
+        DiagnosisRecommendation(name="Essential (primary) hypertension", code="I10", reasoning="Mapped high blood pressure"),
+        DiagnosisRecommendation(name="Obesity, unspecified", code="E66.9", reasoning="model guess"),
+    ])
+    engine = DiagnosisEngine(agent=agent)
+
+    analysis = asyncio.run(engine.analyze(_intake(5, 6, 220, conditions=["high blood pressure"])))
+
+    # BMI 35.5 plus a comorbidity is morbid obesity; the model's obesity code is ignored
+    assert _codes(analysis) == ["E66.01", "Z68.35", "I10"]
+    assert len(agent.prompts) == 1
+    assert "high blood pressure" in agent.prompts[0]
+    assert engine.get_stats()["llm_calls"] == 1
+
+
+def test_bmi_bands_and_overweight():
+    engine = DiagnosisEngine(agent=FakeAgent([]))
+
+    overweight = asyncio.run(engine.analyze(_intake(5, 10, 180)))
+    normal = asyncio.run(engine.analyze(_intake(5, 10, 130)))
+
+    assert _codes(overweight) == ["E66.3", "Z68.25"]
+    assert _codes(normal) == []
+    assert normal.bmi_category == "Normal"
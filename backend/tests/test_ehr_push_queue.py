@@ -0,0 +1,162 @@
+"""
+Test the background EHR push queue: job processing, retries and tracking write-back
+"""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from app.core.config import get_settings
+from app.routers import chat as chat_module
+from app.services.ehr_push_queue import EHRPushQueue
+from tests.test_session_unit_of_work import FakeSessionDatabase, _repository
+
+
+class FakeJobRepository:
+    """In-memory stand-in for the ehr_push_jobs table"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    async def get_active_job(self, record_id, section):
+        for job in self.jobs.values():
+            if job["record_id"] == record_id and job["section"] == section and job["status"] in ("pending", "running"):
+                return job
+        return None
+
+    async def create_job(self, record_id, session_id, section, max_attempts):
+        job = {
+            "id": f"job-{len(self.jobs) + 1}",
+            "record_id": record_id,
+            "session_id": session_id,
+            "section": section,
+            "status": "pending",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+        }
+        self.jobs[job["id"]] = job
+        return job
+
+    async def mark_succeeded(self, job_id, attempts):
+        self.jobs[job_id].update(status="succeeded", attempts=attempts)
+        return True
+
+    async def schedule_retry(self, job_id, attempts, next_attempt_at, error):
+        self.jobs[job_id].update(status="pending", attempts=attempts, last_error=error, next_attempt_at=next_attempt_at)
+        return True
+
+    async def mark_failed(self, job_id, attempts, error):
+        self.jobs[job_id].update(status="failed", attempts=attempts, last_error=error)
+        return True
+
+
+class FakeSessionRepository:
+    def __init__(self):
+        self.record = {
+            "id": "record-1",
+            "charm_patient_id": "patient-1",
+            "intake": {
+                "intake_demographics": {"firstName": "Jane"},
+                "intake_demographics_tracking": {"isComplete": True, "pushed_to_charm": False},
+            },
+        }
+
+    async def get_session_by_id(self, record_id):
+        return self.record
+
+    async def update_session_intake(self, record_id, intake_data):
+        self.record["intake"].update(intake_data)
+        return True
+
+    async def update_intake_with_retry(self, record_id, build_patch):
+        self.record["intake"].update(build_patch(self.record["intake"]))
+        return True
+
+
+class FakeEHRService:
+    def __init__(self, results):
+        self.results = list(results)
+        self.pushed = []
+
+    async def push_intake_section(self, section_type, patient_id, section_data):
+        self.pushed.append((section_type, patient_id, section_data))
+        return self.results.pop(0)
+
+
+def _queue(results):
+    jobs, sessions, service = FakeJobRepository(), FakeSessionRepository(), FakeEHRService(results)
+    return EHRPushQueue(job_repository=jobs, session_repository=sessions, service=service), jobs, sessions, service
+
+
+def test_enqueue_skips_duplicate_active_job():
+    queue, jobs, _, _ = _queue([])
+
+    async def run():
+        first = await queue.enqueue("record-1", "session-1", "intake_demographics")
+        second = await queue.enqueue("record-1", "session-1", "intake_demographics")
+        return first, second
+
+    assert asyncio.run(run()) == (True, False)
+    assert len(jobs.jobs) == 1
+
+
+def test_successful_push_writes_tracking_status():
+    queue, jobs, sessions, service = _queue([True])
+
+    async def run():
+        await queue.enqueue("record-1", "session-1", "intake_demographics")
+        return await queue.process_job(dict(jobs.jobs["job-1"]))
+
+    assert asyncio.run(run()) is True
+    assert service.pushed == [("demographics", "patient-1", {"firstName": "Jane"})]
+    assert jobs.jobs["job-1"]["status"] == "succeeded"
+    assert sessions.record["intake"]["intake_demographics_tracking"]["pushed_to_charm"] is True
+
+
+def test_failed_push_retries_then_gives_up():
+    queue, jobs, sessions, _ = _queue([False, False])
+
+    async def run():
+        await queue.enqueue("record-1", "session-1", "intake_demographics")
+        jobs.jobs["job-1"]["max_attempts"] = 2
+        await queue.process_job(dict(jobs.jobs["job-1"]))
+        retried = dict(jobs.jobs["job-1"])
+        await queue.process_job(dict(jobs.jobs["job-1"]))
+        return retried
+
+    retried = asyncio.run(run())
+
+    assert retried["status"] == "pending"
+    assert retried["attempts"] == 1
+    assert jobs.jobs["job-1"]["status"] == "failed"
+    tracking = sessions.record["intake"]["intake_demographics_tracking"]
+    assert tracking["pushed_to_charm"] is False
+    assert tracking["push_error"]
+
+
+def test_confirmed_section_is_queued_only_when_auto_push_is_enabled(monkeypatch):
+    queued = []
+
+    class RecordingQueue:
+        async def enqueue(self, record_id, session_id, section):
+            queued.append(section)
+            return True
+
+    monkeypatch.setattr(chat_module, "ehr_push_queue", RecordingQueue())
+
+    def confirm(auto_push):
+        settings = get_settings().model_copy(update={"ehr_auto_push_enabled": auto_push})
+        monkeypatch.setattr(chat_module, "get_settings", lambda: settings)
+        database = FakeSessionDatabase({"intake_demographics": {"firstName": "Jane"}})
+        monkeypatch.setattr(chat_module, "intake_repository", _repository(database))
+        result = asyncio.run(chat_module.confirm_section_data("session-1"))
+        return result, database
+
+    result, database = confirm(auto_push=False)
+    assert result["completed_section"] == "intake_demographics"
+    assert database.row["intake"]["intake_demographics"]["isComplete"] is True
+    assert queued == []
+
+    confirm(auto_push=True)
+    assert queued == ["intake_demographics"]
@@ -0,0 +1,56 @@
+"""
+Test the indexed field_grouping.json question groups
+"""
+
+import json
+import os
+
+from app.services.field_grouping import FieldGroupingIndex, field_grouping_index
+
+
+def _write_config(path, groups):
+    path.write_text(json.dumps({"intake_demographics": {"groups": groups}}))
+
+
+def test_next_group_is_lowest_group_with_unasked_fields(tmp_path):
+    config = tmp_path / "field_grouping.json"
+    _write_config(config, [
+        {"group_id": 2, "name": "contact", "fields": [{"field": "email"}, {"field": "phone.mobile"}]},
+        {"group_id": 1, "name": "basic", "fields": [{"field": "firstName"}, {"field": "lastName"}]},
+    ])
+    index = FieldGroupingIndex(str(config))
+
+    assert index.next_group_fields(["phone.mobile", "lastName"], "intake_demographics") == ["lastName"]
+    assert index.next_group_fields(["phone.mobile", "email"], "intake_demographics") == ["email", "phone.mobile"]
+    assert index.next_group_fields(["notGrouped"], "intake_demographics") == []
+
+
+def test_section_without_groups_falls_back_to_first_field(tmp_path):
+    config = tmp_path / "field_grouping.json"
+    _write_config(config, [])
+    index = FieldGroupingIndex(str(config))
+
+    assert index.next_group_fields(["b", "a"], "intake_medical_history") == ["b"]
+    assert index.next_group_fields([], "intake_medical_history") == []
+
+
+def test_reloads_only_when_mtime_changes(tmp_path):
+    config = tmp_path / "field_grouping.json"
+    _write_config(config, [{"group_id": 1, "name": "basic", "fields": [{"field": "firstName"}]}])
+    index = FieldGroupingIndex(str(config))
+    first = index.get_section("intake_demographics")
+
+    assert index.get_section("intake_demographics") is first
+
+    _write_config(config, [{"group_id": 1, "name": "basic", "fields": [{"field": "lastName"}]}])
+    stat = os.stat(config)
+    os.utime(config, (stat.st_atime, stat.st_mtime + 10))
+
+    assert index.get_groups("intake_demographics") == {1: ["lastName"]}
+
+
+def test_shipped_config_loads():
+    groups = field_grouping_index.get_groups("intake_demographics")
+
+    assert groups
+    assert all(isinstance(group_id, int) for group_id in groups)
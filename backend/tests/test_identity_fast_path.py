@@ -0,0 +1,82 @@
+"""
+Test the local identity extractors and the LLM fallback of the verification flow
+"""
+
+import asyncio
+
+from app.services.identity_verification import IdentityVerificationService
+
+
+class FakeLLMExtraction:
+    last_name = "Smith"
+    date_of_birth = "1985-01-15"
+    original_date_format = "MM/DD/YYYY"
+
+
+def test_local_extraction_handles_common_replies():
+    service = IdentityVerificationService()
+    replies = {
+        "Smith 01/15/1985": ("Smith", "1985-01-15", "MM/DD/YYYY"),
+        "my last name is O'Brien and my dob is 1/15/85": ("O'Brien", "1985-01-15", "MM/DD/YY"),
+        "It's Doe-Jones, born January 15th, 1985": ("Doe-Jones", "1985-01-15", "Month DD, YYYY"),
+        "garcia 15 march 1985": ("Garcia", "1985-03-15", "DD Month YYYY"),
+        "Lee, 1985-01-15": ("Lee", "1985-01-15", "YYYY-MM-DD"),
+    }
+
+    for message, (last_name, dob, date_format) in replies.items():
+        match = service.extract_identity(message)
+        assert (match.last_name, match.date_of_birth, match.original_date_format) == (last_name, dob, date_format), message
+        assert match.confidence >= service.settings.identity_fast_path_min_confidence, message
+
+
+def test_missing_field_is_filled_from_earlier_user_message():
+    service = IdentityVerificationService()
+    history = [
+        {"role": "assistant", "content": "Could you tell me your last name and date of birth?"},
+        {"role": "user", "content": "Smith"},
+        {"role": "assistant", "content": "Thanks! And your date of birth?"},
+    ]
+
+    match = service.extract_identity("03/04/1990", history)
+
+    assert (match.last_name, match.date_of_birth) == ("Smith", "1990-03-04")
+
+
+def test_confident_match_skips_history_and_llm():
+    service = IdentityVerificationService()
+    calls = []
+
+    async def load_history():
+        calls.append("history")
+        return []
+
+    async def llm_extract(message, history):
+        calls.append("llm")
+        return FakeLLMExtraction()
+
+    match = asyncio.run(service.resolve_identity("Smith 01/15/1985", load_history, llm_extract))
+
+    assert match.source == "local"
+    assert calls == []
+    assert service.get_stats()["local_hits"] == 1
+
+
+def test_ambiguous_reply_falls_back_to_llm():
+    service = IdentityVerificationService()
+    calls = []
+
+    async def load_history():
+        calls.append("history")
+        return [{"role": "user", "content": "hello"}]
+
+    async def llm_extract(message, history):
+        calls.append(("llm", len(history)))
+        return FakeLLMExtraction()
+
+    match = asyncio.run(service.resolve_identity("my name is Jane Smith, born the fifteenth of January", load_history, llm_extract))
+
+    assert match.source == "llm"
+    assert (match.last_name, match.date_of_birth) == ("Smith", "1985-01-15")
+    assert calls == ["history", ("llm", 1)]
+    stats = service.get_stats()
+    assert stats["llm_fallbacks"] == 1 and stats["hit_ratio"] == 0.0
@@ -0,0 +1,129 @@
+"""
+Test partial intake writes through patch_session_intake and the compare-and-swap retry
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.repositories.intake_repository import IntakeSessionRepository, IntakeVersionConflict, merge_intake_sections
+
+
+class FakeIntakeDatabase:
+    """In-memory poc_intake_sessions row with the semantics of patch_session_intake"""
+
+    def __init__(self, intake):
+        self.row = {"id": "record-1", "intake": intake, "intake_version": 0}
+        self.calls = []
+        self.before_patch = None  # hook to simulate a write landing between read and patch
+
+    def rpc(self, name, params):
+        self.calls.append(("rpc", name, params))
+        return SimpleNamespace(execute=lambda: self._patch(params))
+
+    async def _patch(self, params):
+        if self.before_patch:
+            hook, self.before_patch = self.before_patch, None
+            hook()
+        expected = params["p_expected_version"]
+        if params["p_record_id"] != self.row["id"] or (expected is not None and expected != self.row["intake_version"]):
+            return SimpleNamespace(data=None)
+        self.row["intake"] = {**self.row["intake"], **params["p_patch"]}
+        self.row["intake_version"] += 1
+        return SimpleNamespace(data=self.row["intake_version"])
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self.calls.append(("select", columns))
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=[{"intake": dict(self.row["intake"]), "intake_version": self.row["intake_version"]}])
+
+
+def _repository(database):
+    repository = IntakeSessionRepository()
+
+    async def get_client():
+        return database
+
+    repository._get_client = get_client
+    return repository
+
+
+def test_update_session_intake_sends_only_changed_keys():
+    database = FakeIntakeDatabase({"intake_demographics": {"firstName": "Jane"}, "intake_weight_history": {"goal": 150}})
+    repository = _repository(database)
+
+    asyncio.run(repository.update_session_intake("record-1", {"intake_demographics": {"firstName": "Janet"}}))
+
+    assert database.calls == [("rpc", "patch_session_intake", {
+        "p_record_id": "record-1",
+        "p_patch": {"intake_demographics": {"firstName": "Janet"}},
+        "p_expected_version": None,
+    })]
+    assert database.row["intake"]["intake_weight_history"] == {"goal": 150}
+
+
+def test_stale_version_raises_conflict():
+    database = FakeIntakeDatabase({})
+    database.row["intake_version"] = 3
+    repository = _repository(database)
+
+    with pytest.raises(IntakeVersionConflict):
+        asyncio.run(repository.update_session_intake("record-1", {"intake_demographics": {}}, expected_version=2))
+
+
+def test_retry_keeps_concurrent_write():
+    database = FakeIntakeDatabase({"intake_demographics": {"firstName": "Jane"}})
+    repository = _repository(database)
+
+    def concurrent_chat_turn():
+        database.row["intake"]["intake_demographics"] = {"firstName": "Jane", "email": "jane@example.com"}
+        database.row["intake_version"] += 1
+
+    database.before_patch = concurrent_chat_turn
+
+    def build_patch(intake):
+        section = dict(intake.get("intake_demographics") or {})
+        section["isComplete"] = True
+        return {"intake_demographics": section}
+
+    assert asyncio.run(repository.update_intake_with_retry("record-1", build_patch)) is True
+    assert database.row["intake"]["intake_demographics"] == {
+        "firstName": "Jane",
+        "email": "jane@example.com",
+        "isComplete": True,
+    }
+    assert database.row["intake_version"] == 2
+
+
+def test_conflict_merge_writes_only_the_callers_changes():
+    base = {
+        "intake_demographics": {"firstName": "Jane", "address": {"city": "Tucson", "zipCode": "85701"}},
+        "intake_demographics_tracking": {"unasked_fields": ["email"], "isComplete": False, "pushed_to_charm": False},
+        "intake_weight_history": {"currentWeight": 210},
+    }
+    # The caller re-stages every key it read but changes only the email and the city
+    updated = {
+        "intake_demographics": {"firstName": "Jane", "email": "jane@example.com", "address": {"city": "Phoenix", "zipCode": "85701"}},
+        "intake_demographics_tracking": {"unasked_fields": [], "isComplete": False, "pushed_to_charm": False},
+        "intake_weight_history": {"currentWeight": 210},
+    }
+    # Meanwhile other writes changed the name, the zip code, the push flag and another section
+    latest = {
+        "intake_demographics": {"firstName": "Janet", "address": {"city": "Tucson", "zipCode": "85705"}},
+        "intake_demographics_tracking": {"unasked_fields": ["email"], "isComplete": False, "pushed_to_charm": True},
+        "intake_weight_history": {"currentWeight": 205},
+    }
+
+    assert merge_intake_sections(latest, updated, base) == {
+        "intake_demographics": {"firstName": "Janet", "email": "jane@example.com", "address": {"city": "Phoenix", "zipCode": "85705"}},
+        "intake_demographics_tracking": {"unasked_fields": [], "isComplete": False, "pushed_to_charm": True},
+    }
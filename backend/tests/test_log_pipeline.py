@@ -0,0 +1,112 @@
+"""
+Test the queued logging pipeline: PHI redaction, payload summaries, sampling and non-blocking enqueue
+"""
+
+import logging
+import queue
+
+from app.core.log_pipeline import (
+    LogPipeline,
+    LogPipelineStats,
+    NonBlockingQueueHandler,
+    PHI,
+    PHIRedactionFilter,
+    Payload,
+    SamplingFilter,
+    ScrubbingQueueListener,
+)
+
+
+def _record(msg, args, level=logging.INFO, name="app.routers.chat"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_redaction_copies_args_and_masks_phi_fields():
+    demographics = {"firstName": "Jane", "email": "jane@example.com", "address": {"city": "Tucson", "state": "AZ"}, "isComplete": False}
+    record = _record("Demographics: %s", (demographics,))
+
+    PHIRedactionFilter().filter(record)
+    demographics["firstName"] = "Changed"
+
+    message = record.getMessage()
+    assert "Jane" not in message and "Changed" not in message
+    assert "jane@example.com" not in message and "Tucson" not in message
+    assert "'state': 'AZ'" in message and "'isComplete': False" in message
+
+
+def test_listener_scrubs_emails_and_phone_numbers():
+    record = _record("Contact %s at %s", ("jane@example.com", "(520) 555-0100"))
+
+    ScrubbingQueueListener(queue.Queue()).prepare(record)
+
+    assert record.getMessage() == "Contact [REDACTED] at [REDACTED]"
+
+
+def test_scalar_phi_args_are_never_rendered():
+    record = _record("Allergy %s already recorded for patient %s", (PHI("Penicillin"), "patient-1"))
+
+    PHIRedactionFilter().filter(record)
+    ScrubbingQueueListener(queue.Queue()).prepare(record)
+
+    assert record.getMessage() == "Allergy [REDACTED] already recorded for patient patient-1"
+    assert repr(PHI("Penicillin")) == "[REDACTED]"
+
+
+def test_payload_renders_size_not_contents():
+    assert str(Payload({"lastName": "Doe", "dob": "1980-01-01"})) == "<dict 2 keys: dob, lastName>"
+    assert str(Payload("Doe")) == "<3 bytes>"
+    assert str(Payload([1, 2, 3])) == "<list 3 items>"
+
+
+def test_sampling_uses_longest_prefix_and_keeps_warnings():
+    sampling = SamplingFilter({"app": 1.0, "app.services.ehr_service": 0.0})
+
+    assert sampling.filter(_record("kept", (), name="app.routers.chat"))
+    assert not sampling.filter(_record("dropped", (), name="app.services.ehr_service"))
+    assert sampling.filter(_record("warning", (), level=logging.WARNING, name="app.services.ehr_service"))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    stats = LogPipelineStats()
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1), stats)
+
+    handler.handle(_record("first", ()))
+    handler.handle(_record("second", ()))
+
+    assert stats.enqueued == 1
+    assert stats.dropped == 1
+
+
+def test_pipeline_formats_on_listener_thread():
+    root = logging.getLogger()
+    collector = CollectingHandler()
+    original_handlers, original_level = list(root.handlers), root.level
+    for handler in original_handlers:
+        root.removeHandler(handler)
+    root.addHandler(collector)
+    root.setLevel(logging.INFO)
+
+    pipeline = LogPipeline()
+    try:
+        pipeline.start()
+        assert root.handlers != [collector]
+        logging.getLogger("app.test").info("Patient %s updated", {"lastName": "Doe", "patient_id": "42"})
+        pipeline.stop()
+    finally:
+        pipeline.stop()
+        root.removeHandler(collector)
+        for handler in original_handlers:
+            root.addHandler(handler)
+        root.setLevel(original_level)
+
+    assert collector.messages == ["Patient {'lastName': '[REDACTED]', 'patient_id': '42'} updated"]
+    assert pipeline.get_stats()["enqueued"] == 1
@@ -0,0 +1,80 @@
+"""
+Test that medical history sub-pushes and per-item writes run concurrently
+under the configured Charm concurrency limit
+"""
+
+import asyncio
+
+import httpx
+
+from app.services.ehr_service import EHRService
+
+
+class InFlightRecorder:
+    """Charm handler recording how many requests overlap"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return httpx.Response(200, json={"code": "0"})
+
+
+def test_medical_history_push_fans_out_under_limit(mock_charm):
+    recorder = InFlightRecorder()
+    charm_http = mock_charm(recorder.handle)
+    service = EHRService(http_client=charm_http)
+    service._request_semaphore = asyncio.Semaphore(4)
+
+    medical_history = {
+        "allergies": [{"allergen": f"Allergen {i}", "severity": "mild"} for i in range(5)],
+        "familyHistory": [{"familyMember": "mother", "medicalProblem": f"Problem {i}"} for i in range(5)],
+        "pastSurgicalHistory": [{"surgeryType": f"Surgery {i}", "year": 2000 + i} for i in range(5)],
+    }
+
+    async def run():
+        result = await service._push_medical_history_to_charm("patient-1", medical_history)
+        await charm_http.aclose()
+        return result
+
+    assert asyncio.run(run()) is True
+    # 15 inserts plus one read of each chart list being synced (allergies, family history, procedures)
+    assert len(charm_http.requests) == 18
+    assert 1 < recorder.max_in_flight <= 4
+
+
+def test_failed_item_fails_its_sub_push(mock_charm):
+    def fail_second_surgery(request):
+        status = 500 if b"Surgery 1" in request.content else 200
+        return httpx.Response(status, json={"code": "0"})
+
+    service = EHRService(http_client=mock_charm(fail_second_surgery))
+    surgeries = [{"surgeryType": f"Surgery {i}", "year": 2010} for i in range(3)]
+
+    assert asyncio.run(service._push_past_surgeries_to_charm("patient-1", surgeries, {})) is False
+
+
+def test_every_legacy_sub_push_shares_the_limit(mock_charm):
+    recorder = InFlightRecorder()
+    charm_http = mock_charm(recorder.handle)
+    service = EHRService(http_client=charm_http)
+    service.settings = service.settings.model_copy(update={"ehr_push_sync_mode": False})
+    service._request_semaphore = asyncio.Semaphore(2)
+
+    medical_history = {
+        "currentMedications": [{"medicationName": "Metformin", "strength": "500 mg"}],
+        "PMHx": ["Hypertension"],
+        "socialHistory": {"smokingSummary": "Never"},
+        "allergies": [{"allergen": f"Allergen {i}"} for i in range(3)],
+        "pastSurgicalHistory": [{"surgeryType": f"Surgery {i}"} for i in range(3)],
+    }
+
+    assert asyncio.run(service._push_medical_history_to_charm("patient-1", medical_history)) is True
+    # medications, PMHx, social history, allergy fetch, 3 allergies, 3 surgeries
+    assert len(charm_http.requests) == 10
+    assert recorder.max_in_flight == 2
@@ -0,0 +1,121 @@
+"""
+Test per-stage latency metrics, the Prometheus rendering and the Server-Timing header
+"""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+from fastapi import FastAPI
+
+from app import main as main_module
+from app.core.http_client import CharmHTTPClient
+from app.core.metrics import MetricsRegistry, ServerTimingMiddleware
+from app.services import pydantic_intake_agent as agent_module
+
+
+def test_quantiles_and_prometheus_output():
+    registry = MetricsRegistry(window_size=100)
+    for ms in range(1, 101):
+        registry.observe("db.verify_session", ms / 1000)
+
+    stats = registry.snapshot()["db.verify_session"]
+    assert stats["count"] == 100
+    assert stats["p50"] == 0.05
+    assert stats["p95"] == 0.095
+    assert stats["p99"] == 0.099
+
+    text = registry.render_prometheus()
+    assert 'poc_intake_stage_duration_seconds{stage="db.verify_session",quantile="0.95"} 0.095000' in text
+    assert 'poc_intake_stage_duration_seconds_count{stage="db.verify_session"} 100' in text
+
+
+def test_timed_counts_errors():
+    registry = MetricsRegistry(window_size=10)
+
+    @registry.timed("agent.conversation")
+    async def failing():
+        raise ValueError("boom")
+
+    try:
+        asyncio.run(failing())
+    except ValueError:
+        pass
+
+    assert registry.snapshot()["agent.conversation"]["errors"] == 1
+
+
+def test_server_timing_header_lists_request_stages():
+    registry = MetricsRegistry(window_size=10)
+    app = FastAPI()
+
+    @registry.timed("db.get_recent_messages")
+    async def load_messages():
+        await asyncio.sleep(0.01)
+
+    @app.get("/api/v1/chat/{session_id}/history")
+    async def history(session_id: str):
+        await load_messages()
+        await load_messages()
+        return {"ok": True}
+
+    app.add_middleware(ServerTimingMiddleware, registry=registry, header_enabled=True)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/v1/chat/abc/history")
+
+    response = asyncio.run(run())
+    header = response.headers["server-timing"]
+
+    assert header.startswith('db.get_recent_messages;dur=')
+    assert 'desc="x2"' in header
+    assert "total;dur=" in header
+    assert registry.snapshot()["http.GET /api/v1/chat/{session_id}/history"]["count"] == 1
+
+
+def test_charm_stage_name_drops_ids():
+    request = httpx.Request("GET", "https://ehr.charmtracker.com/api/ehr/v1/patients/123456/allergies")
+    assert CharmHTTPClient._stage_name(request) == "charm.get.patients.allergies"
+
+
+def test_metrics_endpoint_requires_the_configured_token(monkeypatch):
+    async def get(headers=None):
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics", headers=headers or {})
+
+    def with_token(token):
+        settings = main_module.get_settings().model_copy(update={"metrics_token": token})
+        monkeypatch.setattr(main_module, "get_settings", lambda: settings)
+
+    with_token(None)
+    assert asyncio.run(get({"Authorization": "Bearer anything"})).status_code == 404
+
+    with_token("secret")
+    assert asyncio.run(get()).status_code == 404
+    assert asyncio.run(get({"Authorization": "Bearer wrong"})).status_code == 404
+    response = asyncio.run(get({"Authorization": "Bearer secret"}))
+    assert response.status_code == 200
+    assert "poc_intake_stage_duration_seconds" in response.text
+
+
+def test_failed_conversation_run_counts_as_an_error(monkeypatch):
+    registry = MetricsRegistry(window_size=10)
+    monkeypatch.setattr(agent_module, "metrics", registry)
+
+    class FailingAgent:
+        async def run(self, prompt):
+            raise RuntimeError("model unavailable")
+
+    agent = agent_module.pydantic_intake_agent
+    monkeypatch.setattr(agent, "conversation_agent", FailingAgent())
+    context = agent_module.IntakeContext(session_id="session-1", current_section="intake_demographics", intake_data={})
+
+    response = asyncio.run(agent.process_conversation("hello", context))
+
+    assert response.agent_actions == ["error_recovery"]
+    assert registry.snapshot()["agent.conversation"]["errors"] == 1
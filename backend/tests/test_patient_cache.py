@@ -0,0 +1,99 @@
+"""
+Test the Charm patient record cache: reuse across lookups, TTL expiry and invalidation on writes
+"""
+
+import asyncio
+
+import httpx
+
+from app.services.ehr_service import EHRService
+from app.services.patient_cache import PatientRecordCache
+
+PATIENT = {"patient_id": "900", "first_name": "Jane", "last_name": "Doe", "dob": "1980-01-01", "gender": "female"}
+
+
+def _patients_handler(request):
+    """Answers patient lookups and detail reads"""
+    if request.method == "GET" and request.url.path.endswith("/patients"):
+        return httpx.Response(200, json={"code": "0", "patients": [PATIENT]})
+    if request.method == "GET":
+        return httpx.Response(200, json={"code": "0", "patient": dict(PATIENT, custom_field_1="")})
+    return httpx.Response(200, json={"code": "0"})
+
+
+def _service(mock_charm):
+    charm_http = mock_charm(_patients_handler)
+    return EHRService(http_client=charm_http), charm_http
+
+
+def _gets(charm_http):
+    return [("GET", request.url.path) for request in charm_http.requests if request.method == "GET"]
+
+
+def test_mrn_lookup_is_served_from_cache_until_demographics_push(mock_charm):
+    service, charm_http = _service(mock_charm)
+
+    async def run():
+        first = await service.validate_patient_by_mrn("MRN-1")
+        first["first_name"] = "changed by caller"
+        second = await service.validate_patient_by_mrn("MRN-1")
+        await service._push_demographics_to_charm("900", {"firstName": "Janet"})
+        third = await service.validate_patient_by_mrn("MRN-1")
+        return second, third
+
+    second, third = asyncio.run(run())
+
+    lookups = [r for r in _gets(charm_http) if r == ("GET", "/api/ehr/v1/patients")]
+    assert second["first_name"] == "Jane"
+    assert third["first_name"] == "Jane"
+    assert len(lookups) == 2
+    stats = service.patient_cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["invalidations"] == 1
+
+
+def test_demographics_update_drops_the_cached_patient(mock_charm):
+    service, charm_http = _service(mock_charm)
+
+    async def run():
+        await service.validate_patient_by_mrn("MRN-1")
+        await service._get_patient_details("900", {})
+        await service.update_patient_demographics("900", {"first_name": "Janet"})
+        await service.validate_patient_by_mrn("MRN-1")
+        await service._get_patient_details("900", {})
+
+    asyncio.run(run())
+
+    assert _gets(charm_http) == [
+        ("GET", "/api/ehr/v1/patients"),
+        ("GET", "/api/ehr/v1/patients/900"),
+        ("GET", "/api/ehr/v1/patients"),
+        ("GET", "/api/ehr/v1/patients/900"),
+    ]
+
+
+def test_bariatric_update_writes_through_patient_details(mock_charm):
+    service, charm_http = _service(mock_charm)
+
+    async def run():
+        await service._push_bariatric_surgery_to_patient("900", {"surgeryType": ["Sleeve"], "surgeryYear": 2015}, {})
+        return await service._get_patient_details("900", {})
+
+    details = asyncio.run(run())
+
+    assert details["custom_field_1"] == "Sleeve"
+    assert details["custom_field_2"] == "2015"
+    assert _gets(charm_http) == [("GET", "/api/ehr/v1/patients/900")]
+
+
+def test_expired_entries_count_as_stale(monkeypatch):
+    cache = PatientRecordCache(ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr("app.core.ttl_cache.time.monotonic", lambda: now[0])
+
+    cache.put_by_mrn("MRN-1", PATIENT)
+    assert cache.get_by_mrn("MRN-1") == PATIENT
+
+    now[0] += 61
+    assert cache.get_by_mrn("MRN-1") is None
+    assert cache.get_stats()["stale"] == 1
@@ -0,0 +1,115 @@
+"""
+Test the preloaded payer list: paged loading, alias/prefix/typo matching and the agent tool
+"""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+
+from app.services import payer_directory as payer_module
+from app.services import pydantic_intake_agent as agent_module
+from app.services.ehr_service import EHRService
+from app.services.payer_directory import PayerDirectory, PayerIndex
+
+PAYERS = [
+    {"practice_payer_id": 101, "payer_id": "BCBSAZ", "payer_name": "Blue Cross Blue Shield of Arizona"},
+    {"practice_payer_id": 102, "payer_id": "87726", "payer_name": "UnitedHealthcare"},
+    {"practice_payer_id": 103, "payer_id": "60054", "payer_name": "Aetna"},
+    {"practice_payer_id": 104, "payer_id": "SKAZ0", "payer_name": "AHCCCS Medicaid"},
+    {"practice_payer_id": 105, "payer_id": "62308", "payer_name": "Cigna Health and Life Insurance"},
+]
+
+
+def _payers_handler(payers, honour_paging=True):
+    """Serves /payers in start_index/count pages"""
+    def handler(request):
+        if not honour_paging:
+            return httpx.Response(200, json={"code": "0", "payers": payers})
+        start, count = int(request.url.params["start_index"]), int(request.url.params["count"])
+        return httpx.Response(200, json={"code": "0", "payers": payers[start:start + count]})
+
+    return handler
+
+
+def _ids(matches):
+    return [payer["practice_payer_id"] for payer, _ in matches]
+
+
+def test_index_matches_aliases_prefixes_typos_and_ids():
+    index = PayerIndex(PAYERS)
+
+    assert _ids(index.search("BCBS"))[0] == 101
+    assert _ids(index.search("united health care"))[0] == 102
+    assert _ids(index.search("Unit"))[0] == 102
+    assert _ids(index.search("Aetan"))[0] == 103
+    assert _ids(index.search("medicaid"))[0] == 104
+    assert index.search("87726") == [(PAYERS[1], 1.0)]
+    assert index.lookup_id("skaz0")["payer_name"] == "AHCCCS Medicaid"
+    assert index.search("Kaiser Permanente") == []
+
+
+def test_refresh_reads_every_page_and_stops_when_paging_is_ignored(mock_charm):
+    paged = mock_charm(_payers_handler(PAYERS), payer_module)
+    unpaged = mock_charm(_payers_handler(PAYERS, honour_paging=False), payer_module)
+    directory = PayerDirectory(http_client=paged)
+    directory.settings = directory.settings.model_copy(update={"payer_directory_page_size": 2})
+    fallback = PayerDirectory(http_client=unpaged)
+    fallback.settings = directory.settings
+
+    assert asyncio.run(directory.refresh()) == 5
+    assert [request.url.params["start_index"] for request in paged.requests] == ["0", "2", "4"]
+    assert asyncio.run(fallback.refresh()) == 5
+    assert len(unpaged.requests) == 2
+
+
+def test_ehr_service_and_agent_tool_share_the_preloaded_list(monkeypatch, mock_charm):
+    charm_http = mock_charm(_payers_handler(PAYERS), payer_module)
+    directory = PayerDirectory(http_client=charm_http)
+    monkeypatch.setattr(agent_module, "payer_directory", directory)
+    service = EHRService(http_client=charm_http, payer_directory=directory)
+
+    async def run():
+        payers = await service.get_payers_list()
+        matches = await agent_module.search_payers("my insurance is united healthcare")
+        return payers, matches
+
+    payers, matches = asyncio.run(run())
+
+    assert payers == PAYERS
+    assert matches[0]["practice_payer_id"] == 102 and matches[0]["match_score"] >= 0.5
+    assert len(charm_http.requests) == 1
+    assert directory.get_stats()["searches"] == 1
+
+
+def test_concurrent_first_loads_share_one_fetch(mock_charm):
+    charm_http = mock_charm(_payers_handler(PAYERS), payer_module)
+    directory = PayerDirectory(http_client=charm_http)
+
+    async def run():
+        await asyncio.gather(*(directory.ensure_loaded() for _ in range(5)))
+
+    asyncio.run(run())
+
+    assert len(charm_http.requests) == 1
+    assert directory.get_stats()["refreshes"] == 1
+
+
+def test_requests_do_not_refetch_while_the_background_load_is_failing(monkeypatch, mock_charm):
+    charm_http = mock_charm(lambda request: httpx.Response(503, text="unavailable"), payer_module)
+    directory = PayerDirectory(http_client=charm_http)
+    monkeypatch.setattr(agent_module, "payer_directory", directory)
+
+    async def run():
+        await directory.start()
+        await asyncio.sleep(0.01)  # the loop's first load fails
+        results = await asyncio.gather(*(agent_module.search_payers("Aetna") for _ in range(3)))
+        await directory.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results == [[], [], []]
+    assert len(charm_http.requests) == 1
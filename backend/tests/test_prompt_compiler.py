@@ -0,0 +1,64 @@
+"""
+Test prompt compilation: compact JSON rendering, optional fragments and per-fragment token accounting
+"""
+
+from app.services.prompt_compiler import (
+    CONVERSATION_SYSTEM,
+    CONVERSATION_TURN_FRAGMENTS,
+    PromptCompiler,
+    PromptFragment,
+    compact_json,
+    count_tokens,
+    prompt_compiler,
+)
+
+
+def test_compact_json_drops_empty_fields():
+    data = {"firstName": "Jane", "middleName": "", "phone": {"work": None, "mobile": "5205550100"}, "providers": [{}], "isComplete": False}
+
+    assert compact_json(data) == '{"firstName":"Jane","phone":{"mobile":"5205550100"},"isComplete":false}'
+
+
+def test_compile_renders_fragments_and_counts_tokens():
+    compiler = PromptCompiler([
+        PromptFragment("header", 1, "Section: $section"),
+        PromptFragment("data", 3, "Data: $data"),
+        PromptFragment("summary", 1, "Summary:\n$summary", optional=True),
+    ])
+
+    compiled = compiler.compile("turn", ["header", "data", "summary"], {"section": "intake_demographics", "data": {"email": "a@b.co", "lastName": ""}, "summary": ""})
+
+    assert compiled.text == 'Section: intake_demographics\n\nData: {"email":"a@b.co"}'
+    assert [name for name, _, _ in compiled.fragments] == ["header", "data"]
+    assert compiled.token_breakdown()["data@v3"] == count_tokens('Data: {"email":"a@b.co"}')
+
+    compiler.compile("turn", ["header", "data"], {"section": "intake_medical_history", "data": {}})
+    stats = compiler.get_stats()
+    assert stats["prompts"]["turn"]["sent"] == 2
+    assert stats["fragments"]["header"]["sent"] == 2
+    assert stats["fragments"]["data"]["version"] == 3
+    assert "summary" not in stats["fragments"]
+
+
+def test_conversation_prompt_has_no_legacy_prompt_or_reprs():
+    system = prompt_compiler.compile("conversation.system", [CONVERSATION_SYSTEM.name], record=False)
+    assert not any(line.lstrip().startswith("#") for line in system.text.splitlines())
+
+    turn = prompt_compiler.compile("conversation.turn", CONVERSATION_TURN_FRAGMENTS, {
+        "session_id": "abc123",
+        "current_section": "intake_demographics",
+        "tracking_key": "intake_demographics_tracking",
+        "schema_info": "Schema for intake_demographics",
+        "current_data": {"firstName": "Jane", "middleName": None},
+        "unasked_fields": ["email", "phone.work"],
+        "next_question_group": ["email"],
+        "remaining_fields": 2,
+        "conversation_summary": "",
+        "conversation_history": "No previous conversation",
+        "message": '"My email is jane@example.com"',
+    }, record=False)
+
+    assert 'Current Section Data (JSON): {"firstName":"Jane"}' in turn.text
+    assert 'Unasked fields remaining: ["email","phone.work"]' in turn.text
+    assert "Earlier Conversation Summary" not in turn.text
+    assert turn.text.startswith("DATA EXTRACTION RULES:")
@@ -0,0 +1,147 @@
+"""
+Test the local provider directory: fuzzy index search, background sync and incremental additions
+"""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+
+from app.services import provider_directory as directory_module
+from app.services import pydantic_intake_agent as agent_module
+from app.services.provider_directory import ProviderDirectory, ProviderIndex
+from app.services.provider_search_cache import ProviderSearchCache
+
+PROVIDERS = [
+    {"provider_id": "1", "first_name": "Katherine", "middle_name": "A", "last_name": "Nguyen", "speciality": "Family Medicine", "mobile": "(520) 555-0100", "practice_name": "Desert Family Care"},
+    {"provider_id": "2", "first_name": "Kathryn", "last_name": "Newman", "speciality": "Cardiology", "mobile": "520-555-0199", "practice_name": "Tucson Heart Group"},
+    {"provider_id": "3", "first_name": "Robert", "last_name": "Alvarez", "speciality": "Endocrinology", "mobile": "6025550123", "practice_name": "Valley Endocrine"},
+]
+
+
+def _directory_handler(providers, per_page=2):
+    """Serves a paged directory listing and provider creation"""
+    def handler(request):
+        params = dict(request.url.params)
+        if request.method == "POST":
+            return httpx.Response(200, json={"code": "0", "provider_details": {"provider_id": "9", "first_name": "Maria", "last_name": "Okafor"}})
+        if "page" not in params:
+            return httpx.Response(200, json={"code": "0", "providers": []})
+        page = int(params["page"])
+        chunk = providers[(page - 1) * per_page:page * per_page]
+        more = page * per_page < len(providers)
+        return httpx.Response(200, json={"code": "0", "providers": chunk, "page_context": {"has_more_page": more}})
+
+    return handler
+
+
+class FakeRepository:
+    """In-memory stand-in for the Supabase mirror"""
+
+    def __init__(self, providers=()):
+        self.rows = {provider["provider_id"]: provider for provider in providers}
+
+    async def load_all(self):
+        return list(self.rows.values())
+
+    async def upsert_providers(self, providers, synced_at):
+        for provider in providers:
+            self.rows[str(provider["provider_id"])] = provider
+
+    async def delete_stale(self, synced_before):
+        return 0
+
+
+def _ids(matches):
+    return [provider["provider_id"] for provider, _ in matches]
+
+
+def test_index_tolerates_typos_titles_and_missing_middle_names():
+    index = ProviderIndex(PROVIDERS)
+
+    assert _ids(index.search("Dr. Katherine Nguyen MD"))[0] == "1"
+    assert _ids(index.search("Katherin Nguyin"))[0] == "1"
+    assert _ids(index.search("Alvarez")) == ["3"]
+    assert index.search("Thomas Becker") == []
+
+
+def test_phone_and_practice_rank_between_similar_names():
+    index = ProviderIndex(PROVIDERS)
+
+    assert _ids(index.search("Kathryn N", phone="520.555.0199"))[0] == "2"
+    assert _ids(index.search("Kath Nguyen", practice_name="desert family"))[0] == "1"
+
+    index.upsert({**PROVIDERS[1], "mobile": "520-555-0111"})
+    assert _ids(index.search("Kathryn N", phone="520.555.0199", min_score=0.9)) == []
+    assert len(index) == 3
+
+
+def test_sync_follows_pages_and_keeps_additions_made_during_the_listing(mock_charm):
+    charm_http = mock_charm(_directory_handler(PROVIDERS), directory_module)
+    repository = FakeRepository()
+    directory = ProviderDirectory(repository=repository, http_client=charm_http)
+    fetch_all = directory.fetch_all
+
+    async def fetch_then_add():
+        providers = await fetch_all()
+        await directory.add({"provider_id": "8", "first_name": "Lena", "last_name": "Park"})
+        return providers
+
+    directory.fetch_all = fetch_then_add
+    count = asyncio.run(directory.sync())
+
+    assert count == 4
+    assert [request.url.params["page"] for request in charm_http.requests] == ["1", "2"]
+    assert set(repository.rows) == {"1", "2", "3", "8"}
+    assert directory.search("Lena Park")[0]["provider_id"] == "8"
+    assert directory.get_stats()["syncs"] == 1
+
+
+def test_agent_tool_answers_from_the_index_and_applies_new_providers(monkeypatch, mock_charm):
+    charm_http = mock_charm(_directory_handler(PROVIDERS), agent_module)
+    directory = ProviderDirectory(repository=FakeRepository(PROVIDERS), http_client=charm_http)
+    monkeypatch.setattr(agent_module, "get_charm_http_client", lambda: charm_http)
+    monkeypatch.setattr(agent_module, "provider_search_cache", ProviderSearchCache(ttl_seconds=60))
+    monkeypatch.setattr(agent_module, "provider_directory", directory)
+
+    async def run():
+        await directory.load()
+        found = await agent_module.search_providers("Robert Alverez")
+        await agent_module.add_provider_to_charm({"first_name": "Maria", "last_name": "Okafor", "practice_name": "Sonoran Pediatrics"})
+        added = await agent_module.search_providers("Maria Okafor")
+        return found, added
+
+    found, added = asyncio.run(run())
+
+    assert found[0]["provider_id"] == "3" and found[0]["match_score"] >= 0.6
+    assert added[0]["provider_id"] == "9" and added[0]["practice_name"] == "Sonoran Pediatrics"
+    assert [request.method for request in charm_http.requests] == ["POST"]
+    assert directory.get_stats()["incremental_updates"] == 1
+
+
+def test_providers_found_in_charm_are_mirrored_in_one_upsert(monkeypatch, mock_charm):
+    found = [{"provider_id": "21", "first_name": "Lena", "last_name": "Park"}, {"provider_id": "22", "first_name": "Lena", "last_name": "Parker"}]
+    charm_http = mock_charm(lambda request: httpx.Response(200, json={"code": "0", "providers": found}), agent_module)
+    repository = FakeRepository(PROVIDERS)
+    upserts = []
+    upsert_providers = repository.upsert_providers
+
+    async def record_upsert(providers, synced_at):
+        upserts.append([provider["provider_id"] for provider in providers])
+        await upsert_providers(providers, synced_at)
+
+    repository.upsert_providers = record_upsert
+    directory = ProviderDirectory(repository=repository, http_client=charm_http)
+    monkeypatch.setattr(agent_module, "get_charm_http_client", lambda: charm_http)
+    monkeypatch.setattr(agent_module, "provider_search_cache", ProviderSearchCache(ttl_seconds=60))
+    monkeypatch.setattr(agent_module, "provider_directory", directory)
+
+    async def run():
+        await directory.load()
+        return await agent_module.search_providers("Lena Park")
+
+    assert asyncio.run(run()) == found
+    assert upserts == [["21", "22"]]
+    assert directory.search("Lena Parker")[0]["provider_id"] == "22"
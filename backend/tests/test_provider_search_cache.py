@@ -0,0 +1,84 @@
+"""
+Test the provider search cache: normalized keys, TTL/LRU eviction and invalidation when a provider is added
+"""
+
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+
+from app.services import ehr_service as ehr_module
+from app.services import pydantic_intake_agent as agent_module
+from app.services.provider_search_cache import ProviderSearchCache, normalize_search_params
+
+PROVIDER = {"provider_id": "77", "first_name": "Ann", "last_name": "Lee", "practice_name": "Desert Family Care"}
+
+
+def _directory_handler(request):
+    if request.method == "GET":
+        return httpx.Response(200, json={"code": "0", "providers": [PROVIDER]})
+    return httpx.Response(200, json={"code": "0", "provider_details": {"provider_id": "78"}})
+
+
+def test_keys_ignore_case_spacing_and_phone_formatting():
+    first = normalize_search_params({"first_name": "Ann", "last_name": "  LEE ", "mobile": "(520) 555-0100"})
+    second = normalize_search_params({"mobile": "520.555.0100", "last_name": "lee", "first_name": "ann", "practice_name": None})
+
+    assert first == second
+
+
+def test_entries_expire_and_least_recently_used_is_evicted(monkeypatch):
+    cache = ProviderSearchCache(ttl_seconds=60, max_entries=2)
+    cache.put({"last_name": "Lee"}, [PROVIDER])
+    cache.put({"last_name": "Kim"}, [])
+    assert cache.get({"last_name": "lee"}) == [PROVIDER]  # Lee is now most recent
+    cache.put({"last_name": "Diaz"}, [])
+
+    assert cache.get({"last_name": "Kim"}) is None
+    assert cache.get({"last_name": "Lee"}) == [PROVIDER]
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr("app.core.ttl_cache.time.monotonic", lambda: later)
+    assert cache.get({"last_name": "Lee"}) is None
+    assert cache.get_stats()["stale"] == 1
+
+
+def test_agent_tool_serves_repeats_locally_until_a_provider_is_added(monkeypatch, mock_charm):
+    charm_http = mock_charm(_directory_handler, agent_module)
+    cache = ProviderSearchCache(ttl_seconds=60)
+    monkeypatch.setattr(agent_module, "get_charm_http_client", lambda: charm_http)
+    monkeypatch.setattr(agent_module, "provider_search_cache", cache)
+
+    async def run():
+        first = await agent_module.search_providers("Ann Lee")
+        first[0]["last_name"] = "changed by caller"
+        second = await agent_module.search_providers("ann  LEE")
+        await agent_module.add_provider_to_charm({"first_name": "Bo", "last_name": "Lee"})
+        third = await agent_module.search_providers("Ann Lee")
+        return second, third
+
+    second, third = asyncio.run(run())
+
+    searches = [request for request in charm_http.requests if request.method == "GET"]
+    assert second == [PROVIDER] and third == [PROVIDER]
+    assert len(searches) == 2
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["invalidations"] == 1
+
+
+def test_service_search_returns_and_caches_the_provider_list(mock_charm):
+    charm_http = mock_charm(_directory_handler)
+    cache = ProviderSearchCache(ttl_seconds=60)
+    service = ehr_module.EHRService(http_client=charm_http, provider_cache=cache, provider_directory=SimpleNamespace(is_ready=False))
+
+    async def run():
+        return await service.search_providers("Ann Lee"), await service.search_providers("Ann Lee")
+
+    first, second = asyncio.run(run())
+
+    assert first == [PROVIDER] and second == [PROVIDER]
+    assert len(charm_http.requests) == 1
@@ -0,0 +1,102 @@
+"""
+Test the persistent provider web search cache: normalized keys, TTL, store failures and the agent tool
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import httpx
+
+from app.services import pydantic_intake_agent as agent_module
+from app.services.provider_web_search_cache import ProviderWebSearchCache, web_search_key
+
+
+class FakeRepository:
+    """In-memory stand-in for the Supabase table"""
+
+    def __init__(self, fail=False):
+        self.rows = {}
+        self.fail = fail
+        self.reads = 0
+
+    async def get_unexpired(self, cache_key):
+        self.reads += 1
+        if self.fail:
+            raise RuntimeError("supabase unavailable")
+        row = self.rows.get(cache_key)
+        if row and datetime.fromisoformat(row["expires_at"]) > datetime.utcnow():
+            return row
+        return None
+
+    async def save(self, entry):
+        if self.fail:
+            raise RuntimeError("supabase unavailable")
+        self.rows[entry["cache_key"]] = entry
+
+
+def test_keys_ignore_titles_case_and_punctuation():
+    assert web_search_key("Dr. Ann Lee, MD", "Tucson", "AZ") == web_search_key("ann  lee", "tucson", "az")
+    assert web_search_key("Ann Lee", "Tucson", "AZ") != web_search_key("Ann Lee", "Phoenix", "AZ")
+
+
+def test_answers_are_shared_through_the_store_until_they_expire():
+    repository = FakeRepository()
+    writer = ProviderWebSearchCache(ttl_seconds=3600, repository=repository)
+    reader = ProviderWebSearchCache(ttl_seconds=3600, repository=repository)
+
+    async def run():
+        await writer.put("Ann Lee", "Desert Family Care, (520) 555-0100", "Tucson", "AZ")
+        first = await reader.get("Dr Ann Lee", "Tucson", "AZ")
+        second = await reader.get("Ann Lee", "Tucson", "AZ")
+        key = web_search_key("Ann Lee", "Tucson", "AZ")
+        repository.rows[key]["expires_at"] = (datetime.utcnow() - timedelta(seconds=1)).isoformat()
+        expired = await ProviderWebSearchCache(ttl_seconds=3600, repository=repository).get("Ann Lee", "Tucson", "AZ")
+        return first, second, expired
+
+    first, second, expired = asyncio.run(run())
+
+    assert first == second == "Desert Family Care, (520) 555-0100"
+    assert expired is None
+    stats = reader.get_stats()
+    assert stats["store_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_store_failures_are_misses():
+    cache = ProviderWebSearchCache(ttl_seconds=3600, repository=FakeRepository(fail=True))
+
+    async def run():
+        missing = await cache.get("Ann Lee")
+        await cache.put("Ann Lee", "content")
+        return missing, await cache.get("Ann Lee")
+
+    missing, remembered = asyncio.run(run())
+
+    assert missing is None and remembered == "content"
+    assert cache.get_stats()["errors"] == 2
+
+
+def test_agent_tool_calls_perplexity_once_per_provider(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Desert Family Care, (520) 555-0100"}}]})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(agent_module.httpx, "AsyncClient", lambda: real_client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "test-key")
+    monkeypatch.setattr(agent_module, "provider_web_search_cache", ProviderWebSearchCache(ttl_seconds=3600, repository=FakeRepository()))
+
+    async def run():
+        first = await agent_module.web_search_provider("Ann Lee", city="Tucson", state="AZ")
+        second = await agent_module.web_search_provider("Dr. Ann Lee", city="tucson", state="az")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert "Desert Family Care" in first
+    assert second.replace("Dr. Ann Lee", "Ann Lee") == first
+    assert len(calls) == 1
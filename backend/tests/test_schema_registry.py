@@ -0,0 +1,37 @@
+"""
+Test the precompiled intake schema registry
+"""
+
+from app.models.intake_schemas import IntakeMedicalHistory
+from app.services.schema_registry import SchemaRegistry, schema_registry
+
+
+def test_sections_are_compiled_once():
+    section = schema_registry.get("intake_demographics")
+
+    assert section is not None
+    assert section.schema_info.startswith("Schema for intake_demographics:")
+    assert schema_registry.get("intake_demographics") is section
+    assert "isComplete" not in section.field_paths
+
+
+def test_field_paths_are_returned_as_copies():
+    paths = schema_registry.field_paths("intake_weight_history")
+    paths.clear()
+
+    assert schema_registry.field_paths("intake_weight_history")
+
+
+def test_resolved_schema_has_no_refs_and_required_flags():
+    registry = SchemaRegistry({"intake_medical_history": IntakeMedicalHistory})
+    section = registry.get("intake_medical_history")
+
+    assert "$ref" not in str(section.resolved_schema)
+    assert set(section.required_fields) == set(section.field_paths)
+    assert section.required_fields["socialHistory.smokingSummary"] is True
+
+
+def test_unknown_section():
+    assert schema_registry.get("bogus") is None
+    assert schema_registry.field_paths("bogus") == []
+    assert schema_registry.schema_info("bogus") == "Unknown section: bogus"
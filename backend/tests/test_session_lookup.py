@@ -0,0 +1,75 @@
+"""
+Test that verify_session uses an indexed JSONB containment lookup
+instead of scanning the whole poc_intake_sessions table
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.repositories.intake_repository import IntakeSessionRepository
+
+
+class FakeQuery:
+    """Records the PostgREST builder calls made by the repository"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def table(self, name):
+        self.calls.append(("table", name))
+        return self
+
+    def select(self, columns):
+        self.calls.append(("select", columns))
+        return self
+
+    def filter(self, column, operator, value):
+        self.calls.append(("filter", column, operator, value))
+        return self
+
+    def limit(self, count):
+        self.calls.append(("limit", count))
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+
+def _repository_with(rows):
+    fake = FakeQuery(rows)
+    repository = IntakeSessionRepository()
+
+    async def get_client():
+        return fake
+
+    repository._get_client = get_client
+    return repository, fake
+
+
+def test_verify_session_uses_containment_filter():
+    record = {
+        "id": "record-1",
+        "charm_mrn": "12345",
+        "sessions": [
+            {"session_id": "old-session", "confirmed": True},
+            {"session_id": "new-session", "confirmed": False},
+        ],
+    }
+    repository, fake = _repository_with([record])
+
+    result = asyncio.run(repository.verify_session("new-session"))
+
+    assert result["id"] == "record-1"
+    assert result["current_session"]["session_id"] == "new-session"
+
+    filters = [call for call in fake.calls if call[0] == "filter"]
+    assert filters == [("filter", "sessions", "cs", json.dumps([{"session_id": "new-session"}]))]
+    assert ("limit", 1) in fake.calls
+
+
+def test_verify_session_returns_none_when_not_found():
+    repository, _ = _repository_with([])
+
+    assert asyncio.run(repository.verify_session("missing-session")) is None
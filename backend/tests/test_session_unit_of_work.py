@@ -0,0 +1,191 @@
+"""
+Test the per-request session unit of work: one read, staged changes, one combined write
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import pytest
+
+from app.repositories.intake_repository import IntakeSessionRepository
+from app.routers import chat as chat_module
+from app.services.pydantic_intake_agent import IntakeAgentResponse, IntakeContext
+
+
+class FakeSessionDatabase:
+    """In-memory poc_intake_sessions row with the semantics of apply_session_changes"""
+
+    def __init__(self, intake):
+        self.row = {
+            "id": "record-1",
+            "charm_patient_id": "patient-1",
+            "intake": intake,
+            "intake_version": 0,
+            "sessions": [{"session_id": "session-1", "confirmed": False}],
+        }
+        self.calls = []
+        self.before_apply = None  # hook to simulate a write landing between load and commit
+
+    def rpc(self, name, params):
+        self.calls.append(("rpc", name))
+        return SimpleNamespace(execute=lambda: self._apply(params))
+
+    async def _apply(self, params):
+        if self.before_apply:
+            hook, self.before_apply = self.before_apply, None
+            hook()
+        expected = params["p_expected_version"]
+        if expected is not None and expected != self.row["intake_version"]:
+            return SimpleNamespace(data=None)
+        if params["p_intake_patch"]:
+            self.row["intake"] = {**self.row["intake"], **params["p_intake_patch"]}
+            self.row["intake_version"] += 1
+        for entry in self.row["sessions"]:
+            if entry["session_id"] == params["p_session_id"]:
+                entry.update(params["p_session_updates"])
+        return SimpleNamespace(data=self.row["intake_version"])
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self.calls.append(("select", columns))
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=[{"intake": dict(self.row["intake"]), "intake_version": self.row["intake_version"]}])
+
+
+def _repository(database):
+    repository = IntakeSessionRepository()
+
+    async def get_client():
+        return database
+
+    async def verify_session(session_id):
+        database.calls.append(("verify_session", session_id))
+        record = {**database.row, "intake": dict(database.row["intake"]), "sessions": [dict(s) for s in database.row["sessions"]]}
+        record["current_session"] = record["sessions"][0]
+        return record
+
+    repository._get_client = get_client
+    repository.verify_session = verify_session
+    return repository
+
+
+def test_turn_reads_once_and_writes_once():
+    database = FakeSessionDatabase({"intake_demographics": {"firstName": "Jane"}})
+    repository = _repository(database)
+    queued = []
+
+    async def turn():
+        async with repository.unit_of_work("session-1") as unit_of_work:
+            await repository.confirm_session("session-1", unit_of_work=unit_of_work)
+            await repository.update_session_intake("record-1", {
+                "intake_demographics": {"firstName": "Jane", "email": "jane@example.com"},
+                "intake_demographics_tracking": {"isComplete": True},
+            }, unit_of_work=unit_of_work)
+            await repository.mark_section_complete("session-1", "intake_demographics", unit_of_work=unit_of_work)
+
+            async def enqueue():
+                queued.append(dict(database.row["intake"]["intake_demographics"]))
+
+            unit_of_work.after_commit(enqueue)
+            assert database.calls == [("verify_session", "session-1")]
+
+    asyncio.run(turn())
+
+    assert database.calls == [("verify_session", "session-1"), ("rpc", "apply_session_changes")]
+    assert database.row["intake"]["intake_demographics"] == {"firstName": "Jane", "email": "jane@example.com", "isComplete": True}
+    assert database.row["sessions"][0]["confirmed"] is True
+    assert database.row["intake_version"] == 1
+    # after_commit callbacks see the stored data
+    assert queued == [{"firstName": "Jane", "email": "jane@example.com", "isComplete": True}]
+
+
+def test_conflict_merges_staged_sections_over_latest():
+    database = FakeSessionDatabase({"intake_demographics": {"firstName": "Jane"}})
+    repository = _repository(database)
+
+    def concurrent_write():
+        database.row["intake"]["intake_demographics"] = {"firstName": "Jane", "phone": {"mobile": "5205550100"}}
+        database.row["intake_version"] += 1
+
+    async def turn():
+        async with repository.unit_of_work("session-1") as unit_of_work:
+            await repository.mark_section_complete("session-1", "intake_demographics", unit_of_work=unit_of_work)
+            database.before_apply = concurrent_write
+
+    asyncio.run(turn())
+
+    assert database.row["intake"]["intake_demographics"] == {
+        "firstName": "Jane",
+        "phone": {"mobile": "5205550100"},
+        "isComplete": True,
+    }
+    assert database.row["intake_version"] == 2
+
+
+def test_error_discards_staged_changes():
+    database = FakeSessionDatabase({})
+    repository = _repository(database)
+
+    async def turn():
+        async with repository.unit_of_work("session-1") as unit_of_work:
+            await repository.update_session_data("session-1", {"verification_attempts": 1}, unit_of_work=unit_of_work)
+            raise RuntimeError("agent failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(turn())
+
+    assert [call for call in database.calls if call[0] == "rpc"] == []
+    assert "verification_attempts" not in database.row["sessions"][0]
+
+
+def test_chat_turn_does_not_revert_a_concurrent_tracking_write(monkeypatch):
+    intake = {
+        "intake_demographics": {"firstName": "Jane", "isComplete": True},
+        "intake_demographics_tracking": {"unasked_fields": [], "isComplete": True, "pushed_to_charm": False},
+        "intake_weight_history": {"currentWeight": 210},
+        "intake_weight_history_tracking": {"unasked_fields": ["maxWeight"], "isComplete": False, "pushed_to_charm": False},
+    }
+    database = FakeSessionDatabase(intake)
+    repository = _repository(database)
+    monkeypatch.setattr(chat_module, "intake_repository", repository)
+
+    async def add_messages(session_id, messages):
+        return True
+
+    monkeypatch.setattr(chat_module.chat_history_repository, "add_messages", add_messages)
+    monkeypatch.setattr(chat_module.conversation_memory, "schedule_refresh", lambda unit_of_work, window: None)
+
+    def push_worker_write_back():
+        tracking = dict(database.row["intake"]["intake_demographics_tracking"], pushed_to_charm=True)
+        database.row["intake"] = {**database.row["intake"], "intake_demographics_tracking": tracking}
+        database.row["intake_version"] += 1
+
+    async def turn():
+        async with repository.unit_of_work("session-1") as unit_of_work:
+            context = IntakeContext(session_id="session-1", current_section="intake_weight_history", intake_data=dict(unit_of_work.intake))
+            # As returned by the agent: the whole intake with the current section merged in
+            updated_data = {
+                **context.intake_data,
+                "intake_weight_history": {"currentWeight": 210, "maxWeight": 240},
+                "intake_weight_history_tracking": {"unasked_fields": [], "isComplete": False, "pushed_to_charm": False},
+            }
+            response = IntakeAgentResponse(response="Thanks", current_section="intake_weight_history", updated_data=updated_data)
+            await chat_module._save_conversation_turn(SimpleNamespace(session_id="session-1", message="240"), unit_of_work, context, response)
+            assert set(unit_of_work.intake_patch) == {"intake_weight_history", "intake_weight_history_tracking"}
+            database.before_apply = push_worker_write_back
+
+    asyncio.run(turn())
+
+    assert database.row["intake"]["intake_demographics_tracking"]["pushed_to_charm"] is True
+    assert database.row["intake"]["intake_weight_history"] == {"currentWeight": 210, "maxWeight": 240}
+    assert database.row["intake"]["intake_weight_history_tracking"]["unasked_fields"] == []
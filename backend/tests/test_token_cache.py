@@ -0,0 +1,100 @@
+"""
+Test the in-process Charm token cache and single-flight refresh
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.core import token_manager as token_module
+from app.core.token_manager import CharmTokenManager
+
+
+class FakeTokenManager(CharmTokenManager):
+    """Token manager with an in-memory authTokens row"""
+
+    def __init__(self, stored=None):
+        super().__init__()
+        self.stored = stored
+        self.db_reads = 0
+        self.db_writes = 0
+
+    def _get_secret(self, secret_name: str) -> str:
+        return f"{secret_name}-value"
+
+    async def _get_token_from_db(self):
+        self.db_reads += 1
+        return self.stored
+
+    async def _save_token_to_db(self, access_token: str, expires_in: int) -> None:
+        self.db_writes += 1
+        self.stored = {
+            "authToken": access_token,
+            "tokenExpiration": (datetime.utcnow() + timedelta(seconds=expires_in)).isoformat(),
+        }
+
+
+def _mock_oauth(monkeypatch, expires_in=3600):
+    calls = []
+    real_client = httpx.AsyncClient
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"access_token": f"token-{len(calls)}", "expires_in": expires_in})
+
+    monkeypatch.setattr(
+        token_module.httpx, "AsyncClient",
+        lambda *args, **kwargs: real_client(transport=httpx.MockTransport(handler))
+    )
+    return calls
+
+
+def test_cold_start_reads_database_once():
+    stored = {
+        "authToken": "stored-token",
+        "tokenExpiration": (datetime.utcnow() + timedelta(hours=1)).isoformat() + "Z",
+    }
+    manager = FakeTokenManager(stored)
+
+    async def run():
+        return [await manager.get_token() for _ in range(5)]
+
+    assert asyncio.run(run()) == ["stored-token"] * 5
+    assert manager.db_reads == 1
+    assert manager.db_writes == 0
+
+
+def test_concurrent_callers_share_one_refresh(monkeypatch):
+    calls = _mock_oauth(monkeypatch)
+    manager = FakeTokenManager(stored=None)
+
+    async def run():
+        return await asyncio.gather(*(manager.get_token() for _ in range(10)))
+
+    tokens = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert set(tokens) == {"token-1"}
+    assert manager.db_reads == 1
+    assert manager.db_writes == 1
+
+
+def test_token_near_expiry_refreshes_in_background(monkeypatch):
+    calls = _mock_oauth(monkeypatch)
+    manager = FakeTokenManager()
+    # Still valid, but inside the proactive refresh window
+    manager._set_cached_token("old-token", datetime.utcnow() + timedelta(seconds=120))
+
+    async def run():
+        token = await manager.get_token()
+        await manager._background_refresh
+        return token, await manager.get_token()
+
+    first, second = asyncio.run(run())
+
+    assert first == "old-token"
+    assert second == "token-1"
+    assert len(calls) == 1
+    assert manager.db_reads == 0
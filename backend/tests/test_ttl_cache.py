@@ -0,0 +1,36 @@
+"""
+Test the shared TTL + LRU cache: copies, per-entry TTL, eviction and shared stats
+"""
+
+from app.core.ttl_cache import CacheStats, TTLCache
+
+
+def test_values_are_copied_and_least_recently_used_is_evicted():
+    cache = TTLCache(ttl_seconds=60, max_entries=2)
+    record = {"name": "Jane"}
+    cache.put("a", record)
+    record["name"] = "changed by caller"
+    cache.put("b", {})
+
+    assert cache.get("a") == {"name": "Jane"}  # a is now most recent
+    cache.put("c", {})
+
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.update("a", {"city": "Tucson"}) and cache.get("a") == {"name": "Jane", "city": "Tucson"}
+    assert cache.discard_where(lambda key, value: "city" in value) == 1
+
+
+def test_entries_expire_per_ttl_and_stats_can_be_shared(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.ttl_cache.time.monotonic", lambda: now[0])
+    stats = CacheStats()
+    first, second = TTLCache(ttl_seconds=60, stats=stats), TTLCache(ttl_seconds=60, stats=stats)
+    first.put("a", "kept")
+    second.put("b", "short", ttl_seconds=5)
+
+    now[0] += 10
+    assert first.get("a") == "kept"
+    assert second.get("b") is None
+
+    assert stats.as_dict() == {"hits": 1, "misses": 1, "stale": 1, "invalidations": 0, "hit_ratio": 0.5}
@@ -153,10 +153,13 @@ function ChatbotPageContent() {
     // Scroll to bottom immediately after adding user message
     setTimeout(() => scrollToBottom(), 50);
 
+    // Sage reply bubble, added once the stream opens
+    const sageId = `msg-${Date.now()}-sage`;
+
     try {
       // Call the backend API
       const apiUrl = getApiUrl();
-      const response = await fetch(`${apiUrl}/api/v1/chat`, {
+      const response = await fetch(`${apiUrl}/api/v1/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -167,32 +170,69 @@ function ChatbotPageContent() {
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      const sageResponse: Message = {
-        id: `msg-${Date.now()}-sage`,
-        text: data.response || "I received your message and I'm processing it.",
+      // Add an empty sage message and fill it in as deltas arrive
+      let sageText = "";
+      setMessages(prev => [...prev, {
+        id: sageId,
+        text: "",
         sender: "sage",
         timestamp: new Date()
+      }]);
+
+      const updateSageMessage = (text: string) => {
+        setMessages(prev => prev.map(msg => msg.id === sageId ? { ...msg, text } : msg));
       };
-      
-      setMessages(prev => [...prev, sageResponse]);
-      
-      // Scroll to bottom after adding sage response
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events are separated by a blank line
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf("\n\n");
+
+          const eventType = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1];
+          if (!eventType || !dataLine) continue;
+          const data = JSON.parse(dataLine);
+
+          if (eventType === "delta") {
+            sageText += data.text;
+            updateSageMessage(sageText);
+            scrollToBottom();
+          } else if (eventType === "final") {
+            sageText = data.response || sageText || "I received your message and I'm processing it.";
+            updateSageMessage(sageText);
+          } else if (eventType === "error") {
+            throw new Error(data.detail);
+          }
+        }
+      }
+
+      // Scroll to bottom after the sage response is complete
       setTimeout(() => scrollToBottom(), 100);
     } catch (error) {
       console.error('Error calling backend:', error);
       const errorResponse: Message = {
-        id: `msg-${Date.now()}-sage`,
+        id: `msg-${Date.now()}-sage-error`,
         text: "I'm sorry, I'm having trouble connecting right now. Please try again in a moment.",
         sender: "sage",
         timestamp: new Date()
       };
-      setMessages(prev => [...prev, errorResponse]);
+      // Drop the empty or half-filled streaming bubble so only the error remains
+      setMessages(prev => [...prev.filter(msg => msg.id !== sageId), errorResponse]);
       
       // Scroll to bottom after adding error response
       setTimeout(() => scrollToBottom(), 100);